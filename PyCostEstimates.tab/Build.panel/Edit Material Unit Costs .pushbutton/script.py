@@ -1,47 +1,74 @@
-# Material Unit Costs 1 - pyRevit Pushbutton
-# Robust CSV locator (no hard-coded folders)
+# -*- coding: utf-8 -*-
+"""
+Material Unit Costs editor.
 
-import os
-from pyrevit import script, forms
+Edits material_unit_costs.csv (and recipes.csv, second tab) in a
+window instead of Excel: the files are not locked while it is open, the
+rates of the recipes using an edited price and the project total are
+updated live, and Save writes the CSVs atomically.
+"""
+from pyrevit import revit, DB, forms
 
-# ---------------------------------------------------------------------
-# Start searching from the script directory
-# ---------------------------------------------------------------------
-start_dir = os.path.dirname(__file__)
-target_file = "material_unit_costs.csv"
-
-found_path = None
-
-# Walk up directories (max 6 levels for safety)
-current_dir = start_dir
-for _ in range(6):
-    # Walk through subfolders
-    for root, dirs, files in os.walk(current_dir):
-        if target_file in files:
-            found_path = os.path.join(root, target_file)
-            break
-    if found_path:
-        break
-    current_dir = os.path.abspath(os.path.join(current_dir, ".."))
+from pce import PROVINCES, BASES, cost_column as make_cost_column
+from pce import amounts, editorwindow
+
+doc = revit.doc
+
+CATEGORIES = [
+    DB.BuiltInCategory.OST_Walls,
+    DB.BuiltInCategory.OST_Floors,
+    DB.BuiltInCategory.OST_Roofs,
+    DB.BuiltInCategory.OST_Ceilings,
+    DB.BuiltInCategory.OST_Doors,
+    DB.BuiltInCategory.OST_Windows,
+    DB.BuiltInCategory.OST_StructuralColumns,
+    DB.BuiltInCategory.OST_StructuralFraming,
+    DB.BuiltInCategory.OST_StructuralFoundation,
+    DB.BuiltInCategory.OST_Conduit,
+    DB.BuiltInCategory.OST_ElectricalFixtures,
+    DB.BuiltInCategory.OST_ElectricalEquipment,
+    DB.BuiltInCategory.OST_LightingFixtures,
+    DB.BuiltInCategory.OST_LightingDevices,
+    DB.BuiltInCategory.OST_PlumbingFixtures,
+    DB.BuiltInCategory.OST_PipeCurves,
+    DB.BuiltInCategory.OST_PipeFitting,
+    DB.BuiltInCategory.OST_PipeAccessory,
+    DB.BuiltInCategory.OST_GenericModel,
+    DB.BuiltInCategory.OST_Rebar,
+    DB.BuiltInCategory.OST_SpecialityEquipment,
+]
 
 # ---------------------------------------------------------------------
-# Validate
+# Scenario shown live while editing
 # ---------------------------------------------------------------------
-if not found_path:
-    forms.alert(
-        "Material Unit Costs file not found.\n\n"
-        "Searched upward from:\n{}".format(start_dir),
-        title="Material Unit Costs 1"
-    )
-    script.exit()
+province = forms.SelectFromList.show(
+    PROVINCES,
+    title="Select Province",
+    button_name="Use Selected Province"
+)
+if not province:
+    raise SystemExit
+
+cost_basis = forms.SelectFromList.show(
+    BASES,
+    title="Select Unit Cost Basis",
+    button_name="Use Selected Cost"
+)
+if not cost_basis:
+    raise SystemExit
 
 # ---------------------------------------------------------------------
-# Open CSV
+# Model quantities from the last Update Amount run
 # ---------------------------------------------------------------------
-try:
-    os.startfile(found_path)
-except Exception as ex:
-    forms.alert(
-        "Failed to open Material Unit Costs file.\n\n{}".format(ex),
-        title="Material Unit Costs 1"
-    )
+by_type, project_total = amounts.collect(doc, CATEGORIES)
+quantities = dict(
+    (tname, info.quantity) for tname, info in by_type.items() if info.quantity
+)
+
+editorwindow.show(
+    doc,
+    make_cost_column(province, cost_basis),
+    quantities,
+    project_total,
+    tab=editorwindow.PRICES,
+)
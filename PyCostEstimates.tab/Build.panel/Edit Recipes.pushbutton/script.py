@@ -1,40 +1,74 @@
-import os
-from pyrevit import forms
+# -*- coding: utf-8 -*-
+"""
+Recipe (rate build-up) editor.
 
-# -----------------------------------------------------------------------------
-# Resolve extension root
-# -----------------------------------------------------------------------------
-script_dir = os.path.dirname(__file__)
+Edits recipes.csv (and material_unit_costs.csv, first tab) in a
+window instead of Excel: the files are not locked while it is open, the
+rates of the edited recipes, everything built on them and the project
+total are updated live, and Save writes the CSVs atomically.
+"""
+from pyrevit import revit, DB, forms
 
-extension_root = os.path.abspath(
-    os.path.join(script_dir, "..", "..", "..")
+from pce import PROVINCES, BASES, cost_column as make_cost_column
+from pce import amounts, editorwindow
+
+doc = revit.doc
+
+CATEGORIES = [
+    DB.BuiltInCategory.OST_Walls,
+    DB.BuiltInCategory.OST_Floors,
+    DB.BuiltInCategory.OST_Roofs,
+    DB.BuiltInCategory.OST_Ceilings,
+    DB.BuiltInCategory.OST_Doors,
+    DB.BuiltInCategory.OST_Windows,
+    DB.BuiltInCategory.OST_StructuralColumns,
+    DB.BuiltInCategory.OST_StructuralFraming,
+    DB.BuiltInCategory.OST_StructuralFoundation,
+    DB.BuiltInCategory.OST_Conduit,
+    DB.BuiltInCategory.OST_ElectricalFixtures,
+    DB.BuiltInCategory.OST_ElectricalEquipment,
+    DB.BuiltInCategory.OST_LightingFixtures,
+    DB.BuiltInCategory.OST_LightingDevices,
+    DB.BuiltInCategory.OST_PlumbingFixtures,
+    DB.BuiltInCategory.OST_PipeCurves,
+    DB.BuiltInCategory.OST_PipeFitting,
+    DB.BuiltInCategory.OST_PipeAccessory,
+    DB.BuiltInCategory.OST_GenericModel,
+    DB.BuiltInCategory.OST_Rebar,
+    DB.BuiltInCategory.OST_SpecialityEquipment,
+]
+
+# ---------------------------------------------------------------------
+# Scenario shown live while editing
+# ---------------------------------------------------------------------
+province = forms.SelectFromList.show(
+    PROVINCES,
+    title="Select Province",
+    button_name="Use Selected Province"
 )
+if not province:
+    raise SystemExit
 
-# -----------------------------------------------------------------------------
-# Path to the SHARED recipes.csv
-# -----------------------------------------------------------------------------
-recipes_csv = os.path.join(
-    extension_root,
-    "PyCostEstimates.tab",
-    "Update.panel",
-    "Apply Rate.pushbutton",
-    "recipes.csv"
+cost_basis = forms.SelectFromList.show(
+    BASES,
+    title="Select Unit Cost Basis",
+    button_name="Use Selected Cost"
 )
+if not cost_basis:
+    raise SystemExit
 
-# -----------------------------------------------------------------------------
-# Open CSV safely
-# -----------------------------------------------------------------------------
-if not os.path.exists(recipes_csv):
-    forms.alert(
-        "recipes.csv not found at:\n\n{}".format(recipes_csv),
-        warn_icon=True
-    )
-else:
-    try:
-        os.startfile(recipes_csv)
-    except Exception as e:
-        forms.alert(
-            "Failed to open recipes.csv:\n\n{}\n\n{}"
-            .format(recipes_csv, str(e)),
-            warn_icon=True
-        )
+# ---------------------------------------------------------------------
+# Model quantities from the last Update Amount run
+# ---------------------------------------------------------------------
+by_type, project_total = amounts.collect(doc, CATEGORIES)
+quantities = dict(
+    (tname, info.quantity) for tname, info in by_type.items() if info.quantity
+)
+
+editorwindow.show(
+    doc,
+    make_cost_column(province, cost_basis),
+    quantities,
+    project_total,
+    tab=editorwindow.RECIPES,
+)
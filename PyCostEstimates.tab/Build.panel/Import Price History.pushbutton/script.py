@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Import the current price book and recipes into the price history.
+"""
+from pyrevit import forms, script
+
+from pce import paths, pricebook, pricedb
+from pce import recipes as recipe_loader
+
+output = script.get_output()
+
+if not pricedb.available():
+    forms.alert(
+        "SQLite is not available in this Python engine, so the price "
+        "history cannot be used.",
+        title="Import Price History"
+    )
+    script.exit()
+
+# ---------------------------------------------------------------------
+# Shift+Click: list revisions
+# ---------------------------------------------------------------------
+if __shiftclick__:  # noqa: F821 (pyRevit builtin)
+    output.print_table(
+        pricedb.history(),
+        columns=["Effective date", "Kind", "Rows stored", "Source"],
+        title="Price history: {}".format(paths.PRICE_DB)
+    )
+    script.exit()
+
+# ---------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------
+effective_date = forms.ask_for_string(
+    default=pricedb.today(),
+    prompt="Date (YYYY-MM-DD) from which these prices and recipes apply:",
+    title="Import Price History"
+)
+if not effective_date:
+    script.exit()
+
+try:
+    conn = pricedb.connect()
+    try:
+        stored, unchanged, report = pricedb.import_prices(
+            conn, paths.MATERIAL_COSTS_CSV, effective_date
+        )
+        recipe_rows = pricedb.import_recipes(
+            conn, paths.RECIPES_CSV, effective_date
+        )
+    finally:
+        conn.close()
+except (pricedb.PriceDBError, pricebook.PriceBookError,
+        recipe_loader.RecipeError) as ex:
+    forms.alert(str(ex), title="Import Price History")
+    script.exit()
+
+summary = [
+    "EFFECTIVE DATE: {}".format(pricedb.parse_date(effective_date)),
+    "PRICES STORED: {} (unchanged: {})".format(stored, unchanged),
+    "RECIPE ROWS STORED: {}".format(recipe_rows),
+    "DATABASE: {}".format(paths.PRICE_DB),
+]
+if report:
+    summary.append("\nPRICE BOOK ISSUES ({}):".format(len(report)))
+    for line in report[:20]:
+        summary.append("- " + line)
+
+forms.alert("\n".join(summary), title="Import Price History")
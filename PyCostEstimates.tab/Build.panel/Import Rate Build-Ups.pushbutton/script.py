@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Import the rate build-ups of an Excel workbook into recipes.csv.
+"""
+import os
+
+from pyrevit import forms, script
+
+from pce import editor, paths, rateimport, xlsx
+
+TITLE = "Import Rate Build-Ups"
+
+output = script.get_output()
+
+# ---------------------------------------------------------------------
+# Workbook
+# ---------------------------------------------------------------------
+workbook = paths.RATE_TEMPLATE_XLSX
+if __shiftclick__ or not os.path.exists(workbook):  # noqa: F821 (pyRevit builtin)
+    workbook = forms.pick_file(
+        file_ext="xlsx",
+        init_dir=paths.APPLY_RATE_DIR,
+        title="Rate build-up workbook",
+    )
+    if not workbook:
+        script.exit()
+
+try:
+    buildups, rejected = rateimport.extract(workbook)
+except xlsx.XlsxError as ex:
+    forms.alert(str(ex), title=TITLE)
+    script.exit()
+
+if not buildups:
+    forms.alert(
+        "No rate build-ups were found in {}.".format(os.path.basename(workbook)),
+        title=TITLE,
+    )
+    script.exit()
+
+# ---------------------------------------------------------------------
+# Pick and merge
+# ---------------------------------------------------------------------
+try:
+    sheet = editor.RecipeSheet.load(paths.RECIPES_CSV)
+except editor.EditorError as ex:
+    forms.alert(str(ex), title=TITLE)
+    script.exit()
+
+existing = set(sheet.recipe_name(n) for n in range(len(sheet.rows)))
+labels = dict(
+    (u"{}{}   [{}]".format(b.name, u"  (replace)" if b.name in existing else u"",
+                           b.sheet), b)
+    for b in buildups
+)
+chosen = forms.SelectFromList.show(
+    sorted(labels),
+    title="Build-ups to import ({} found)".format(len(buildups)),
+    button_name="Import",
+    multiselect=True,
+)
+if not chosen:
+    script.exit()
+
+chosen = [labels[label] for label in chosen]
+added, replaced = rateimport.merge(sheet, chosen)
+try:
+    sheet.save()
+except (IOError, OSError) as ex:
+    forms.alert(u"Could not save {}:\n\n{}".format(sheet.path, ex), title=TITLE)
+    script.exit()
+
+# ---------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------
+output.print_md("## Rate build-ups imported from {}".format(os.path.basename(workbook)))
+output.print_table(
+    [[b.name, b.sheet, b.ref, b.uom or "-", "{:,.2f}".format(b.total)] for b in chosen],
+    columns=["Type", "Sheet", "Cell", "UoM", "Workbook rate"],
+)
+if rejected:
+    output.print_md("### Not imported ({})".format(len(rejected)))
+    output.print_table(
+        [list(r) for r in rejected],
+        columns=["Sheet", "Build-up", "Cell", "Reason"],
+    )
+
+forms.alert(
+    "ADDED: {}\nREPLACED: {}\nNOT IMPORTED: {} (see the output window)\n\n"
+    "Saved to {}. Apply Rate picks the new recipes up on its next run.".format(
+        len(added), len(replaced), len(rejected), paths.RECIPES_CSV
+    ),
+    title=TITLE,
+)
@@ -7,6 +7,11 @@ import codecs
 from Autodesk.Revit.DB import *
 from pyrevit import revit
 
+from pce import params
+
+# "Type Comments" resolved once per category (see pce.params)
+type_comments_of = params.Accessors()[params.PARAM_TYPE_COMMENTS]
+
 doc = revit.doc
 
 # ---------------------------------------
@@ -61,7 +66,7 @@ for symbol in collector:
         if not type_name:
             continue
 
-        comment_param = symbol.LookupParameter("Type Comments")
+        comment_param = type_comments_of.get(symbol)
         type_comments = comment_param.AsString() if comment_param else ""
 
         rows.append([type_name, type_comments or ""])
@@ -7,6 +7,11 @@ import codecs
 from Autodesk.Revit.DB import *
 from pyrevit import revit, forms
 
+from pce import params
+
+# "Type Comments" resolved once per category (see pce.params)
+type_comments_of = params.Accessors()[params.PARAM_TYPE_COMMENTS]
+
 doc = revit.doc
 
 # --------------------------------------------------
@@ -75,7 +80,7 @@ with revit.Transaction("Update Type Comments from CSV"):
                 continue
 
             # Type Comments
-            comment_param = symbol.LookupParameter("Type Comments")
+            comment_param = type_comments_of.get(symbol)
             if not comment_param or comment_param.IsReadOnly:
                 skipped += 1
                 continue
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Cost risk analysis.
+
+Treats every material price as a triangular or PERT distribution over
+the province's Min / Avg / Max unit costs and reports P10 / P50 / P90
+rates per type, amounts per BOQ category and the grand total. Nothing
+in the model is written.
+"""
+import time
+from pyrevit import revit, DB, forms, script
+
+from pce import PROVINCES, amounts, layers, linear, modeltypes, paths, pricebook
+from pce import risk, snapshot
+from pce import recipes as recipe_loader
+
+doc = revit.doc
+output = script.get_output()
+
+# BOQ category per Revit category, as in Generate BOQ; walls, floors and
+# stairs are split internal / external by their type's Function.
+BOQ_CATEGORIES = {
+    DB.BuiltInCategory.OST_StructuralFoundation: "Structural Foundations",
+    DB.BuiltInCategory.OST_Floors: "Floors",
+    DB.BuiltInCategory.OST_Walls: "Walls",
+    DB.BuiltInCategory.OST_Stairs: "Stairs",
+    DB.BuiltInCategory.OST_StructuralColumns: "Structural Columns",
+    DB.BuiltInCategory.OST_StructuralFraming: "Structural Framing",
+    DB.BuiltInCategory.OST_Rebar: "Structural Rebar",
+    DB.BuiltInCategory.OST_Roofs: "Roofs",
+    DB.BuiltInCategory.OST_Ceilings: "Ceilings",
+    DB.BuiltInCategory.OST_Windows: "Windows",
+    DB.BuiltInCategory.OST_Doors: "Doors",
+    DB.BuiltInCategory.OST_Conduit: "Electrical",
+    DB.BuiltInCategory.OST_LightingFixtures: "Electrical",
+    DB.BuiltInCategory.OST_LightingDevices: "Electrical",
+    DB.BuiltInCategory.OST_ElectricalFixtures: "Electrical",
+    DB.BuiltInCategory.OST_ElectricalEquipment: "Electrical",
+    DB.BuiltInCategory.OST_PlumbingFixtures: "Plumbing",
+    DB.BuiltInCategory.OST_PipeCurves: "Plumbing",
+    DB.BuiltInCategory.OST_PipeFitting: "Plumbing",
+    DB.BuiltInCategory.OST_PipeAccessory: "Plumbing",
+    DB.BuiltInCategory.OST_GenericModel: "Wall and Floor Finishes",
+    DB.BuiltInCategory.OST_Furniture: "Furniture",
+    DB.BuiltInCategory.OST_FurnitureSystems: "Furniture",
+    DB.BuiltInCategory.OST_SpecialityEquipment: "Site Works",
+}
+SPLIT_BY_FUNCTION = ("Floors", "Walls", "Stairs")
+
+
+def boq_category(info):
+    name = BOQ_CATEGORIES.get(info.category, "Other")
+    if name in SPLIT_BY_FUNCTION:
+        external = any(w in info.function for w in ("exterior", "external", "outside"))
+        return ("External " if external else "Internal ") + name
+    return name
+
+
+# ---------------------------------------------------------------------
+# USER INPUTS
+# ---------------------------------------------------------------------
+province = forms.SelectFromList.show(
+    PROVINCES,
+    title="Select Province",
+    button_name="Use Selected Province"
+)
+if not province:
+    raise SystemExit
+
+method = forms.CommandSwitchWindow.show(
+    ["Triangular", "PERT"],
+    message="Price distribution between Min / Avg / Max:"
+)
+if not method:
+    raise SystemExit
+
+# ---------------------------------------------------------------------
+# Cost model and price ranges
+# ---------------------------------------------------------------------
+# The model's price snapshot, when Apply Rate stored one
+try:
+    stored = snapshot.load(doc)
+    if stored:
+        price_book, recipe_book, _aliases = stored
+        output.print_md("- Prices: {}".format(price_book.layers[0].name))
+    else:
+        price_book = layers.load(
+            project_csv=layers.project_override_path(doc.PathName)
+        )
+        recipe_book = recipe_loader.load(paths.RECIPES_CSV)
+except (pricebook.PriceBookError, recipe_loader.RecipeError,
+        snapshot.SnapshotError) as ex:
+    forms.alert(str(ex), title="Invalid Cost Data")
+    raise SystemExit
+
+try:
+    ranges = risk.price_ranges(price_book, province)
+finally:
+    price_book.close()
+
+# Recipe templates: a recipe for each of this model's matching types
+recipe_book.expand(modeltypes.type_names(doc, list(BOQ_CATEGORIES)))
+model = linear.LinearModel(recipe_book)
+
+# ---------------------------------------------------------------------
+# Model quantities per type
+# ---------------------------------------------------------------------
+by_type, model_total = amounts.collect(doc, list(BOQ_CATEGORIES))
+quantities = {}
+groups = {}
+for tname, info in by_type.items():
+    if tname in model and info.quantity:
+        quantities[tname] = info.quantity
+        groups[tname] = boq_category(info)
+
+# ---------------------------------------------------------------------
+# Simulation
+# ---------------------------------------------------------------------
+started = time.time()
+result = risk.simulate(
+    model, ranges, quantities, groups, method=method.lower()
+)
+elapsed = time.time() - started
+
+# Amounts of types without a simulated rate are carried as fixed values
+fixed = {}
+for tname, info in by_type.items():
+    if tname not in quantities or tname not in result.types:
+        group = boq_category(info)
+        fixed[group] = fixed.get(group, 0.0) + info.amount
+
+
+def fmt(values):
+    return ["{:,.2f}".format(v) for v in values]
+
+
+labels = ["P{}".format(p) for p in result.percentiles]
+
+output.print_md("## Cost Risk: {} ({})".format(province, method))
+output.print_md(
+    "{:,} samples, {} engine, {:.1f}s".format(
+        result.samples, result.backend, elapsed
+    )
+)
+
+fixed_total = sum(fixed.values())
+output.print_md("Current model total: {:,.2f}".format(model_total))
+output.print_table(
+    [fmt(v + fixed_total for v in result.total)],
+    columns=labels,
+    title="Grand total"
+)
+
+group_rows = []
+for group in sorted(set(result.groups) | set(fixed)):
+    base = fixed.get(group, 0.0)
+    sim = result.groups.get(group, (0.0,) * len(labels))
+    group_rows.append([group] + fmt(base + v for v in sim))
+output.print_table(
+    group_rows, columns=["BOQ category"] + labels, title="Per BOQ category"
+)
+
+output.print_table(
+    [[tname] + fmt(result.types[tname]) for tname in sorted(quantities)
+     if tname in result.types],
+    columns=["Type"] + labels,
+    title="Unit rate per type"
+)
+
+output.print_md(
+    "_Types without a recipe keep their current amount. Quantities come "
+    "from the last Update Amount run (Amount / Cost)._"
+)
+unpriced = sorted(t for t in quantities if t in result.skipped)
+if unpriced:
+    output.print_md("Types not simulated (no price range): {}".format(
+        ", ".join(unpriced)
+    ))
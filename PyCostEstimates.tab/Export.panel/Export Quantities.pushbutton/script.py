@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Quantity snapshot export.
+
+Saves the measured quantity, unit and current rate of every costed type
+to ``<model>_quantities.json`` beside the model (the Desktop for an
+unsaved model), so a BOQ can be rendered and re-priced without Revit:
+
+    python -m pce boq <model>_quantities.json -o boq.xlsx --province Lusaka --basis Avg
+
+Quantities are read back from ``Amount (Qty*Rate)``, so run Apply Rate
+and Update Amount first.
+"""
+import os
+
+from pyrevit import revit, DB, forms, script
+
+from pce import amounts, boq, paths
+from pce import recipes as recipe_loader
+
+doc = revit.doc
+output = script.get_output()
+
+# BOQ category per Revit category, as in Generate BOQ; walls, floors and
+# stairs are split internal / external by their type's Function.
+BOQ_CATEGORIES = {
+    DB.BuiltInCategory.OST_StructuralFoundation: "Structural Foundations",
+    DB.BuiltInCategory.OST_Floors: "Floors",
+    DB.BuiltInCategory.OST_Walls: "Walls",
+    DB.BuiltInCategory.OST_Stairs: "Stairs",
+    DB.BuiltInCategory.OST_StructuralColumns: "Structural Columns",
+    DB.BuiltInCategory.OST_StructuralFraming: "Structural Framing",
+    DB.BuiltInCategory.OST_Rebar: "Structural Rebar",
+    DB.BuiltInCategory.OST_Roofs: "Roofs",
+    DB.BuiltInCategory.OST_Ceilings: "Ceilings",
+    DB.BuiltInCategory.OST_Windows: "Windows",
+    DB.BuiltInCategory.OST_Doors: "Doors",
+    DB.BuiltInCategory.OST_Conduit: "Electrical",
+    DB.BuiltInCategory.OST_LightingFixtures: "Electrical",
+    DB.BuiltInCategory.OST_LightingDevices: "Electrical",
+    DB.BuiltInCategory.OST_ElectricalFixtures: "Electrical",
+    DB.BuiltInCategory.OST_ElectricalEquipment: "Electrical",
+    DB.BuiltInCategory.OST_PlumbingFixtures: "Plumbing",
+    DB.BuiltInCategory.OST_PipeCurves: "Plumbing",
+    DB.BuiltInCategory.OST_PipeFitting: "Plumbing",
+    DB.BuiltInCategory.OST_PipeAccessory: "Plumbing",
+    DB.BuiltInCategory.OST_GenericModel: "Wall and Floor Finishes",
+    DB.BuiltInCategory.OST_Furniture: "Furniture",
+    DB.BuiltInCategory.OST_FurnitureSystems: "Furniture",
+    DB.BuiltInCategory.OST_SpecialityEquipment: "Site Works",
+}
+SPLIT_BY_FUNCTION = ("Floors", "Walls", "Stairs")
+
+
+def boq_category(info):
+    name = BOQ_CATEGORIES.get(info.category, "Other")
+    if name in SPLIT_BY_FUNCTION:
+        external = any(w in info.function for w in ("exterior", "external", "outside"))
+        return ("External " if external else "Internal ") + name
+    return name
+
+
+# BOQ units from the recipes, where they give one
+try:
+    recipe_book = recipe_loader.load(paths.RECIPES_CSV)
+except (recipe_loader.RecipeError, IOError, OSError):
+    recipe_book = None
+
+by_type, model_total = amounts.collect(doc, list(BOQ_CATEGORIES))
+if recipe_book is not None:
+    recipe_book.expand(by_type)
+rows = []
+for name in sorted(by_type):
+    info = by_type[name]
+    recipe = recipe_book.get(name) if recipe_book is not None else None
+    rows.append(boq.QuantityRow(
+        name,
+        boq_category(info),
+        info.function,
+        recipe.uom if recipe else u"",
+        info.quantity,
+        info.rate,
+        info.count,
+    ))
+
+if not rows:
+    forms.alert(
+        "No amounts found in this model.\n\nRun Apply Rate and Update Amount first.",
+        title="Export Quantities"
+    )
+    script.exit()
+
+path = boq.snapshot_path(doc.PathName)
+if not path:
+    desktop = os.path.join(os.environ["USERPROFILE"], "Desktop")
+    path = os.path.join(desktop, doc.Title + boq.SNAPSHOT_SUFFIX)
+boq.write_snapshot(path, rows, doc.Title)
+
+unrated = [r.type for r in rows if not r.rate]
+output.print_md("## Quantity Snapshot")
+output.print_md("- Types: **{}**".format(len(rows)))
+output.print_md("- Model total: **{:,.2f}**".format(model_total))
+output.print_md("- Saved to: `{}`".format(path))
+if unrated:
+    output.print_md("- Types without a rate (quantity unknown): {}".format(
+        ", ".join(unrated[:20])
+    ))
+output.print_md(
+    "\nRender a BOQ without Revit:\n\n"
+    "`python -m pce boq \"{}\" -o boq.xlsx --province Lusaka --basis Avg`".format(path)
+)
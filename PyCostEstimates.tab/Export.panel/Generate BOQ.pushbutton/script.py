@@ -10,6 +10,8 @@ clr.AddReference("System.Windows.Forms")
 from System.Windows.Forms import MessageBox
 from pyrevit import revit, DB
 
+from pce import breakdowns, measure, params
+
 # ------------------------------------------------------------------------------
 # Save path
 # ------------------------------------------------------------------------------
@@ -19,8 +21,18 @@ xlsx_path = os.path.join(desktop, "BOQ_Export_From_Model.xlsx")
 # ------------------------------------------------------------------------------
 # Parameters / constants
 # ------------------------------------------------------------------------------
-PARAM_COST  = "Cost"
-PARAM_TOTAL = "Amount (Qty*Rate)"   # ← FIX (was Test_1234)
+PARAM_COST  = params.PARAM_COST
+PARAM_TOTAL = params.PARAM_AMOUNT   # ← FIX (was Test_1234)
+
+# Parameters are read through accessors resolved once per category
+# (built-in / shared parameter), not looked up by name per element
+accessors = params.Accessors()
+
+# Quantities come from the measurement Update Amount uses (pce.measure),
+# so BOQ quantities x rates add up to the model's amounts
+calculator = measure.AmountCalculator(
+    revit.doc, accessors, measure.recipe_uoms(revit.doc)
+)
 
 TAB_COLORS = {
     "COVER":   "#A6A6A6",
@@ -28,6 +40,7 @@ TAB_COLORS = {
     "BILL2":   "#C00000",
     "BILL3":   "#FFD966",   # EXTERNAL WORKS tab = yellow
     "SUMMARY": "#70AD47",
+    "BUILDUP": "#7F7F7F",
 }
 
 # Category order for BILL 1 + BILL 2
@@ -252,9 +265,9 @@ CATEGORY_DESCRIPTIONS = {
 }
 
 # Units
-FT3_TO_M3 = 0.0283168
-FT2_TO_M2 = 0.092903
-FT_TO_M   = 0.3048
+FT3_TO_M3 = measure.FT3_TO_M3
+FT2_TO_M2 = measure.FT2_TO_M2
+FT_TO_M   = measure.FT_TO_M
 
 # ------------------------------------------------------------------------------
 # Workbook & formats
@@ -532,7 +545,7 @@ def _gather_wall_painting(doc):
 
     def _rate_from_material(mat):
         try:
-            p = mat.LookupParameter(PARAM_COST) if mat else None
+            p = accessors.get(mat, PARAM_COST) if mat else None
             return float(p.AsDouble()) if (p and p.HasValue) else 0.0
         except:
             return 0.0
@@ -817,7 +830,7 @@ def _get_cost(o):
     if not o:
         return 0.0
     try:
-        cp = o.LookupParameter(PARAM_COST)
+        cp = accessors.get(o, PARAM_COST)
         if cp and cp.HasValue:
             return float(cp.AsDouble())
     except:
@@ -836,7 +849,7 @@ def _get_function_string(el_type):
     if not el_type:
         return ""
     try:
-        func_param = el_type.LookupParameter("Function")
+        func_param = accessors.get(el_type, params.PARAM_FUNCTION)
     except:
         func_param = None
     if not (func_param and func_param.HasValue):
@@ -858,6 +871,11 @@ def _get_function_string(el_type):
 
     return ""
 
+def _measured(el):
+    """Quantity and unit of an element; 0 when it has no quantity data."""
+    method, qty, _error = calculator.measurement(el)
+    return qty, measure.UNITS.get(method, "No.")
+
 def _is_external_function(fv_lower):
     if "exterior" in fv_lower:
         return True
@@ -898,15 +916,11 @@ def _gather_floors_by_function(doc):
 
             rate = _get_cost(el_type) or _get_cost(el)
 
-            qty = 0.0
-            unit = "m²"
-            a = el.LookupParameter("Area")
-            if a and a.HasValue:
-                qty = a.AsDouble() * FT2_TO_M2
+            qty, unit = _measured(el)
 
             cmt = ""
             if el_type:
-                tc = el_type.LookupParameter("Type Comments")
+                tc = accessors.get(el_type, params.PARAM_TYPE_COMMENTS)
                 if tc and tc.HasValue:
                     cmt = tc.AsString() or ""
             cmt = _clean_comment(name, cmt)
@@ -966,18 +980,11 @@ def _gather_walls_by_function(doc):
 
             rate = _get_cost(el_type) or _get_cost(el)
 
-            qty = 0.0
-            unit = "m²"
-            area_param = (
-                el.get_Parameter(DB.BuiltInParameter.HOST_AREA_COMPUTED)
-                or el.LookupParameter("Area")
-            )
-            if area_param and area_param.HasValue:
-                qty = area_param.AsDouble() * FT2_TO_M2
+            qty, unit = _measured(el)
 
             cmt = ""
             if el_type:
-                tc = el_type.LookupParameter("Type Comments")
+                tc = accessors.get(el_type, params.PARAM_TYPE_COMMENTS)
                 if tc and tc.HasValue:
                     cmt = tc.AsString() or ""
             cmt = _clean_comment(name, cmt)
@@ -1040,9 +1047,9 @@ def _gather_stairs_by_function(doc):
             qty = 1.0
             unit = "No."
             area_param = (
-                el.LookupParameter("Actual Tread Surface Area")
-                or el.LookupParameter("Tread Surface Area")
-                or el.LookupParameter("Area")
+                accessors.get(el, "Actual Tread Surface Area")
+                or accessors.get(el, "Tread Surface Area")
+                or accessors.get(el, params.PARAM_AREA)
             )
             if area_param and area_param.HasValue:
                 try:
@@ -1055,7 +1062,7 @@ def _gather_stairs_by_function(doc):
 
             cmt = ""
             if el_type:
-                tc = el_type.LookupParameter("Type Comments")
+                tc = accessors.get(el_type, params.PARAM_TYPE_COMMENTS)
                 if tc and tc.HasValue:
                     cmt = tc.AsString() or ""
             cmt = _clean_comment(name, cmt)
@@ -1134,7 +1141,7 @@ def _collect_elements_by_categories(doc, bic_list, default_unit="No."):
 
                 cmt = ""
                 if el_type:
-                    tc = el_type.LookupParameter("Type Comments")
+                    tc = accessors.get(el_type, params.PARAM_TYPE_COMMENTS)
                     if tc and tc.HasValue:
                         cmt = tc.AsString() or ""
                 cmt = _clean_comment(name, cmt)
@@ -1404,7 +1411,7 @@ for cat_name in CATEGORY_ORDER:
             pad_excav_m3 = 0.0
             for p in pad_elems:
                 try:
-                    v = p.LookupParameter("Volume")
+                    v = accessors.get(p, params.PARAM_VOLUME)
                     if v and v.HasValue:
                         pad_excav_m3 += v.AsDouble() * FT3_TO_M3
                 except:
@@ -1521,138 +1528,11 @@ for cat_name in CATEGORY_ORDER:
 
             rate = _get_cost(el_type) or _get_cost(el)
 
-            qty = 1.0
-            unit = "No."
-
-            if cat_name in ("Block Work in Walls",):
-                prm = el.get_Parameter(DB.BuiltInParameter.HOST_AREA_COMPUTED) or el.LookupParameter("Area")
-                qty = prm.AsDouble() * FT2_TO_M2 if (prm and prm.HasValue) else 0.0
-                unit = "m²"
-
-            elif cat_name in ("Doors","Windows"):
-                qty = 1
-                unit = "No."
-
-            elif cat_name in ("Wall and Floor Finishes","Roofs","Ceilings"):
-                prm = el.LookupParameter("Area")
-                if prm and prm.HasValue:
-                    qty = prm.AsDouble() * FT2_TO_M2
-                    unit = "m²"
-
-            elif cat_name == "Structural Foundations":
-                prm = el.LookupParameter("Volume")
-                if prm and prm.HasValue:
-                    qty = prm.AsDouble() * FT3_TO_M3
-                    unit = "m³"
-
-
-            elif cat_name == "Structural Framing":
-
-                # Detect material
-
-                mat_prm = el.LookupParameter("Structural Material")
-
-                mat_elem = revit.doc.GetElement(mat_prm.AsElementId()) if mat_prm else None
-
-                mat_name = (mat_elem.Name if mat_elem else "").lower()
-
-                vol_prm = el.LookupParameter("Volume")
-
-                len_prm = el.get_Parameter(DB.BuiltInParameter.CURVE_ELEM_LENGTH)
-
-                if "concrete" in mat_name:
-
-                    # Concrete beams / ring beams → volume
-
-                    if vol_prm and vol_prm.HasValue:
-
-                        qty = vol_prm.AsDouble() * FT3_TO_M3
-
-                        unit = "m³"
-
-                    else:
-
-                        qty = 0.0
-
-                        unit = "m³"
-
-
-                else:
-
-                    # Steel beams / channels → length
-
-                    if len_prm and len_prm.HasValue:
-
-                        qty = len_prm.AsDouble() * FT_TO_M
-
-                        unit = "m"
-
-                    else:
-
-                        qty = 0.0
-
-                        unit = "m"
-
-
-            elif cat_name == "Structural Rebar":
-                # Use TOTAL bar length (accounts for quantity of bars)
-                length_param = el.get_Parameter(
-                    DB.BuiltInParameter.REBAR_ELEM_TOTAL_LENGTH
-                )
-
-                if length_param and length_param.HasValue:
-                    qty = length_param.AsDouble() * FT_TO_M
-                    unit = "m"
-                else:
-                    qty = 0.0
-                    unit = "m"
-
-
-
-            elif cat_name == "Structural Columns":
-                mat_prm  = el.LookupParameter("Structural Material")
-                mat_elem = revit.doc.GetElement(mat_prm.AsElementId()) if mat_prm else None
-                low = (
-                    (mat_elem.Name if mat_elem else "") + " " +
-                    (getattr(mat_elem,"MaterialClass","") if mat_elem else "")
-                ).lower()
-
-                vol_prm = (
-                    el.get_Parameter(DB.BuiltInParameter.HOST_VOLUME_COMPUTED)
-                    or el.LookupParameter("Volume")
-                )
-                len_prm = (
-                    el.get_Parameter(DB.BuiltInParameter.CURVE_ELEM_LENGTH)
-                    or el.get_Parameter(DB.BuiltInParameter.INSTANCE_LENGTH_PARAM)
-                    or el.get_Parameter(DB.BuiltInParameter.COLUMN_HEIGHT)
-                    or el.LookupParameter("Length")
-                )
-
-                if "concrete" in low:
-                    if vol_prm and vol_prm.HasValue:
-                        qty  = vol_prm.AsDouble() * FT3_TO_M3
-                        unit = "m³"
-                    elif len_prm and len_prm.HasValue:
-                        qty  = len_prm.AsDouble() * FT_TO_M
-                        unit = "m"
-                elif ("steel" in low) or ("metal" in low):
-                    if len_prm and len_prm.HasValue:
-                        qty  = len_prm.AsDouble() * FT_TO_M
-                        unit = "m"
-                    elif vol_prm and vol_prm.HasValue:
-                        qty  = vol_prm.AsDouble() * FT3_TO_M3
-                        unit = "m³"
-                else:
-                    if vol_prm and vol_prm.HasValue and vol_prm.AsDouble()>0:
-                        qty  = vol_prm.AsDouble() * FT3_TO_M3
-                        unit = "m³"
-                    elif len_prm and len_prm.HasValue:
-                        qty  = len_prm.AsDouble() * FT_TO_M
-                        unit = "m"
+            qty, unit = _measured(el)
 
             comment = ""
             if el_type:
-                tc = el_type.LookupParameter("Type Comments")
+                tc = accessors.get(el_type, params.PARAM_TYPE_COMMENTS)
                 if tc and tc.HasValue:
                     comment = tc.AsString() or ""
             comment = _clean_comment(name, comment)
@@ -2023,13 +1903,55 @@ row += 1
 
 summary_ws.set_h_pagebreaks([FIRST_PAGE_LAST_ROW])
 
+# ------------------------------------------------------------------------------
+# Rate build-up (saved by Apply Rate for the scenario priced into the model)
+# ------------------------------------------------------------------------------
+store = breakdowns.BreakdownStore.load(revit.doc.PathName or revit.doc.Title)
+buildups = store.by_name()
+
+if buildups:
+    BUILDUP_NAME = _safe_sheet_name("RATE BUILD-UP", _USED_SHEETS)
+    buildup_ws = wb.add_worksheet(BUILDUP_NAME)
+    _set_portrait(buildup_ws)
+    buildup_ws.set_tab_color(TAB_COLORS["BUILDUP"])
+    buildup_ws.merge_range(
+        0, 0, 0, 5,
+        "RATE BUILD-UP [{}]".format(store.current.replace("_UnitCost", "")),
+        fmt_title
+    )
+    for c, h in enumerate(["ITEM", "DESCRIPTION", "UNIT", "QTY", "RATE (EUR)", "AMOUNT (EUR)"]):
+        buildup_ws.write(1, c, h, fmt_header)
+    buildup_ws.set_column(1, 1, 45)
+    buildup_ws.set_column(4, 4, 12)
+    buildup_ws.set_column(5, 5, 16)
+    buildup_ws.freeze_panes(2, 0)
+
+    row = 2
+    for idx, name in enumerate(sorted(buildups), 1):
+        buildup_ws.write(row, 0, str(idx), fmt_section)
+        buildup_ws.write(row, 1, name, fmt_section)
+        row += 1
+        for desc, uom, qty, rate, amount in breakdowns.buildup_rows(buildups[name]):
+            buildup_ws.write(row, 1, desc, fmt_normal)
+            buildup_ws.write(row, 2, uom or "", fmt_normal)
+            if qty is not None:
+                buildup_ws.write(row, 3, round(qty, 4), fmt_normal)
+            if rate is not None:
+                buildup_ws.write(row, 4, rate, fmt_money)
+            buildup_ws.write(row, 5, amount, fmt_money)
+            row += 1
+        row += 1
+
 # ------------------------------------------------------------------------------
 # Close and notify
 # ------------------------------------------------------------------------------
 wb.close()
+by_name = ""
+if accessors.fallbacks:
+    by_name = "\nParameters read by name: {}".format(accessors.fallback_summary())
 MessageBox.Show(
-    "BOQ export (multi-sheet) complete!\nSaved to Desktop:\n{}\nSkipped: {}".format(
-        xlsx_path, skipped
+    "BOQ export (multi-sheet) complete!\nSaved to Desktop:\n{}\nSkipped: {}{}".format(
+        xlsx_path, skipped, by_name
     ),
     "✅ XLSX Export"
 )
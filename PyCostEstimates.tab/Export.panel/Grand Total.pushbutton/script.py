@@ -2,6 +2,8 @@
 from pyrevit import revit, DB, forms
 from collections import defaultdict
 
+from pce import params
+
 # --- Settings ---
 PARAM_NAME = "Test_1234"
 doc = revit.doc
@@ -11,6 +13,9 @@ elements = DB.FilteredElementCollector(doc)\
     .WhereElementIsNotElementType()\
     .ToElements()
 
+# Read through an accessor resolved once per category (see pce.params)
+amount_of = params.Accessors()[PARAM_NAME]
+
 category_totals = defaultdict(float)
 category_counts = defaultdict(int)
 grand_total = 0.0
@@ -19,7 +24,7 @@ total_count = 0
 # --- Process elements ---
 for elem in elements:
     try:
-        param = elem.LookupParameter(PARAM_NAME)
+        param = amount_of.get(elem)
         if param and param.HasValue and param.StorageType == DB.StorageType.Double:
             value = param.AsDouble()
             if value > 0:
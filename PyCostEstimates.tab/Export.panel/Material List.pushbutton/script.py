@@ -51,109 +51,79 @@ output.print_md("- Cost type: {}".format(cost_type))
 # ------------------------------------------------------------
 
 from Autodesk.Revit.DB import *
-import System
 import os
-import csv
 from collections import defaultdict
 
 doc = __revit__.ActiveUIDocument.Document
 
 # ------------------------------------------------------------
-# FILE PATHS (FIXED)
+# PRICE BOOK AND RECIPES (shared with Apply Rate)
 # ------------------------------------------------------------
 
-BASE_DIR = os.path.dirname(__file__)
+from pce import breakdowns, layers, measure, modeltypes, paths, pricebook, pricedb, resolve, snapshot
+from pce import recipes as recipe_loader
 
-RECIPES_CSV = os.path.abspath(os.path.join(
-    BASE_DIR, "..", "..",
-    "Rate.panel", "Rate.pushbutton",
-    "recipes.csv"
-))
-
-UNIT_COSTS_CSV = os.path.abspath(os.path.join(
-    BASE_DIR, "..", "..",
-    "Rate.panel", "Rate.pushbutton",
-    "material_unit_costs.csv"
-))
-
-if not os.path.exists(UNIT_COSTS_CSV):
-    forms.alert(
-        "Unit cost file not found:\n\n{}".format(UNIT_COSTS_CSV),
-        title="Missing Unit Cost CSV"
+as_of = None
+if pricedb.available() and os.path.exists(paths.PRICE_DB):
+    as_of = forms.ask_for_string(
+        default="current",
+        prompt="Price date (YYYY-MM-DD) from the price history,\n"
+               "or 'current' to use the CSV price book:",
+        title="Price Date"
     )
-    script.exit()
-
-# ------------------------------------------------------------
-# CATEGORY → UNIT MAP
-# ------------------------------------------------------------
-
-CATEGORY_UNIT_MAP = {
-    BuiltInCategory.OST_Walls: "m2",
-    BuiltInCategory.OST_Floors: "m3",
-    BuiltInCategory.OST_Roofs: "m2",
-    BuiltInCategory.OST_Ceilings: "m2",
-    BuiltInCategory.OST_Doors: "No",
-    BuiltInCategory.OST_Windows: "No",
-    BuiltInCategory.OST_StructuralColumns: "m3",
-    BuiltInCategory.OST_StructuralFraming: "m",
-    BuiltInCategory.OST_StructuralFoundation: "m3",
-    BuiltInCategory.OST_Conduit: "m",
-    BuiltInCategory.OST_PipeCurves: "m",
-    BuiltInCategory.OST_ElectricalFixtures: "No",
-    BuiltInCategory.OST_ElectricalEquipment: "No",
-    BuiltInCategory.OST_LightingFixtures: "No",
-    BuiltInCategory.OST_LightingDevices: "No",
-    BuiltInCategory.OST_PlumbingFixtures: "No",
-    BuiltInCategory.OST_PipeFitting: "No",
-    BuiltInCategory.OST_PipeAccessory: "No",
-    BuiltInCategory.OST_SpecialityEquipment: "No",
-}
-
-SUPPORTED_BICS = set(CATEGORY_UNIT_MAP.keys())
-
-# ------------------------------------------------------------
-# HELPERS
-# ------------------------------------------------------------
-
-def normalize(text):
-    return text.lower().strip() if text else ""
-
-def norm_key(text):
-    if not text:
-        return ""
-    return text.lower().replace(" ", "").replace("-", "").replace("_", "")
+    if not as_of:
+        script.exit()
+    as_of = None if as_of.strip().lower() == "current" else as_of
+
+if as_of:
+    output.print_md("- Prices as of: {}".format(as_of))
+
+# Build-ups Apply Rate saved for this scenario
+scenario = breakdowns.scenario_key(cost_column, as_of)
+stored = breakdowns.BreakdownStore.load(doc.PathName or doc.Title)
+stored_ids = stored.scenarios.get(scenario, {})
+
+
+def load_cost_data():
+    """
+    Price book, recipes and aliases, for types Apply Rate has not
+    priced; the model's price snapshot is used when it has one.
+    """
+    if not as_of:
+        try:
+            from_model = snapshot.load(doc)
+        except (pricebook.PriceBookError, recipe_loader.RecipeError,
+                snapshot.SnapshotError) as ex:
+            forms.alert(str(ex), title="Invalid Cost Data")
+            script.exit()
+        if from_model:
+            output.print_md("- Prices: {}".format(from_model[0].layers[0].name))
+            return from_model
+
+    if not as_of and not os.path.exists(paths.MATERIAL_COSTS_CSV):
+        forms.alert(
+            "Unit cost file not found:\n\n{}".format(paths.MATERIAL_COSTS_CSV),
+            title="Missing Unit Cost CSV"
+        )
+        script.exit()
 
-def get_bic(elem):
     try:
-        return System.Enum.Parse(
-            BuiltInCategory,
-            str(elem.Category.Id.IntegerValue)
-        )
-    except:
-        return None
-
-def get_raw_quantity(elem, bic):
-    if bic == BuiltInCategory.OST_Walls:
-        p = elem.get_Parameter(BuiltInParameter.HOST_AREA_COMPUTED)
-        return p.AsDouble() if p else 0.0
-
-    if bic in (
-        BuiltInCategory.OST_Floors,
-        BuiltInCategory.OST_StructuralFoundation,
-        BuiltInCategory.OST_StructuralColumns
-    ):
-        p = elem.get_Parameter(BuiltInParameter.HOST_VOLUME_COMPUTED)
-        return p.AsDouble() if p else 0.0
-
-    if bic in (
-        BuiltInCategory.OST_StructuralFraming,
-        BuiltInCategory.OST_PipeCurves,
-        BuiltInCategory.OST_Conduit
-    ):
-        p = elem.get_Parameter(BuiltInParameter.CURVE_ELEM_LENGTH)
-        return p.AsDouble() if p else 0.0
-
-    return 1.0
+        project_csv = layers.project_override_path(doc.PathName)
+        if as_of:
+            price_book = layers.load(
+                project_csv=project_csv,
+                base_book=pricedb.load_prices(as_of),
+                base_name="base: price history as of {}".format(as_of),
+            )
+            recipe_book = pricedb.load_recipes(as_of)
+        else:
+            price_book = layers.load(project_csv=project_csv)
+            recipe_book = recipe_loader.load(paths.RECIPES_CSV)
+    except (pricebook.PriceBookError, recipe_loader.RecipeError,
+            pricedb.PriceDBError) as ex:
+        forms.alert(str(ex), title="Invalid Cost Data")
+        script.exit()
+    return price_book, recipe_book, resolve.load_aliases()
 
 # ------------------------------------------------------------
 # STAGE 1 — EXTRACT MODEL QUANTITIES
@@ -161,50 +131,26 @@ def get_raw_quantity(elem, bic):
 
 output.print_md("Stage 1: Extracting model quantities")
 
-model_data = {}
-
-elements = FilteredElementCollector(doc).WhereElementIsNotElementType().ToElements()
-
-for elem in elements:
-    if not elem.Category:
-        continue
-
-    bic = get_bic(elem)
-    if bic not in SUPPORTED_BICS:
-        continue
-
-    elem_type = doc.GetElement(elem.GetTypeId())
-    if not elem_type:
-        continue
-
-    type_name = elem_type.get_Parameter(
-        BuiltInParameter.SYMBOL_NAME_PARAM
-    ).AsString()
+# Measured the way Update Amount and Generate BOQ measure (pce.measure):
+# per category, by structural material or by the recipe's BOQ UoM
+calculator = measure.AmountCalculator(doc, uoms=measure.recipe_uoms(doc))
+elements = (
+    FilteredElementCollector(doc)
+    .WherePasses(modeltypes.category_filter(measure.categories()))
+    .WhereElementIsNotElementType()
+)
 
-    unit = CATEGORY_UNIT_MAP[bic]
-    raw_qty = get_raw_quantity(elem, bic)
+model_data = {}
 
-    model_data.setdefault(type_name, {
-        "unit": unit,
-        "raw_qty": 0.0,
+for row in calculator.quantities(elements):
+    data = model_data.setdefault(row.name, {
+        "unit": row.unit,
         "revit_quantity": 0.0,
-        "components": {}
+        "components": {},
+        "type_ids": set()
     })
-
-    model_data[type_name]["raw_qty"] += raw_qty
-
-for d in model_data.values():
-    if d["unit"] == "m2":
-        d["revit_quantity"] = UnitUtils.ConvertFromInternalUnits(
-            d["raw_qty"], UnitTypeId.SquareMeters)
-    elif d["unit"] == "m3":
-        d["revit_quantity"] = UnitUtils.ConvertFromInternalUnits(
-            d["raw_qty"], UnitTypeId.CubicMeters)
-    elif d["unit"] == "m":
-        d["revit_quantity"] = UnitUtils.ConvertFromInternalUnits(
-            d["raw_qty"], UnitTypeId.Meters)
-    else:
-        d["revit_quantity"] = d["raw_qty"]
+    data["revit_quantity"] += row.quantity
+    data["type_ids"].add(row.unique_id)
 
 output.print_md("Stage 1 complete")
 
@@ -214,56 +160,70 @@ output.print_md("Stage 1 complete")
 
 output.print_md("Stage 2: Matching recipes")
 
-recipes = defaultdict(list)
+# Types Apply Rate priced under this scenario use the saved build-up;
+# only the rest are matched against the CSVs.
+unmatched = {}
+
+for fam, data in model_data.items():
+    for type_id in data["type_ids"]:
+        if type_id not in stored_ids:
+            continue
+        for m in stored.get(scenario, type_id).materials:
+            data["components"][m.item] = {
+                "recipe_qty": m.quantity,
+                "uom": m.uom,
+                "unit_cost": m.unit_price,
+            }
+        break
+    else:
+        unmatched[fam] = data
+
+output.print_md("- Saved build-ups: {} type(s)".format(
+    len(model_data) - len(unmatched)))
 
-with open(RECIPES_CSV, "rb") as f:
-    text = f.read().replace(b"\x00", b"").decode("utf-8", "ignore")
+if unmatched:
+    price_book, recipe_book, aliases = load_cost_data()
+    recipe_book.expand(unmatched)
 
-for r in csv.DictReader(text.splitlines()):
-    try:
-        recipes[normalize(r["Type"])].append(
-            (r["Component"].strip(), float(r["Quantity"]))
-        )
-    except:
-        pass
+    recipes = defaultdict(list)
 
-for fam, data in model_data.items():
-    fam_key = normalize(fam)
-    for recipe_type, comps in recipes.items():
-        if recipe_type in fam_key:
-            for comp, qty in comps:
-                data["components"][comp] = {"recipe_qty": qty}
+    for name in recipe_book:
+        recipes[resolve.normalize(name)].extend(
+            recipe_book.flat_materials(name).items())
+
+    for fam, data in unmatched.items():
+        fam_key = resolve.normalize(fam)
+        for recipe_type, comps in recipes.items():
+            if recipe_type in fam_key:
+                for comp, qty in comps:
+                    data["components"][comp] = {"recipe_qty": qty}
 
 output.print_md("Stage 2 complete")
 
 # ------------------------------------------------------------
-# STAGE 3 — RESOLVE UNIT COSTS (FIXED PATH)
+# STAGE 3 — RESOLVE UNIT COSTS
 # ------------------------------------------------------------
 
 output.print_md("Stage 3: Resolving unit costs")
 
-costs = {}
-
-with open(UNIT_COSTS_CSV, "rb") as f:
-    text = f.read().replace(b"\x00", b"").decode("utf-8", "ignore")
+# Same resolution as Apply Rate: exact name, saved alias, normalised name
+if unmatched:
+    costs = {}
 
-for r in csv.DictReader(text.splitlines()):
     try:
-        name = r.get("Item")
-        if not name:
-            continue
-        costs[norm_key(name)] = {
-            "uom": r["UoM"],
-            "unit_cost": float(r[cost_column])
-        }
-    except:
-        pass
-
-for data in model_data.values():
-    for comp, info in data["components"].items():
-        key = norm_key(comp)
-        if key in costs:
-            info.update(costs[key])
+        prices, _ = price_book.prices_for(cost_column)
+        for name, uom in zip(price_book.items, price_book.uoms):
+            if name in prices:
+                costs[name] = {"uom": uom, "unit_cost": prices[name]}
+        resolver = resolve.Resolver(price_book.items, aliases)
+    finally:
+        price_book.close()
+
+    for data in unmatched.values():
+        for comp, info in data["components"].items():
+            item, _how = resolver.resolve(comp)
+            if item in costs:
+                info.update(costs[item])
 
 output.print_md("Stage 3 complete")
 
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Rate build-up export.
+
+Writes the per-type build-ups Apply Rate saved for this model (see
+``pce.breakdowns``) to a CSV on the Desktop, one block per type.
+"""
+import os
+
+from pyrevit import revit, forms, script
+
+from pce import breakdowns, csvutil
+
+doc = revit.doc
+output = script.get_output()
+
+store = breakdowns.BreakdownStore.load(doc.PathName or doc.Title)
+scenarios = sorted(s for s in store.scenarios if store.scenarios[s])
+if not scenarios:
+    forms.alert(
+        "No saved rate build-ups for this model.\n\nRun Apply Rate first.",
+        title="Rate Build-Up"
+    )
+    script.exit()
+
+scenario = store.current if store.current in scenarios else scenarios[0]
+if len(scenarios) > 1:
+    scenario = forms.CommandSwitchWindow.show(
+        scenarios,
+        message="Rate build-up for which scenario? (in the model: {})".format(
+            store.current
+        ),
+    )
+    if not scenario:
+        script.exit()
+
+buildups = store.by_name(scenario)
+
+
+def _cell(value, fmt="{:.2f}"):
+    if value is None:
+        return u""
+    if isinstance(value, float):
+        return fmt.format(value)
+    return u"{}".format(value)
+
+
+desktop = os.path.join(os.environ["USERPROFILE"], "Desktop")
+csv_path = os.path.join(desktop, "Rate_BuildUp.csv")
+
+rows = [[u"Scenario", _cell(scenario)], []]
+for name in sorted(buildups):
+    rows.append([_cell(name)])
+    rows.append([u"Description", u"UoM", u"Quantity", u"Rate", u"Amount"])
+    for desc, uom, qty, rate, amount in breakdowns.buildup_rows(buildups[name]):
+        rows.append([_cell(desc), _cell(uom), _cell(qty, "{:.4f}"),
+                     _cell(rate), _cell(amount)])
+    rows.append([])
+csvutil.write_rows(csv_path, rows)
+
+output.print_table(
+    [[name, buildups[name].uom,
+      "{:,.2f}".format(buildups[name].breakdown.material_total),
+      "{:,.2f}".format(buildups[name].breakdown.total_cost)]
+     for name in sorted(buildups)],
+    columns=["Type", "UoM", "Materials", "Rate"],
+    title="Rate build-up [{}]".format(scenario),
+)
+output.print_md("Saved: {}".format(csv_path))
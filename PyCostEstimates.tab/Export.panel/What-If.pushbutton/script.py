@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+What-if price sensitivity.
+
+Applies relative material price changes ("cement +15%, steel -5%") to
+the compiled linear cost model of every recipe and reports the new rate
+of each affected type and the effect on the project total. Nothing in
+the model is written.
+"""
+from pyrevit import revit, DB, forms, script
+
+from pce import PROVINCES, BASES, cost_column as make_cost_column
+from pce import amounts, layers, linear, modeltypes, paths, pricebook, snapshot
+from pce import recipes as recipe_loader
+from pce.engine import national_column_for
+
+doc = revit.doc
+output = script.get_output()
+
+CATEGORIES = [
+    DB.BuiltInCategory.OST_Walls,
+    DB.BuiltInCategory.OST_Floors,
+    DB.BuiltInCategory.OST_Roofs,
+    DB.BuiltInCategory.OST_Ceilings,
+    DB.BuiltInCategory.OST_Doors,
+    DB.BuiltInCategory.OST_Windows,
+    DB.BuiltInCategory.OST_StructuralColumns,
+    DB.BuiltInCategory.OST_StructuralFraming,
+    DB.BuiltInCategory.OST_StructuralFoundation,
+    DB.BuiltInCategory.OST_Conduit,
+    DB.BuiltInCategory.OST_ElectricalFixtures,
+    DB.BuiltInCategory.OST_ElectricalEquipment,
+    DB.BuiltInCategory.OST_LightingFixtures,
+    DB.BuiltInCategory.OST_LightingDevices,
+    DB.BuiltInCategory.OST_PlumbingFixtures,
+    DB.BuiltInCategory.OST_PipeCurves,
+    DB.BuiltInCategory.OST_PipeFitting,
+    DB.BuiltInCategory.OST_PipeAccessory,
+    DB.BuiltInCategory.OST_GenericModel,
+    DB.BuiltInCategory.OST_Rebar,
+    DB.BuiltInCategory.OST_SpecialityEquipment,
+]
+
+# ---------------------------------------------------------------------
+# USER INPUTS
+# ---------------------------------------------------------------------
+province = forms.SelectFromList.show(
+    PROVINCES,
+    title="Select Province",
+    button_name="Use Selected Province"
+)
+if not province:
+    raise SystemExit
+
+cost_basis = forms.SelectFromList.show(
+    BASES,
+    title="Select Unit Cost Basis",
+    button_name="Use Selected Cost"
+)
+if not cost_basis:
+    raise SystemExit
+
+cost_column = make_cost_column(province, cost_basis)
+
+shock_text = forms.ask_for_string(
+    default="cement +15%, steel -5%",
+    prompt="Price changes, comma separated (item name or word, +/- percent):",
+    title="What-If Prices"
+)
+if not shock_text:
+    raise SystemExit
+
+# ---------------------------------------------------------------------
+# Cost model
+# ---------------------------------------------------------------------
+# The model's price snapshot, when Apply Rate stored one
+try:
+    stored = snapshot.load(doc)
+    if stored:
+        price_book, recipe_book, _aliases = stored
+        output.print_md("- Prices: {}".format(price_book.layers[0].name))
+    else:
+        price_book = layers.load(
+            project_csv=layers.project_override_path(doc.PathName)
+        )
+        recipe_book = recipe_loader.load(paths.RECIPES_CSV)
+except (pricebook.PriceBookError, recipe_loader.RecipeError,
+        snapshot.SnapshotError) as ex:
+    forms.alert(str(ex), title="Invalid Cost Data")
+    raise SystemExit
+
+try:
+    prices, _ = price_book.prices_for(
+        cost_column, national_column_for(cost_column)
+    )
+    items = list(price_book.items)
+finally:
+    price_book.close()
+
+shocks, matches, problems = linear.parse_shocks(shock_text, items)
+if not shocks:
+    forms.alert(
+        "No price changes recognised.\n\n" + "\n".join(problems),
+        title="What-If Prices"
+    )
+    raise SystemExit
+
+# Recipe templates: a recipe for each of this model's matching types
+recipe_book.expand(modeltypes.type_names(doc, CATEGORIES))
+model = linear.LinearModel(recipe_book)
+rates = model.what_if(prices, shocks)
+
+# ---------------------------------------------------------------------
+# Quantities per type, read back from the last Update Amount run
+# ---------------------------------------------------------------------
+by_type, project_total = amounts.collect(doc, CATEGORIES)
+quantities = dict(
+    (tname, info.quantity) for tname, info in by_type.items()
+    if tname in rates and info.quantity
+)
+
+# ---------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------
+output.print_md("## What-If Prices: {}".format(cost_column))
+
+output.print_table(
+    [[term, "{:+.1%}".format(change), len(hits), "; ".join(hits[:5])
+      + (" ..." if len(hits) > 5 else "")]
+     for term, change, hits in matches],
+    columns=["Change", "By", "Items", "Matched"],
+    title="Price changes"
+)
+for problem in problems:
+    output.print_md("- ⚠️ {}".format(problem))
+
+rows = []
+project_delta = 0.0
+for tname in sorted(rates, key=lambda n: -abs(rates[n][1] - rates[n][0])):
+    old, new = rates[tname]
+    qty = quantities.get(tname)
+    delta = qty * (new - old) if qty else 0.0
+    project_delta += delta
+    rows.append([
+        tname,
+        "{:,.2f}".format(old),
+        "{:,.2f}".format(new),
+        "{:+.2%}".format((new - old) / old) if old else "-",
+        "{:,.2f}".format(qty) if qty else "-",
+        "{:+,.2f}".format(delta) if qty else "-",
+    ])
+
+output.print_table(
+    rows,
+    columns=["Type", "Rate", "New rate", "Change", "Model qty", "Amount change"],
+    title="Affected recipes ({})".format(len(rows))
+)
+
+new_total = project_total + project_delta
+output.print_md(
+    "**Project total** (sum of '{}'): {:,.2f} → **{:,.2f}** ({:+,.2f}{})".format(
+        amounts.PARAM_AMOUNT,
+        project_total,
+        new_total,
+        project_delta,
+        ", {:+.2%}".format(project_delta / project_total) if project_total else "",
+    )
+)
+output.print_md(
+    "_Model quantities come from the last Update Amount run "
+    "(Amount / Cost); types not in the model show no amount change._"
+)
+if model.skipped:
+    output.print_md("Recipes not modelled: {}".format(
+        ", ".join(sorted(model.skipped))
+    ))
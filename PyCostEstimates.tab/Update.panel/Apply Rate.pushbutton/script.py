@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 import os
-import csv
 import traceback
-from pyrevit import revit, DB, forms
+from pyrevit import revit, DB, forms, script
 
-doc = revit.doc
+from pce import (
+    breakdowns, csvutil, engine, incremental, layers, modeltypes, params,
+    pricebook, pricedb, priceservice, resolve, snapshot, worksharing,
+)
+from pce import plan as changeplan
+from pce import recipes as recipe_loader
+
+active_doc = revit.doc
 
 # ---------------------------------------------------------------------
 # USER INPUTS
@@ -38,128 +44,81 @@ cost_column = "{}_{}_UnitCost".format(province, cost_basis)
 national_column = "National_{}_UnitCost".format(cost_basis)
 
 # ---------------------------------------------------------------------
-# Paths (FIXED: single CSV, no folder)
+# Models to price: the active one, or every open project model with
+# the price book and recipes loaded once
 # ---------------------------------------------------------------------
-script_dir = os.path.dirname(__file__)
-material_costs_csv = os.path.join(script_dir, "material_unit_costs.csv")
-recipes_csv = os.path.join(script_dir, "recipes.csv")
-
-if not os.path.exists(material_costs_csv):
-    forms.alert(
-        "Material unit cost file not found:\n\n{}".format(material_costs_csv),
-        title="Missing Material Cost File"
+open_docs = [
+    d for d in __revit__.Application.Documents  # noqa: F821 (pyRevit builtin)
+    if not d.IsLinked and not d.IsFamilyDocument and not d.IsReadOnly
+]
+documents = [active_doc]
+if len(open_docs) > 1:
+    target = forms.CommandSwitchWindow.show(
+        ["Active model", "All open models ({})".format(len(open_docs))],
+        message="Apply rates to:",
     )
-    raise SystemExit
+    if not target:
+        raise SystemExit
+    if target != "Active model":
+        documents += [d for d in open_docs if not d.Equals(active_doc)]
 
 # ---------------------------------------------------------------------
-# Helpers
+# Paths: base price book, supplier books in material_costs/ and an
+# optional <model>_prices.csv override next to each model
 # ---------------------------------------------------------------------
-def is_valid_cost(value):
-    try:
-        return value is not None and str(value).strip() != "" and float(value) > 0
-    except:
-        return False
+script_dir = os.path.dirname(__file__)
+material_costs_csv = os.path.join(script_dir, "material_unit_costs.csv")
+supplier_dir = os.path.join(script_dir, "material_costs")
+recipes_csv = os.path.join(script_dir, "recipes.csv")
+price_db = os.path.join(script_dir, "price_history.sqlite")
+aliases_csv = os.path.join(script_dir, "aliases.csv")
 
 # ---------------------------------------------------------------------
-# Load material prices (Province → National fallback)
+# Optional price history: re-price at the prices in force on a date
 # ---------------------------------------------------------------------
-material_prices = {}
-material_price_source = {}
-loaded_files = []
-
-with open(material_costs_csv, "r") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        try:
-            item = row["Item"].strip()
-            if not item:
-                continue
-
-            prov_val = row.get(cost_column, "")
-            if is_valid_cost(prov_val):
-                material_prices[item] = float(prov_val)
-                material_price_source[item] = cost_column
-                continue
-
-            nat_val = row.get(national_column, "")
-            if is_valid_cost(nat_val):
-                material_prices[item] = float(nat_val)
-                material_price_source[item] = national_column
-
-        except:
-            continue
-
-loaded_files.append(os.path.basename(material_costs_csv))
+as_of = None
+if pricedb.available() and os.path.exists(price_db):
+    as_of = forms.ask_for_string(
+        default="current",
+        prompt="Price date (YYYY-MM-DD) to re-price from the price history,\n"
+               "or 'current' to use the CSV price book:",
+        title="Price Date"
+    )
+    if not as_of:
+        raise SystemExit
+    as_of = None if as_of.strip().lower() == "current" else as_of
 
 # ---------------------------------------------------------------------
-# Load recipes (UNCHANGED)
+# Optional price snapshot in the model: price from the snapshot every
+# workstation shares, or store this run's price files in it (written
+# only when their content hash differs from the stored one)
 # ---------------------------------------------------------------------
-recipes = {}
-
-with open(recipes_csv, "r") as f:
-    for row in csv.DictReader(f):
-        try:
-            rtype = row["Type"].strip()
-            comp = row["Component"].strip()
-            qty = float(row["Quantity"]) if row["Quantity"] else 0.0
-
-            pct = row.get("Labour/Transport/Wastage/Profit", "").strip()
-            fixed = row.get("Labour/Transport/Plant_Fixed", "").strip()
-            time_dist = row.get("Time/Distance", "").strip()
-            rate = row.get("Rate", "").strip()
-
-            recipes.setdefault(rtype, {
-                "materials": {},
-                "labour_percent": 0.0,
-                "labour_fixed": [],
-                "labour_time": [],
-                "transport_percent": 0.0,
-                "transport_fixed": [],
-                "transport_distance": [],
-                "wastage_percent": 0.0,
-                "plant_percent": 0.0,
-                "plant_fixed": [],
-                "plant_time": [],
-                "overhead_percent": 0.0,
-            })
-
-            cname = comp.lower()
-
-            if pct:
-                pct_val = float(pct.replace("%", "")) / 100.0
-                if "wastage" in cname or "shrinkage" in cname:
-                    recipes[rtype]["wastage_percent"] = pct_val
-                elif "profit" in cname or "overhead" in cname:
-                    recipes[rtype]["overhead_percent"] = pct_val
-                elif cname.startswith("transport"):
-                    recipes[rtype]["transport_percent"] = pct_val
-                elif "plant" in cname:
-                    recipes[rtype]["plant_percent"] = pct_val
-                else:
-                    recipes[rtype]["labour_percent"] = pct_val
-
-            if fixed:
-                if cname.startswith("transport"):
-                    recipes[rtype]["transport_fixed"].append(float(fixed))
-                elif "plant" in cname:
-                    recipes[rtype]["plant_fixed"].append(float(fixed))
-                else:
-                    recipes[rtype]["labour_fixed"].append(float(fixed))
-
-            if time_dist and rate:
-                cost = float(time_dist) * float(rate)
-                if cname.startswith("transport"):
-                    recipes[rtype]["transport_distance"].append(cost)
-                elif "plant" in cname:
-                    recipes[rtype]["plant_time"].append(cost)
-                else:
-                    recipes[rtype]["labour_time"].append(cost)
-
-            if not pct and not fixed and not time_dist:
-                recipes[rtype]["materials"][comp] = qty
-
-        except:
-            continue
+FROM_FILES = "Price files"
+STORE_SNAPSHOT = "Price files, and store them in the model"
+FROM_SNAPSHOT = "Price snapshot stored in the model"
+
+price_source = FROM_FILES
+if not as_of:
+    stored_snapshot = snapshot.read_header(active_doc)
+    sources = [FROM_FILES, STORE_SNAPSHOT]
+    message = "Price from:"
+    if stored_snapshot:
+        message = "This model has a price snapshot ({}, stored {}). Price from:".format(
+            stored_snapshot[1], stored_snapshot[2]
+        )
+        if len(documents) == 1:
+            sources.insert(0, FROM_SNAPSHOT)
+    price_source = forms.CommandSwitchWindow.show(sources, message=message)
+    if not price_source:
+        raise SystemExit
+from_snapshot = price_source == FROM_SNAPSHOT
+
+if not as_of and not from_snapshot and not os.path.exists(material_costs_csv):
+    forms.alert(
+        "Material unit cost file not found:\n\n{}".format(material_costs_csv),
+        title="Missing Material Cost File"
+    )
+    raise SystemExit
 
 # ---------------------------------------------------------------------
 # Categories (UNCHANGED)
@@ -187,176 +146,623 @@ CATEGORIES = [
     DB.BuiltInCategory.OST_SpecialityEquipment,
 ]
 
-type_elements = []
-for cat in CATEGORIES:
-    try:
-        type_elements.extend(
-            DB.FilteredElementCollector(doc)
-            .OfCategory(cat)
-            .WhereElementIsElementType()
-            .ToElements()
+# ---------------------------------------------------------------------
+# Load material prices and recipes
+# Each price book layer is compiled once into the per-user cache and
+# memory-mapped on later runs; recipes are priced for every province /
+# basis in one pass and this run just looks up its scenario column.
+# ---------------------------------------------------------------------
+aliases = None
+try:
+    if from_snapshot:
+        price_book, recipe_book, aliases = snapshot.load(active_doc)
+    elif as_of:
+        price_book = layers.load(
+            material_costs_csv, supplier_dir,
+            base_book=pricedb.load_prices(as_of, price_db),
+            base_name="base: price history as of {}".format(as_of),
         )
-    except:
-        continue
+        recipe_book = pricedb.load_recipes(as_of, price_db)
+    else:
+        price_book = layers.load(material_costs_csv, supplier_dir)
+        recipe_book = recipe_loader.load(recipes_csv)
+except (pricebook.PriceBookError, recipe_loader.RecipeError,
+        pricedb.PriceDBError, snapshot.SnapshotError) as ex:
+    forms.alert(str(ex), title="Invalid Cost Data")
+    raise SystemExit
 
-materials = list(DB.FilteredElementCollector(doc).OfClass(DB.Material))
+# Recipe templates ("Strip footing {w}x{t}mm thick"): one concrete
+# recipe per matching type name in the models, built once
+if recipe_book.templates:
+    model_type_names = set()
+    for d in documents:
+        model_type_names.update(modeltypes.type_names(d, CATEGORIES))
+    recipe_book.expand(sorted(model_type_names))
 
 # ---------------------------------------------------------------------
-# Book-keeping (UNCHANGED)
+# Resolve recipe components to price book items: exact names, saved
+# aliases and normalised names apply silently; close matches are offered
+# for confirmation and remembered in aliases.csv, declined ones as well.
 # ---------------------------------------------------------------------
-updated = {}
-skipped = {}
-missing_materials = set()
-paint_updated = {}
-
-labour_applied = {}
-transport_applied = {}
-plant_applied = {}
-wastage_applied = {}
-overhead_applied = {}
-national_fallback_used = {}
+if aliases is None:
+    aliases = resolve.load_aliases(aliases_csv)
+rejected = resolve.load_rejected(aliases_csv)
+resolver = resolve.Resolver(price_book.items, aliases, rejected)
+resolved, unresolved = resolve.resolve_recipes(recipe_book, resolver)
+
+choices = []
+offered = []
+for component in unresolved:
+    matches = resolver.suggest(component)
+    auto = resolver.auto(matches)
+    offered.extend(matches)
+    for match in matches:
+        choices.append(forms.TemplateListItem(
+            match, checked=match is auto, name_attr="label"
+        ))
+
+if choices:
+    accepted = forms.SelectFromList.show(
+        choices,
+        title="Recipe components not in the price book - tick the matches to use",
+        button_name="Use Ticked Matches",
+        multiselect=True,
+    )
+    best = {}
+    for match in accepted or []:
+        if match.component not in best or match.score > best[match.component].score:
+            best[match.component] = match
+    for component, match in best.items():
+        resolved[component] = (match.item, resolve.FUZZY)
+        aliases[component] = match.item
+    # Closing the dialog declines nothing; otherwise suggestions left
+    # unticked for a component are not offered for it again
+    declined = 0
+    if accepted is not None:
+        for match in offered:
+            if match.component not in best:
+                rejected.setdefault(match.component, set()).add(match.item)
+                declined += 1
+    if (best or declined) and not from_snapshot:
+        try:
+            resolve.save_aliases(aliases, aliases_csv, rejected)
+        except (IOError, OSError):
+            pass
+
+resolve.rename_materials(
+    recipe_book, dict((c, item) for c, (item, how) in resolved.items())
+)
 
 # ---------------------------------------------------------------------
-# TRANSACTION (RESTORED)
+# Price view per model: the shared layers, plus that model's own
+# <model>_prices.csv when it has one (a snapshot already includes it)
 # ---------------------------------------------------------------------
+price_contexts = {}
+recipe_rows = None
+if price_source == STORE_SNAPSHOT:
+    recipe_rows = csvutil.read_rows(recipes_csv)
+
+
+def project_prices(doc):
+    if from_snapshot:
+        return None
+    return layers.project_override_path(doc.PathName)
+
+
+# Rates from the local pricing service when one is running (see
+# pce.priceservice); priced in-process otherwise
+service = None
+if not as_of and not from_snapshot:
+    service = priceservice.connect()
+
+
+def scenario_table(book, project_csv):
+    if service is not None:
+        try:
+            return service.scenario_table(recipe_book.order, cost_column, project_csv)
+        except priceservice.ServiceError:
+            pass
+    return engine.scenario_table(book, recipe_book)
+
+
+
+def price_context(project_csv):
+    """Scenario table and prices for one price view (cached per file)."""
+    if project_csv and not os.path.exists(project_csv):
+        project_csv = None
+    ctx = price_contexts.get(project_csv)
+    if ctx is not None:
+        return ctx
+
+    book = layers.with_project(price_book, project_csv)
+    try:
+        ctx = {
+            "scenarios": scenario_table(book, project_csv),
+            "prices": book.prices_for(cost_column, national_column)[0],
+            "uoms": dict(zip(book.items, book.uoms)),
+            "layers": book.suppliers(cost_column, national_column),
+            "layer_kinds": [(layer.name, layer.kind) for layer in book.layers],
+            "rows": incremental.row_fingerprints(book),
+            "report": list(book.report),
+            "report_path": book.report_path,
+        }
+        if price_source == STORE_SNAPSHOT:
+            ctx["snapshot"] = snapshot.Snapshot.build(
+                book, recipe_rows, aliases, cost_column,
+                snapshot.source_hash(snapshot.source_files(
+                    project_csv, recipes_csv, aliases_csv
+                )),
+            )
+    finally:
+        if book is not price_book:
+            book.layers[-1].book.close()
+    price_contexts[project_csv] = ctx
+    return ctx
+
+
 try:
-    with revit.Transaction(
-        "Composite & Paint Cost Update [{}]".format(cost_column)
-    ):
+    shared_context = price_context(None)
+    for d in documents:
+        price_context(project_prices(d))
+except pricebook.PriceBookError as ex:
+    forms.alert(str(ex), title="Invalid Cost Data")
+    raise SystemExit
+finally:
+    price_book.close()
+    if service is not None:
+        service.close()
+
+loaded_files = [name for name, kind in shared_context["layer_kinds"]]
+for project_csv in sorted(p for p in price_contexts if p):
+    loaded_files.append("project: " + os.path.basename(project_csv))
+if from_snapshot:
+    loaded_files.append("recipes: " + snapshot.LAYER_NAME)
+elif as_of:
+    loaded_files.append("recipes: price history as of {} (version of {})".format(
+        as_of, recipe_book.source["effective_date"]
+    ))
+else:
+    loaded_files.append("recipes: " + os.path.basename(recipes_csv))
+if recipe_book.source.get("templates"):
+    loaded_files.append("recipe templates: {} type(s)".format(
+        len(recipe_book.source["templates"])
+    ))
+if service is not None:
+    loaded_files.append("rates: local pricing service")
 
-        for elem in type_elements:
-            cost_param = elem.LookupParameter("Cost")
-            if not cost_param or cost_param.IsReadOnly:
-                continue
+# ---------------------------------------------------------------------
+# PLAN one model: old -> new for every candidate, no-op writes dropped
+# ---------------------------------------------------------------------
+def plan_document(doc):
+    run = {
+        "doc": doc,
+        "title": doc.Title,
+        "doc_key": doc.PathName or doc.Title,
+        "ctx": price_context(project_prices(doc)),
+        "priced": {},
+        "skipped": {},
+        "unchanged": set(),
+        "stale": set(),
+        "missing": set(),
+        "national": {},
+        "plan": changeplan.ChangePlan(),
+        "accessors": params.Accessors(),
+    }
+    ctx = run["ctx"]
+    scenarios = ctx["scenarios"]
+    material_prices = ctx["prices"]
+    plan = run["plan"]
+
+    # Model types whose name matches a recipe: one multi-category
+    # pass, indexed by type name
+    type_index = modeltypes.collect(doc, CATEGORIES, params.PARAM_COST,
+                                    names=recipe_book, accessors=run["accessors"])
+    types_by_recipe = run["types_by_recipe"] = {}
+    for tname, entries in type_index.items():
+        for elem, cost_param in entries:
+            types_by_recipe.setdefault(tname, []).append(elem.UniqueId)
+    run["collisions"] = type_index.collisions()
+
+    # Incremental re-pricing: only types whose recipe or component
+    # prices changed since the last run on this model are written.
+    # Shift+Click forces a full re-price.
+    applied_state = run["applied_state"] = incremental.AppliedState.load(
+        run["doc_key"]
+    )
+    changes = run["changes"] = incremental.diff(
+        applied_state,
+        cost_column,
+        recipe_book,
+        ctx["rows"],
+        material_prices,
+        types_by_recipe,
+        force=__shiftclick__,  # noqa: F821 (pyRevit builtin)
+    )
 
-            name_param = elem.get_Parameter(DB.BuiltInParameter.SYMBOL_NAME_PARAM)
-            if not name_param:
+    for tname, entries in type_index.items():
+        breakdown = scenarios.get(tname, cost_column)
+        if breakdown is None:
+            mat = scenarios.missing(tname, cost_column)
+            if mat == recipe_loader.EMPTY_RECIPE:
+                run["skipped"][tname] = mat
                 continue
+            run["missing"].add(mat)
+            run["skipped"][tname] = "missing material: {}".format(mat)
+            continue
 
-            tname = name_param.AsString()
-            if not tname or tname not in recipes:
+        # Types whose inputs did not change are still compared with the
+        # cached total: an undo, a manual edit or another user's sync can
+        # leave a stale Cost. They are unchanged only when every stored
+        # value matches.
+        stale = False
+        for elem, cost_param in entries:
+            if plan.add("Type", tname, cost_param, cost_param.AsDouble(),
+                        breakdown.total_cost):
+                stale = True
+        if not changes.affects(tname):
+            if not stale:
+                run["unchanged"].add(tname)
                 continue
+            run["stale"].add(tname)
 
-            r = recipes[tname]
-            material_total = 0.0
-            valid = True
+        if scenarios.used_national(tname, cost_column):
+            run["national"][tname] = national_column.replace("_UnitCost", "")
 
-            for mat, qty in r["materials"].items():
-                if mat not in material_prices:
-                    missing_materials.add(mat)
-                    skipped[tname] = "missing material: {}".format(mat)
-                    valid = False
-                    break
+        run["priced"][tname] = breakdown
 
-                material_total += qty * material_prices[mat]
+    # Paint / finishes: every priced material is compared, like types
+    material_cost = run["accessors"][params.PARAM_COST]
+    for mat in DB.FilteredElementCollector(doc).OfClass(DB.Material):
+        if mat.Name in material_prices:
+            p = material_cost.get(mat)
+            if p and not p.IsReadOnly:
+                plan.add("Material", mat.Name, p, p.AsDouble(),
+                         material_prices[mat.Name])
+    return run
 
-                src = material_price_source.get(mat, "")
-                if src.startswith("National"):
-                    national_fallback_used[tname] = src.replace("_UnitCost", "")
 
-            if not valid:
-                continue
+runs = [plan_document(d) for d in documents]
+batch = len(runs) > 1
 
-            wastage_cost = material_total * r["wastage_percent"]
+# ---------------------------------------------------------------------
+# PREVIEW: one table per model, one confirmation for all of them
+# ---------------------------------------------------------------------
+n_writes = sum(len(run["plan"].writes) for run in runs)
+n_noops = sum(len(run["plan"].noops) for run in runs)
+
+if n_writes:
+    sort_by = forms.CommandSwitchWindow.show(
+        sorted(changeplan.ChangePlan.SORT_KEYS),
+        message="{} change(s) planned, {} already up to date. Sort preview by:"
+        .format(n_writes, n_noops),
+    )
+    if not sort_by:
+        raise SystemExit
 
-            labour_cost = (
-                material_total * r["labour_percent"]
-                + sum(r["labour_fixed"])
-                + sum(r["labour_time"])
-            )
+    output = script.get_output()
+    for run in runs:
+        if not run["plan"].writes:
+            continue
+        output.print_table(
+            run["plan"].table(sort_by),
+            columns=["Kind", "Name", "Current", "New", "Change"],
+            title="Apply Rate plan [{}]{} - sorted by {}".format(
+                cost_column, " - " + run["title"] if batch else "", sort_by
+            ),
+        )
 
-            transport_cost = (
-                material_total * r["transport_percent"]
-                + sum(r["transport_fixed"])
-                + sum(r["transport_distance"])
-            )
+    if not forms.alert(
+        "Write {} change(s) to {}?\n\n"
+        "{} value(s) already match and will not be touched."
+        .format(n_writes,
+                "{} models".format(len(runs)) if batch else "the model",
+                n_noops),
+        title="Apply Rate Plan",
+        yes=True, no=True,
+    ):
+        raise SystemExit
 
-            plant_cost = (
-                material_total * r["plant_percent"]
-                + sum(r["plant_fixed"])
-                + sum(r["plant_time"])
-            )
 
-            subtotal = (
-                material_total
-                + wastage_cost
-                + labour_cost
-                + transport_cost
-                + plant_cost
+# ---------------------------------------------------------------------
+# TRANSACTION per model: only the planned changes
+# ---------------------------------------------------------------------
+def apply_document(run):
+    plan = run["plan"]
+    # Workshared: borrow the elements to write in one call; writes to
+    # elements owned by others are held and retried on the next run
+    if plan.writes:
+        worksharing.hold_blocked(run["doc"], plan)
+    if plan.writes:
+        try:
+            with revit.Transaction(
+                "Composite & Paint Cost Update [{}]".format(cost_column),
+                doc=run["doc"],
+            ):
+                plan.apply()
+        except Exception:
+            forms.alert(
+                "{}\n\n{}".format(run["title"], traceback.format_exc()),
+                title="Cost Update Failed"
+            )
+            raise
+
+    priced = run["priced"]
+    run["updated"] = {}
+    run["paint_updated"] = {}
+    for w in plan.written:
+        if w.kind == "Material":
+            run["paint_updated"][w.name] = w.new
+        else:
+            run["updated"][w.name] = priced[w.name]
+
+    for w, error in plan.failed:
+        if w.kind == "Type":
+            priced.pop(w.name, None)
+            run["updated"].pop(w.name, None)
+            run["skipped"][w.name] = "write failed: {}".format(error)
+
+    for w, owner, reason in plan.blocked:
+        if w.kind == "Type":
+            priced.pop(w.name, None)
+            run["updated"].pop(w.name, None)
+            run["skipped"][w.name] = "blocked: {}".format(
+                "{} ({})".format(reason, owner) if owner else reason
             )
 
-            overhead_cost = subtotal * r["overhead_percent"]
-            total_cost = subtotal + overhead_cost
+    snap = run["ctx"].get("snapshot")
+    run["snapshot"] = None
+    if snap is not None:
+        header = snapshot.read_header(run["doc"])
+        if header and header[0] == snap.hash:
+            run["snapshot"] = "unchanged ({})".format(snap.hash[:8])
+        else:
+            try:
+                with revit.Transaction("Store Price Snapshot", doc=run["doc"]):
+                    snapshot.store(run["doc"], snap)
+                run["snapshot"] = "stored ({}, {})".format(snap.scenario, snap.hash[:8])
+            except Exception as ex:
+                run["snapshot"] = "not stored: {}".format(ex)
+
+
+def remember_document(run):
+    """Incremental state and saved build-ups for the next runs."""
+    ctx = run["ctx"]
+    plan = run["plan"]
+    changes = run["changes"]
+    types_by_recipe = run["types_by_recipe"]
+
+    applied_state = run["applied_state"]
+    if changes.full:
+        applied_state = incremental.AppliedState()
+
+    applied_state.column = cost_column
+    applied_state.rows = ctx["rows"]
+    applied_state.prices = ctx["prices"]
+    applied_state.materials.update(
+        (w.name, w.new) for w in plan.written + plan.noops if w.kind == "Material"
+    )
+
+    for tname in run["priced"]:
+        applied_state.recipes[tname] = changes.fingerprints[tname]
+        applied_state.types[tname] = types_by_recipe[tname]
+
+    for tname in run["skipped"]:
+        applied_state.recipes.pop(tname, None)
+        applied_state.types.pop(tname, None)
+
+    try:
+        applied_state.save(run["doc_key"])
+    except (IOError, OSError):
+        pass
+
+    # Full build-up of every priced type (per scenario and type
+    # UniqueId) for Material List, Generate BOQ and Rate Build-Up
+    scenario = breakdowns.scenario_key(cost_column, as_of)
+    store = breakdowns.BreakdownStore.load(run["doc_key"])
+    if changes.full:
+        store.clear(scenario)
+
+    for tname, breakdown in run["priced"].items():
+        priced_materials = breakdowns.priced_materials(
+            recipe_book, tname, ctx["prices"], ctx["uoms"]
+        )
+        for unique_id in types_by_recipe[tname]:
+            store.put(scenario, unique_id, tname, recipe_book[tname].uom,
+                      breakdown, priced_materials)
 
-            cost_param.Set(total_cost)
+    for tname in run["skipped"]:
+        for unique_id in types_by_recipe.get(tname, ()):
+            store.remove(scenario, unique_id)
 
-            updated[tname] = total_cost
-            labour_applied[tname] = labour_cost > 0
-            transport_applied[tname] = transport_cost > 0
-            plant_applied[tname] = plant_cost > 0
-            wastage_applied[tname] = wastage_cost > 0
-            overhead_applied[tname] = overhead_cost > 0
+    store.current = scenario
+    try:
+        store.save(run["doc_key"])
+    except (IOError, OSError):
+        pass
 
-        # Paint / finishes
-        for mat in materials:
-            if mat.Name in material_prices:
-                p = mat.LookupParameter("Cost")
-                if p and not p.IsReadOnly:
-                    p.Set(material_prices[mat.Name])
-                    paint_updated[mat.Name] = material_prices[mat.Name]
 
-except Exception:
-    forms.alert(traceback.format_exc(), title="Cost Update Failed")
-    raise
+for run in runs:
+    apply_document(run)
+    remember_document(run)
 
 # ---------------------------------------------------------------------
-# SUMMARY (UNCHANGED)
+# SUMMARY: shared inputs once, then one section per model
 # ---------------------------------------------------------------------
+def document_summary(run):
+    lines = []
+    plan = run["plan"]
+    changes = run["changes"]
+    updated = run["updated"]
+    paint_updated = run["paint_updated"]
+    skipped = run["skipped"]
+
+    lines.append(
+        "PLANNED: {planned}  WRITTEN: {written}  "
+        "SKIPPED (UNCHANGED): {skipped}  FAILED: {failed}  "
+        "BLOCKED: {blocked}\n".format(**plan.counts())
+    )
+    if run["snapshot"]:
+        lines.append("PRICE SNAPSHOT IN MODEL: {}\n".format(run["snapshot"]))
+
+    if changes.full:
+        lines.append("FULL RE-PRICE: {} type(s)\n".format(len(run["types_by_recipe"])))
+    else:
+        lines.append(
+            "INCREMENTAL RE-PRICE: {} changed, {} unchanged type(s)\n".format(
+                len(run["priced"]) + len(skipped), len(run["unchanged"])
+            )
+        )
+        affected = sorted(t for t in changes.reasons if t in run["types_by_recipe"])
+        if affected or run["stale"]:
+            lines.append("CHANGES SINCE LAST RUN:")
+            for name in affected:
+                causes = [incremental.describe(r) for r in changes.reasons[name]]
+                lines.append("- {} <- {}".format(name, "; ".join(causes[:5])))
+            for name in sorted(run["stale"]):
+                lines.append("- {} <- stored Cost differs from its rate".format(name))
+            lines.append("")
+
+    if updated:
+        lines.append(
+            "UPDATED TYPE COSTS (INCL. LABOUR, TRANSPORT, WASTAGE, PLANT & PROFIT):"
+        )
+        for name in sorted(updated):
+            breakdown = updated[name]
+            labels = []
+            if breakdown.labour_cost > 0:
+                labels.append("⚠️ Labour")
+            if breakdown.transport_cost > 0:
+                labels.append("🚚 Transport")
+            if breakdown.plant_cost > 0:
+                labels.append("🚜 Plant")
+            if breakdown.wastage_cost > 0:
+                labels.append("♻️ Wastage")
+            if breakdown.overhead_cost > 0:
+                labels.append("💼 Profit")
+
+            fallback = ""
+            if name in run["national"]:
+                fallback = " ⚠️ [{}]".format(run["national"][name])
+
+            label = "  " + ", ".join(labels) + fallback if labels or fallback else ""
+            lines.append("- {} : {:.2f} ZMW{}".format(
+                name, breakdown.total_cost, label
+            ))
+
+    if paint_updated:
+        lines.append("\nUPDATED PAINT / FINISH MATERIALS:")
+        for name in sorted(paint_updated):
+            lines.append("- {} : {:.2f} ZMW".format(name, paint_updated[name]))
+
+    if plan.blocked:
+        lines.append("\nBLOCKED BY WORKSHARING (RETRIED ON THE NEXT RUN):")
+        held = dict(
+            (w.target.Element.Id.IntegerValue, (owner, reason))
+            for w, owner, reason in plan.blocked
+        )
+        names = dict(
+            (w.target.Element.Id.IntegerValue, w.name) for w, _, _ in plan.blocked
+        )
+        for label, ids in worksharing.by_owner(held):
+            lines.append("- {} : {}".format(
+                label, ", ".join(sorted(set(names[i] for i in ids)))
+            ))
+
+    if skipped:
+        lines.append("\nSKIPPED TYPES:")
+        for name in sorted(skipped):
+            lines.append("- {} ({})".format(name, skipped[name]))
+
+    if run["collisions"]:
+        lines.append("\nTYPE NAMES IN SEVERAL CATEGORIES (SAME RATE APPLIED):")
+        for name in sorted(run["collisions"]):
+            lines.append("- {} ({})".format(name, ", ".join(run["collisions"][name])))
+
+    if run["accessors"].fallbacks:
+        lines.append("\nPARAMETERS READ BY NAME: {}".format(
+            run["accessors"].fallback_summary()
+        ))
+
+    if run["missing"]:
+        lines.append("\nMISSING MATERIALS:")
+        for m in sorted(run["missing"]):
+            lines.append("- " + str(m))
+
+    price_layers = run["ctx"]["layers"]
+    layer_use = {}
+    for name in updated:
+        for item in recipe_book.materials_of(name):
+            if item in price_layers:
+                layer_use.setdefault(price_layers[item], set()).add(item)
+    for name in paint_updated:
+        if name in price_layers:
+            layer_use.setdefault(price_layers[name], set()).add(name)
+
+    if layer_use:
+        lines.append("\nPRICES BY LAYER (UPDATED ITEMS):")
+        for layer, kind in run["ctx"]["layer_kinds"]:
+            items = sorted(layer_use.get(layer, ()))
+            if not items:
+                continue
+            lines.append("- {} : {} price(s)".format(layer, len(items)))
+            if kind != layers.BASE:
+                for item in items[:20]:
+                    lines.append("    {}".format(item))
+                if len(items) > 20:
+                    lines.append("    ... {} more".format(len(items) - 20))
+    return lines
+
+
 summary = []
-summary.append("UNIT COST COLUMN USED: {}\n".format(cost_column))
+summary.append("UNIT COST COLUMN USED: {}".format(cost_column))
+if as_of:
+    summary.append("PRICES AS OF: {}".format(as_of))
 
-if updated:
+if batch:
+    totals = dict((k, sum(run["plan"].counts()[k] for run in runs))
+                  for k in ("planned", "written", "skipped", "failed", "blocked"))
     summary.append(
-        "UPDATED TYPE COSTS (INCL. LABOUR, TRANSPORT, WASTAGE, PLANT & PROFIT):"
+        "MODELS: {}  PLANNED: {planned}  WRITTEN: {written}  "
+        "SKIPPED (UNCHANGED): {skipped}  FAILED: {failed}  "
+        "BLOCKED: {blocked}".format(len(runs), **totals)
     )
-    for name in sorted(updated):
-        labels = []
-        if labour_applied.get(name):
-            labels.append("⚠️ Labour")
-        if transport_applied.get(name):
-            labels.append("🚚 Transport")
-        if plant_applied.get(name):
-            labels.append("🚜 Plant")
-        if wastage_applied.get(name):
-            labels.append("♻️ Wastage")
-        if overhead_applied.get(name):
-            labels.append("💼 Profit")
-
-        fallback = ""
-        if name in national_fallback_used:
-            fallback = " ⚠️ [{}]".format(national_fallback_used[name])
-
-        label = "  " + ", ".join(labels) + fallback if labels or fallback else ""
-        summary.append("- {} : {:.2f} ZMW{}".format(name, updated[name], label))
-
-if paint_updated:
-    summary.append("\nUPDATED PAINT / FINISH MATERIALS:")
-    for name in sorted(paint_updated):
-        summary.append("- {} : {:.2f} ZMW".format(name, paint_updated[name]))
-
-if skipped:
-    summary.append("\nSKIPPED TYPES:")
-    for name in sorted(skipped):
-        summary.append("- {} ({})".format(name, skipped[name]))
-
-if missing_materials:
-    summary.append("\nMISSING MATERIALS:")
-    for m in sorted(missing_materials):
-        summary.append("- " + str(m))
+    for run in runs:
+        summary.append("\n=== {} ===".format(run["title"]))
+        summary.extend(document_summary(run))
+else:
+    summary.extend(document_summary(runs[0]))
+
+if resolved:
+    summary.append("\nRESOLVED COMPONENTS:")
+    for component in sorted(resolved):
+        item, how = resolved[component]
+        summary.append(u"- {} -> {} ({})".format(component.strip(), item, how))
+
+price_book_report = []
+price_book_report_path = None
+for project_csv, ctx in sorted(price_contexts.items(), key=lambda kv: kv[0] or ""):
+    for line in ctx["report"]:
+        if line not in price_book_report:
+            price_book_report.append(line)
+    price_book_report_path = price_book_report_path or ctx["report_path"]
+
+if price_book_report:
+    summary.append("\nPRICE BOOK ISSUES ({}):".format(len(price_book_report)))
+    for line in price_book_report[:20]:
+        summary.append("- " + line)
+    if len(price_book_report) > 20:
+        summary.append("- ... {} more".format(len(price_book_report) - 20))
+    if price_book_report_path:
+        summary.append("Full report: {}".format(price_book_report_path))
+
+if recipe_book.report:
+    summary.append("\nRECIPE ISSUES ({}):".format(len(recipe_book.report)))
+    for line in recipe_book.report[:20]:
+        summary.append("- " + line)
 
 if loaded_files:
-    summary.append("\nCSVs LOADED:")
-    for f in sorted(loaded_files):
+    summary.append("\nCSVs LOADED (LOWEST PRECEDENCE FIRST):")
+    for f in loaded_files:
         summary.append("- " + f)
 
 forms.alert("\n".join(summary), title="Composite & Paint Cost Update")
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Keeps the updater in one engine for the session
+__persistentengine__ = True
+
+from pyrevit import forms
+
+from pce import liveamount
+
+app = __revit__.Application
+addin_id = app.ActiveAddInId
+
+if liveamount.is_registered(addin_id):
+    state = liveamount.status()
+    liveamount.unregister(addin_id, app)
+    message = "Live Amount is off."
+    details = None
+    if state is not None:
+        updated, errors, first_error = state
+        message += "\n\nAmounts written while it was on: {:,}.".format(updated)
+        if errors:
+            message += (
+                "\n{:,} update(s) failed and left amounts unchanged; the first "
+                "error is below and in:\n{}".format(errors, liveamount.log_path())
+            )
+            details = first_error
+    message += ("\n\nRun Compute Amount to bring amounts up to date after "
+                "further edits.")
+    forms.alert(message, title="Live Amount", expanded=details)
+else:
+    liveamount.register(addin_id, app)
+    forms.alert(
+        "Live Amount is on for this Revit session.\n\n"
+        "Amount (Qty*Rate) is recomputed for placed elements, elements whose "
+        "geometry, size or type changes, and every instance of a type whose "
+        "Cost changes.\n"
+        "Run Compute Amount once first so existing amounts are current.\n"
+        "Click again to turn it off and see how many updates ran or failed.",
+        title="Live Amount",
+    )
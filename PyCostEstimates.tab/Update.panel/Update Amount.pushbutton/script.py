@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from pyrevit import revit, DB
-from pyrevit import script
+from pyrevit import forms, script
+
+from pce import checkpoint, measure, modeltypes, params, worksharing
 
 output = script.get_output()
 doc = revit.doc
@@ -8,155 +10,181 @@ doc = revit.doc
 # ---------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------
-PARAM_COST = "Cost"
-PARAM_TARGET = "Amount (Qty*Rate)"   # ✅ FIX: exact name including space
-
-FT3_TO_M3 = 0.0283168
-FT2_TO_M2 = 0.092903
-FT_TO_M = 0.3048
-
-# Exact material names for structural columns
-CONCRETE_NAME = "Concrete - Cast-in-Place Concrete"
-STEEL_NAME = "Metal - Steel 43-275"
+PARAM_TARGET = params.PARAM_AMOUNT   # ✅ FIX: exact name including space
+CHUNK_SIZE = 2000                    # elements per transaction
 
 # ---------------------------------------------------------------------
-# Method of cost calculation by category
+# Collect all element ids: one multi-category pass, in id order so a
+# run can resume after the last id it finished
 # ---------------------------------------------------------------------
-category_methods = {
-    DB.BuiltInCategory.OST_Doors: "count",
-    DB.BuiltInCategory.OST_Windows: "count",
-    DB.BuiltInCategory.OST_StructuralFraming: "length",
-    DB.BuiltInCategory.OST_StructuralFoundation: "volume",
-    DB.BuiltInCategory.OST_Floors: "volume",
-    DB.BuiltInCategory.OST_Walls: "area",
-    DB.BuiltInCategory.OST_Roofs: "area",
-    DB.BuiltInCategory.OST_Ceilings: "area",
-    DB.BuiltInCategory.OST_Conduit: "length",
-    DB.BuiltInCategory.OST_LightingFixtures: "count",
-    DB.BuiltInCategory.OST_LightingDevices: "count",
-    DB.BuiltInCategory.OST_ElectricalFixtures: "count",
-    DB.BuiltInCategory.OST_ElectricalEquipment: "count",
-    DB.BuiltInCategory.OST_GenericModel: "area",
-    DB.BuiltInCategory.OST_Rebar: "length",
-    DB.BuiltInCategory.OST_PlumbingFixtures: "count",
-    DB.BuiltInCategory.OST_PipeCurves: "length",
-    DB.BuiltInCategory.OST_PipeFitting: "count",
-    DB.BuiltInCategory.OST_PipeAccessory: "count",
-}
+element_ids = sorted(
+    DB.FilteredElementCollector(doc)
+    .WherePasses(modeltypes.category_filter(measure.categories()))
+    .WhereElementIsNotElementType()
+    .ToElementIds(),
+    key=lambda eid: eid.IntegerValue,
+)
 
 # ---------------------------------------------------------------------
-# Collect all elements
+# Resume an unfinished run?
 # ---------------------------------------------------------------------
-elements = []
-for cat in list(category_methods.keys()) + [DB.BuiltInCategory.OST_StructuralColumns]:
-    elements.extend(
-        DB.FilteredElementCollector(doc)
-        .OfCategory(cat)
-        .WhereElementIsNotElementType()
-        .ToElements()
+doc_key = doc.PathName or doc.Title
+progress = checkpoint.AmountCheckpoint.load(doc_key)
+if progress.started:
+    message = "The last run stopped after {:,} of {:,} elements ({}).".format(
+        progress.done, progress.total, progress.saved_at
     )
+    options = ["Resume", "Start over"]
+    if not progress.same_session:
+        message += ("\nRevit was restarted since: resume only if the model "
+                    "was saved after that run.")
+        options.reverse()
+    choice = forms.CommandSwitchWindow.show(options, message=message)
+    if not choice:
+        raise SystemExit
+    if choice == "Start over":
+        progress = checkpoint.AmountCheckpoint()
+
+# Elements a colleague owned on earlier runs (workshared models)
+queue = worksharing.BlockedQueue.load(doc_key)
+current_ids = set(eid.IntegerValue for eid in element_ids)
+queue.done([i for i in list(queue.blocked) if i not in current_ids])
+if queue and not progress.started:
+    retry = "Retry {:,} blocked element(s)".format(len(queue))
+    choice = forms.CommandSwitchWindow.show(
+        [retry, "All elements"],
+        message="{:,} element(s) could not be written last time "
+                "(owned by others or changed in central).".format(len(queue)),
+    )
+    if not choice:
+        raise SystemExit
+    if choice == retry:
+        element_ids = [eid for eid in element_ids if eid.IntegerValue in queue.blocked]
+
+if progress.started:
+    element_ids = [eid for eid in element_ids if eid.IntegerValue > progress.last_id]
+else:
+    progress.total = len(element_ids)
+
+# Method by category (or by the recipe's BOQ UoM), Cost per type and
+# method per structural material are resolved once; parameters are read
+# through accessors resolved once per category (see pce.measure, pce.params)
+accessors = params.Accessors()
+calculator = measure.AmountCalculator(doc, accessors, measure.recipe_uoms(doc))
 
 # ---------------------------------------------------------------------
-# Transaction
+# Transactions: one per chunk inside a group, so Revit stays responsive,
+# the run can be cancelled between chunks and undone in one step
 # ---------------------------------------------------------------------
-t = DB.Transaction(
-    doc,
-    "Compute Amount (Qty × Rate) using category-specific logic"
-)
-t.Start()
-
-updated = 0
 skipped = []
-
-for elem in elements:
+blocked = {}
+cancelled = False
+
+group = DB.TransactionGroup(doc, "Compute Amount (Qty × Rate)")
+group.Start()
+try:
+    with forms.ProgressBar(title="Compute Amount ({value} of {max_value})",
+                           cancellable=True) as pb:
+        for chunk in checkpoint.chunks(element_ids, CHUNK_SIZE):
+            if pb.cancelled:
+                cancelled = True
+                break
+
+            updated = unchanged = 0
+            chunk_skipped = []
+            changes = []
+
+            # Plan: only amounts that changed are written
+            for eid in chunk:
+                elem = doc.GetElement(eid)
+                try:
+                    change = calculator.change(elem)
+                    if change is None:
+                        unchanged += 1
+                    else:
+                        changes.append((eid, change))
+
+                except Exception as e:
+                    chunk_skipped.append((eid.IntegerValue, str(e)))
+
+            # Workshared: borrow what is available in one call, hold the rest
+            chunk_blocked = worksharing.partition(
+                doc, [eid for eid, _ in changes]
+            ).blocked
+
+            if len(changes) > len(chunk_blocked):
+                t = DB.Transaction(
+                    doc,
+                    "Compute Amount (Qty × Rate) using category-specific logic"
+                )
+                t.Start()
+                try:
+                    for eid, (target_param, result) in changes:
+                        if eid.IntegerValue in chunk_blocked:
+                            continue
+                        try:
+                            target_param.Set(result)
+                            updated += 1
+                        except Exception as e:
+                            chunk_skipped.append((eid.IntegerValue, str(e)))
+                    t.Commit()
+                finally:
+                    if t.HasStarted() and not t.HasEnded():
+                        t.RollBack()
+
+            skipped.extend(chunk_skipped)
+            blocked.update(chunk_blocked)
+            queue.done(eid.IntegerValue for eid in chunk)
+            queue.add(chunk_blocked)
+            progress.advance(chunk[-1].IntegerValue, updated, unchanged,
+                             len(chunk_skipped), len(chunk_blocked))
+            pb.update_progress(progress.done, progress.total)
+finally:
+    # Cancelled or failed runs keep the chunks committed so far. They
+    # only reach the model when the group is assimilated, so that is
+    # when the checkpoint and retry queue are saved: after a crash
+    # they never point past work the model does not have.
+    if group.HasStarted() and not group.HasEnded():
+        group.Assimilate()
     try:
-        category = elem.Category
-        if not category:
-            raise Exception("Missing category")
-
-        # Structural Columns: decide method by material
-        if category.Id.IntegerValue == int(DB.BuiltInCategory.OST_StructuralColumns):
-            mat_param = elem.LookupParameter("Structural Material")
-            if not mat_param:
-                raise Exception("No 'Structural Material' parameter")
-
-            mat_elem = doc.GetElement(mat_param.AsElementId())
-            mat_name = mat_elem.Name if mat_elem else ""
-
-            if mat_name == CONCRETE_NAME:
-                method = "volume"
-            elif mat_name == STEEL_NAME:
-                method = "length"
-            else:
-                raise Exception("Unsupported material: {}".format(mat_name))
-        else:
-            method = category_methods.get(
-                DB.BuiltInCategory(category.Id.IntegerValue)
-            )
-            if not method:
-                raise Exception("Unrecognized category")
-
-        # Retrieve parameters
-        type_elem = doc.GetElement(elem.GetTypeId())
-        cost_param = type_elem.LookupParameter(PARAM_COST)
-        target_param = elem.LookupParameter(PARAM_TARGET)
-
-        if not cost_param:
-            raise Exception("Missing 'Cost' type parameter")
-
-        if not target_param:
-            raise Exception(
-                "Missing instance parameter '{}'".format(PARAM_TARGET)
-            )
-
-        if target_param.IsReadOnly:
-            raise Exception("'{}' is read-only".format(PARAM_TARGET))
-
-        cost_val = cost_param.AsDouble()
-        factor = 1.0  # default for count-based items
-
-        # Quantity extraction
-        if method == "volume":
-            p = elem.LookupParameter("Volume")
-            if not p or not p.HasValue:
-                raise Exception("No volume data")
-            factor = p.AsDouble() * FT3_TO_M3
-
-        elif method == "area":
-            p = elem.LookupParameter("Area")
-            if not p or not p.HasValue:
-                raise Exception("No area data")
-            factor = p.AsDouble() * FT2_TO_M2
-
-        elif method == "length":
-            if category.Id.IntegerValue == int(DB.BuiltInCategory.OST_Rebar):
-                p = elem.LookupParameter("Total Bar Length")
-            else:
-                p = elem.LookupParameter("Length")
-
-            if not p or not p.HasValue:
-                raise Exception("No length data")
-            factor = p.AsDouble() * FT_TO_M
-
-        # Calculate and write amount
-        result = cost_val * factor
-        target_param.Set(result)
-        updated += 1
-
-    except Exception as e:
-        skipped.append((elem.Id.IntegerValue, str(e)))
-
-t.Commit()
+        if progress.started:
+            progress.save(doc_key)
+        queue.save(doc_key)
+    except (IOError, OSError):
+        pass
+
+if not cancelled:
+    checkpoint.AmountCheckpoint.clear(doc_key)
 
 # ---------------------------------------------------------------------
 # Output summary
 # ---------------------------------------------------------------------
 output.print_md(
-    "✅ Updated **{}** element(s) with **{} = Quantity × Rate**."
-    .format(updated, PARAM_TARGET)
+    "✅ Updated **{}** element(s) with **{} = Quantity × Rate** "
+    "({} already up to date)."
+    .format(progress.updated, PARAM_TARGET, progress.unchanged)
 )
 
+if cancelled:
+    output.print_md(
+        "⏸️ Cancelled after **{:,}** of **{:,}** element(s). "
+        "Run Compute Amount again to resume.".format(progress.done, progress.total)
+    )
+
+if blocked:
+    output.print_md(
+        "🔒 Not written, queued for a retry run: **{}** element(s):"
+        .format(len(blocked))
+    )
+    for owner, ids in worksharing.by_owner(blocked):
+        output.print_md("- **{}**: {} element(s) {}".format(
+            owner, len(ids), output.linkify([DB.ElementId(i) for i in ids[:50]])
+        ))
+
 if skipped:
     output.print_md("⚠️ Skipped **{}** element(s):".format(len(skipped)))
     for eid, reason in skipped:
         output.print_md("- Element ID {} | Reason: {}".format(eid, reason))
+
+if accessors.fallbacks:
+    output.print_md("Parameters read by name: {}".format(accessors.fallback_summary()))
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+PyCostEstimates shared library.
+
+pyRevit puts the extension ``lib`` folder on ``sys.path`` for every
+pushbutton, so the tools import these modules as ``from pce import ...``.
+Nothing in here imports the Revit API at module level; the pricing code
+runs unchanged under IronPython, pyRevit's CPython engine and plain
+CPython.
+"""
+
+PROVINCES = [
+    "Central", "Copperbelt", "Eastern", "Luapula", "Lusaka",
+    "Muchinga", "Northern", "NorthWestern", "Southern",
+    "Western", "National",
+]
+
+BASES = ["Min", "Avg", "Max"]
+
+NATIONAL = "National"
+
+
+def cost_column(province, basis):
+    """Price book column name for a province / cost basis pair."""
+    return "{}_{}_UnitCost".format(province, basis)
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""``python -m pce``: see ``pce.cli``."""
+import sys
+
+from pce.cli import main
+
+sys.exit(main())
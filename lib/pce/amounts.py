@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Model quantities read back from ``Amount (Qty*Rate)``.
+
+Update Amount writes ``Amount = quantity x Cost`` on every instance, so
+``Amount / Cost`` recovers the measured quantity without repeating the
+per-category measurement logic. Read only; parameters are read through
+``pce.params`` accessors and the Revit API is imported when called.
+"""
+from pce import params
+
+PARAM_COST = params.PARAM_COST
+PARAM_AMOUNT = params.PARAM_AMOUNT
+
+
+class TypeAmounts(object):
+    """Quantity and amount summed over the instances of one type."""
+
+    __slots__ = ("name", "category", "function", "rate", "quantity",
+                 "amount", "count")
+
+    def __init__(self, name, category, function, rate):
+        self.name = name
+        self.category = category    # BuiltInCategory
+        self.function = function    # lower-cased type "Function" or ""
+        self.rate = rate
+        self.quantity = 0.0
+        self.amount = 0.0
+        self.count = 0
+
+
+def _function(type_elem, accessors):
+    param = accessors.get(type_elem, params.PARAM_FUNCTION)
+    if not (param and param.HasValue):
+        return ""
+    return (param.AsString() or param.AsValueString() or "").strip().lower()
+
+
+def collect(doc, categories, accessors=None):
+    """
+    ``(by_type, total)``: ``type name -> TypeAmounts`` and the sum of
+    every instance amount in ``categories``. ``accessors`` (a
+    ``params.Accessors`` for ``doc``) is created when not given.
+    """
+    from pyrevit import DB
+
+    accessors = accessors or params.Accessors()
+    amount_of = accessors[PARAM_AMOUNT]
+    cost_of = accessors[PARAM_COST]
+    types = {}      # type id -> TypeAmounts or None
+    by_type = {}
+    total = 0.0
+
+    for cat in categories:
+        collector = (DB.FilteredElementCollector(doc)
+                     .OfCategory(cat)
+                     .WhereElementIsNotElementType())
+        for elem in collector:
+            param = amount_of.get(elem)
+            if not param or not param.HasValue:
+                continue
+            amount = param.AsDouble()
+            total += amount
+
+            type_id = elem.GetTypeId()
+            info = types.get(type_id, False)
+            if info is False:
+                info = None
+                type_elem = doc.GetElement(type_id)
+                name_param = type_elem.get_Parameter(
+                    DB.BuiltInParameter.SYMBOL_NAME_PARAM
+                ) if type_elem else None
+                cost_param = cost_of.get(type_elem) if type_elem else None
+                name = name_param.AsString() if name_param else None
+                if name:
+                    info = by_type.get(name)
+                    if info is None:
+                        info = by_type[name] = TypeAmounts(
+                            name,
+                            cat,
+                            _function(type_elem, accessors),
+                            cost_param.AsDouble() if cost_param else 0.0,
+                        )
+                types[type_id] = info
+            if info is None:
+                continue
+
+            info.amount += amount
+            info.count += 1
+            if info.rate:
+                info.quantity += amount / info.rate
+
+    return by_type, total
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+BOQ from a quantity snapshot, without Revit.
+
+Export Quantities saves the measured quantity, unit and current rate of
+every model type to ``<model>_quantities.json``. ``price`` turns those
+rows into BOQ lines, re-priced from a scenario table when one is given
+(otherwise at the rates the model carried), and ``render`` writes them
+to ``.xlsx`` (xlsxwriter, as Generate BOQ uses) or ``.csv``: one
+section per category with subtotals, then a summary.
+
+Snapshot format (JSON)::
+
+    {"version": 1, "model": "...", "created": "YYYY-MM-DD HH:MM",
+     "rows": [{"type": ..., "category": ..., "function": ..., "uom": ...,
+               "quantity": ..., "rate": ..., "count": ...}, ...]}
+"""
+import datetime
+import json
+import os
+from collections import OrderedDict
+
+from pce import csvutil
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = "_quantities.json"
+
+MODEL = "model"
+RECIPES = "recipes"
+UNPRICED = "unpriced"
+
+
+class BoqError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------
+# Quantity snapshot
+# ---------------------------------------------------------------------
+class QuantityRow(object):
+    __slots__ = ("type", "category", "function", "uom", "quantity", "rate",
+                 "count")
+
+    def __init__(self, type, category, function=u"", uom=u"", quantity=0.0,
+                 rate=0.0, count=0):
+        self.type = type
+        self.category = category    # BOQ section, e.g. "External Walls"
+        self.function = function    # lower-cased type "Function" or ""
+        self.uom = uom
+        self.quantity = quantity
+        self.rate = rate            # rate the model carried when exported
+        self.count = count          # instances
+
+    def to_dict(self):
+        return dict((k, getattr(self, k)) for k in self.__slots__)
+
+
+def snapshot_path(doc_path):
+    """``<model>_quantities.json`` beside a saved model, or None."""
+    if not doc_path:
+        return None
+    return os.path.splitext(doc_path)[0] + SNAPSHOT_SUFFIX
+
+
+def write_snapshot(path, rows, model=None):
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "model": model or u"",
+        "created": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "rows": [row.to_dict() for row in rows],
+    }
+    csvutil.write_json(path, data, indent=1, sort_keys=True)
+
+
+def load_snapshot(path):
+    """``(meta, [QuantityRow])``; ``meta`` has ``model`` and ``created``."""
+    try:
+        with open(path, "rb") as f:
+            data = json.loads(f.read().decode("utf-8"))
+    except (IOError, OSError, ValueError) as ex:
+        raise BoqError("Cannot read quantity snapshot {}: {}".format(path, ex))
+    if data.get("version") != SNAPSHOT_VERSION:
+        raise BoqError("Unsupported quantity snapshot version {} in {}".format(
+            data.get("version"), path
+        ))
+    rows = []
+    for entry in data.get("rows", []):
+        try:
+            rows.append(QuantityRow(**entry))
+        except TypeError as ex:
+            raise BoqError("Bad row in {}: {}".format(path, ex))
+    meta = {"model": data.get("model", u""), "created": data.get("created", u"")}
+    return meta, rows
+
+
+# ---------------------------------------------------------------------
+# Pricing
+# ---------------------------------------------------------------------
+class BoqLine(object):
+    __slots__ = ("section", "type", "uom", "quantity", "rate", "source", "note")
+
+    def __init__(self, section, type, uom, quantity, rate, source, note=u""):
+        self.section = section
+        self.type = type
+        self.uom = uom
+        self.quantity = quantity
+        self.rate = rate            # None when unpriced
+        self.source = source        # RECIPES, MODEL or UNPRICED
+        self.note = note
+
+    @property
+    def amount(self):
+        return self.quantity * self.rate if self.rate is not None else 0.0
+
+
+def price(rows, table=None, column=None, recipe_book=None):
+    """
+    BOQ lines for snapshot ``rows``.
+
+    With a scenario ``table`` each type is priced from its recipe under
+    ``column``; types without a priced recipe keep the model's rate and
+    say why. ``recipe_book`` supplies the BOQ unit where it has one.
+    """
+    lines = []
+    for row in rows:
+        uom = row.uom
+        if recipe_book is not None and row.type in recipe_book:
+            uom = recipe_book[row.type].uom or uom
+        rate, source, note = None, UNPRICED, u""
+        if table is not None:
+            breakdown = table.get(row.type, column)
+            if breakdown is not None:
+                rate, source = breakdown.total_cost, RECIPES
+            elif row.type in table:
+                note = u"missing price: {}".format(table.missing(row.type, column))
+            else:
+                note = u"no recipe"
+        if rate is None and row.rate:
+            rate, source = row.rate, MODEL
+        lines.append(BoqLine(row.category, row.type, uom, row.quantity, rate,
+                             source, note))
+    return lines
+
+
+def sections(lines):
+    """``section -> lines`` (sections and types alphabetical)."""
+    grouped = OrderedDict()
+    for line in sorted(lines, key=lambda l: (l.section.lower(), l.type.lower())):
+        grouped.setdefault(line.section, []).append(line)
+    return grouped
+
+
+# ---------------------------------------------------------------------
+# Rendering
+# ---------------------------------------------------------------------
+HEADER = ["Item", "Description", "Unit", "Quantity", "Rate", "Amount", "Rate from"]
+
+
+def _rate_from(line):
+    return line.source + (u" ({})".format(line.note) if line.note else u"")
+
+
+def render_csv(path, lines, title):
+    rows = [[title], [], HEADER]
+    grand = 0.0
+    for n, (section, section_lines) in enumerate(sections(lines).items(), 1):
+        rows.append([u"{}".format(n), section.upper()])
+        subtotal = 0.0
+        for m, line in enumerate(section_lines, 1):
+            rows.append([
+                u"{}.{}".format(n, m), line.type, line.uom,
+                u"{:.2f}".format(line.quantity),
+                u"" if line.rate is None else u"{:.2f}".format(line.rate),
+                u"{:.2f}".format(line.amount), _rate_from(line),
+            ])
+            subtotal += line.amount
+        rows.append([u"", u"Total {}".format(section), u"", u"", u"",
+                     u"{:.2f}".format(subtotal)])
+        rows.append([])
+        grand += subtotal
+    rows.append([u"", u"GRAND TOTAL", u"", u"", u"", u"{:.2f}".format(grand)])
+    csvutil.write_rows(path, rows)
+    return grand
+
+
+def render_xlsx(path, lines, title):
+    try:
+        import xlsxwriter
+        from xlsxwriter.utility import xl_rowcol_to_cell
+    except ImportError:
+        raise BoqError("xlsxwriter is not installed; write a .csv instead")
+
+    workbook = xlsxwriter.Workbook(path)
+    bold = workbook.add_format({"bold": True})
+    heading = workbook.add_format({"bold": True, "bg_color": "#D9E1F2", "border": 1})
+    money = workbook.add_format({"num_format": "#,##0.00"})
+    money_bold = workbook.add_format({"num_format": "#,##0.00", "bold": True})
+    missing = workbook.add_format({"num_format": "#,##0.00", "font_color": "#C00000"})
+
+    sheet = workbook.add_worksheet("BOQ")
+    sheet.set_column(0, 0, 8)
+    sheet.set_column(1, 1, 50)
+    sheet.set_column(2, 2, 8)
+    sheet.set_column(3, 5, 15)
+    sheet.set_column(6, 6, 30)
+    sheet.write(0, 0, title, bold)
+    for col, name in enumerate(HEADER):
+        sheet.write(2, col, name, heading)
+
+    r = 3
+    totals = []     # (section, subtotal cell)
+    for n, (section, section_lines) in enumerate(sections(lines).items(), 1):
+        sheet.write(r, 0, n, bold)
+        sheet.write(r, 1, section.upper(), bold)
+        r += 1
+        first = r
+        for m, line in enumerate(section_lines, 1):
+            sheet.write(r, 0, u"{}.{}".format(n, m))
+            sheet.write(r, 1, line.type)
+            sheet.write(r, 2, line.uom)
+            sheet.write_number(r, 3, line.quantity, money)
+            if line.rate is None:
+                sheet.write_blank(r, 4, None, missing)
+            else:
+                sheet.write_number(r, 4, line.rate, money if line.source == RECIPES else missing)
+            sheet.write_formula(
+                r, 5, "={}*{}".format(xl_rowcol_to_cell(r, 3), xl_rowcol_to_cell(r, 4)),
+                money, line.amount,
+            )
+            sheet.write(r, 6, _rate_from(line))
+            r += 1
+        sheet.write(r, 1, u"Total {}".format(section), bold)
+        sheet.write_formula(
+            r, 5, "=SUM({}:{})".format(xl_rowcol_to_cell(first, 5), xl_rowcol_to_cell(r - 1, 5)),
+            money_bold, sum(l.amount for l in section_lines),
+        )
+        totals.append((section, xl_rowcol_to_cell(r, 5, row_abs=True, col_abs=True),
+                       sum(l.amount for l in section_lines)))
+        r += 2
+
+    summary = workbook.add_worksheet("SUMMARY")
+    summary.set_column(0, 0, 50)
+    summary.set_column(1, 1, 18)
+    summary.write(0, 0, title, bold)
+    for i, (section, cell, value) in enumerate(totals):
+        summary.write(2 + i, 0, section)
+        summary.write_formula(2 + i, 1, "=BOQ!{}".format(cell), money, value)
+    end = 2 + len(totals)
+    grand = sum(t[2] for t in totals)
+    summary.write(end, 0, "GRAND TOTAL", bold)
+    summary.write_formula(end, 1, "=SUM(B3:B{})".format(end), money_bold, grand)
+    workbook.close()
+    return grand
+
+
+def render(path, lines, title):
+    """Write ``lines`` to ``path`` (.xlsx or .csv); returns the grand total."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".xlsx":
+        return render_xlsx(path, lines, title)
+    if ext == ".csv":
+        return render_csv(path, lines, title)
+    raise BoqError("BOQ output must be .xlsx or .csv: {}".format(path))
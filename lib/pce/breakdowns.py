@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Per-type rate build-ups saved by Apply Rate.
+
+Apply Rate writes only the total to ``Cost``; the full breakdown
+(material total, wastage, labour, transport, plant, profit) and the
+priced materials behind it are kept in a per-model sidecar, keyed by
+scenario and type ``UniqueId``:
+
+    {"scenarios": {"Lusaka_Avg_UnitCost": {<UniqueId>: entry, ...}},
+     "current": "Lusaka_Avg_UnitCost"}
+
+    entry = [type name, BOQ UoM, [7 Breakdown values],
+             [[item, item UoM, quantity per unit, unit price], ...]]
+
+``current`` is the scenario whose totals are in the model, so Material
+List, Generate BOQ and Rate Build-Up read precomputed build-ups instead
+of re-matching the CSVs.
+"""
+import hashlib
+import json
+import os
+
+from pce import csvutil, paths
+from pce.recipes import Breakdown
+
+STORE_VERSION = 1
+
+
+def scenario_key(cost_column, as_of=None):
+    """``Lusaka_Avg_UnitCost`` or ``Lusaka_Avg_UnitCost@2025-01-31``."""
+    return "{}@{}".format(cost_column, as_of) if as_of else cost_column
+
+
+class Material(object):
+    __slots__ = ("item", "uom", "quantity", "unit_price")
+
+    def __init__(self, item, uom, quantity, unit_price):
+        self.item = item
+        self.uom = uom
+        self.quantity = quantity        # per unit of the type
+        self.unit_price = unit_price
+
+    @property
+    def cost(self):
+        return self.quantity * self.unit_price
+
+
+class TypeBreakdown(object):
+    __slots__ = ("unique_id", "name", "uom", "breakdown", "materials")
+
+    def __init__(self, unique_id, name, uom, breakdown, materials):
+        self.unique_id = unique_id
+        self.name = name
+        self.uom = uom
+        self.breakdown = breakdown      # recipes.Breakdown
+        self.materials = materials      # [Material]
+
+
+class BreakdownStore(object):
+    def __init__(self, scenarios=None, current=None):
+        self.scenarios = scenarios or {}
+        self.current = current
+
+    @staticmethod
+    def path_for(doc_key, store_dir=None):
+        store_dir = store_dir or paths.user_cache_dir("breakdowns")
+        name = hashlib.sha1(doc_key.encode("utf-8")).hexdigest()[:16] + ".json"
+        return os.path.join(store_dir, name)
+
+    @classmethod
+    def load(cls, doc_key, store_dir=None):
+        path = cls.path_for(doc_key, store_dir)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return cls()
+        if data.get("version") != STORE_VERSION:
+            return cls()
+        return cls(data.get("scenarios"), data.get("current"))
+
+    def save(self, doc_key, store_dir=None):
+        path = self.path_for(doc_key, store_dir)
+        csvutil.write_json(path, {
+            "version": STORE_VERSION,
+            "doc": doc_key,
+            "current": self.current,
+            "scenarios": self.scenarios,
+        }, separators=(",", ":"))
+
+    # -- entries --------------------------------------------------------
+    def put(self, scenario, unique_id, name, uom, breakdown, materials):
+        """
+        Store one type's build-up; ``materials`` is
+        ``[(item, item UoM, quantity per unit, unit price), ...]``.
+        """
+        self.scenarios.setdefault(scenario, {})[unique_id] = [
+            name, uom, list(breakdown), [list(m) for m in materials],
+        ]
+
+    def remove(self, scenario, unique_id):
+        self.scenarios.get(scenario, {}).pop(unique_id, None)
+
+    def clear(self, scenario):
+        self.scenarios[scenario] = {}
+
+    def get(self, scenario, unique_id):
+        entry = self.scenarios.get(scenario, {}).get(unique_id)
+        if entry is None:
+            return None
+        name, uom, values, materials = entry
+        return TypeBreakdown(
+            unique_id, name, uom, Breakdown(*values),
+            [Material(*m) for m in materials],
+        )
+
+    def types(self, scenario=None):
+        """Every ``TypeBreakdown`` of a scenario (default: ``current``)."""
+        scenario = scenario or self.current
+        return [self.get(scenario, uid)
+                for uid in self.scenarios.get(scenario or "", {})]
+
+    def by_name(self, scenario=None):
+        """``type name -> TypeBreakdown`` (one entry per name)."""
+        result = {}
+        for tb in self.types(scenario):
+            result.setdefault(tb.name, tb)
+        return result
+
+
+def priced_materials(recipe_book, name, prices, uoms):
+    """
+    ``[(item, UoM, quantity, unit price), ...]`` behind ``name``'s
+    material total, sub-recipes expanded.
+    """
+    return [
+        (item, uoms.get(item, ""), qty, prices.get(item, 0.0))
+        for item, qty in sorted(recipe_book.flat_materials(name).items())
+    ]
+
+
+BUILDUP_LINES = (
+    ("Materials", "material_total"),
+    ("Wastage", "wastage_cost"),
+    ("Labour", "labour_cost"),
+    ("Transport", "transport_cost"),
+    ("Plant", "plant_cost"),
+    ("Profit & overheads", "overhead_cost"),
+)
+
+
+def buildup_rows(type_breakdown):
+    """
+    Printable build-up of one unit of a type:
+    ``[(description, UoM, quantity, rate, amount), ...]`` material lines,
+    then the cost lines and the resulting rate. Blank cells are None.
+    """
+    rows = [(m.item, m.uom, m.quantity, m.unit_price, m.cost)
+            for m in type_breakdown.materials]
+    bd = type_breakdown.breakdown
+    # sub-recipes enter the material total at their full rate
+    extra = bd.material_total - sum(m.cost for m in type_breakdown.materials)
+    if extra > 0.005:
+        rows.append(("Sub-recipe labour, plant & profit", None, None, None, extra))
+    for label, field in BUILDUP_LINES:
+        value = getattr(bd, field)
+        if value or field == "material_total":
+            rows.append((label, None, None, None, value))
+    rows.append(("Rate per {}".format(type_breakdown.uom or "unit"),
+                 type_breakdown.uom, None, None, bd.total_cost))
+    return rows
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Progress of a long Update Amount run, so it can be resumed.
+
+Update Amount works through a model's elements in element id order,
+one chunk per transaction inside a transaction group. When the group is
+assimilated (the run finished, was cancelled or failed) it records the
+last element id done; the next run can then carry on from the next id
+instead of measuring the whole model again. New elements always get
+higher ids, so they are still reached by a resumed run. A run that
+Revit crashed during saves nothing, and a checkpoint from another Revit
+session is only valid if the model was saved after that run, so Update
+Amount offers to start over first.
+
+The checkpoint is a small JSON file per model in the local cache and is
+removed when a run completes.
+"""
+import hashlib
+import json
+import os
+import time
+
+from pce import csvutil, paths
+
+CHECKPOINT_VERSION = 1
+
+
+def chunks(items, size):
+    """Consecutive slices of ``items`` of at most ``size``."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class AmountCheckpoint(object):
+    def __init__(self, last_id=None, done=0, total=0, updated=0,
+                 unchanged=0, skipped=0, pid=None, saved_at=None, blocked=0):
+        self.last_id = last_id      # last element id done, or None
+        self.done = done            # elements done (written, unchanged, skipped or blocked)
+        self.total = total          # elements in the model when the run started
+        self.updated = updated
+        self.unchanged = unchanged
+        self.skipped = skipped
+        self.blocked = blocked      # left for a retry pass (pce.worksharing)
+        self.pid = pid              # Revit process that wrote it
+        self.saved_at = saved_at
+
+    @property
+    def started(self):
+        return self.last_id is not None
+
+    @property
+    def same_session(self):
+        """
+        True when written by this Revit process: the chunks it records
+        are still in the open model. After a crash they are only there
+        if the model was saved since.
+        """
+        return self.pid == os.getpid()
+
+    def advance(self, last_id, updated, unchanged, skipped, blocked=0):
+        """Record one committed chunk."""
+        self.last_id = last_id
+        self.updated += updated
+        self.unchanged += unchanged
+        self.skipped += skipped
+        self.blocked += blocked
+        self.done += updated + unchanged + skipped + blocked
+
+    @staticmethod
+    def path_for(doc_key, state_dir=None):
+        state_dir = state_dir or paths.user_cache_dir("amount_runs")
+        name = hashlib.sha1(doc_key.encode("utf-8")).hexdigest()[:16] + ".json"
+        return os.path.join(state_dir, name)
+
+    @classmethod
+    def load(cls, doc_key, state_dir=None):
+        """The model's checkpoint, or an empty one."""
+        path = cls.path_for(doc_key, state_dir)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return cls()
+        if data.get("version") != CHECKPOINT_VERSION or data.get("doc") != doc_key:
+            return cls()
+        return cls(
+            data.get("last_id"), data.get("done", 0), data.get("total", 0),
+            data.get("updated", 0), data.get("unchanged", 0),
+            data.get("skipped", 0), data.get("pid"), data.get("saved_at"),
+            data.get("blocked", 0),
+        )
+
+    def save(self, doc_key, state_dir=None):
+        path = self.path_for(doc_key, state_dir)
+        self.pid = os.getpid()
+        self.saved_at = time.strftime("%Y-%m-%d %H:%M")
+        csvutil.write_json(path, {
+            "version": CHECKPOINT_VERSION,
+            "doc": doc_key,
+            "last_id": self.last_id,
+            "done": self.done,
+            "total": self.total,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "skipped": self.skipped,
+            "blocked": self.blocked,
+            "pid": self.pid,
+            "saved_at": self.saved_at,
+        })
+
+    @classmethod
+    def clear(cls, doc_key, state_dir=None):
+        path = cls.path_for(doc_key, state_dir)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Command line pricing, without Revit.
+
+Run with CPython from the extension's ``lib`` folder::
+
+    python -m pce price --province Lusaka --basis Avg -o rates.csv
+    python -m pce price --all-scenarios --recipes variants.csv -o rates.csv
+    python -m pce boq "Project_quantities.json" -o boq.xlsx --province Lusaka --basis Avg
+
+``price`` prices every recipe (or ``--type`` ones, which may match a
+recipe template) through the same
+layers, alias resolution and matrix engine as Apply Rate; ``boq``
+renders a BOQ from a quantity snapshot saved by Export Quantities. The
+price book, supplier folder, recipes and aliases default to the
+extension's own files. ``--time`` reports load and pricing times.
+"""
+import argparse
+import csv
+import sys
+import time
+
+from pce import BASES, PROVINCES, boq, cost_column, engine, layers, paths
+from pce import pricebook, resolve
+from pce import recipes as recipe_loader
+
+BREAKDOWN_COLUMNS = ["Material", "Wastage", "Labour", "Transport", "Plant",
+                     "Profit", "Rate"]
+
+
+class _Timer(object):
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.start = time.time()
+
+    def mark(self, label):
+        if self.enabled:
+            now = time.time()
+            sys.stderr.write("{:<10} {:8.3f}s\n".format(label, now - self.start))
+            self.start = now
+
+
+def _scenario(args):
+    if not args.province or not args.basis:
+        return None
+    return cost_column(args.province, args.basis)
+
+
+def _load(args):
+    """``(book, recipe_book, unresolved)`` with components resolved."""
+    book = layers.load(args.prices, args.suppliers, args.project)
+    try:
+        recipe_book = recipe_loader.load(args.recipes or paths.RECIPES_CSV)
+        resolver = resolve.Resolver(book.items, resolve.load_aliases(args.aliases))
+        resolved, unresolved = resolve.resolve_recipes(recipe_book, resolver)
+        resolve.rename_materials(
+            recipe_book, dict((c, item) for c, (item, how) in resolved.items())
+        )
+    except Exception:
+        book.close()
+        raise
+    return book, recipe_book, unresolved
+
+
+def _write(rows, output):
+    if output:
+        from pce import csvutil
+        csvutil.write_rows(output, rows)
+        return
+    writer = csv.writer(sys.stdout, lineterminator="\n")
+    for row in rows:
+        writer.writerow(row)
+
+
+def _money(value):
+    return u"{:.2f}".format(value)
+
+
+# ---------------------------------------------------------------------
+# price
+# ---------------------------------------------------------------------
+def cmd_price(args):
+    timer = _Timer(args.time)
+    if args.all_scenarios:
+        columns = engine.scenario_columns()
+    else:
+        column = _scenario(args)
+        if column is None:
+            raise SystemExit("give --province and --basis, or --all-scenarios")
+        columns = [column]
+
+    book, recipe_book, unresolved = _load(args)
+    if args.type:
+        recipe_book.expand(args.type)
+    timer.mark("load")
+    try:
+        table = engine.evaluate(book, recipe_book, columns)
+    finally:
+        book.close()
+    timer.mark("price")
+
+    names = args.type or list(recipe_book)
+    if args.all_scenarios:
+        rows = [["Type", "UoM"] + columns]
+        for name in names:
+            recipe = recipe_book.get(name)
+            rows.append([name, recipe.uom if recipe else u""] + [
+                _money(b.total_cost) if b is not None else u""
+                for b in (table.get(name, c) for c in columns)
+            ])
+    else:
+        rows = [["Type", "UoM"] + BREAKDOWN_COLUMNS + ["National fallback", "Missing"]]
+        for name in names:
+            recipe = recipe_book.get(name)
+            breakdown = table.get(name, column)
+            row = [name, recipe.uom if recipe else u""]
+            if breakdown is None:
+                missing = table.missing(name, column) if name in table else u"no recipe"
+                row += [u""] * len(BREAKDOWN_COLUMNS) + [u"", missing]
+            else:
+                row += [_money(v) for v in (
+                    breakdown.material_total, breakdown.wastage_cost,
+                    breakdown.labour_cost, breakdown.transport_cost,
+                    breakdown.plant_cost, breakdown.overhead_cost,
+                    breakdown.total_cost,
+                )]
+                row += [u"yes" if table.used_national(name, column) else u"", u""]
+            rows.append(row)
+    _write(rows, args.output)
+    timer.mark("write")
+
+    if unresolved:
+        sys.stderr.write("{} component(s) not in the price book: {}\n".format(
+            len(unresolved), u", ".join(unresolved[:10])
+        ))
+    if recipe_book.report:
+        sys.stderr.write("{} recipe issue(s); first: {}\n".format(
+            len(recipe_book.report), recipe_book.report[0]
+        ))
+    return 0
+
+
+# ---------------------------------------------------------------------
+# boq
+# ---------------------------------------------------------------------
+def cmd_boq(args):
+    timer = _Timer(args.time)
+    meta, rows = boq.load_snapshot(args.snapshot)
+    column = _scenario(args)
+    table = recipe_book = None
+    if column is not None:
+        book, recipe_book, _unresolved = _load(args)
+        recipe_book.expand([row.type for row in rows])
+        try:
+            table = engine.evaluate(book, recipe_book, [column])
+        finally:
+            book.close()
+    timer.mark("price")
+
+    lines = boq.price(rows, table, column, recipe_book)
+    title = u"Bill of Quantities - {}{}".format(
+        meta["model"] or args.snapshot,
+        u" [{}]".format(column) if column else u" [model rates]",
+    )
+    total = boq.render(args.output, lines, title)
+    timer.mark("render")
+
+    unpriced = [l.type for l in lines if l.rate is None]
+    sys.stdout.write("{} line(s), grand total {:,.2f} -> {}\n".format(
+        len(lines), total, args.output
+    ))
+    if unpriced:
+        sys.stderr.write("{} unpriced line(s): {}\n".format(
+            len(unpriced), u", ".join(unpriced[:10])
+        ))
+    return 0
+
+
+# ---------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------
+def _price_options(parser):
+    parser.add_argument("--province", choices=PROVINCES)
+    parser.add_argument("--basis", choices=BASES)
+    parser.add_argument("--prices", help="base price book CSV")
+    parser.add_argument("--suppliers", help="supplier price book folder")
+    parser.add_argument("--project", help="project _prices.csv override")
+    parser.add_argument("--recipes", help="recipes CSV")
+    parser.add_argument("--aliases", help="aliases CSV")
+    parser.add_argument("--time", action="store_true",
+                        help="report load / pricing times on stderr")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m pce", description="PyCostEstimates pricing without Revit"
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    price = commands.add_parser("price", help="price recipes")
+    _price_options(price)
+    price.add_argument("--all-scenarios", action="store_true",
+                       help="one rate column per province / basis")
+    price.add_argument("--type", action="append",
+                       help="price only this type (repeatable)")
+    price.add_argument("-o", "--output", help="CSV file (default: stdout)")
+    price.set_defaults(run=cmd_price)
+
+    bill = commands.add_parser("boq", help="render a BOQ from a quantity snapshot")
+    bill.add_argument("snapshot", help="<model>_quantities.json")
+    _price_options(bill)
+    bill.add_argument("-o", "--output", required=True, help=".xlsx or .csv")
+    bill.set_defaults(run=cmd_boq)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not getattr(args, "run", None):
+        build_parser().print_help()
+        return 2
+    try:
+        return args.run(args)
+    except (pricebook.PriceBookError, recipe_loader.RecipeError,
+            boq.BoqError, IOError, OSError) as ex:
+        sys.stderr.write("error: {}\n".format(ex))
+        return 1
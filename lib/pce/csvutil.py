@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+CSV helpers shared by the price book and recipe loaders and editors.
+
+The shipped CSVs are edited in Excel on different machines and end up
+with a mix of UTF-8 and cp1252 lines (and the odd NUL byte), so every
+line is decoded on its own instead of failing the whole file.
+
+Every file the extension writes (CSVs, compiled books, cached tables
+and per-model state) goes through ``open_atomic``: it is written to a
+temporary file next to the target, which then replaces the target in
+one step.
+"""
+import csv
+import io
+import json
+import os
+import re
+from contextlib import contextmanager
+
+_THOUSANDS = re.compile(r"^[-+]?\d{1,3}(,\d{3})+(\.\d+)?$")
+
+# Cell values the price book uses for "no price in this column"
+BLANK_MARKERS = ("", "-")
+
+
+def decode_line(raw):
+    try:
+        return raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return raw.decode("cp1252", "replace")
+
+
+def read_lines(path):
+    with open(path, "rb") as f:
+        raw = f.read().replace(b"\x00", b"")
+    return [decode_line(line) for line in raw.splitlines()]
+
+
+def read_rows(path):
+    """All CSV rows of ``path`` as lists of unicode strings."""
+    return list(csv.reader(read_lines(path)))
+
+
+def parse_number(text):
+    """
+    Parse a CSV numeric cell.
+
+    Returns None for blank / "-" cells, raises ValueError for anything
+    that is not a number. Excel-style thousands separators ("1,275")
+    are accepted.
+    """
+    s = (text or "").strip()
+    if s in BLANK_MARKERS:
+        return None
+    if _THOUSANDS.match(s):
+        s = s.replace(",", "")
+    return float(s)
+
+
+def format_cell(text):
+    if any(c in text for c in u',"\r\n'):
+        return u'"' + text.replace(u'"', u'""') + u'"'
+    return text
+
+
+# ---------------------------------------------------------------------
+# Atomic writes
+# ---------------------------------------------------------------------
+def replace_file(tmp_path, path):
+    """
+    Move ``tmp_path`` over ``path`` in one step.
+
+    IronPython 2.7 has no ``os.replace`` and ``os.rename`` will not
+    overwrite on Windows, so .NET's ``File.Replace`` is used there
+    (``File.Move`` when there is nothing to replace yet). On POSIX
+    ``os.rename`` already replaces atomically.
+    """
+    replace = getattr(os, "replace", None)
+    if replace is not None:
+        replace(tmp_path, path)
+        return
+    if os.name != "nt":
+        os.rename(tmp_path, path)
+        return
+    from System.IO import File
+
+    if File.Exists(path):
+        File.Replace(tmp_path, path, None)
+    else:
+        File.Move(tmp_path, path)
+
+
+@contextmanager
+def open_atomic(path, mode="wb", encoding=None, newline=None):
+    """
+    ``open`` for writing ``path`` through a temporary file.
+
+    Readers see either the old file or the new one, never a half
+    written one; if the block raises, ``path`` is left as it was.
+    """
+    tmp_path = path + ".tmp"
+    if encoding is None:
+        f = open(tmp_path, mode)
+    else:
+        f = io.open(tmp_path, mode, encoding=encoding, newline=newline)
+    try:
+        with f:
+            yield f
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    replace_file(tmp_path, path)
+
+
+def write_json(path, data, **options):
+    """Write ``data`` as JSON (``json.dumps`` ``options``) atomically."""
+    with open_atomic(path) as f:
+        f.write(json.dumps(data, **options).encode("utf-8"))
+
+
+def write_rows(path, rows):
+    """
+    Write ``rows`` to ``path`` atomically (see ``open_atomic``).
+
+    The UTF-8 BOM keeps Excel from reading the file as cp1252.
+    """
+    with open_atomic(path, "w", encoding="utf-8-sig", newline=u"") as f:
+        for row in rows:
+            f.write(u",".join(format_cell(cell) for cell in row) + u"\r\n")
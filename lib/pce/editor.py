@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Price book and recipe editing with live re-pricing.
+
+The editor reads ``material_unit_costs.csv`` and ``recipes.csv`` into
+memory and closes them, so Apply Rate can run while it is open, and
+writes them back atomically (``csvutil.write_rows``). Every committed
+cell edit re-prices only the recipes that depend on it through the
+compiled linear cost model (``pce.linear``): a price edit touches the
+recipes using that item, a recipe edit the recipes whose fingerprint
+changed (the edited type and everything built on it).
+"""
+import math
+import os
+
+from pce import csvutil, incremental, linear, pricebook, resolve
+from pce import recipes as recipe_loader
+
+
+class EditorError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------
+# Editable CSV
+# ---------------------------------------------------------------------
+class CsvSheet(object):
+    """
+    Rows of one CSV file held in memory.
+
+    Row numbers are stable for the life of the sheet: deleted rows
+    become None and are dropped on save, new rows are appended.
+    """
+
+    def __init__(self, path, rows):
+        if not rows:
+            raise EditorError("File is empty: {}".format(path))
+        self.path = path
+        self.header = list(rows[0])
+        width = len(self.header)
+        self.rows = [list(row) + [u""] * (width - len(row)) for row in rows[1:]]
+        self.stat = _stat(path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            raise EditorError("File not found: {}".format(path))
+        return cls(path, csvutil.read_rows(path))
+
+    def column(self, name):
+        """Index of the first column headed ``name`` (None if absent)."""
+        for i, h in enumerate(self.header):
+            if h.strip() == name:
+                return i
+        return None
+
+    def live_rows(self):
+        return [row for row in self.rows if row is not None]
+
+    def set(self, n, col, value):
+        """Set one cell; returns the previous text."""
+        row = self.rows[n]
+        old = row[col]
+        if value != old:
+            row[col] = value
+            self.dirty = True
+        return old
+
+    def append(self, row=None):
+        row = list(row or ())
+        self.rows.append(row + [u""] * (len(self.header) - len(row)))
+        self.dirty = True
+        return len(self.rows) - 1
+
+    def delete(self, n):
+        old = self.rows[n]
+        self.rows[n] = None
+        self.dirty = True
+        return old
+
+    def changed_on_disk(self):
+        """True when someone else saved the file since it was read."""
+        return _stat(self.path) != self.stat
+
+    def save(self):
+        csvutil.write_rows(self.path, [self.header] + self.live_rows())
+        self.stat = _stat(self.path)
+        self.dirty = False
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime)
+
+
+# ---------------------------------------------------------------------
+# Price sheet
+# ---------------------------------------------------------------------
+class PriceSheet(CsvSheet):
+    """``material_unit_costs.csv`` with the effective price of a row."""
+
+    def __init__(self, path, rows):
+        CsvSheet.__init__(self, path, rows)
+        self.item_col = self.column(pricebook.ITEM_COLUMN)
+        if self.item_col is None:
+            raise EditorError("Price book has no '{}' column: {}".format(
+                pricebook.ITEM_COLUMN, path
+            ))
+
+    def item(self, n):
+        row = self.rows[n]
+        return row[self.item_col].strip() if row is not None else u""
+
+    def items(self):
+        """Item names of the live rows, in file order."""
+        return [item for item in
+                (row[self.item_col].strip() for row in self.live_rows())
+                if item]
+
+    def price(self, n, column, fallback_column=None):
+        """
+        Effective price of row ``n`` under ``column`` (National
+        fallback applied), or None. Raises ValueError on a bad cell.
+        """
+        row = self.rows[n]
+        if row is None:
+            return None
+        for name in (column, fallback_column):
+            col = self.column(name) if name else None
+            if col is None:
+                continue
+            value = csvutil.parse_number(row[col])
+            if value is not None and value > 0:
+                return value
+        return None
+
+
+# ---------------------------------------------------------------------
+# Recipe sheet
+# ---------------------------------------------------------------------
+class RecipeSheet(CsvSheet):
+    """``recipes.csv``; ``book`` re-parses the rows on demand."""
+
+    def __init__(self, path, rows):
+        CsvSheet.__init__(self, path, rows)
+        self.type_col = self.column(recipe_loader.TYPE_COLUMN)
+        if self.type_col is None:
+            raise EditorError("Recipe file has no '{}' column: {}".format(
+                recipe_loader.TYPE_COLUMN, path
+            ))
+
+    def recipe_name(self, n):
+        row = self.rows[n]
+        return row[self.type_col].strip() if row is not None else u""
+
+    def book(self, resolver=None):
+        """``RecipeBook`` of the current rows, components resolved."""
+        book = recipe_loader.parse_rows(
+            [self.header] + self.live_rows(), label=self.path
+        )
+        if resolver is not None:
+            resolved, _ = resolve.resolve_recipes(book, resolver)
+            resolve.rename_materials(
+                book, dict((c, item) for c, (item, how) in resolved.items())
+            )
+        return book
+
+
+# ---------------------------------------------------------------------
+# Live pricing
+# ---------------------------------------------------------------------
+class LivePricing(object):
+    """
+    Current rate of every recipe against the rates when the editor
+    opened, and the effect on the project total.
+
+    ``prices`` is the effective ``item -> price`` map of one scenario
+    column; ``quantities`` is ``type name -> model quantity``.
+    ``locked`` items are priced by a supplier or project layer, so
+    editing the base price book does not change them.
+    """
+
+    def __init__(self, recipe_book, prices, quantities=None, locked=None):
+        self.prices = dict(prices)
+        self.quantities = quantities or {}
+        self.locked = locked or {}      # item -> layer name
+        self.recipe_book = recipe_book
+        self.fingerprints = incremental.recipe_fingerprints(recipe_book)
+        self.model = linear.LinearModel(recipe_book)
+        self.rates = self.model.totals(self.prices)
+        self.base = dict(self.rates)
+
+    def _reprice(self, names):
+        for name in names:
+            cost = self.model.costs.get(name)
+            if cost is None or cost.missing(self.prices) is not None:
+                self.rates.pop(name, None)
+            else:
+                self.rates[name] = cost.total(self.prices)
+        return set(names)
+
+    def set_price(self, item, price):
+        """
+        New effective price (None = no price) for ``item``.
+
+        Returns the re-priced recipes.
+        """
+        if not item or item in self.locked:
+            return set()
+        old = self.prices.get(item)
+        if price is None:
+            self.prices.pop(item, None)
+        else:
+            self.prices[item] = price
+        if old == price:
+            return set()
+        return self._reprice(self.model.users.get(item, ()))
+
+    def set_recipes(self, recipe_book):
+        """
+        Swap in a re-parsed recipe book.
+
+        Only recipes whose fingerprint changed (including everything
+        built on an edited sub-recipe) are recompiled and re-priced.
+        """
+        fingerprints = incremental.recipe_fingerprints(recipe_book)
+        changed = set(
+            name for name, fp in fingerprints.items()
+            if self.fingerprints.get(name) != fp
+        )
+        changed.update(n for n in self.fingerprints if n not in fingerprints)
+        self.recipe_book = recipe_book
+        self.fingerprints = fingerprints
+        if not changed:
+            return set()
+        self.model.update(recipe_book, changed)
+        return self._reprice(changed)
+
+    # -- report -----------------------------------------------------------
+    def changes(self):
+        """
+        ``[(type, old rate, new rate, quantity, amount change), ...]``
+        for every recipe whose rate moved since the editor opened,
+        largest amount change first. Unpriced rates are None.
+        """
+        rows = []
+        for name in set(self.base) | set(self.rates):
+            old = self.base.get(name)
+            new = self.rates.get(name)
+            if old is not None and new is not None and _same(old, new):
+                continue
+            qty = self.quantities.get(name)
+            delta = qty * ((new or 0.0) - (old or 0.0)) if qty else 0.0
+            rows.append((name, old, new, qty, delta))
+        rows.sort(key=lambda r: (-abs(r[4]), r[0]))
+        return rows
+
+    def problems(self):
+        """``recipe -> reason`` for recipes that cannot be priced now."""
+        result = dict(self.model.skipped)
+        for name, cost in self.model.costs.items():
+            if name not in self.rates:
+                result[name] = u"no price: {}".format(cost.missing(self.prices))
+        return result
+
+
+def _same(a, b):
+    return abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b))
+
+
+def parse_price(text):
+    """Cell text -> price; None for blank. Raises ValueError otherwise."""
+    value = csvutil.parse_number(text)
+    if value is None:
+        return None
+    if math.isnan(value) or value <= 0:
+        raise ValueError("price must be positive")
+    return value
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+WPF window for ``pce.editor``, shared by the Edit Material Unit Costs
+and Edit Recipes buttons.
+
+Both CSVs are shown in virtualized data grids (only the visible rows
+are realised, so a 10k row price book scrolls smoothly). Every
+committed cell edit re-prices the dependent recipes and refreshes the
+rate changes and the project total delta. The .NET assemblies and
+pyRevit are imported when ``show`` is called.
+"""
+import os
+
+from pce import editor, layers, paths, pricebook, resolve
+from pce import recipes as recipe_loader
+from pce.engine import national_column_for
+
+XAML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "editor.xaml")
+
+PRICES = "prices"
+RECIPES = "recipes"
+
+ROW_COLUMN = "n"
+CHANGE_COLUMNS = ["Type", "Rate", "New rate", "Change", "Model qty", "Amount change"]
+
+
+def _money(value):
+    return u"-" if value is None else u"{:,.2f}".format(value)
+
+
+def _like(text):
+    """``text`` as a DataView ``LIKE`` pattern matching anywhere."""
+    escaped = []
+    for c in text.replace(u"'", u"''"):
+        escaped.append(u"[{}]".format(c) if c in u"*%[]" else c)
+    return u"'*{}*'".format(u"".join(escaped))
+
+
+def show(doc, cost_column, quantities=None, project_total=0.0, tab=PRICES):
+    """
+    Open the editor for one scenario column.
+
+    ``quantities`` is ``type name -> model quantity`` (see
+    ``pce.amounts``) and ``project_total`` the model's current total.
+    """
+    import clr
+    clr.AddReference("System.Data")
+    clr.AddReference("PresentationCore")
+    clr.AddReference("PresentationFramework")
+    from System import DBNull, Int32, String
+    from System.Data import DataTable
+    from System.IO import File
+    from System.Windows.Controls import (
+        DataGridEditingUnit, DataGridLength, DataGridLengthUnitType,
+        DataGridTextColumn, TextBlock,
+    )
+    from System.Windows.Data import Binding
+    from System.Windows.Markup import XamlReader
+    from pyrevit import forms
+
+    national_column = national_column_for(cost_column)
+
+    # -----------------------------------------------------------------
+    # Data
+    # -----------------------------------------------------------------
+    try:
+        sheets = {
+            PRICES: editor.PriceSheet.load(paths.MATERIAL_COSTS_CSV),
+            RECIPES: editor.RecipeSheet.load(paths.RECIPES_CSV),
+        }
+        book = layers.load(
+            project_csv=layers.project_override_path(doc.PathName)
+        )
+    except (editor.EditorError, pricebook.PriceBookError) as ex:
+        forms.alert(str(ex), title="Price Book and Recipes")
+        return
+
+    try:
+        prices, _ = book.prices_for(cost_column, national_column)
+        kinds = dict((layer.name, layer.kind) for layer in book.layers)
+        locked = dict(
+            (item, layer)
+            for item, layer in book.suppliers(cost_column, national_column).items()
+            if kinds.get(layer) != layers.BASE
+        )
+        # Items of the supplier and project layers; the base items come
+        # from the sheet, so added and renamed rows resolve too
+        layer_items = [item for layer in book.layers if layer.kind != layers.BASE
+                       for item in layer.book.items]
+    finally:
+        book.close()
+    aliases = resolve.load_aliases()
+
+    def make_resolver():
+        return resolve.Resolver(sheets[PRICES].items() + layer_items, aliases)
+
+    resolver = make_resolver()
+    try:
+        recipe_book = sheets[RECIPES].book(resolver)
+    except recipe_loader.RecipeError as ex:
+        forms.alert(str(ex), title="Price Book and Recipes")
+        return
+
+    pricing = editor.LivePricing(recipe_book, prices, quantities, locked)
+
+    # -----------------------------------------------------------------
+    # Window
+    # -----------------------------------------------------------------
+    window = XamlReader.Parse(File.ReadAllText(XAML_PATH))
+    find = window.FindName
+    grids = {PRICES: find("prices_grid"), RECIPES: find("recipes_grid")}
+    key_columns = {
+        PRICES: [sheets[PRICES].item_col],
+        RECIPES: [c for c in (
+            sheets[RECIPES].type_col,
+            sheets[RECIPES].column(recipe_loader.COMPONENT_COLUMN),
+        ) if c is not None],
+    }
+    status_tb = find("status_tb")
+    total_tb = find("total_tb")
+    tabs = find("tabs")
+    state = {"loading": False, "resolver": resolver}
+
+    find("scenario_tb").Text = u"Live rates: {}  (fallback {})".format(
+        cost_column, national_column
+    )
+
+    def status(text):
+        status_tb.Text = text
+        status_tb.ToolTip = text
+
+    def text_of(value):
+        if value is None or value is DBNull.Value:
+            return u""
+        return u"{}".format(value)
+
+    # -- sheets as DataTables -------------------------------------------
+    tables = {}
+
+    def add_row(table, n, row):
+        values = [n] + list(row)
+        table.Rows.Add(*values)
+
+    def build(kind):
+        sheet = sheets[kind]
+        table = DataTable(kind)
+        table.Columns.Add(ROW_COLUMN, Int32)
+        for i in range(len(sheet.header)):
+            table.Columns.Add("c{}".format(i), String)
+        table.BeginLoadData()
+        for n, row in enumerate(sheet.rows):
+            add_row(table, n, row)
+        table.EndLoadData()
+        tables[kind] = table
+
+        grid = grids[kind]
+        for i, name in enumerate(sheet.header):
+            header = TextBlock()
+            header.Text = name or u" "
+            column = DataGridTextColumn()
+            column.Header = header
+            column.Binding = Binding("c{}".format(i))
+            if i in key_columns[kind]:
+                column.Width = DataGridLength(260)
+            column.MinWidth = 60
+            grid.Columns.Add(column)
+        grid.ItemsSource = table.DefaultView
+        table.ColumnChanged += lambda sender, args: on_cell(kind, args)
+
+    # -- live re-pricing --------------------------------------------------
+    changes_table = DataTable("changes")
+    changes_grid = find("changes_grid")
+    for i, name in enumerate(CHANGE_COLUMNS):
+        changes_table.Columns.Add("c{}".format(i), String)
+        column = DataGridTextColumn()
+        column.Header = name
+        column.Binding = Binding("c{}".format(i))
+        if i == 0:
+            column.Width = DataGridLength(1, DataGridLengthUnitType.Star)
+        changes_grid.Columns.Add(column)
+    changes_grid.ItemsSource = changes_table.DefaultView
+
+    def refresh(repriced=None):
+        changes = pricing.changes()
+        changes_table.Clear()
+        for name, old, new, qty, delta in changes:
+            if old and new is not None:
+                change = u"{:+.2%}".format((new - old) / old)
+            else:
+                change = u"unpriced" if new is None else u"new"
+            changes_table.Rows.Add(
+                name, _money(old), _money(new), change,
+                u"{:,.2f}".format(qty) if qty else u"-",
+                u"{:+,.2f}".format(delta) if qty else u"-",
+            )
+        delta = sum(c[4] for c in changes)
+        total_tb.Text = (
+            u"Project total: {:,.2f} -> {:,.2f} ({:+,.2f})    "
+            u"{} type rate(s) changed".format(
+                project_total, project_total + delta, delta, len(changes)
+            )
+        )
+        if repriced is not None:
+            status(u"{} recipe(s) re-priced".format(len(repriced)))
+
+    def on_cell(kind, args):
+        if state["loading"] or args.Column.ColumnName == ROW_COLUMN:
+            return
+        sheet = sheets[kind]
+        n = int(args.Row[ROW_COLUMN])
+        col = int(args.Column.ColumnName[1:])
+        text = text_of(args.ProposedValue)
+
+        if kind == PRICES:
+            old_item = sheet.item(n)
+            sheet.set(n, col, text)
+            item = sheet.item(n)
+            header = sheet.header[col].strip()
+            problem = None
+            if header in (cost_column, national_column) and text.strip():
+                try:
+                    editor.parse_price(text)
+                except ValueError as ex:
+                    problem = u"'{}' {}: {} - not priced".format(item, header, ex)
+            repriced = set()
+            if old_item != item:
+                repriced |= pricing.set_price(old_item, None)
+            try:
+                price = sheet.price(n, cost_column, national_column)
+            except ValueError:
+                price = None
+            repriced |= pricing.set_price(item, price)
+            if old_item != item:
+                # recipe components may now resolve to another item
+                state["resolver"] = make_resolver()
+                reparse(repriced)
+            else:
+                refresh(repriced)
+            if problem:
+                status(problem)
+            elif item in locked:
+                status(u"'{}' is priced by {}; this edit does not change "
+                       u"the model's rate".format(item, locked[item]))
+        else:
+            sheet.set(n, col, text)
+            reparse()
+
+    def reparse(repriced=()):
+        try:
+            book = sheets[RECIPES].book(state["resolver"])
+        except recipe_loader.RecipeError as ex:
+            refresh(set(repriced))
+            status(str(ex))
+            return
+        refresh(set(repriced) | pricing.set_recipes(book))
+        if book.report:
+            status(u"{} recipe issue(s): {}".format(len(book.report), book.report[-1]))
+
+    # -- commands -----------------------------------------------------
+    def current():
+        return PRICES if tabs.SelectedIndex == 0 else RECIPES
+
+    def commit():
+        for grid in grids.values():
+            grid.CommitEdit(DataGridEditingUnit.Row, True)
+
+    def on_filter(sender, args):
+        text = find("filter_tb").Text.strip()
+        for kind, table in tables.items():
+            if not text:
+                table.DefaultView.RowFilter = u""
+                continue
+            table.DefaultView.RowFilter = u" OR ".join(
+                u"c{} LIKE {}".format(c, _like(text)) for c in key_columns[kind]
+            )
+
+    def on_add(sender, args):
+        commit()
+        kind = current()
+        sheet = sheets[kind]
+        grid = grids[kind]
+        row = []
+        if kind == RECIPES and grid.SelectedItem is not None:
+            row = [u""] * len(sheet.header)
+            row[sheet.type_col] = text_of(grid.SelectedItem["c{}".format(sheet.type_col)])
+        n = sheet.append(row)
+        state["loading"] = True
+        try:
+            add_row(tables[kind], n, sheet.rows[n])
+        finally:
+            state["loading"] = False
+        view = tables[kind].DefaultView
+        grid.ScrollIntoView(view[view.Count - 1])
+        status(u"Row added")
+
+    def on_delete(sender, args):
+        commit()
+        kind = current()
+        sheet = sheets[kind]
+        selected = [item.Row for item in grids[kind].SelectedItems]
+        if not selected:
+            return
+        repriced = set()
+        for data_row in selected:
+            n = int(data_row[ROW_COLUMN])
+            item = sheet.item(n) if kind == PRICES else None
+            sheet.delete(n)
+            tables[kind].Rows.Remove(data_row)
+            if item:
+                repriced |= pricing.set_price(item, None)
+        if kind == RECIPES:
+            reparse()
+        else:
+            state["resolver"] = make_resolver()
+            reparse(repriced)
+        status(u"{} row(s) deleted".format(len(selected)))
+
+    def save():
+        commit()
+        saved = []
+        for kind in (PRICES, RECIPES):
+            sheet = sheets[kind]
+            if not sheet.dirty:
+                continue
+            if sheet.changed_on_disk() and not forms.alert(
+                u"{} was changed by someone else since it was opened.\n\n"
+                u"Overwrite it with your edits?".format(os.path.basename(sheet.path)),
+                title="Price Book and Recipes", yes=True, no=True,
+            ):
+                continue
+            try:
+                sheet.save()
+            except (IOError, OSError) as ex:
+                forms.alert(u"Could not save {}:\n\n{}".format(sheet.path, ex),
+                            title="Price Book and Recipes")
+                return False
+            saved.append(os.path.basename(sheet.path))
+        status(u"Saved " + u", ".join(saved) if saved else u"Nothing to save")
+        return not any(sheet.dirty for sheet in sheets.values())
+
+    def on_closing(sender, args):
+        commit()
+        if not any(sheet.dirty for sheet in sheets.values()):
+            return
+        choice = forms.alert(
+            "Save your changes to the price book and recipes?",
+            title="Price Book and Recipes",
+            options=["Save", "Discard changes"],
+        )
+        if choice is None or (choice == "Save" and not save()):
+            args.Cancel = True
+
+    state["loading"] = True
+    try:
+        build(PRICES)
+        build(RECIPES)
+    finally:
+        state["loading"] = False
+
+    find("filter_tb").TextChanged += on_filter
+    find("add_b").Click += on_add
+    find("delete_b").Click += on_delete
+    find("save_b").Click += lambda sender, args: save()
+    find("close_b").Click += lambda sender, args: window.Close()
+    window.Closing += on_closing
+
+    tabs.SelectedIndex = 0 if tab == PRICES else 1
+    refresh()
+    problems = pricing.problems()
+    status(u"{} price rows, {} recipes ({} cannot be priced)".format(
+        len(sheets[PRICES].rows), len(recipe_book), len(problems)
+    ))
+    window.ShowDialog()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Matrix pricing engine.
+
+Recipes are compiled into a sparse types x items quantity matrix and
+multiplied once against the full items x scenarios price matrix (every
+province and Min/Avg/Max basis, National fallback applied element-wise).
+Sub-recipes are evaluated first (the recipe book's topological order)
+and memoized, so a shared mix is priced once per scenario no matter how
+many types use it. The result is a per-type scenario table: switching
+province or basis is a lookup, and the table is cached next to the
+compiled price book so the next run with unchanged inputs does not
+recompute it either.
+"""
+import hashlib
+import json
+import math
+import os
+
+from pce import BASES, NATIONAL, PROVINCES, cost_column, csvutil, paths
+from pce.recipes import EMPTY_RECIPE, Breakdown
+
+ENGINE_VERSION = 4
+TABLE_EXT = ".scenarios.json"
+
+
+def scenario_columns():
+    """All province / basis price columns, province-major."""
+    return [cost_column(p, b) for p in PROVINCES for b in BASES]
+
+
+def national_column_for(column):
+    basis = column.split("_")[-2]
+    return cost_column(NATIONAL, basis)
+
+
+# ---------------------------------------------------------------------
+# Price matrix (items x scenarios)
+# ---------------------------------------------------------------------
+def price_matrix(book, columns):
+    """
+    Effective price columns with the National fallback applied.
+
+    Returns ``(prices, national)``: per scenario column, the price of
+    every book item (NaN = no price anywhere) and whether that price
+    came from a National column.
+    """
+    empty = [float("nan")] * len(book.items)
+    prices = []
+    national = []
+    for col in columns:
+        nat_col = national_column_for(col)
+        own = book.column(col) if col in book.column_index else empty
+        nat = book.column(nat_col) if nat_col in book.column_index else empty
+        from_nat = col.startswith(NATIONAL)
+
+        col_prices = []
+        col_national = []
+        for p, n in zip(own, nat):
+            if not math.isnan(p):
+                col_prices.append(p)
+                col_national.append(from_nat)
+            else:
+                col_prices.append(n)
+                col_national.append(not math.isnan(n))
+        prices.append(col_prices)
+        national.append(col_national)
+    return prices, national
+
+
+# ---------------------------------------------------------------------
+# Quantity matrix (types x items, sparse)
+# ---------------------------------------------------------------------
+def quantity_matrix(recipes, book):
+    """
+    Sparse rows ``type -> [(item index, qty), ...]`` in recipe order.
+
+    Components that are not in the price book at all stop the row there,
+    like the per-type loop did; they are returned in ``unknown``.
+    Sub-recipe components are not part of the matrix; ``evaluate`` adds
+    their memoized totals.
+    """
+    rows = {}
+    unknown = {}
+    for name, recipe in recipes.items():
+        row = []
+        for comp, qty in recipe.materials.items():
+            i = book.index.get(comp)
+            if i is None:
+                unknown[name] = comp
+                break
+            row.append((i, qty))
+        rows[name] = row
+    return rows, unknown
+
+
+# ---------------------------------------------------------------------
+# Scenario table
+# ---------------------------------------------------------------------
+class ScenarioTable(object):
+    """
+    Priced recipes for every scenario column.
+
+    ``rows[type][k]`` is either a list ``Breakdown + [national]`` for
+    ``columns[k]`` or the name of the first component without a price.
+    """
+
+    def __init__(self, columns, rows):
+        self.columns = list(columns)
+        self.rows = rows
+        self._col = dict((c, k) for k, c in enumerate(self.columns))
+
+    def __contains__(self, type_name):
+        return type_name in self.rows
+
+    def _entry(self, type_name, column):
+        row = self.rows.get(type_name)
+        k = self._col.get(column)
+        if row is None or k is None:
+            return None
+        return row[k]
+
+    def get(self, type_name, column):
+        """Breakdown of ``type_name`` under ``column`` or None if unpriced."""
+        entry = self._entry(type_name, column)
+        if isinstance(entry, list):
+            return Breakdown(*entry[:7])
+        return None
+
+    def used_national(self, type_name, column):
+        entry = self._entry(type_name, column)
+        return bool(isinstance(entry, list) and entry[7])
+
+    def missing(self, type_name, column):
+        """First component of ``type_name`` with no price under ``column``."""
+        entry = self._entry(type_name, column)
+        if entry is None or isinstance(entry, list):
+            return None
+        return entry
+
+    def column(self, column):
+        """``type -> Breakdown`` for every priced type under ``column``."""
+        k = self._col[column]
+        return dict(
+            (name, Breakdown(*row[k][:7]))
+            for name, row in self.rows.items()
+            if isinstance(row[k], list)
+        )
+
+    def save(self, path):
+        csvutil.write_json(path, {"columns": self.columns, "rows": self.rows})
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(data["columns"], data["rows"])
+
+
+def evaluate(book, recipes, columns=None):
+    """Price every recipe under every scenario column in one pass."""
+    columns = columns or scenario_columns()
+    prices, national = price_matrix(book, columns)
+    qty_rows, unknown = quantity_matrix(recipes, book)
+    k_range = range(len(columns))
+
+    rows = {}
+    for name in recipes.order:
+        recipe = recipes[name]
+        problem = recipes.cycles.get(name) or unknown.get(name)
+        if problem is None and recipe.is_empty:
+            problem = EMPTY_RECIPE
+        if problem is None:
+            for sub in recipe.subrecipes:
+                if sub not in recipes:
+                    problem = u"Recipe: {}".format(sub)
+                    break
+        if problem is not None:
+            rows[name] = [problem] * len(columns)
+            continue
+
+        row = []
+        sparse = qty_rows[name]
+        subs = [(rows[sub], qty) for sub, qty in recipe.subrecipes.items()]
+        for k in k_range:
+            col_prices = prices[k]
+            col_national = national[k]
+            material_total = 0.0
+            used_nat = False
+            missing = None
+            for i, qty in sparse:
+                p = col_prices[i]
+                if math.isnan(p):
+                    missing = book.items[i]
+                    break
+                material_total += qty * p
+                used_nat = used_nat or col_national[i]
+
+            if missing is None:
+                for sub_row, qty in subs:
+                    entry = sub_row[k]
+                    if not isinstance(entry, list):
+                        missing = entry
+                        break
+                    material_total += qty * entry[6]
+                    used_nat = used_nat or entry[7]
+
+            if missing is not None:
+                row.append(missing)
+            else:
+                row.append(list(recipe.breakdown(material_total)) + [used_nat])
+        rows[name] = row
+
+    return ScenarioTable(columns, rows)
+
+
+def _table_key(book, recipes):
+    text = json.dumps(
+        [ENGINE_VERSION, book.source, recipes.source], sort_keys=True
+    )
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:32]
+
+
+def scenario_table(book, recipes, cache_dir=None):
+    """Cached ``evaluate`` keyed on both source files."""
+    cache_dir = cache_dir or paths.user_cache_dir("scenarios")
+    path = os.path.join(cache_dir, _table_key(book, recipes) + TABLE_EXT)
+    if os.path.exists(path):
+        try:
+            return ScenarioTable.load(path)
+        except (ValueError, KeyError, IOError):
+            pass
+
+    table = evaluate(book, recipes)
+    try:
+        table.save(path)
+    except (IOError, OSError):
+        pass
+    return table
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental re-pricing.
+
+Apply Rate remembers, per model, what it last wrote: the scenario column,
+a fingerprint of every recipe and price-book row it used, the effective
+price of every material and the model types that received a cost. The
+next run diffs against that state through a material -> recipe -> type
+reverse index and reports why each type changed. The stored ``Cost`` of
+every other type is still compared with its cached total, since an undo,
+a manual edit or another user's sync can change it behind this state.
+"""
+import hashlib
+import json
+import os
+import struct
+
+from pce import csvutil, paths
+
+STATE_VERSION = 1
+
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def recipe_fingerprint(recipe, sub_fingerprints=()):
+    """
+    Fingerprint of everything in a recipe that affects its rate.
+
+    Sub-recipes contribute their own fingerprints, so editing a shared
+    mix changes the fingerprint of every recipe built on it.
+    """
+    data = json.dumps([
+        list(recipe.materials.items()),
+        [[sub, qty, dict(sub_fingerprints).get(sub)]
+         for sub, qty in recipe.subrecipes.items()],
+        recipe.labour_percent, recipe.labour_fixed, recipe.labour_time,
+        recipe.transport_percent, recipe.transport_fixed,
+        recipe.transport_distance,
+        recipe.wastage_percent,
+        recipe.plant_percent, recipe.plant_fixed, recipe.plant_time,
+        recipe.overhead_percent,
+    ], sort_keys=True)
+    return _sha1(data.encode("utf-8"))
+
+
+def recipe_fingerprints(recipe_book):
+    """``recipe -> fingerprint`` for the whole book, sub-recipes first."""
+    fps = {}
+    for name in recipe_book.order:
+        recipe = recipe_book[name]
+        fps[name] = recipe_fingerprint(recipe, [
+            (sub, fps.get(sub)) for sub in recipe.subrecipes
+        ])
+    return fps
+
+
+def row_fingerprints(book):
+    """``item -> fingerprint`` over every price column of the book."""
+    columns = [book.column(c) for c in book.columns]
+    fmt = "<{}d".format(len(columns))
+    return dict(
+        (item, _sha1(struct.pack(fmt, *[col[i] for col in columns])))
+        for i, item in enumerate(book.items)
+    )
+
+
+# ---------------------------------------------------------------------
+# Reverse dependency index
+# ---------------------------------------------------------------------
+class DependencyIndex(object):
+    """
+    material -> recipes -> model types.
+
+    A material used by a sub-recipe maps to every recipe built on that
+    sub-recipe as well.
+    """
+
+    def __init__(self, recipe_book, types_by_recipe=None):
+        self.recipes_by_material = {}
+        for name, recipe in recipe_book.items():
+            users = set([name]) | recipe_book.ancestors(name)
+            for mat in recipe.materials:
+                self.recipes_by_material.setdefault(mat, set()).update(users)
+        self.types_by_recipe = types_by_recipe or {}
+
+    def recipes_using(self, material):
+        return self.recipes_by_material.get(material, set())
+
+    def types_using(self, material):
+        ids = set()
+        for name in self.recipes_using(material):
+            ids.update(self.types_by_recipe.get(name, ()))
+        return ids
+
+
+# ---------------------------------------------------------------------
+# Persisted state
+# ---------------------------------------------------------------------
+class AppliedState(object):
+    def __init__(self, column=None, recipes=None, rows=None, prices=None,
+                 types=None, materials=None):
+        self.column = column
+        self.recipes = recipes or {}      # recipe -> fingerprint
+        self.rows = rows or {}            # price-book item -> row fingerprint
+        self.prices = prices or {}        # item -> effective price in column
+        self.types = types or {}          # recipe -> [type UniqueIds]
+        self.materials = materials or {}  # Revit material name -> price
+
+    @staticmethod
+    def path_for(doc_key, state_dir=None):
+        state_dir = state_dir or paths.user_cache_dir("applied")
+        name = _sha1(doc_key.encode("utf-8")) + ".json"
+        return os.path.join(state_dir, name)
+
+    @classmethod
+    def load(cls, doc_key, state_dir=None):
+        path = cls.path_for(doc_key, state_dir)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return cls()
+        if data.get("version") != STATE_VERSION:
+            return cls()
+        return cls(
+            data.get("column"), data.get("recipes"), data.get("rows"),
+            data.get("prices"), data.get("types"), data.get("materials"),
+        )
+
+    def save(self, doc_key, state_dir=None):
+        path = self.path_for(doc_key, state_dir)
+        csvutil.write_json(path, {
+            "version": STATE_VERSION,
+            "doc": doc_key,
+            "column": self.column,
+            "recipes": self.recipes,
+            "rows": self.rows,
+            "prices": self.prices,
+            "types": self.types,
+            "materials": self.materials,
+        })
+
+
+# ---------------------------------------------------------------------
+# Diff
+# ---------------------------------------------------------------------
+def _same_price(a, b):
+    if a is None or b is None:
+        return a is b
+    return abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b))
+
+
+class ChangeSet(object):
+    """
+    Recipes that need re-pricing and why.
+
+    ``reasons[recipe]`` is a list of human readable causes; ``deltas``
+    holds ``item -> (old price, new price)`` for every changed material.
+    """
+
+    def __init__(self, full=False, fingerprints=None):
+        self.full = full
+        self.reasons = {}
+        self.deltas = {}
+        self.fingerprints = fingerprints or {}
+
+    def add(self, recipe, reason):
+        self.reasons.setdefault(recipe, []).append(reason)
+
+    def affects(self, recipe):
+        return self.full or recipe in self.reasons
+
+    def material_changed(self, name):
+        return self.full or name in self.deltas
+
+
+def diff(state, column, recipe_book, rows, prices, types_by_recipe,
+         force=False):
+    """
+    Compare the current inputs with the last applied ``state``.
+
+    ``rows`` are the current row fingerprints, ``prices`` the effective
+    ``item -> price`` map for ``column`` and ``types_by_recipe`` the
+    model types (UniqueIds) whose name matches each recipe.
+    """
+    fingerprints = recipe_fingerprints(recipe_book)
+    if force or state.column != column:
+        return ChangeSet(True, fingerprints)
+
+    changes = ChangeSet(False, fingerprints)
+    index = DependencyIndex(recipe_book, types_by_recipe)
+
+    # price-book rows -> effective price deltas -> dependent recipes
+    changed_items = set(
+        item for item, fp in rows.items() if state.rows.get(item) != fp
+    )
+    changed_items.update(item for item in state.rows if item not in rows)
+    for item in changed_items:
+        old = state.prices.get(item)
+        new = prices.get(item)
+        if _same_price(old, new):
+            continue
+        changes.deltas[item] = (old, new)
+        for name in index.recipes_using(item):
+            changes.add(name, ("price", item, old, new))
+
+    # recipe definitions and newly matched model types
+    for name in recipe_book:
+        if name not in types_by_recipe:
+            continue
+        if state.recipes.get(name) != fingerprints[name]:
+            changes.add(name, ("recipe", None, None, None))
+            continue
+        applied = set(state.types.get(name, ()))
+        if not set(types_by_recipe[name]) <= applied:
+            changes.add(name, ("new type", None, None, None))
+
+    return changes
+
+
+def describe(reason):
+    kind, item, old, new = reason
+    if kind != "price":
+        return kind
+    if old is None:
+        return u"{}: new price {:.2f}".format(item, new)
+    if new is None:
+        return u"{}: price removed (was {:.2f})".format(item, old)
+    return u"{}: {:.2f} -> {:.2f} ({:+.2f})".format(item, old, new, new - old)
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+Layered price books.
+
+Prices resolve through a stack of compiled books, lowest precedence
+first:
+
+    base       the extension's ``material_unit_costs.csv``
+    supplier   every ``material_costs/*.csv`` (flat ``Item,,UnitCost``)
+    project    ``<model>_prices.csv`` next to the model, if present
+
+Each layer is compiled and cached on its own (see ``pce.pricebook``).
+A ``LayeredBook`` behaves like a single ``PriceBook``; its columns are
+the base book's own columns with a sparse ``index -> price`` overlay on
+top, so the base matrix is never copied.
+
+A supplier book's flat ``UnitCost`` is a single national price: it only
+fills ``National_*`` cells that have no price yet, so it never overrides
+a province / Min / Avg / Max price and reaches the provinces through
+the usual National fallback. A flat project book is an explicit
+per-model override and applies to every column.
+"""
+import glob
+import math
+import os
+
+from pce import NATIONAL, paths, pricebook
+
+NAN = float("nan")
+
+BASE = "base"
+SUPPLIER = "supplier"
+PROJECT = "project"
+
+PROJECT_SUFFIX = "_prices.csv"
+
+
+class Layer(object):
+    __slots__ = ("name", "kind", "path", "book", "positions")
+
+    def __init__(self, name, kind, path, book):
+        self.name = name
+        self.kind = kind
+        self.path = path
+        self.book = book
+        self.positions = None   # layer item index -> merged item index
+
+    def column(self, name):
+        """
+        This layer's values for ``name``; flat books answer any column
+        (supplier books only National ones).
+        """
+        if name in self.book.column_index:
+            return self.book.column(name)
+        if self.kind == SUPPLIER and not name.startswith(NATIONAL):
+            return None
+        if pricebook.FLAT_COLUMN in self.book.column_index:
+            return self.book.column(pricebook.FLAT_COLUMN)
+        return None
+
+    def fills_only(self, name):
+        """True when this layer's ``name`` values only fill empty cells."""
+        return self.kind == SUPPLIER and name not in self.book.column_index
+
+
+class OverlayColumn(object):
+    """Read-only column: ``base`` values with sparse ``overrides``."""
+
+    __slots__ = ("base", "overrides", "size")
+
+    def __init__(self, base, overrides, size):
+        self.base = base
+        self.overrides = overrides
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        value = self.overrides.get(i)
+        if value is not None:
+            return value
+        return self.base[i] if i < len(self.base) else NAN
+
+    def __iter__(self):
+        base = self.base
+        n_base = len(base)
+        get = self.overrides.get
+        for i in range(self.size):
+            value = get(i)
+            if value is None:
+                value = base[i] if i < n_base else NAN
+            yield value
+
+
+def _is_empty(own, overrides, i):
+    """True when cell ``i`` has no price in ``own`` or ``overrides``."""
+    if i in overrides:
+        return False
+    return i >= len(own) or math.isnan(own[i])
+
+
+class LayeredBook(object):
+    """``PriceBook``-compatible view over ``layers`` (base first)."""
+
+    def __init__(self, layers):
+        if not layers:
+            raise pricebook.PriceBookError("No price book layers to load")
+        self.layers = layers
+        base = layers[0].book
+
+        self.items = list(base.items)
+        self.uoms = list(base.uoms)
+        self.index = dict(base.index)
+        self.columns = list(base.columns)
+        layers[0].positions = list(range(len(base.items)))
+
+        for layer in layers[1:]:
+            positions = []
+            for item, uom in zip(layer.book.items, layer.book.uoms):
+                i = self.index.get(item)
+                if i is None:
+                    i = self.index[item] = len(self.items)
+                    self.items.append(item)
+                    self.uoms.append(uom)
+                positions.append(i)
+            layer.positions = positions
+            for col in layer.book.columns:
+                if col != pricebook.FLAT_COLUMN and col not in self.columns:
+                    self.columns.append(col)
+
+        self.column_index = dict((c, i) for i, c in enumerate(self.columns))
+        self.source = {"layers": [l.book.source for l in layers]}
+        self.report = []
+        for layer in layers:
+            prefix = u"" if layer.kind == BASE else u"[{}] ".format(layer.name)
+            self.report.extend(prefix + line for line in layer.book.report)
+        self._columns = {}
+
+    # -- PriceBook interface ------------------------------------------
+    @property
+    def report_path(self):
+        for layer in self.layers:
+            if layer.book.report_path:
+                return layer.book.report_path
+        return None
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for layer in self.layers:
+            layer.book.close()
+
+    def column(self, name):
+        """Effective prices of one column, upper layers winning."""
+        values = self._columns.get(name)
+        if values is not None:
+            return values
+
+        own = self.layers[0].column(name)
+        if own is None:
+            own = ()
+        overrides = {}
+        for layer in self.layers[1:]:
+            overlay = layer.column(name)
+            if overlay is None:
+                continue
+            positions = layer.positions
+            fills_only = layer.fills_only(name)
+            for j, value in enumerate(overlay):
+                if math.isnan(value):
+                    continue
+                i = positions[j]
+                if fills_only and not _is_empty(own, overrides, i):
+                    continue
+                overrides[i] = value
+
+        if not overrides and len(own) == len(self.items):
+            values = own
+        else:
+            values = OverlayColumn(own, overrides, len(self.items))
+        self._columns[name] = values
+        return values
+
+    def price(self, item, column):
+        i = self.index.get(item)
+        if i is None or column not in self.column_index:
+            return None
+        value = self.column(column)[i]
+        return None if math.isnan(value) else value
+
+    def prices_for(self, column, fallback_column=None):
+        prices = {}
+        sources = {}
+        lookups = [c for c in (column, fallback_column)
+                   if c and c in self.column_index]
+        for col in reversed(lookups):
+            for item, value in zip(self.items, self.column(col)):
+                if not math.isnan(value):
+                    prices[item] = value
+                    sources[item] = col
+        return prices, sources
+
+    # -- provenance ----------------------------------------------------
+    def suppliers(self, column, fallback_column=None):
+        """``item -> layer name`` for every price ``prices_for`` returns."""
+        result = {}
+        for col in [c for c in (fallback_column, column) if c]:
+            claimed = {}
+            for layer in self.layers:
+                values = layer.column(col)
+                if values is None:
+                    continue
+                fills_only = layer.fills_only(col)
+                for j, value in enumerate(values):
+                    if math.isnan(value):
+                        continue
+                    item = self.items[layer.positions[j]]
+                    if fills_only and item in claimed:
+                        continue
+                    claimed[item] = layer.name
+            result.update(claimed)
+        return result
+
+
+# ---------------------------------------------------------------------
+# Discovery
+# ---------------------------------------------------------------------
+def project_override_path(doc_path):
+    """``<model>_prices.csv`` beside a saved model, or None."""
+    if not doc_path:
+        return None
+    return os.path.splitext(doc_path)[0] + PROJECT_SUFFIX
+
+
+def layer_files(base_csv=None, supplier_dir=None, project_csv=None):
+    """``[(kind, path), ...]`` of existing layer files, base first."""
+    base_csv = base_csv or paths.MATERIAL_COSTS_CSV
+    supplier_dir = supplier_dir or paths.MATERIAL_COSTS_DIR
+    files = [(BASE, base_csv)]
+    for path in sorted(glob.glob(os.path.join(supplier_dir, "*.csv"))):
+        files.append((SUPPLIER, path))
+    if project_csv and os.path.exists(project_csv):
+        files.append((PROJECT, project_csv))
+    return files
+
+
+def load(base_csv=None, supplier_dir=None, project_csv=None, cache_dir=None,
+         base_book=None, base_name=None):
+    """
+    Compile (if stale) and open every layer as one ``LayeredBook``.
+
+    ``base_book`` replaces the base CSV with an already open book, e.g.
+    a price history snapshot (see ``pce.pricedb``).
+    """
+    layers = []
+    try:
+        for kind, path in layer_files(base_csv, supplier_dir, project_csv):
+            name = u"{}: {}".format(kind, os.path.basename(path))
+            if kind == BASE and base_book is not None:
+                layers.append(Layer(base_name or name, kind, path, base_book))
+                continue
+            layers.append(Layer(name, kind, path, pricebook.load(path, cache_dir)))
+        return LayeredBook(layers)
+    except Exception:
+        for layer in layers:
+            layer.book.close()
+        if base_book is not None and not layers:
+            base_book.close()
+        raise
+
+
+def with_project(book, project_csv, cache_dir=None):
+    """
+    ``book`` plus a model's ``<model>_prices.csv`` layer.
+
+    The new view shares ``book``'s open base and supplier books; close
+    only its last layer when done with it. Returns ``book`` itself when
+    there is no override file.
+    """
+    if not project_csv or not os.path.exists(project_csv):
+        return book
+    shared = [Layer(l.name, l.kind, l.path, l.book)
+              for l in book.layers if l.kind != PROJECT]
+    name = u"{}: {}".format(PROJECT, os.path.basename(project_csv))
+    project = Layer(name, PROJECT, project_csv,
+                    pricebook.load(project_csv, cache_dir))
+    return LayeredBook(shared + [project])
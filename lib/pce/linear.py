@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Linear cost models for what-if price sensitivity.
+
+A recipe's rate is linear in its material prices:
+
+    total = overhead x (percent x material total + fixed adders)
+
+with ``percent = 1 + wastage + labour% + transport% + plant%``. Each
+recipe (sub-recipes flattened in) is compiled once into ``weights``
+(d total / d price per price-book item) and a ``constant``, so the
+effect of any set of price changes on every type is a sparse dot
+product, without re-reading the CSVs or touching the model.
+"""
+import re
+
+from pce.recipes import EMPTY_RECIPE
+
+SHOCK_RE = re.compile(r"^\s*(.+?)\s*([+-]\s*\d+(?:\.\d+)?)\s*%?\s*$")
+
+
+class LinearCost(object):
+    __slots__ = ("name", "weights", "constant")
+
+    def __init__(self, name, weights, constant):
+        self.name = name
+        self.weights = weights      # item -> d total / d price
+        self.constant = constant    # fixed and time/distance adders
+
+    def missing(self, prices):
+        """First component without a price, or None."""
+        for item in self.weights:
+            if item not in prices:
+                return item
+        return None
+
+    def total(self, prices):
+        return self.constant + sum(
+            w * prices[item] for item, w in self.weights.items()
+        )
+
+
+def _factors(recipe):
+    percent = (
+        1.0
+        + recipe.wastage_percent
+        + recipe.labour_percent
+        + recipe.transport_percent
+        + recipe.plant_percent
+    )
+    fixed = (
+        sum(recipe.labour_fixed) + sum(recipe.labour_time)
+        + sum(recipe.transport_fixed) + sum(recipe.transport_distance)
+        + sum(recipe.plant_fixed) + sum(recipe.plant_time)
+    )
+    overhead = 1.0 + recipe.overhead_percent
+    return overhead * percent, overhead * fixed
+
+
+class LinearModel(object):
+    """
+    Compiled linear costs for every recipe that can be priced.
+
+    Recipes in a sub-recipe cycle or using an undefined sub-recipe are
+    left out (``skipped``); price availability is checked per scenario.
+    """
+
+    def __init__(self, recipe_book):
+        self.costs = {}
+        self.skipped = {}
+        self.users = {}     # item -> recipes whose weights include it
+
+        for name in recipe_book.order:
+            self._compile(recipe_book, name)
+
+    def _compile(self, recipe_book, name):
+        recipe = recipe_book[name]
+        if name in recipe_book.cycles:
+            self.skipped[name] = recipe_book.cycles[name]
+            return
+        if recipe.is_empty:
+            self.skipped[name] = EMPTY_RECIPE
+            return
+
+        weights = dict(recipe.materials)
+        constant = 0.0
+        for sub, qty in recipe.subrecipes.items():
+            child = self.costs.get(sub)
+            if child is None:
+                self.skipped[name] = self.skipped.get(
+                    sub, u"Recipe: {}".format(sub)
+                )
+                return
+            for item, w in child.weights.items():
+                weights[item] = weights.get(item, 0.0) + qty * w
+            constant += qty * child.constant
+
+        scale, fixed = _factors(recipe)
+        self.costs[name] = LinearCost(
+            name,
+            dict((item, scale * w) for item, w in weights.items()),
+            scale * constant + fixed,
+        )
+        for item in weights:
+            self.users.setdefault(item, set()).add(name)
+
+    def update(self, recipe_book, names):
+        """
+        Recompile ``names`` (edited recipes and everything built on
+        them) from ``recipe_book``; names no longer in the book are
+        dropped.
+        """
+        names = set(names)
+        for name in names:
+            cost = self.costs.pop(name, None)
+            self.skipped.pop(name, None)
+            if cost is None:
+                continue
+            for item in cost.weights:
+                users = self.users.get(item)
+                if users is not None:
+                    users.discard(name)
+                    if not users:
+                        del self.users[item]
+        for name in recipe_book.order:
+            if name in names:
+                self._compile(recipe_book, name)
+
+    def __contains__(self, name):
+        return name in self.costs
+
+    def totals(self, prices):
+        """``recipe -> total`` for every recipe fully priced by ``prices``."""
+        return dict(
+            (name, cost.total(prices))
+            for name, cost in self.costs.items()
+            if cost.missing(prices) is None
+        )
+
+    def what_if(self, prices, shocks):
+        """
+        Effect of relative price changes on every affected recipe.
+
+        ``shocks`` maps item -> fractional change (0.15 = +15%). Returns
+        ``recipe -> (old total, new total)`` for recipes that use at
+        least one shocked item and are fully priced.
+        """
+        affected = set()
+        for item in shocks:
+            affected.update(self.users.get(item, ()))
+
+        result = {}
+        for name in affected:
+            cost = self.costs[name]
+            if cost.missing(prices) is not None:
+                continue
+            old = cost.total(prices)
+            delta = sum(
+                cost.weights[item] * prices[item] * change
+                for item, change in shocks.items()
+                if item in cost.weights
+            )
+            result[name] = (old, old + delta)
+        return result
+
+
+def parse_shocks(text, items):
+    """
+    Parse "cement +15%, steel -5%" into ``item -> fractional change``.
+
+    Each term matches every price-book item containing it as whole
+    words (case insensitive), so "cement" hits "Cement 42.5-50Kg" but
+    not "Fibercement"; an exact item name matches only itself. Returns
+    ``(shocks, matches, problems)``; ``matches`` lists ``(term, change,
+    items hit)``.
+    """
+    shocks = {}
+    matches = []
+    problems = []
+    exact = set(items)
+
+    for term in re.split(r"[,;\n]+", text or ""):
+        if not term.strip():
+            continue
+        m = SHOCK_RE.match(term)
+        if not m:
+            problems.append(u"'{}': expected '<item> +/-<percent>%'".format(
+                term.strip()
+            ))
+            continue
+        name = m.group(1)
+        change = float(m.group(2).replace(" ", "")) / 100.0
+        if name in exact:
+            hits = [name]
+        else:
+            word = re.compile(r"\b{}\b".format(re.escape(name)), re.I | re.U)
+            hits = [item for item in items if word.search(item)]
+        if not hits:
+            problems.append(u"'{}': no price-book item matches".format(name))
+            continue
+        for item in hits:
+            shocks[item] = change
+        matches.append((name, change, hits))
+
+    return shocks, matches, problems
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Live ``Amount (Qty*Rate)`` through a dynamic model updater.
+
+Once registered (the Live Amount button), Revit calls the updater inside
+every transaction that adds an element of a costed category, changes
+its geometry or one of the parameters its quantity is read from
+(``QUANTITY_PARAMETERS``), or changes a type's ``Cost``. ``Cost`` is
+triggered as the built-in parameter in every document and, per
+document, as the shared or project parameter it resolves to there
+(``cost_parameter_ids``); documents opened later get theirs when they
+open, and a ``Cost`` parameter added during the session is picked up
+when Live Amount is turned on again. Edits to anything else, including
+the ``Amount`` the updater writes, do not call it.
+
+It recomputes the amount of just those elements, and of the instances
+of re-priced types, with the same ``measure.AmountCalculator`` as Update
+Amount, so each edit costs in proportion to what it changed. One
+calculator is kept per document, so parameters, category methods and
+the recipe units are resolved once per session; a re-priced type is
+forgotten (``forget_type``) and the recipe units are looked up again
+only when a type changed. Amounts are only written when they differ,
+and never to instances owned by someone else in a workshared model.
+
+Registration is for the Revit session and every open document; the
+updater is optional, so models edited without it open without warnings.
+A failing update never fails the user's transaction: it is counted, and
+the first traceback is kept and written to ``live_amount.log`` in the
+local cache, for the Live Amount button to report. The Revit API is
+imported when called.
+"""
+import io
+import os
+import time
+import traceback
+
+from pce import measure, modeltypes, params, paths, worksharing
+
+UPDATER_GUID = "3c9e5a71-4d2b-4f0e-8a6c-1b7d2e9f5a84"
+UPDATER_NAME = "PyCostEstimates Live Amount"
+
+LOG_FILE = "live_amount.log"
+
+# Instance parameters a quantity, its method or the element's type is
+# read from (BuiltInParameter member names)
+QUANTITY_PARAMETERS = tuple(
+    member
+    for name in (params.PARAM_VOLUME, params.PARAM_AREA, params.PARAM_LENGTH,
+                 params.PARAM_BAR_LENGTH, params.PARAM_STRUCTURAL_MATERIAL)
+    for member in params.BUILTINS[name]
+) + ("ELEM_TYPE_PARAM",)
+
+_updater = None     # the registered instance, kept alive for the session
+_on_opened = None   # its DocumentOpened handler
+_calculators = {}   # document hash code -> AmountCalculator
+
+
+def log_path():
+    return os.path.join(paths.user_cache_dir(), LOG_FILE)
+
+
+def _log_failure(text):
+    try:
+        with io.open(log_path(), "a", encoding="utf-8") as f:
+            f.write(u"{}\n{}\n".format(time.strftime("%Y-%m-%d %H:%M:%S"), text))
+    except (IOError, OSError):
+        pass
+
+
+def _updater_class():
+    from pyrevit import DB
+
+    class AmountUpdater(DB.IUpdater):
+        def __init__(self, addin_id):
+            from System import Guid
+
+            self.updater_id = DB.UpdaterId(addin_id, Guid(UPDATER_GUID))
+            self.updated = 0
+            self.errors = 0
+            self.first_error = None     # traceback of the first failure
+
+        def GetUpdaterId(self):
+            return self.updater_id
+
+        def GetUpdaterName(self):
+            return UPDATER_NAME
+
+        def GetAdditionalInformation(self):
+            return "Recomputes Amount (Qty*Rate) of changed and re-priced elements"
+
+        def GetChangePriority(self):
+            return DB.ChangePriority.Annotations
+
+        def Execute(self, data):
+            # An exception here would make Revit disable the updater
+            try:
+                self.updated += update(
+                    data.GetDocument(),
+                    list(data.GetAddedElementIds()) + list(data.GetModifiedElementIds()),
+                )
+            except Exception:
+                self.errors += 1
+                if self.first_error is None:
+                    self.first_error = traceback.format_exc()
+                    _log_failure(self.first_error)
+
+    return AmountUpdater
+
+
+def _instances_of(doc, type_id):
+    """Instances of one element type."""
+    from pyrevit import DB
+
+    rule = DB.ParameterFilterRuleFactory.CreateEqualsRule(
+        DB.ElementId(DB.BuiltInParameter.ELEM_TYPE_PARAM), type_id
+    )
+    return (DB.FilteredElementCollector(doc)
+            .WherePasses(modeltypes.category_filter(measure.categories()))
+            .WhereElementIsNotElementType()
+            .WherePasses(DB.ElementParameterFilter(rule)))
+
+
+def _calculator(doc, types_changed):
+    """
+    The document's ``AmountCalculator``, made on first use and again
+    when the recipe units changed (looked up only when a type did).
+    """
+    key = doc.GetHashCode()
+    calculator = _calculators.get(key)
+    if calculator is not None and not calculator.doc.IsValidObject:
+        calculator = None
+    if calculator is None or types_changed:
+        uoms = measure.recipe_uoms(doc)
+        if calculator is None or (uoms is not calculator.uoms
+                                  and (uoms or calculator.uoms)):
+            for stale in [k for k, c in _calculators.items()
+                          if not c.doc.IsValidObject]:
+                del _calculators[stale]
+            calculator = _calculators[key] = measure.AmountCalculator(doc, uoms=uoms)
+    calculator.start_run()
+    return calculator
+
+
+def update(doc, element_ids):
+    """
+    Recompute the amounts affected by ``element_ids`` (instances, or
+    types whose instances follow); returns the number written.
+    """
+    from pyrevit import DB
+
+    elements = [e for e in (doc.GetElement(i) for i in element_ids) if e is not None]
+    calculator = _calculator(
+        doc, any(isinstance(e, DB.ElementType) for e in elements)
+    )
+    seen = set()
+    changes = []
+    for elem in elements:
+        if isinstance(elem, DB.ElementType):
+            calculator.forget_type(elem.Id)
+            instances = _instances_of(doc, elem.Id)
+        else:
+            instances = [elem]
+        for inst in instances:
+            key = inst.Id.IntegerValue
+            if key in seen or not calculator.is_costed(inst):
+                continue
+            seen.add(key)
+            try:
+                change = calculator.change(inst)
+            except measure.MeasureError:
+                continue
+            if change is not None:
+                changes.append((inst.Id, change))
+
+    # A write to an instance a colleague owns would fail the user's
+    # transaction: leave those to a later Compute Amount
+    blocked = worksharing.partition(
+        doc, [element_id for element_id, _ in changes], borrow=False
+    ).blocked
+    written = 0
+    for element_id, (target_param, value) in changes:
+        if element_id.IntegerValue not in blocked:
+            target_param.Set(value)
+            written += 1
+    return written
+
+
+def status():
+    """
+    ``(updated, errors, first_error)`` of this session's updater, or
+    None when it was not registered from this engine.
+    """
+    if _updater is None:
+        return None
+    return _updater.updated, _updater.errors, _updater.first_error
+
+
+def is_registered(addin_id):
+    from System import Guid
+    from pyrevit import DB
+
+    return DB.UpdaterRegistry.IsUpdaterRegistered(
+        DB.UpdaterId(addin_id, Guid(UPDATER_GUID))
+    )
+
+
+def _type_filter():
+    from pyrevit import DB
+
+    return DB.LogicalAndFilter(
+        modeltypes.category_filter(measure.categories()),
+        DB.ElementIsElementTypeFilter(False),
+    )
+
+
+def cost_parameter_ids(doc):
+    """
+    Ids of the shared or project parameters ``Cost`` resolves to on the
+    costed types of ``doc`` (``params.ParameterAccessor``, one type per
+    category). The built-in ``Cost`` has no such id and is left out.
+    """
+    from pyrevit import DB
+
+    accessor = params.ParameterAccessor(params.PARAM_COST)
+    resolved = set()    # category ids
+    ids = {}
+    for type_elem in DB.FilteredElementCollector(doc).WherePasses(_type_filter()):
+        category = type_elem.Category
+        if category is None or category.Id.IntegerValue in resolved:
+            continue
+        param = accessor.get(type_elem)
+        if param is None:
+            continue
+        resolved.add(category.Id.IntegerValue)
+        if param.Id.IntegerValue > 0:
+            ids[param.Id.IntegerValue] = param.Id
+    return [ids[key] for key in sorted(ids)]
+
+
+def add_document_triggers(updater_id, doc):
+    """Trigger on the type ``Cost`` parameters specific to ``doc``."""
+    from pyrevit import DB
+
+    if doc.IsFamilyDocument or doc.IsLinked:
+        return
+    for param_id in cost_parameter_ids(doc):
+        DB.UpdaterRegistry.AddTrigger(
+            updater_id, doc, _type_filter(),
+            DB.Element.GetChangeTypeParameter(param_id),
+        )
+
+
+def register(addin_id, app):
+    """
+    Register the updater and its triggers for the session: on every
+    open document, and on each document ``app`` opens later.
+    """
+    global _updater, _on_opened
+    from pyrevit import DB
+
+    updater = _updater_class()(addin_id)
+    updater_id = updater.GetUpdaterId()
+    if DB.UpdaterRegistry.IsUpdaterRegistered(updater_id):
+        return
+    DB.UpdaterRegistry.RegisterUpdater(updater, True)
+
+    instances = DB.LogicalAndFilter(
+        modeltypes.category_filter(measure.categories()),
+        DB.ElementIsElementTypeFilter(True),
+    )
+    DB.UpdaterRegistry.AddTrigger(
+        updater_id, instances, DB.Element.GetChangeTypeElementAddition()
+    )
+    DB.UpdaterRegistry.AddTrigger(
+        updater_id, instances, DB.Element.GetChangeTypeGeometry()
+    )
+    for member in QUANTITY_PARAMETERS:
+        DB.UpdaterRegistry.AddTrigger(
+            updater_id, instances, DB.Element.GetChangeTypeParameter(
+                DB.ElementId(getattr(DB.BuiltInParameter, member))
+            ),
+        )
+    DB.UpdaterRegistry.AddTrigger(
+        updater_id, _type_filter(),
+        DB.Element.GetChangeTypeParameter(DB.ElementId(DB.BuiltInParameter.ALL_MODEL_COST)),
+    )
+    for doc in app.Documents:
+        add_document_triggers(updater_id, doc)
+
+    def on_opened(sender, args):
+        # A failure here must not interrupt opening the document
+        try:
+            add_document_triggers(updater_id, args.Document)
+        except Exception:
+            _log_failure(traceback.format_exc())
+
+    app.DocumentOpened += on_opened
+    _on_opened = on_opened
+    _updater = updater
+
+
+def unregister(addin_id, app):
+    global _updater, _on_opened
+    from System import Guid
+    from pyrevit import DB
+
+    updater_id = DB.UpdaterId(addin_id, Guid(UPDATER_GUID))
+    if DB.UpdaterRegistry.IsUpdaterRegistered(updater_id):
+        DB.UpdaterRegistry.UnregisterUpdater(updater_id)
+    if _on_opened is not None:
+        app.DocumentOpened -= _on_opened
+    _updater = None
+    _on_opened = None
+    _calculators.clear()
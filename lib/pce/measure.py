@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+"""
+Element quantities and ``Amount = quantity x Cost``.
+
+The one place the model is measured. Each costed category is measured
+one way (count, length, area or volume); structural columns and framing
+by their material (concrete by volume, steel by length), falling back
+to the category method for other materials. A type whose recipe has a
+``BOQ UoM`` is measured in that unit instead, so the quantity always
+matches the unit its ``Cost`` is per. The recipe is looked up by type
+name in the recipe book the model is priced with (see ``recipe_uoms``),
+so every user and workstation measures a model the same way.
+
+These rules reconcile what Update Amount, Generate BOQ and Material
+List used to do separately: framing was measured by length for amounts
+but by volume (concrete) or length (steel) in the BOQ, and specialty
+equipment and furniture were counted in the BOQ only. Both now follow
+the BOQ rules everywhere (``pick_method``).
+
+``AmountCalculator`` holds the lookups of one document: category
+methods by id, each type's ``Cost``, measuring method and each
+material's method are resolved once and cached, and each element is
+measured once per run. Update Amount, the live updater
+(``pce.liveamount``), Generate BOQ and Material List all use it, so
+amounts, BOQ quantities and material lists agree. The Revit API is
+imported when called.
+"""
+from pce import params, paths, plan, snapshot
+from pce import recipes as recipe_loader
+
+FT3_TO_M3 = 0.0283168
+FT2_TO_M2 = 0.092903
+FT_TO_M = 0.3048
+
+# Stored amounts within this of the computed one are left alone
+TOLERANCE = plan.DEFAULT_TOLERANCE
+
+COUNT = "count"
+LENGTH = "length"
+AREA = "area"
+VOLUME = "volume"
+
+UNITS = {COUNT: u"No.", LENGTH: u"m", AREA: u"m²", VOLUME: u"m³"}
+
+# Method of cost calculation by category (BuiltInCategory member names)
+CATEGORY_METHODS = {
+    "OST_Doors": COUNT,
+    "OST_Windows": COUNT,
+    "OST_StructuralColumns": VOLUME,
+    "OST_StructuralFraming": LENGTH,
+    "OST_StructuralFoundation": VOLUME,
+    "OST_Floors": VOLUME,
+    "OST_Walls": AREA,
+    "OST_Roofs": AREA,
+    "OST_Ceilings": AREA,
+    "OST_Conduit": LENGTH,
+    "OST_LightingFixtures": COUNT,
+    "OST_LightingDevices": COUNT,
+    "OST_ElectricalFixtures": COUNT,
+    "OST_ElectricalEquipment": COUNT,
+    "OST_GenericModel": AREA,
+    "OST_Rebar": LENGTH,
+    "OST_PlumbingFixtures": COUNT,
+    "OST_PipeCurves": LENGTH,
+    "OST_PipeFitting": COUNT,
+    "OST_PipeAccessory": COUNT,
+    "OST_SpecialityEquipment": COUNT,
+    "OST_Furniture": COUNT,
+    "OST_FurnitureSystems": COUNT,
+}
+
+# Categories measured by structural material; the category method
+# above applies to other materials
+BY_MATERIAL = ("OST_StructuralColumns", "OST_StructuralFraming")
+MATERIAL_METHODS = (
+    ("concrete", VOLUME),
+    ("steel", LENGTH),
+    ("metal", LENGTH),
+)
+
+# Recipe ``BOQ UoM`` spellings (lower case, no spaces) -> method
+UOM_METHODS = {
+    "no": COUNT, "no.": COUNT, "nr": COUNT, "each": COUNT, "item": COUNT,
+    "m": LENGTH, "lm": LENGTH,
+    "m2": AREA, u"m²": AREA, "sqm": AREA,
+    "m3": VOLUME, u"m³": VOLUME, "cum": VOLUME,
+}
+
+
+class MeasureError(Exception):
+    """Why an element has no amount (reported, not fatal)."""
+
+
+def categories():
+    """Every costed ``BuiltInCategory``."""
+    from pyrevit import DB
+
+    return [getattr(DB.BuiltInCategory, name) for name in sorted(CATEGORY_METHODS)]
+
+
+def method_for_uom(uom):
+    """Method of a recipe ``BOQ UoM``, or None when it is not a known unit."""
+    return UOM_METHODS.get((uom or u"").strip().lower().replace(u" ", u""))
+
+
+def material_method(text):
+    """Method named by a material's name and class, or None when neither tells."""
+    text = (text or u"").lower()
+    return next((method for word, method in MATERIAL_METHODS if word in text), None)
+
+
+def pick_method(category, by_uom=None, by_material=None):
+    """
+    Method of an element of ``category`` (a ``BuiltInCategory`` member
+    name), or None when the category is not costed. ``by_uom`` is the
+    method of its type's recipe ``BOQ UoM`` and wins; ``by_material``
+    (see ``material_method``) applies to ``BY_MATERIAL`` categories.
+    """
+    method = CATEGORY_METHODS.get(category)
+    if method is None:
+        return None
+    if by_uom:
+        return by_uom
+    if by_material and category in BY_MATERIAL:
+        return by_material
+    return method
+
+
+class RecipeUoms(object):
+    """``type name -> BOQ UoM`` of a ``RecipeBook``, templates included."""
+
+    def __init__(self, recipe_book):
+        self.book = recipe_book
+
+    def get(self, type_name, default=None):
+        recipe = self.book.get(type_name)
+        if recipe is None:
+            recipe = self.book.instantiate(type_name)
+        if recipe is None or not recipe.uom:
+            return default
+        return recipe.uom
+
+
+_recipe_uoms = {}   # snapshot hash or recipes.csv stat -> RecipeUoms
+
+
+def recipe_uoms(doc):
+    """
+    ``RecipeUoms`` of the recipe book ``doc`` is priced with: the
+    model's price snapshot when it has one, else the extension's
+    recipes.csv. Read again only when either changed; {} when there are
+    no readable recipes.
+    """
+    try:
+        stored = snapshot.load_recipes(doc)
+        if stored is not None:
+            key = ("snapshot", stored[0])
+            if key not in _recipe_uoms:
+                _recipe_uoms[key] = RecipeUoms(stored[1])
+            return _recipe_uoms[key]
+
+        stat = recipe_loader.source_stat(paths.RECIPES_CSV)
+        key = (stat["path"], stat["size"], stat["mtime"])
+        if key not in _recipe_uoms:
+            _recipe_uoms[key] = RecipeUoms(recipe_loader.load(paths.RECIPES_CSV))
+        return _recipe_uoms[key]
+    except (IOError, OSError, ValueError, recipe_loader.RecipeError,
+            snapshot.SnapshotError):
+        return {}
+
+
+def type_name(type_elem):
+    """Type name as recipes are keyed (``SYMBOL_NAME_PARAM``)."""
+    from pyrevit import DB
+
+    name_param = type_elem.get_Parameter(DB.BuiltInParameter.SYMBOL_NAME_PARAM)
+    return name_param.AsString() if name_param else type_elem.Name
+
+
+class TypeQuantity(object):
+    """Quantity summed over the measured instances of one type."""
+
+    __slots__ = ("type_id", "unique_id", "name", "category", "method",
+                 "quantity", "count", "unmeasured")
+
+    def __init__(self, type_id, unique_id, name, category, method):
+        self.type_id = type_id
+        self.unique_id = unique_id
+        self.name = name
+        self.category = category    # category id
+        self.method = method
+        self.quantity = 0.0
+        self.count = 0
+        self.unmeasured = 0         # instances without quantity data
+
+    @property
+    def unit(self):
+        return UNITS.get(self.method, u"")
+
+
+class AmountCalculator(object):
+    """
+    Quantity and amount of any costed element of one document.
+
+    ``uoms`` is ``type name -> BOQ UoM`` (see ``recipe_uoms``).
+    """
+
+    def __init__(self, doc, accessors=None, uoms=None):
+        from pyrevit import DB
+
+        self.doc = doc
+        self.accessors = accessors or params.Accessors()
+        self.uoms = uoms or {}
+        self.methods = dict(
+            (int(getattr(DB.BuiltInCategory, name)), name)
+            for name in CATEGORY_METHODS
+        )   # category id -> BuiltInCategory name
+        self.rebar_id = int(DB.BuiltInCategory.OST_Rebar)
+        self.type_costs = {}        # type id -> Cost, or MeasureError
+        self.type_methods = {}      # type id -> method of its BOQ UoM, or None
+        self.material_methods = {}  # material id -> method, or None
+        self.measured = {}          # element id -> (method, quantity, error)
+
+        self.cost_of = self.accessors[params.PARAM_COST]
+        self.amount_of = self.accessors[params.PARAM_AMOUNT]
+        self.material_of = self.accessors[params.PARAM_STRUCTURAL_MATERIAL]
+        self.volume_of = self.accessors[params.PARAM_VOLUME]
+        self.area_of = self.accessors[params.PARAM_AREA]
+        self.length_of = self.accessors[params.PARAM_LENGTH]
+        self.bar_length_of = self.accessors[params.PARAM_BAR_LENGTH]
+
+    def is_costed(self, elem):
+        category = elem.Category
+        return category is not None and category.Id.IntegerValue in self.methods
+
+    # -- cached per type / material -----------------------------------
+    def type_cost(self, type_id):
+        key = type_id.IntegerValue
+        if key not in self.type_costs:
+            type_elem = self.doc.GetElement(type_id)
+            cost_param = self.cost_of.get(type_elem) if type_elem else None
+            if not cost_param:
+                self.type_costs[key] = MeasureError("Missing 'Cost' type parameter")
+            else:
+                self.type_costs[key] = cost_param.AsDouble()
+        return self.type_costs[key]
+
+    def start_run(self):
+        """
+        Forget the values read from the model (type costs and
+        measurements) but keep the resolved parameters and methods, for
+        a calculator kept between runs (the live updater).
+        """
+        self.type_costs.clear()
+        self.measured.clear()
+
+    def forget_type(self, type_id):
+        """Drop the cached ``Cost`` and method of a type that changed."""
+        self.type_costs.pop(type_id.IntegerValue, None)
+        self.type_methods.pop(type_id.IntegerValue, None)
+
+    def type_method(self, type_id):
+        """Method of the type's recipe ``BOQ UoM``, or None."""
+        key = type_id.IntegerValue
+        if key not in self.type_methods:
+            method = None
+            if self.uoms:
+                type_elem = self.doc.GetElement(type_id)
+                if type_elem is not None:
+                    method = method_for_uom(self.uoms.get(type_name(type_elem)))
+            self.type_methods[key] = method
+        return self.type_methods[key]
+
+    def material_method(self, material_id):
+        """Method by material name and class, or None when neither tells."""
+        key = material_id.IntegerValue
+        if key not in self.material_methods:
+            mat_elem = self.doc.GetElement(material_id)
+            text = u""
+            if mat_elem is not None:
+                text = u"{} {}".format(
+                    mat_elem.Name, getattr(mat_elem, "MaterialClass", "") or ""
+                )
+            self.material_methods[key] = material_method(text)
+        return self.material_methods[key]
+
+    # -- per element ---------------------------------------------------
+    def method(self, elem):
+        category = elem.Category
+        if not category:
+            raise MeasureError("Missing category")
+        name = self.methods.get(category.Id.IntegerValue)
+        if not name:
+            raise MeasureError("Unrecognized category")
+
+        by_uom = self.type_method(elem.GetTypeId())
+        by_material = None
+        if not by_uom and name in BY_MATERIAL:
+            mat_param = self.material_of.get(elem)
+            if mat_param:
+                by_material = self.material_method(mat_param.AsElementId())
+        return pick_method(name, by_uom, by_material)
+
+    def quantity(self, elem, method):
+        """Measured quantity in m, m2, m3 or 1 for counted items."""
+        if method == VOLUME:
+            p = self.volume_of.get(elem)
+            if not p or not p.HasValue:
+                raise MeasureError("No volume data")
+            return p.AsDouble() * FT3_TO_M3
+
+        if method == AREA:
+            p = self.area_of.get(elem)
+            if not p or not p.HasValue:
+                raise MeasureError("No area data")
+            return p.AsDouble() * FT2_TO_M2
+
+        if method == LENGTH:
+            if elem.Category.Id.IntegerValue == self.rebar_id:
+                p = self.bar_length_of.get(elem)
+            else:
+                p = self.length_of.get(elem)
+            if not p or not p.HasValue:
+                raise MeasureError("No length data")
+            return p.AsDouble() * FT_TO_M
+
+        return 1.0  # default for count-based items
+
+    def measurement(self, elem):
+        """
+        ``(method, quantity, error)`` of ``elem``, measured once per run.
+        ``error`` is the ``MeasureError`` when there is no quantity (0.0);
+        ``method`` is None when the element is not measurable at all.
+        """
+        key = elem.Id.IntegerValue
+        result = self.measured.get(key)
+        if result is None:
+            method = None
+            try:
+                method = self.method(elem)
+                result = (method, self.quantity(elem, method), None)
+            except MeasureError as ex:
+                result = (method, 0.0, ex)
+            self.measured[key] = result
+        return result
+
+    def measure(self, elem):
+        """``(method, quantity)``; raises ``MeasureError`` when there is none."""
+        method, quantity, error = self.measurement(elem)
+        if error is not None:
+            raise error
+        return method, quantity
+
+    def quantities(self, elements):
+        """
+        One ``TypeQuantity`` per type of ``elements``, in the order types
+        are first met; elements of unmeasurable categories are left out.
+        """
+        table = {}
+        order = []
+        for elem in elements:
+            method, quantity, error = self.measurement(elem)
+            if method is None:
+                continue
+            type_id = elem.GetTypeId()
+            key = type_id.IntegerValue
+            row = table.get(key)
+            if row is None:
+                type_elem = self.doc.GetElement(type_id)
+                if type_elem is None:
+                    continue
+                row = table[key] = TypeQuantity(
+                    type_id, type_elem.UniqueId, type_name(type_elem),
+                    elem.Category.Id.IntegerValue, method,
+                )
+                order.append(key)
+            row.count += 1
+            if error is not None:
+                row.unmeasured += 1
+            else:
+                row.quantity += quantity
+        return [table[key] for key in order]
+
+    def amount(self, elem):
+        """
+        ``(Amount parameter, new value)`` of ``elem``; raises
+        ``MeasureError`` with the reason when it has none.
+        """
+        _method, quantity = self.measure(elem)
+
+        cost_val = self.type_cost(elem.GetTypeId())
+        if isinstance(cost_val, MeasureError):
+            raise cost_val
+
+        target_param = self.amount_of.get(elem)
+        if not target_param:
+            raise MeasureError(
+                "Missing instance parameter '{}'".format(params.PARAM_AMOUNT)
+            )
+        if target_param.IsReadOnly:
+            raise MeasureError("'{}' is read-only".format(params.PARAM_AMOUNT))
+
+        return target_param, cost_val * quantity
+
+    def change(self, elem):
+        """
+        ``(Amount parameter, new value)`` when it differs from the stored
+        amount, else None. Raises ``MeasureError`` like ``amount``.
+        """
+        target_param, value = self.amount(elem)
+        if abs(target_param.AsDouble() - value) <= TOLERANCE:
+            return None
+        return target_param, value
+
+    def update(self, elem):
+        """Write the amount of ``elem`` if it changed; True when written."""
+        change = self.change(elem)
+        if change is None:
+            return False
+        change[0].Set(change[1])
+        return True
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+One-pass collection of the model types a tool prices.
+
+A single ``ElementMulticategoryFilter`` collector returns the types of
+every category at once; each type is read through a parameter accessor
+resolved once per category (see ``pce.params``), and indexed by type
+name. The same name in several categories is reported instead of
+silently sharing one result. The Revit API is imported when called.
+"""
+from pce.params import ParameterAccessor
+
+
+class TypeIndex(object):
+    """``type name -> [(element type, parameter)]`` with collision report."""
+
+    def __init__(self):
+        self.by_name = {}
+        self.categories = {}        # type name -> set of category names
+        self.scanned = 0
+        self.accessor = None        # ParameterAccessor used to read them
+
+    def add(self, name, elem, param):
+        self.by_name.setdefault(name, []).append((elem, param))
+        self.categories.setdefault(name, set()).add(
+            elem.Category.Name if elem.Category else ""
+        )
+
+    def collisions(self):
+        """``type name -> sorted category names`` for names in 2+ categories."""
+        return dict(
+            (name, sorted(cats))
+            for name, cats in self.categories.items()
+            if len(cats) > 1
+        )
+
+    def ids(self, name):
+        return [elem.Id for elem, _ in self.by_name.get(name, ())]
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __iter__(self):
+        return iter(self.by_name)
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def items(self):
+        return self.by_name.items()
+
+
+def category_filter(categories):
+    from pyrevit import DB
+    from System.Collections.Generic import List
+
+    return DB.ElementMulticategoryFilter(
+        List[DB.BuiltInCategory](categories)
+    )
+
+
+def collect(doc, categories, param_name, names=None, writable=True,
+            accessors=None):
+    """
+    Index every element type in ``categories`` that has ``param_name``.
+
+    ``names`` limits the index to those type names (e.g. the recipe
+    book); ``writable`` skips types whose parameter is read-only.
+    ``accessors`` (``params.Accessors`` of ``doc``) shares the
+    parameter's resolution with the rest of the run. Returns a
+    ``TypeIndex``.
+    """
+    from pyrevit import DB
+
+    index = TypeIndex()
+    if accessors is not None:
+        accessor = index.accessor = accessors[param_name]
+    else:
+        accessor = index.accessor = ParameterAccessor(param_name)
+    collector = (DB.FilteredElementCollector(doc)
+                 .WherePasses(category_filter(categories))
+                 .WhereElementIsElementType())
+
+    for elem in collector:
+        index.scanned += 1
+        name_param = elem.get_Parameter(DB.BuiltInParameter.SYMBOL_NAME_PARAM)
+        name = name_param.AsString() if name_param else None
+        if not name or (names is not None and name not in names):
+            continue
+        param = accessor.get(elem)
+        if param is None or (writable and param.IsReadOnly):
+            continue
+        index.add(name, elem, param)
+
+    return index
+
+
+def type_names(doc, categories):
+    """Names of every element type in ``categories``."""
+    from pyrevit import DB
+
+    names = set()
+    collector = (DB.FilteredElementCollector(doc)
+                 .WherePasses(category_filter(categories))
+                 .WhereElementIsElementType())
+    for elem in collector:
+        name_param = elem.get_Parameter(DB.BuiltInParameter.SYMBOL_NAME_PARAM)
+        name = name_param.AsString() if name_param else None
+        if name:
+            names.add(name)
+    return names
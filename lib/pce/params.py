@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Parameter access by logical name, resolved once per document and category.
+
+``LookupParameter(name)`` scans an element's parameters by display name
+on every call and fails in a localised Revit. A ``ParameterAccessor``
+resolves its name once per category, on the first element that carries
+it, to the ``BuiltInParameter``, shared-parameter GUID or project
+parameter definition behind it, and reads every later element with
+``get_Parameter``. Where the name is not
+found (another language) the built-ins listed in ``BUILTINS`` are tried.
+Elements the resolved getter cannot read are looked up by name and
+counted in ``fallbacks``.
+
+``Accessors`` holds one accessor per logical name for one document, so
+a run resolves each parameter once and can report how many reads fell
+back to the name. The Revit API is imported when called.
+"""
+
+PARAM_COST = "Cost"
+PARAM_AMOUNT = "Amount (Qty*Rate)"
+PARAM_TYPE_COMMENTS = "Type Comments"
+PARAM_FUNCTION = "Function"
+PARAM_VOLUME = "Volume"
+PARAM_AREA = "Area"
+PARAM_LENGTH = "Length"
+PARAM_BAR_LENGTH = "Total Bar Length"
+PARAM_STRUCTURAL_MATERIAL = "Structural Material"
+
+# Built-in parameters behind a logical name, tried in order when the
+# display name is not found (BuiltInParameter member names)
+BUILTINS = {
+    PARAM_COST: ("ALL_MODEL_COST",),
+    PARAM_TYPE_COMMENTS: ("ALL_MODEL_TYPE_COMMENTS",),
+    PARAM_FUNCTION: ("FUNCTION_PARAM",),
+    PARAM_VOLUME: ("HOST_VOLUME_COMPUTED",),
+    PARAM_AREA: ("HOST_AREA_COMPUTED",),
+    PARAM_LENGTH: ("CURVE_ELEM_LENGTH", "INSTANCE_LENGTH_PARAM", "COLUMN_HEIGHT"),
+    PARAM_BAR_LENGTH: ("REBAR_ELEM_TOTAL_LENGTH",),
+    PARAM_STRUCTURAL_MATERIAL: ("STRUCTURAL_MATERIAL_PARAM",),
+}
+
+
+class ParameterAccessor(object):
+    """
+    Reads one parameter by name, resolved once per category.
+
+    The first element of a category that carries the parameter decides
+    how it is fetched for the rest: ``get_Parameter(BuiltInParameter)``
+    for built-ins, ``get_Parameter(Guid)`` for shared parameters and
+    ``get_Parameter(Definition)`` for project parameters.
+    """
+
+    def __init__(self, name, builtins=None):
+        self.name = name
+        self.builtins = BUILTINS.get(name, ()) if builtins is None else builtins
+        self._by_category = {}      # category id -> getter
+        self.fallbacks = 0          # elements read by name
+
+    def _resolve(self, elem):
+        from pyrevit import DB
+
+        param = elem.LookupParameter(self.name)
+        if param is None:
+            for member in self.builtins:
+                bip = getattr(DB.BuiltInParameter, member, None)
+                if bip is not None and elem.get_Parameter(bip) is not None:
+                    return lambda e, bip=bip: e.get_Parameter(bip)
+            return None
+        definition = param.Definition
+        bip = getattr(definition, "BuiltInParameter", DB.BuiltInParameter.INVALID)
+        if bip != DB.BuiltInParameter.INVALID:
+            return lambda e: e.get_Parameter(bip)
+        if param.IsShared:
+            guid = param.GUID
+            return lambda e: e.get_Parameter(guid)
+        # project parameter: its definition is shared by the category
+        return lambda e: e.get_Parameter(definition)
+
+    def get(self, elem):
+        cat_id = elem.Category.Id.IntegerValue if elem.Category else None
+        getter = self._by_category.get(cat_id)
+        if getter is None:
+            getter = self._resolve(elem)
+            if getter is None:      # looked up by name: not on this element
+                self.fallbacks += 1
+                return None
+            self._by_category[cat_id] = getter
+        param = getter(elem)
+        if param is None:
+            self.fallbacks += 1
+            param = elem.LookupParameter(self.name)
+        return param
+
+    def double(self, elem):
+        """``AsDouble()`` of a parameter with a value, else None."""
+        param = self.get(elem)
+        if param is None or not param.HasValue:
+            return None
+        return param.AsDouble()
+
+
+class Accessors(object):
+    """One ``ParameterAccessor`` per logical name, for one document."""
+
+    def __init__(self):
+        self._by_name = {}
+
+    def __getitem__(self, name):
+        accessor = self._by_name.get(name)
+        if accessor is None:
+            accessor = self._by_name[name] = ParameterAccessor(name)
+        return accessor
+
+    def get(self, elem, name):
+        return self[name].get(elem)
+
+    @property
+    def fallbacks(self):
+        """Reads that fell back to ``LookupParameter``, in total."""
+        return sum(a.fallbacks for a in self._by_name.values())
+
+    def fallback_counts(self):
+        """``name -> reads by name`` for names that needed any."""
+        return dict(
+            (name, a.fallbacks) for name, a in self._by_name.items() if a.fallbacks
+        )
+
+    def fallback_summary(self):
+        """``"Area x12, Cost x3"``, or "" when every read was resolved."""
+        return u", ".join(
+            u"{} x{}".format(name, count)
+            for name, count in sorted(self.fallback_counts().items())
+        )
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Well-known file locations shared by the pushbuttons.
+"""
+import os
+
+LIB_DIR = os.path.dirname(os.path.abspath(__file__))
+EXTENSION_ROOT = os.path.abspath(os.path.join(LIB_DIR, "..", ".."))
+
+APPLY_RATE_DIR = os.path.join(
+    EXTENSION_ROOT,
+    "PyCostEstimates.tab",
+    "Update.panel",
+    "Apply Rate.pushbutton",
+)
+
+MATERIAL_COSTS_CSV = os.path.join(APPLY_RATE_DIR, "material_unit_costs.csv")
+MATERIAL_COSTS_DIR = os.path.join(APPLY_RATE_DIR, "material_costs")
+RECIPES_CSV = os.path.join(APPLY_RATE_DIR, "recipes.csv")
+PRICE_DB = os.path.join(APPLY_RATE_DIR, "price_history.sqlite")
+ALIASES_CSV = os.path.join(APPLY_RATE_DIR, "aliases.csv")
+RATE_TEMPLATE_XLSX = os.path.join(APPLY_RATE_DIR, "RATE BUILD UP TEMPLATE.xlsx")
+
+
+def user_cache_dir(*parts):
+    """
+    Per-user, machine-local cache folder (created on demand).
+
+    Uses %LOCALAPPDATA% on Windows so compiled data never lands on a
+    roaming profile or a network share.
+    """
+    base = (
+        os.environ.get("LOCALAPPDATA")
+        or os.environ.get("XDG_CACHE_HOME")
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    path = os.path.join(base, "PyCostEstimates", *parts)
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+    return path
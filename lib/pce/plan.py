@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Dry-run change plans for parameter writes.
+
+A plan is built before any transaction opens: every candidate write is
+recorded with its current and new value, and values that already match
+within a tolerance are dropped. Only the remaining writes are applied,
+so unchanged elements never land on the undo stack or get borrowed in
+a workshared model.
+"""
+
+# Half a cent: below the 2-decimal precision every tool displays
+DEFAULT_TOLERANCE = 0.005
+
+
+class PlannedWrite(object):
+    __slots__ = ("kind", "name", "target", "old", "new", "key")
+
+    def __init__(self, kind, name, target, old, new, key=None):
+        self.kind = kind
+        self.name = name
+        self.target = target      # anything with .Set(value)
+        self.old = old
+        self.new = new
+        self.key = key
+
+    @property
+    def delta(self):
+        return self.new - (self.old or 0.0)
+
+
+class ChangePlan(object):
+    SORT_KEYS = {
+        "Largest change": lambda w: -abs(w.delta),
+        "Name": lambda w: (w.name or "").lower(),
+        "Kind": lambda w: (w.kind, (w.name or "").lower()),
+        "New value": lambda w: -w.new,
+    }
+
+    def __init__(self, tolerance=DEFAULT_TOLERANCE):
+        self.tolerance = tolerance
+        self.writes = []
+        self.noops = []
+        self.failed = []
+        self.written = []
+        self.blocked = []   # (write, owner, reason), see pce.worksharing
+
+    def add(self, kind, name, target, old, new, key=None):
+        """Record a write of ``new``; returns False if it is a no-op."""
+        write = PlannedWrite(kind, name, target, old, new, key)
+        if old is not None and abs(new - old) <= self.tolerance:
+            self.noops.append(write)
+            return False
+        self.writes.append(write)
+        return True
+
+    @property
+    def planned(self):
+        return len(self.writes) + len(self.noops) + len(self.blocked)
+
+    def sorted_writes(self, sort_by="Largest change"):
+        return sorted(self.writes, key=self.SORT_KEYS[sort_by])
+
+    def table(self, sort_by="Largest change", fmt="{:,.2f}"):
+        """Rows for a preview table: kind, name, old, new, change."""
+        return [
+            [
+                w.kind,
+                w.name,
+                "-" if w.old is None else fmt.format(w.old),
+                fmt.format(w.new),
+                fmt.format(w.delta),
+            ]
+            for w in self.sorted_writes(sort_by)
+        ]
+
+    def apply(self):
+        """Write every planned change; call inside an open transaction."""
+        for w in self.writes:
+            try:
+                w.target.Set(w.new)
+                self.written.append(w)
+            except Exception as ex:
+                self.failed.append((w, str(ex)))
+        return len(self.written)
+
+    def counts(self):
+        return {
+            "planned": self.planned,
+            "written": len(self.written),
+            "skipped": len(self.noops),
+            "failed": len(self.failed),
+            "blocked": len(self.blocked),
+        }
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled price book.
+
+``material_unit_costs.csv`` is compiled once into a binary columnar file
+(item index + float64 price matrix) kept in the per-user cache, keyed on
+the source path, size and mtime. Later runs memory-map that file instead
+of re-parsing the CSV.
+
+File layout (little endian):
+
+    header   8s magic, uint32 items, uint32 columns, uint32 meta length
+    meta     UTF-8 JSON: columns, items, UoMs, source stat, report
+    padding  to an 8 byte boundary
+    matrix   one contiguous float64 block per column (NaN = no price)
+"""
+import hashlib
+import json
+import math
+import os
+import struct
+
+from pce import csvutil, paths
+
+try:
+    import mmap
+except ImportError:  # pragma: no cover - very old IronPython builds
+    mmap = None
+
+MAGIC = b"PCEPB\x00\x00\x01"
+HEADER = struct.Struct("<8sIII")
+CACHE_EXT = ".pcepb"
+REPORT_EXT = ".report.txt"
+
+ITEM_COLUMN = "Item"
+UOM_COLUMN = "UoM"
+COST_SUFFIX = "_UnitCost"
+FLAT_COLUMN = "UnitCost"    # supplier books: one price for every scenario
+
+NAN = float("nan")
+
+
+class PriceBookError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------
+# Compile
+# ---------------------------------------------------------------------
+class CompiledBook(object):
+    """In-memory result of parsing the CSV, before it is written out."""
+
+    def __init__(self, items, uoms, columns, matrix, report):
+        self.items = items
+        self.uoms = uoms
+        self.columns = columns
+        self.matrix = matrix      # one list per column, aligned with items
+        self.report = report
+
+
+def compile_csv(csv_path):
+    """
+    Parse and validate a price book CSV.
+
+    Blank and "-" cells mean "no price". Anything else that is not a
+    positive number is recorded in the report and stored as no price,
+    which is what the old row-by-row loader did silently.
+
+    Supplier books use the flat ``Item,,UnitCost`` schema: an unnamed
+    UoM column and a single ``UnitCost`` column.
+    """
+    rows = csvutil.read_rows(csv_path)
+    if not rows:
+        raise PriceBookError("Price book is empty: {}".format(csv_path))
+
+    header = [h.strip() for h in rows[0]]
+    if ITEM_COLUMN not in header:
+        raise PriceBookError(
+            "Price book has no '{}' column: {}".format(ITEM_COLUMN, csv_path)
+        )
+
+    item_idx = header.index(ITEM_COLUMN)
+    if UOM_COLUMN in header:
+        uom_idx = header.index(UOM_COLUMN)
+    elif item_idx + 1 < len(header) and not header[item_idx + 1]:
+        uom_idx = item_idx + 1
+    else:
+        uom_idx = None
+    cost_idx = [i for i, h in enumerate(header)
+                if h.endswith(COST_SUFFIX) or h == FLAT_COLUMN]
+    columns = [header[i] for i in cost_idx]
+
+    items = []
+    uoms = []
+    matrix = [[] for _ in columns]
+    index = {}
+    report = []
+
+    for line_no, row in enumerate(rows[1:], 2):
+        if not any(cell.strip() for cell in row):
+            continue
+
+        item = row[item_idx].strip() if item_idx < len(row) else ""
+        if not item:
+            report.append("line {}: row has no Item name, ignored".format(line_no))
+            continue
+
+        uom = row[uom_idx].strip() if uom_idx is not None and uom_idx < len(row) else ""
+        if uom == UOM_COLUMN:
+            report.append("line {}: repeated header row, ignored".format(line_no))
+            continue
+
+        values = []
+        for col, i in zip(columns, cost_idx):
+            cell = row[i] if i < len(row) else ""
+            try:
+                value = csvutil.parse_number(cell)
+            except ValueError:
+                report.append(
+                    u"line {}: '{}' {}: not a number ('{}')".format(
+                        line_no, item, col, cell.strip()
+                    )
+                )
+                value = None
+            if value is not None and value <= 0:
+                report.append(
+                    u"line {}: '{}' {}: price must be positive ({})".format(
+                        line_no, item, col, cell.strip()
+                    )
+                )
+                value = None
+            values.append(NAN if value is None else value)
+
+        if item in index:
+            report.append(
+                u"line {}: duplicate item '{}', replaces line {}".format(
+                    line_no, item, index[item][1]
+                )
+            )
+            pos = index[item][0]
+            uoms[pos] = uom
+            for col_values, value in zip(matrix, values):
+                col_values[pos] = value
+            index[item] = (pos, line_no)
+            continue
+
+        index[item] = (len(items), line_no)
+        items.append(item)
+        uoms.append(uom)
+        for col_values, value in zip(matrix, values):
+            col_values.append(value)
+
+    return CompiledBook(items, uoms, columns, matrix, report)
+
+
+def write_compiled(path, book, source=None):
+    meta = json.dumps({
+        "columns": book.columns,
+        "items": book.items,
+        "uoms": book.uoms,
+        "report": book.report,
+        "source": source or {},
+    }).encode("utf-8")
+
+    n_items = len(book.items)
+    header = HEADER.pack(MAGIC, n_items, len(book.columns), len(meta))
+    pad = (-(len(header) + len(meta))) % 8
+
+    with csvutil.open_atomic(path) as f:
+        f.write(header)
+        f.write(meta)
+        f.write(b"\x00" * pad)
+        fmt = "<{}d".format(n_items)
+        for col_values in book.matrix:
+            f.write(struct.pack(fmt, *col_values))
+
+
+# ---------------------------------------------------------------------
+# Load
+# ---------------------------------------------------------------------
+class PriceBook(object):
+    """
+    Read-only view over a compiled price book file.
+
+    Columns are unpacked lazily from the memory map the first time they
+    are asked for, so a run that prices one province touches only the
+    two columns it needs (province + National fallback).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = None
+        if mmap is not None:
+            try:
+                self._map = mmap.mmap(
+                    self._file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            except (EnvironmentError, ValueError):
+                self._map = None
+
+        magic, n_items, n_cols, meta_len = HEADER.unpack(self._read(0, HEADER.size))
+        if magic != MAGIC:
+            self.close()
+            raise PriceBookError("Not a compiled price book: {}".format(path))
+
+        meta = json.loads(self._read(HEADER.size, meta_len).decode("utf-8"))
+        self.columns = meta["columns"]
+        self.items = meta["items"]
+        self.uoms = meta["uoms"]
+        self.report = meta["report"]
+        self.source = meta["source"]
+
+        if len(self.items) != n_items or len(self.columns) != n_cols:
+            self.close()
+            raise PriceBookError("Corrupt price book header: {}".format(path))
+
+        head = HEADER.size + meta_len
+        self._data_offset = head + (-head) % 8
+        self.index = dict((item, i) for i, item in enumerate(self.items))
+        self.column_index = dict((c, i) for i, c in enumerate(self.columns))
+        self._columns = {}
+
+    def _read(self, offset, size):
+        if self._map is not None:
+            return self._map[offset:offset + size]
+        self._file.seek(offset)
+        return self._file.read(size)
+
+    @property
+    def report_path(self):
+        path = os.path.splitext(self.path)[0] + REPORT_EXT
+        return path if os.path.exists(path) else None
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def column(self, name):
+        """Prices of one column, aligned with ``items`` (NaN = no price)."""
+        values = self._columns.get(name)
+        if values is None:
+            c = self.column_index[name]
+            n = len(self.items)
+            raw = self._read(self._data_offset + 8 * n * c, 8 * n)
+            values = struct.unpack("<{}d".format(n), raw)
+            self._columns[name] = values
+        return values
+
+    def price(self, item, column):
+        i = self.index.get(item)
+        if i is None or column not in self.column_index:
+            return None
+        value = self.column(column)[i]
+        return None if math.isnan(value) else value
+
+    def prices_for(self, column, fallback_column=None):
+        """
+        Resolve one pricing column with an optional fallback column.
+
+        Returns ``(prices, sources)``: item -> price and item -> the
+        column the price was taken from.
+        """
+        prices = {}
+        sources = {}
+        lookups = [c for c in (column, fallback_column)
+                   if c and c in self.column_index]
+        for col in reversed(lookups):
+            for item, value in zip(self.items, self.column(col)):
+                if not math.isnan(value):
+                    prices[item] = value
+                    sources[item] = col
+        return prices, sources
+
+
+# ---------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------
+def _source_stat(csv_path):
+    st = os.stat(csv_path)
+    return {
+        "path": os.path.normcase(os.path.abspath(csv_path)),
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+    }
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def cache_key(source):
+    """``<path hash>-<size/mtime hash>``; the prefix groups stale entries."""
+    return "{}-{}".format(
+        _digest(source["path"])[:16],
+        _digest("{}|{!r}".format(source["size"], source["mtime"]))[:16],
+    )
+
+
+def _prune(cache_dir, key):
+    prefix = key.split("-")[0] + "-"
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and not name.startswith(key):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass  # still mapped by another session
+
+
+def compile_to_cache(csv_path, cache_dir=None):
+    """Compile ``csv_path`` into the cache (if stale) and return the file path."""
+    cache_dir = cache_dir or paths.user_cache_dir("pricebooks")
+    source = _source_stat(csv_path)
+    key = cache_key(source)
+    target = os.path.join(cache_dir, key + CACHE_EXT)
+
+    if not os.path.exists(target):
+        _compile(csv_path, target, source)
+        _prune(cache_dir, key)
+
+    return target
+
+
+def _compile(csv_path, target, source):
+    book = compile_csv(csv_path)
+    write_compiled(target, book, source)
+    if book.report:
+        report_path = os.path.splitext(target)[0] + REPORT_EXT
+        with open(report_path, "wb") as f:
+            f.write(u"\n".join(
+                [u"Price book: {}".format(source["path"]), u""] + book.report
+            ).encode("utf-8"))
+
+
+def load(csv_path, cache_dir=None):
+    """Open the compiled price book for ``csv_path``, compiling it if needed."""
+    target = compile_to_cache(csv_path, cache_dir)
+    try:
+        return PriceBook(target)
+    except (PriceBookError, ValueError, struct.error):
+        pass
+    try:
+        os.remove(target)
+    except OSError:
+        # The broken entry is still open in another session: compile
+        # this session's copy beside it instead
+        base = os.path.splitext(target)[0]
+        target = "{}.{}{}".format(base, os.getpid(), CACHE_EXT)
+        _compile(csv_path, target, _source_stat(csv_path))
+        return PriceBook(target)
+    return PriceBook(compile_to_cache(csv_path, cache_dir))
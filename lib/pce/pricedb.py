@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+Versioned price history in a local SQLite file.
+
+Monthly price book revisions are imported with an effective date; only
+prices that differ from the ones already in force at that date are
+stored. Revisions can be imported in any order: a back-dated import
+re-anchors the next later revision, so the prices in force from that
+date on stay what they were. Recipes are stored as whole-file versions.
+An estimate can then be re-priced "as of" its tender date:
+
+    prices   PRIMARY KEY (item, province, basis, effective_date)
+    recipes  PRIMARY KEY (effective_date)
+
+The price book as of a date is read with one indexed query and compiled
+into the regular price book cache (see ``pce.pricebook``), so Apply Rate
+and the other tools use it exactly like the CSV. SQLite is optional:
+``available()`` is False where the ``sqlite3`` module is missing.
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+
+from pce import BASES, PROVINCES, cost_column, csvutil, paths, pricebook
+from pce import recipes as recipe_loader
+
+try:
+    import sqlite3
+except ImportError:  # IronPython builds without IronPython.SQLite
+    sqlite3 = None
+
+SCHEMA_VERSION = 1
+DATE_FORMAT = "%Y-%m-%d"
+
+_COLUMN_RE = re.compile(r"^(.+)_({})_UnitCost$".format("|".join(BASES)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS imports (
+    id             INTEGER PRIMARY KEY,
+    kind           TEXT NOT NULL,
+    source         TEXT,
+    effective_date TEXT NOT NULL,
+    imported_at    TEXT NOT NULL,
+    rows           INTEGER
+);
+CREATE TABLE IF NOT EXISTS items (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    uom  TEXT
+);
+CREATE TABLE IF NOT EXISTS prices (
+    item_id        INTEGER NOT NULL REFERENCES items (id),
+    province       TEXT NOT NULL,
+    basis          TEXT NOT NULL,
+    effective_date TEXT NOT NULL,
+    price          REAL,
+    import_id      INTEGER REFERENCES imports (id),
+    PRIMARY KEY (item_id, province, basis, effective_date)
+);
+CREATE TABLE IF NOT EXISTS recipes (
+    effective_date TEXT PRIMARY KEY,
+    import_id      INTEGER REFERENCES imports (id),
+    rows           TEXT NOT NULL
+);
+"""
+
+# Latest price per (item, province, basis) on or before the date; the
+# correlated MAX() is answered from the primary key index.
+AS_OF_PRICES = """
+SELECT i.name, i.uom, p.province, p.basis, p.price
+FROM prices p
+JOIN items i ON i.id = p.item_id
+WHERE p.effective_date = (
+    SELECT MAX(q.effective_date) FROM prices q
+    WHERE q.item_id = p.item_id
+      AND q.province = p.province
+      AND q.basis = p.basis
+      AND q.effective_date <= ?
+)
+ORDER BY i.id
+"""
+
+
+class PriceDBError(Exception):
+    pass
+
+
+def available():
+    return sqlite3 is not None
+
+
+def parse_date(text):
+    """Validate an ISO ``YYYY-MM-DD`` date, returning it normalised."""
+    try:
+        return datetime.datetime.strptime(
+            (text or "").strip(), DATE_FORMAT
+        ).strftime(DATE_FORMAT)
+    except ValueError:
+        raise PriceDBError("Not a YYYY-MM-DD date: '{}'".format(text))
+
+
+def today():
+    return datetime.date.today().strftime(DATE_FORMAT)
+
+
+def connect(db_path=None):
+    if sqlite3 is None:
+        raise PriceDBError("SQLite is not available in this Python engine")
+    db_path = db_path or paths.PRICE_DB
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    conn.execute(
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('schema', ?)",
+        (str(SCHEMA_VERSION),),
+    )
+    return conn
+
+
+def _revision(conn):
+    row = conn.execute("SELECT MAX(id) FROM imports").fetchone()
+    return row[0] or 0
+
+
+def _new_import(conn, kind, source, effective_date):
+    cur = conn.execute(
+        "INSERT INTO imports (kind, source, effective_date, imported_at)"
+        " VALUES (?, ?, ?, ?)",
+        (kind, source, effective_date,
+         datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")),
+    )
+    return cur.lastrowid
+
+
+# ---------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------
+INSERT_PRICE = (
+    "INSERT OR REPLACE INTO prices"
+    " (item_id, province, basis, effective_date, price, import_id)"
+    " VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+def _item_id(conn, item):
+    return conn.execute(
+        "SELECT id FROM items WHERE name = ?", (item,)
+    ).fetchone()[0]
+
+
+def _same_price(a, b):
+    if a is None or b is None:
+        return a is b
+    return abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b))
+
+
+def _prices_as_of(conn, as_of):
+    """``(item, province, basis) -> price`` in force on ``as_of``."""
+    return dict(
+        ((name, province, basis), price)
+        for name, _uom, province, basis, price
+        in conn.execute(AS_OF_PRICES, (as_of,))
+    )
+
+
+def _next_revision(conn, effective_date):
+    """Effective date of the first price import after ``effective_date``."""
+    row = conn.execute(
+        "SELECT MIN(effective_date) FROM imports"
+        " WHERE kind = 'prices' AND effective_date > ?",
+        (effective_date,),
+    ).fetchone()
+    return row[0]
+
+
+def import_prices(conn, csv_path, effective_date):
+    """
+    Import a ``material_unit_costs.csv`` revision effective on a date.
+
+    The file is a complete revision: items it no longer lists are
+    withdrawn from that date. When a later revision is already stored,
+    its cells that were stored as "unchanged" are written out at its
+    date, so the back-dated prices end there. Returns ``(stored,
+    unchanged, report)``: price cells written, cells equal to the price
+    already in force, and the compile report.
+    """
+    effective_date = parse_date(effective_date)
+    book = pricebook.compile_csv(csv_path)
+
+    columns = []
+    for col in book.columns:
+        m = _COLUMN_RE.match(col)
+        if not m:
+            raise PriceDBError(
+                "'{}' is not a <Province>_<Basis>_UnitCost column".format(col)
+            )
+        columns.append((m.group(1), m.group(2)))
+
+    current = _prices_as_of(conn, effective_date)
+    next_date = _next_revision(conn, effective_date)
+    later = _prices_as_of(conn, next_date) if next_date else None
+
+    with conn:
+        import_id = _new_import(conn, "prices", os.path.abspath(csv_path),
+                                effective_date)
+        item_ids = {}
+        for item, uom in zip(book.items, book.uoms):
+            conn.execute(
+                "INSERT OR IGNORE INTO items (name) VALUES (?)", (item,)
+            )
+            conn.execute(
+                "UPDATE items SET uom = ? WHERE name = ?", (uom, item)
+            )
+            item_ids[item] = _item_id(conn, item)
+
+        unchanged = 0
+        rows = []
+        for (province, basis), values in zip(columns, book.matrix):
+            for item, value in zip(book.items, values):
+                price = None if value != value else value    # NaN
+                key = (item, province, basis)
+                if key not in current:
+                    if price is None:
+                        continue
+                elif _same_price(current[key], price):
+                    unchanged += 1
+                    continue
+                rows.append((item_ids[item], province, basis, effective_date,
+                             price, import_id))
+
+        # a revision is a full book: prices it no longer carries end here
+        listed = set(book.items)
+        for (item, province, basis), price in current.items():
+            if item not in listed and price is not None:
+                rows.append((_item_id(conn, item), province, basis,
+                             effective_date, None, import_id))
+
+        conn.executemany(INSERT_PRICE, rows)
+        stored = len(rows)
+
+        # Back-dated: the next revision keeps the prices it had
+        if later is not None:
+            anchors = []
+            for key, price in _prices_as_of(conn, next_date).items():
+                before = later.get(key)
+                if not _same_price(before, price):
+                    item, province, basis = key
+                    anchors.append((_item_id(conn, item), province, basis,
+                                    next_date, before, import_id))
+            conn.executemany(INSERT_PRICE, anchors)
+            stored += len(anchors)
+        conn.execute("UPDATE imports SET rows = ? WHERE id = ?",
+                     (stored, import_id))
+    return stored, unchanged, book.report
+
+
+def import_recipes(conn, csv_path, effective_date):
+    """Store the whole ``recipes.csv`` as the version effective on a date."""
+    effective_date = parse_date(effective_date)
+    rows = csvutil.read_rows(csv_path)
+    recipe_loader.parse_rows(rows, label=csv_path)   # validate header
+    with conn:
+        import_id = _new_import(conn, "recipes", os.path.abspath(csv_path),
+                                effective_date)
+        conn.execute(
+            "INSERT OR REPLACE INTO recipes (effective_date, import_id, rows)"
+            " VALUES (?, ?, ?)",
+            (effective_date, import_id, json.dumps(rows)),
+        )
+        conn.execute("UPDATE imports SET rows = ? WHERE id = ?",
+                     (len(rows) - 1, import_id))
+    return len(rows) - 1
+
+
+# ---------------------------------------------------------------------
+# As-of queries
+# ---------------------------------------------------------------------
+def compile_as_of(conn, as_of):
+    """The price book in force on ``as_of`` as a ``CompiledBook``."""
+    as_of = parse_date(as_of)
+    columns = [cost_column(p, b) for p in PROVINCES for b in BASES]
+    col_index = dict((c, k) for k, c in enumerate(columns))
+
+    items = []
+    uoms = []
+    index = {}
+    cells = []
+    for name, uom, province, basis, price in conn.execute(AS_OF_PRICES, (as_of,)):
+        i = index.get(name)
+        if i is None:
+            i = index[name] = len(items)
+            items.append(name)
+            uoms.append(uom or "")
+        k = col_index.get(cost_column(province, basis))
+        if k is not None and price is not None:
+            cells.append((k, i, price))
+
+    matrix = [[pricebook.NAN] * len(items) for _ in columns]
+    for k, i, price in cells:
+        matrix[k][i] = price
+    return pricebook.CompiledBook(items, uoms, columns, matrix, [])
+
+
+def _source(db_path, conn, as_of):
+    return {
+        "path": os.path.normcase(os.path.abspath(db_path)),
+        "as_of": as_of,
+        "revision": _revision(conn),
+    }
+
+
+def load_prices(as_of, db_path=None, cache_dir=None):
+    """Open the price book in force on ``as_of`` (compiled and cached)."""
+    db_path = db_path or paths.PRICE_DB
+    as_of = parse_date(as_of)
+    cache_dir = cache_dir or paths.user_cache_dir("pricebooks")
+    conn = connect(db_path)
+    try:
+        source = _source(db_path, conn, as_of)
+        key = "db-" + hashlib.sha1(
+            json.dumps(source, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:32]
+        target = os.path.join(cache_dir, key + pricebook.CACHE_EXT)
+        if not os.path.exists(target):
+            book = compile_as_of(conn, as_of)
+            if not book.items:
+                raise PriceDBError("No prices on or before {}".format(as_of))
+            pricebook.write_compiled(target, book, source)
+    finally:
+        conn.close()
+    return pricebook.PriceBook(target)
+
+
+def load_recipes(as_of, db_path=None):
+    """The recipe book in force on ``as_of``."""
+    db_path = db_path or paths.PRICE_DB
+    as_of = parse_date(as_of)
+    conn = connect(db_path)
+    try:
+        row = conn.execute(
+            "SELECT effective_date, rows FROM recipes WHERE effective_date <= ?"
+            " ORDER BY effective_date DESC LIMIT 1",
+            (as_of,),
+        ).fetchone()
+        source = _source(db_path, conn, as_of)
+    finally:
+        conn.close()
+    if row is None:
+        raise PriceDBError("No recipes on or before {}".format(as_of))
+    source["effective_date"] = row[0]
+    return recipe_loader.parse_rows(
+        json.loads(row[1]), source, "recipes as of {}".format(as_of)
+    )
+
+
+def history(db_path=None):
+    """``[(effective_date, kind, rows, source), ...]`` newest first."""
+    conn = connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT effective_date, kind, rows, source FROM imports"
+            " ORDER BY effective_date DESC, id DESC"
+        ).fetchall()
+    finally:
+        conn.close()
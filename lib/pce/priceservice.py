@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+Optional local pricing service shared by several Revit sessions.
+
+One background process owns the compiled price book, the resolved
+recipes and their scenario table; every Revit session on the machine
+asks it for rates over a localhost socket instead of loading its own
+copy, e.g. "price these 400 types under Lusaka_Avg_UnitCost" in one
+round trip. The service reloads by itself when any source file
+changes (price layers, recipes, aliases, a model's ``_prices.csv``).
+
+Start it with CPython from the extension's ``lib`` folder::
+
+    python -m pce.priceservice          # Ctrl+C or --stop to end it
+
+It writes its port and an access token to the per-user cache; clients
+find it there (``connect``) and fall back to pricing in-process when it
+is not running. A ``Client`` talks through a transport: a
+``SocketTransport`` to the service, or a ``LocalTransport`` that answers
+the same JSON lines in-process (``local_client``) for tools and tests
+without a service.
+
+Protocol: one JSON object per line each way. Requests carry ``op`` and
+the ``token``; replies carry ``ok`` and either the result or ``error``.
+"""
+import binascii
+import json
+import os
+import socket
+import sys
+import threading
+
+from pce import csvutil, engine, layers, paths, pricebook, resolve
+from pce import recipes as recipe_loader
+
+HOST = "127.0.0.1"
+STATE_FILE = "service.json"
+TIMEOUT = 5.0           # seconds a client waits for a reply
+PROTOCOL_VERSION = 1
+
+
+class ServiceError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------
+class PricingEngine(object):
+    """
+    Price book, recipes and scenario table, reloaded when files change.
+
+    One view is kept per ``<model>_prices.csv`` (None = shared layers
+    only), like Apply Rate's price contexts. Components are resolved
+    through exact names, saved aliases and normalised names; nothing is
+    asked, so fuzzy matches must already be in ``aliases.csv``.
+    """
+
+    def __init__(self, base_csv=None, supplier_dir=None, recipes_csv=None,
+                 aliases_csv=None, cache_dir=None):
+        self.base_csv = base_csv or paths.MATERIAL_COSTS_CSV
+        self.supplier_dir = supplier_dir or paths.MATERIAL_COSTS_DIR
+        self.recipes_csv = recipes_csv or paths.RECIPES_CSV
+        self.aliases_csv = aliases_csv or paths.ALIASES_CSV
+        self.cache_dir = cache_dir
+        self.views = {}         # project csv -> (signature, view)
+        self.loads = 0
+        self.lock = threading.Lock()
+
+    def _signature(self, project_csv):
+        files = [p for _kind, p in layers.layer_files(
+            self.base_csv, self.supplier_dir, project_csv
+        )]
+        files += [self.recipes_csv, self.aliases_csv]
+        signature = []
+        for path in files:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, st.st_size, st.st_mtime))
+        return signature
+
+    def _load(self, project_csv):
+        book = layers.load(self.base_csv, self.supplier_dir, project_csv,
+                           self.cache_dir)
+        try:
+            recipe_book = recipe_loader.load(self.recipes_csv)
+            resolver = resolve.Resolver(
+                book.items, resolve.load_aliases(self.aliases_csv)
+            )
+            resolved, unresolved = resolve.resolve_recipes(recipe_book, resolver)
+            resolve.rename_materials(
+                recipe_book, dict((c, item) for c, (item, how) in resolved.items())
+            )
+            view = {
+                "table": engine.scenario_table(book, recipe_book, self.cache_dir),
+                "book": book,
+                "recipes": recipe_book,
+                "prices": {},
+                "unresolved": unresolved,
+                "report": list(book.report) + list(recipe_book.report),
+            }
+        except Exception:
+            book.close()
+            raise
+        self.loads += 1
+        return view
+
+    def view(self, project_csv=None):
+        if project_csv and not os.path.exists(project_csv):
+            project_csv = None
+        signature = self._signature(project_csv)
+        cached = self.views.get(project_csv)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        if cached is not None:
+            cached[1]["book"].close()
+            del self.views[project_csv]
+        view = self._load(project_csv)
+        self.views[project_csv] = (signature, view)
+        return view
+
+    def close(self):
+        for _signature, view in self.views.values():
+            view["book"].close()
+        self.views = {}
+
+    # -- requests -----------------------------------------------------
+    def price(self, types, column, project_csv=None):
+        """
+        Scenario table rows of ``types`` under ``column`` alone. Types
+        matching a recipe template are added (and the view re-priced)
+        the first time they are asked for.
+        """
+        view = self.view(project_csv)
+        table = view["table"]
+        if view["recipes"].expand([n for n in types if n not in table.rows]):
+            table = view["table"] = engine.evaluate(view["book"], view["recipes"])
+        k = table.columns.index(column)
+        rows = {}
+        for name in types:
+            row = table.rows.get(name)
+            if row is not None:
+                rows[name] = [row[k]]
+        return {"columns": [column], "rows": rows}
+
+    def prices(self, column, fallback_column=None, project_csv=None):
+        """Effective ``item -> price`` of one scenario column."""
+        view = self.view(project_csv)
+        key = (column, fallback_column)
+        prices = view["prices"].get(key)
+        if prices is None:
+            prices = view["prices"][key] = view["book"].prices_for(
+                column, fallback_column
+            )[0]
+        return {"prices": prices}
+
+    def status(self):
+        return {
+            "version": PROTOCOL_VERSION,
+            "pid": os.getpid(),
+            "loads": self.loads,
+            "views": sorted(p or u"" for p in self.views),
+        }
+
+    def handle(self, request):
+        """Answer one decoded request; errors are returned, not raised."""
+        op = request.get("op")
+        try:
+            with self.lock:
+                if op == "status":
+                    result = self.status()
+                elif op == "price":
+                    result = self.price(
+                        request["types"], request["column"],
+                        request.get("project_csv"),
+                    )
+                elif op == "prices":
+                    result = self.prices(
+                        request["column"], request.get("fallback_column"),
+                        request.get("project_csv"),
+                    )
+                else:
+                    return {"ok": False, "error": u"unknown op: {}".format(op)}
+        except (pricebook.PriceBookError, recipe_loader.RecipeError,
+                KeyError, ValueError, IOError, OSError) as ex:
+            return {"ok": False, "error": u"{}".format(ex)}
+        result["ok"] = True
+        return result
+
+
+# ---------------------------------------------------------------------
+# Client and transports
+# ---------------------------------------------------------------------
+class LocalTransport(object):
+    """Answers request lines in-process from a ``PricingEngine``."""
+
+    def __init__(self, pricing_engine=None):
+        self.engine = pricing_engine or PricingEngine()
+
+    def exchange(self, line):
+        request = json.loads(line.decode("utf-8"))
+        return json.dumps(self.engine.handle(request)).encode("utf-8")
+
+    def close(self):
+        self.engine.close()
+
+
+class SocketTransport(object):
+    """Sends request lines to a running service over localhost."""
+
+    def __init__(self, port, timeout=TIMEOUT):
+        self.sock = socket.create_connection((HOST, port), timeout)
+        self.reader = self.sock.makefile("rb")
+
+    def exchange(self, line):
+        try:
+            self.sock.sendall(line + b"\n")
+            reply = self.reader.readline()
+        except (socket.error, socket.timeout) as ex:
+            raise ServiceError(u"pricing service did not answer: {}".format(ex))
+        if not reply:
+            raise ServiceError("pricing service closed the connection")
+        return reply
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except socket.error:
+            pass
+
+
+class Client(object):
+    """
+    Pricing requests over a transport.
+
+    A transport has ``exchange(line) -> line`` (one UTF-8 JSON request
+    and reply, without the newline) and ``close()``; the client encodes
+    requests and checks replies the same way for both.
+    """
+
+    def __init__(self, transport, token=None):
+        self.transport = transport
+        self.token = token
+
+    def request(self, op, **args):
+        args["op"] = op
+        if self.token is not None:
+            args["token"] = self.token
+        reply = self.transport.exchange(json.dumps(args).encode("utf-8"))
+        try:
+            reply = json.loads(reply.decode("utf-8"))
+        except ValueError:
+            raise ServiceError("pricing service sent a bad reply")
+        if not reply.get("ok"):
+            raise ServiceError(reply.get("error") or "pricing service error")
+        return reply
+
+    def scenario_table(self, types, column, project_csv=None):
+        """``engine.ScenarioTable`` of ``types`` under ``column`` only."""
+        reply = self.request("price", types=list(types), column=column,
+                             project_csv=project_csv)
+        return engine.ScenarioTable(reply["columns"], reply["rows"])
+
+    def prices(self, column, fallback_column=None, project_csv=None):
+        return self.request("prices", column=column,
+                            fallback_column=fallback_column,
+                            project_csv=project_csv)["prices"]
+
+    def status(self):
+        return self.request("status")
+
+    def close(self):
+        self.transport.close()
+
+
+def local_client(pricing_engine=None):
+    """A ``Client`` answered in-process, for tools and tests without a service."""
+    return Client(LocalTransport(pricing_engine))
+
+
+def state_path(state_dir=None):
+    return os.path.join(state_dir or paths.user_cache_dir("service"), STATE_FILE)
+
+
+def connect(state_dir=None, timeout=TIMEOUT):
+    """A ``Client`` of the running service, or None."""
+    path = state_path(state_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            state = json.loads(f.read().decode("utf-8"))
+        client = Client(SocketTransport(state["port"], timeout), state["token"])
+    except (ValueError, KeyError, IOError, OSError, socket.error):
+        return None
+    try:
+        if client.status().get("version") == PROTOCOL_VERSION:
+            return client
+    except (ServiceError, ValueError):
+        pass
+    client.close()
+    return None
+
+
+# ---------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------
+def _serve_connection(conn, pricing_engine, token, stop):
+    reader = conn.makefile("rb")
+    try:
+        for line in iter(reader.readline, b""):
+            try:
+                request = json.loads(line.decode("utf-8"))
+            except ValueError:
+                reply = {"ok": False, "error": "bad request"}
+            else:
+                if request.get("token") != token:
+                    reply = {"ok": False, "error": "bad token"}
+                elif request.get("op") == "stop":
+                    reply = {"ok": True}
+                    stop.set()
+                else:
+                    reply = pricing_engine.handle(request)
+            conn.sendall(json.dumps(reply).encode("utf-8") + b"\n")
+    except socket.error:
+        pass
+    finally:
+        reader.close()
+        conn.close()
+
+
+def serve(pricing_engine=None, port=0, state_dir=None, ready=None):
+    """
+    Serve until a ``stop`` request (or Ctrl+C). Binds to localhost
+    only; ``port`` 0 picks a free one. ``ready`` (a threading.Event)
+    is set once the state file is written.
+    """
+    pricing_engine = pricing_engine or PricingEngine()
+    token = binascii.hexlify(os.urandom(16)).decode("ascii")
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind((HOST, port))
+    server.listen(16)
+    server.settimeout(0.5)
+
+    path = state_path(state_dir)
+    csvutil.write_json(path, {
+        "port": server.getsockname()[1], "token": token, "pid": os.getpid(),
+    })
+    if ready is not None:
+        ready.set()
+
+    stop = threading.Event()
+    try:
+        while not stop.is_set():
+            try:
+                conn, _addr = server.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout(None)
+            worker = threading.Thread(
+                target=_serve_connection,
+                args=(conn, pricing_engine, token, stop),
+            )
+            worker.daemon = True
+            worker.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        pricing_engine.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if "--stop" in argv:
+        client = connect()
+        if client is None:
+            print("No pricing service is running.")
+            return 1
+        client.request("stop")
+        client.close()
+        print("Pricing service stopped.")
+        return 0
+    if connect() is not None:
+        print("A pricing service is already running.")
+        return 1
+    print("Pricing service running; Ctrl+C to stop.")
+    serve()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+"""
+Import rate build-ups from ``RATE BUILD UP TEMPLATE.xlsx``.
+
+The workbook is read with the streaming reader in ``pce.xlsx``. Each
+sheet is scanned once, row by row, for two layouts:
+
+    blocks   a title row, then one row per component and a labelled
+             total row (``SUM(...)`` or "Cost ..."), possibly several
+             blocks side by side
+    tables   a header row with "Add 30% labour" / "COST/ Unit"
+             columns and one build-up per row
+
+A component whose cell refers to the price sheet (``'01 Material
+Prices'!C26/0.686``) becomes a material priced from the price book, at
+the quantity the workbook used; "Add 30% labour" / "Add 20% Profit" /
+"Waste" rows become percentages and any other priced row a fixed
+amount. A build-up is only kept when its lines add up to the total the
+workbook calculated, so sheets laid out some other way are reported
+instead of being imported half right.
+"""
+import re
+
+from pce import xlsx
+from pce import recipes as recipe_loader
+
+MATERIAL = "material"
+PERCENT = "percent"
+FIXED = "fixed"
+
+LABOUR = "Labour"
+TRANSPORT = "Transport"
+PLANT = "Plant"
+WASTAGE = "Wastage"
+PROFIT = "Profit"
+
+_KEYWORDS = [
+    ("wast", WASTAGE),
+    ("shrink", WASTAGE),
+    ("profit", PROFIT),
+    ("overhead", PROFIT),
+    ("transport", TRANSPORT),
+    ("plant", PLANT),
+    ("labour", LABOUR),
+    ("labor", LABOUR),
+]
+
+PRICE_SHEET_RE = re.compile(r"material\s+prices|price", re.I)
+_SHEET_REF = re.compile(
+    r"(?:'((?:[^']|'')+)'|([A-Za-z0-9_.]+))!\$?([A-Z]{1,3})\$?(\d+)"
+)
+_PERCENT = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+_TOTAL = re.compile(r"^\s*(cost|total)\b", re.I)
+_UNIT = re.compile(r"/\s*([A-Za-z][A-Za-z0-9.]*)\s*$")
+_SPACES = re.compile(r"\s+", re.U)
+_ITEM_HEADER = re.compile(r"material|item|description", re.I)
+
+TOLERANCE = 0.005      # relative difference allowed against the workbook total
+PRICE_COLUMNS = 4      # price columns read to the right of the item names
+
+
+def _text(value):
+    return _SPACES.sub(u" ", value or u"").strip()
+
+
+def _keyword(label):
+    label = label.lower()
+    for key, kind in _KEYWORDS:
+        if key in label:
+            return kind
+    return None
+
+
+def _percent(label):
+    """``(kind, fraction)`` for labels like "Add labour 30%", else None."""
+    m = _PERCENT.search(label)
+    kind = _keyword(label)
+    if m is None or kind is None:
+        return None
+    return kind, float(m.group(1)) / 100.0
+
+
+def _num(value):
+    return u"{:.6g}".format(value)
+
+
+# ---------------------------------------------------------------------
+# Price sheet
+# ---------------------------------------------------------------------
+class PriceSheet(object):
+    """
+    Item names and prices of the workbook's material price sheet.
+
+    The item names are the column headed "Material ..." (or the first
+    heading); prices are the few columns to its right, so the helper
+    tables further across the sheet are left alone. Sizes listed under a heading row ("UPVC Pipes" then "32mm") are
+    named after the heading ("UPVC Pipes 32mm").
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = {}     # row -> item name
+        self.values = {}    # (col, row) -> number
+
+    @classmethod
+    def read(cls, book, name):
+        sheet = cls(name)
+        heading = None
+        name_col = None
+        for row, cells in book.rows(name):
+            if name_col is None:
+                texts = [c for c in cells if c.is_text]
+                named = [c for c in texts if _ITEM_HEADER.search(c.value)]
+                if named or texts:
+                    name_col = (named or texts)[0].col
+                continue
+            label = next((_text(c.value) for c in cells
+                          if c.col == name_col and c.is_text), u"")
+            numbers = [c for c in cells if c.is_number
+                       and name_col < c.col <= name_col + PRICE_COLUMNS]
+            for c in numbers:
+                sheet.values[(c.col, row)] = c.value
+            if not label:
+                continue
+            if label[:1].isdigit():
+                if heading:
+                    label = u"{} {}".format(heading, label)
+            elif numbers:
+                heading = None
+            else:
+                heading = label
+                continue
+            sheet.items[row] = label
+        return sheet
+
+    def lookup(self, formula):
+        """``(item, price)`` of the first price sheet cell in ``formula``."""
+        for m in _SHEET_REF.finditer(formula or ""):
+            sheet = (m.group(1) or "").replace("''", "'") or m.group(2)
+            if sheet != self.name:
+                continue
+            col = xlsx.column_index(m.group(3))
+            row = int(m.group(4))
+            price = self.values.get((col, row))
+            item = self.items.get(row)
+            if item and price:
+                return item, price
+        return None
+
+
+# ---------------------------------------------------------------------
+# Build-ups
+# ---------------------------------------------------------------------
+class Line(object):
+    __slots__ = ("kind", "label", "amount", "item", "quantity", "percent")
+
+    def __init__(self, kind, label, amount, item=None, quantity=None,
+                 percent=None):
+        self.kind = kind
+        self.label = label          # component, or LABOUR / PROFIT / ...
+        self.amount = amount        # workbook amount of the line
+        self.item = item            # price sheet item (materials)
+        self.quantity = quantity    # per unit of the build-up (materials)
+        self.percent = percent      # fraction (percentages)
+
+
+class BuildUp(object):
+    """One rate build-up: lines and the total the workbook calculated."""
+
+    def __init__(self, name, sheet, ref, total, uom, lines):
+        self.name = name
+        self.sheet = sheet
+        self.ref = ref
+        self.total = total
+        self.uom = uom
+        self.lines = lines
+
+    def problem(self):
+        """Why the lines do not reproduce the workbook total, or None."""
+        if not any(l.kind == MATERIAL for l in self.lines):
+            return u"no price book items"
+        found = sum(l.amount for l in self.lines)
+        if abs(found - self.total) > max(0.01, TOLERANCE * abs(self.total)):
+            return u"components add up to {:,.2f}, workbook total is {:,.2f}".format(
+                found, self.total
+            )
+        return None
+
+    def recipe_rows(self, header):
+        """``recipes.csv`` rows laid out for ``header``."""
+        col = dict((h.strip(), i) for i, h in reversed(list(enumerate(header))) if h)
+
+        def row(**cells):
+            values = [u""] * len(header)
+            values[col[recipe_loader.TYPE_COLUMN]] = self.name
+            for name, value in cells.items():
+                if name in col:
+                    values[col[name]] = value
+            return values
+
+        percents = {}
+        rows = []
+        for line in self.lines:
+            if line.kind == MATERIAL:
+                rows.append(row(**{
+                    recipe_loader.COMPONENT_COLUMN: line.item,
+                    recipe_loader.QUANTITY_COLUMN: _num(line.quantity),
+                }))
+            elif line.kind == FIXED:
+                rows.append(row(**{
+                    recipe_loader.COMPONENT_COLUMN: line.label,
+                    recipe_loader.FIXED_COLUMN: _num(line.amount),
+                }))
+            else:
+                percents[line.label] = percents.get(line.label, 0.0) + line.percent
+        for kind in (WASTAGE, LABOUR, TRANSPORT, PLANT, PROFIT):
+            if kind in percents:
+                rows.append(row(**{
+                    recipe_loader.COMPONENT_COLUMN: kind,
+                    recipe_loader.PERCENT_COLUMN: _num(100 * percents[kind]) + u"%",
+                }))
+
+        if rows:
+            first = rows[0]
+            if self.uom and recipe_loader.UOM_COLUMN in col:
+                first[col[recipe_loader.UOM_COLUMN]] = self.uom
+            if "Comment" in col:
+                first[col["Comment"]] = u"Imported from '{}'!{}, workbook rate {:,.2f}".format(
+                    self.sheet, self.ref, self.total
+                )
+        return rows
+
+
+def _unit(text):
+    m = _UNIT.search(text or u"")
+    return m.group(1) if m else u""
+
+
+class _Block(object):
+    __slots__ = ("title", "lines", "uom")
+
+    def __init__(self, title):
+        self.title = title
+        self.lines = []
+        self.uom = u""
+
+
+class _Scanner(object):
+    """Finds the build-ups of one sheet, one row at a time."""
+
+    def __init__(self, sheet, prices):
+        self.sheet = sheet
+        self.prices = prices
+        self.blocks = {}        # lane start column -> _Block
+        self.lanes = []
+        self.table = None       # (label col, {col: (kind, pct)}, total col)
+        self.section = u""
+        self.found = []
+        self.rejected = []      # (name, ref, problem)
+
+    def _emit(self, name, cell, uom, lines):
+        buildup = BuildUp(name, self.sheet, cell.ref, cell.value, uom, lines)
+        problem = buildup.problem()
+        if problem is None:
+            self.found.append(buildup)
+        else:
+            self.rejected.append((name, cell.ref, problem))
+
+    def _line(self, label, cells):
+        """Classify one component; ``cells`` are the numbers after the label."""
+        amount = cells[-1].value
+        pct = _percent(label)
+        if pct is not None:
+            return Line(PERCENT, pct[0], amount, percent=pct[1])
+        if _keyword(label) == WASTAGE and len(cells) > 1 and 0 < cells[0].value < 1:
+            return Line(PERCENT, WASTAGE, amount, percent=cells[0].value)
+        for c in cells:
+            found = self.prices.lookup(c.formula) if self.prices else None
+            if found:
+                item, price = found
+                return Line(MATERIAL, label, amount, item, amount / price)
+        return Line(FIXED, label, amount)
+
+    # -- tables -------------------------------------------------------
+    def _table_header(self, cells):
+        percents = {}
+        total_col = None
+        for c in cells:
+            label = _text(c.value)
+            pct = _percent(label)
+            if pct is not None:
+                percents[c.col] = pct
+            elif _TOTAL.match(label) and total_col is None:
+                total_col = c.col
+        if not percents or total_col is None:
+            return False
+        self.table = (cells[0].col, percents, total_col)
+        self.section = _text(cells[0].value)
+        return True
+
+    def _table_row(self, cells):
+        label_col, percents, total_col = self.table
+        label = next((c for c in cells if c.is_text and c.col <= label_col + 1), None)
+        total = next((c for c in cells if c.col == total_col and c.is_number), None)
+        if label is None or total is None or not total.value:
+            return False
+        lines = []
+        for c in cells:
+            if not c.is_number or c.col == total_col:
+                continue
+            if c.col in percents:
+                kind, pct = percents[c.col]
+                lines.append(Line(PERCENT, kind, c.value, percent=pct))
+                continue
+            found = self.prices.lookup(c.formula) if self.prices else None
+            if found:
+                item, price = found
+                lines.append(Line(MATERIAL, item, c.value, item, c.value / price))
+        units = [_unit(c.value) or _text(c.value) for c in cells
+                 if c.is_text and c.col > label.col and len(_text(c.value)) <= 6]
+        name = _text(label.value)
+        if self.section and self.section.lower() not in name.lower():
+            name = u"{} {}".format(self.section, name)
+        self._emit(name, total, units[0] if units else u"", lines)
+        return True
+
+    # -- blocks -------------------------------------------------------
+    def _lane(self, col):
+        start = None
+        for lane in self.lanes:
+            if lane <= col:
+                start = lane
+        return start
+
+    def row(self, cells):
+        if all(c.is_text for c in cells):
+            if self._table_header(cells):
+                return
+            titles = [c for c in cells if _text(c.value) and not _unit(c.value)]
+            if not titles:
+                return
+            self.lanes = [c.col for c in titles]
+            self.blocks = dict((c.col, _Block(_text(c.value))) for c in titles)
+            self.section = _text(titles[0].value)
+            return
+
+        if self.table is not None and self._table_row(cells):
+            return
+
+        by_lane = {}
+        for c in cells:
+            lane = self._lane(c.col)
+            if lane is not None:
+                by_lane.setdefault(lane, []).append(c)
+
+        for lane, lane_cells in by_lane.items():
+            block = self.blocks.get(lane)
+            if block is None:
+                continue
+            label_cell = next((c for c in lane_cells if c.is_text), None)
+            label = _text(label_cell.value) if label_cell else u""
+            after = label_cell.col if label_cell else -1
+            numbers = [c for c in lane_cells if c.is_number and c.col > after]
+            units = [_unit(c.value) for c in lane_cells
+                     if c.is_text and c is not label_cell and _unit(c.value)]
+            if not numbers or not label:
+                continue    # unlabelled subtotal
+            last = numbers[-1]
+            if _TOTAL.match(label) or (last.formula or "").upper().startswith("SUM("):
+                if block.lines:
+                    uom = _unit(label) or block.uom
+                    self._emit(block.title, last, uom, block.lines)
+                self.blocks[lane] = _Block(block.title)
+                continue
+            block.lines.append(self._line(label, numbers))
+            if units and not block.uom:
+                block.uom = units[0]
+
+
+def find_price_sheet(book):
+    for name in book.sheets:
+        if PRICE_SHEET_RE.search(name):
+            return name
+    return None
+
+
+def extract(path, price_sheet=None):
+    """
+    Build-ups of every sheet in the workbook at ``path``.
+
+    Returns ``(buildups, rejected)``; ``rejected`` lists ``(sheet, name,
+    cell, problem)`` for totals whose components could not be matched.
+    """
+    buildups = []
+    rejected = []
+    names = {}
+    with xlsx.Workbook(path) as book:
+        price_sheet = price_sheet or find_price_sheet(book)
+        prices = PriceSheet.read(book, price_sheet) if price_sheet else None
+        for sheet in book.sheets:
+            if sheet == price_sheet:
+                continue
+            scanner = _Scanner(sheet, prices)
+            for _row, cells in book.rows(sheet):
+                scanner.row(cells)
+            for buildup in scanner.found:
+                _unique_name(buildup, names)
+                buildups.append(buildup)
+            rejected.extend((sheet,) + r for r in scanner.rejected)
+    return buildups, rejected
+
+
+def _unique_name(buildup, names):
+    """Suffix repeated names with their first component, then the cell."""
+    name = buildup.name
+    if name in names:
+        first = next((l.label for l in buildup.lines if l.kind != PERCENT), None)
+        if first and first.lower() not in name.lower():
+            name = u"{} - {}".format(name, first)
+        if name in names:
+            name = u"{} ({}!{})".format(name, buildup.sheet, buildup.ref)
+    names[name] = buildup
+    buildup.name = name
+
+
+# ---------------------------------------------------------------------
+# recipes.csv
+# ---------------------------------------------------------------------
+def merge(sheet, buildups):
+    """
+    Replace or add ``buildups`` in a ``pce.editor.RecipeSheet``.
+
+    Rows of recipes with the same Type are replaced; everything else in
+    the file is kept as it is. Returns ``(added, replaced)`` names.
+    """
+    imported = dict((b.name, b) for b in buildups)
+    existing = set()
+    for n in range(len(sheet.rows)):
+        name = sheet.recipe_name(n)
+        if name in imported:
+            existing.add(name)
+            sheet.delete(n)
+    for buildup in buildups:
+        for row in buildup.recipe_rows(sheet.header):
+            sheet.append(row)
+    added = [b.name for b in buildups if b.name not in existing]
+    return added, sorted(existing)
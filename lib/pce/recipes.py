@@ -0,0 +1,562 @@
+# -*- coding: utf-8 -*-
+"""
+Recipe (rate build-up) loader for ``recipes.csv``.
+
+Each ``Type`` groups component rows. A component is either a material
+(priced from the price book by ``Quantity``) or a labour / transport /
+plant / wastage / profit line given as a percentage of the material
+total, a fixed amount, or ``Time/Distance`` x ``Rate``.
+
+A component named ``Recipe: <Type>`` uses another recipe as a
+sub-assembly: ``Quantity`` units of that recipe's full rate are added to
+the material total, e.g. one mortar mix shared by every wall type.
+Sub-recipes form a DAG; cycles are reported and left unpriced.
+
+A ``Type`` with ``{name}`` placeholders is a template for a family of
+sizes, e.g. ``Strip footing {w}x{t}mm thick``: each placeholder matches
+a number in a model type name, and ``Quantity``, fixed, ``Time/Distance``
+and ``Rate`` cells starting with ``=`` are formulas over them
+(``=7 * w/600 * t/200``). Templates are compiled once when the file is
+read; ``RecipeBook.expand`` turns the model's type names into concrete
+recipes, each built once, and recipes written out in full win over a
+template.
+"""
+import __future__
+import math
+import os
+import re
+from collections import OrderedDict, namedtuple
+
+from pce import csvutil
+
+TYPE_COLUMN = "Type"
+COMPONENT_COLUMN = "Component"
+PERCENT_COLUMN = "Labour/Transport/Wastage/Profit"
+FIXED_COLUMN = "Labour/Transport/Plant_Fixed"
+TIME_COLUMN = "Time/Distance"
+RATE_COLUMN = "Rate"
+QUANTITY_COLUMN = "Quantity"
+UOM_COLUMN = "BOQ UoM"
+
+RECIPE_PREFIX = "recipe:"
+
+# Reason a recipe with nothing to price is left unpriced
+EMPTY_RECIPE = u"empty recipe"
+
+Breakdown = namedtuple("Breakdown", [
+    "material_total",
+    "wastage_cost",
+    "labour_cost",
+    "transport_cost",
+    "plant_cost",
+    "overhead_cost",
+    "total_cost",
+])
+
+
+class RecipeError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------
+# Templates
+# ---------------------------------------------------------------------
+PLACEHOLDER = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+NUMBER = r"\d+(?:\.\d+)?"
+FORMULA_TOKEN = re.compile(
+    r"\s+|[A-Za-z_][A-Za-z0-9_]*|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+    r"|\*\*|[-+*/%(),]"
+)
+FORMULA_FUNCTIONS = {
+    "min": min, "max": max, "abs": abs, "round": round,
+    "ceil": math.ceil, "floor": math.floor, "sqrt": math.sqrt, "pi": math.pi,
+}
+
+
+def is_template(type_name):
+    return PLACEHOLDER.search(type_name) is not None
+
+
+def compile_formula(text, variables):
+    """
+    Code object for ``=expression`` over ``variables``.
+
+    Only numbers, arithmetic, the template's variables and
+    ``FORMULA_FUNCTIONS`` are allowed. Raises ValueError.
+    """
+    expr = text[1:].strip()
+    pos = 0
+    while pos < len(expr):
+        match = FORMULA_TOKEN.match(expr, pos)
+        if match is None:
+            raise ValueError(u"bad formula {!r} at {!r}".format(text, expr[pos:]))
+        token = match.group()
+        if (token[0].isalpha() or token[0] == "_") and \
+                token not in variables and token not in FORMULA_FUNCTIONS:
+            raise ValueError(u"unknown name {!r} in formula {!r}".format(token, text))
+        pos = match.end()
+    try:
+        # true division in IronPython too: "=w/600" with w = 450
+        return compile(expr, "<formula>", "eval",
+                       __future__.division.compiler_flag, True)
+    except SyntaxError:
+        raise ValueError(u"bad formula {!r}".format(text))
+
+
+class RecipeTemplate(object):
+    """
+    Rows of a ``{placeholder}`` type, compiled once.
+
+    ``instantiate`` matches a concrete type name and builds its recipe
+    with every formula evaluated for the numbers in the name.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.variables = []
+        regex = []
+        pos = 0
+        for match in PLACEHOLDER.finditer(pattern):
+            regex.append(re.escape(pattern[pos:match.start()]))
+            var = match.group(1)
+            if var in self.variables:
+                regex.append("(?P={})".format(var))
+            else:
+                self.variables.append(var)
+                regex.append("(?P<{}>{})".format(var, NUMBER))
+            pos = match.end()
+        regex.append(re.escape(pattern[pos:]) + "$")
+        self.regex = re.compile("".join(regex))
+        self.prefix = pattern[:pattern.index("{")]
+        self.uom = ""
+        self.lines = []     # [comp, qty, pct, fixed, time_dist, rate]
+
+    def add_line(self, comp, qty, pct, fixed, time_dist, rate):
+        """Store one row; formula cells are compiled, others kept as text."""
+        line = [comp, qty, pct]
+        for value in (fixed, time_dist, rate):
+            if value.startswith("="):
+                value = compile_formula(value, self.variables)
+            line.append(value)
+        self.lines.append(line)
+
+    def materials(self):
+        """Price book components of the template's rows."""
+        return [
+            comp for comp, qty, pct, fixed, time_dist, rate in self.lines
+            if comp and not pct and not fixed and not time_dist
+            and not comp.lower().startswith(RECIPE_PREFIX)
+        ]
+
+    def rename(self, mapping):
+        for line in self.lines:
+            line[0] = mapping.get(line[0], line[0])
+
+    def match(self, type_name):
+        """``variable -> value`` for a matching type name, or None."""
+        if not type_name.startswith(self.prefix):
+            return None
+        match = self.regex.match(type_name)
+        if match is None:
+            return None
+        return dict((var, float(match.group(var))) for var in self.variables)
+
+    def instantiate(self, type_name, values):
+        scope = dict(FORMULA_FUNCTIONS)
+        scope.update(values)
+        scope["__builtins__"] = {}
+
+        def value_of(cell):
+            if hasattr(cell, "co_code"):
+                return repr(float(eval(cell, scope)))
+            return cell
+
+        recipe = Recipe(type_name)
+        recipe.uom = self.uom
+        for comp, qty, pct, fixed, time_dist, rate in self.lines:
+            if hasattr(qty, "co_code"):
+                qty = float(eval(qty, scope))
+            recipe.add_component(comp, qty, pct, value_of(fixed),
+                                 value_of(time_dist), value_of(rate))
+        return recipe
+
+
+class Recipe(object):
+    def __init__(self, name):
+        self.name = name
+        self.materials = OrderedDict()   # component -> quantity
+        self.subrecipes = OrderedDict()  # sub-recipe type -> quantity
+        self.uom = ""
+        self.labour_percent = 0.0
+        self.labour_fixed = []
+        self.labour_time = []
+        self.transport_percent = 0.0
+        self.transport_fixed = []
+        self.transport_distance = []
+        self.wastage_percent = 0.0
+        self.plant_percent = 0.0
+        self.plant_fixed = []
+        self.plant_time = []
+        self.overhead_percent = 0.0
+
+    def add_component(self, comp, qty, pct, fixed, time_dist, rate):
+        cname = comp.lower()
+
+        if pct:
+            pct_val = float(pct.replace("%", "")) / 100.0
+            if "wastage" in cname or "shrinkage" in cname:
+                self.wastage_percent = pct_val
+            elif "profit" in cname or "overhead" in cname:
+                self.overhead_percent = pct_val
+            elif cname.startswith("transport"):
+                self.transport_percent = pct_val
+            elif "plant" in cname:
+                self.plant_percent = pct_val
+            else:
+                self.labour_percent = pct_val
+
+        if fixed:
+            if cname.startswith("transport"):
+                self.transport_fixed.append(float(fixed))
+            elif "plant" in cname:
+                self.plant_fixed.append(float(fixed))
+            else:
+                self.labour_fixed.append(float(fixed))
+
+        if time_dist and rate:
+            cost = float(time_dist) * float(rate)
+            if cname.startswith("transport"):
+                self.transport_distance.append(cost)
+            elif "plant" in cname:
+                self.plant_time.append(cost)
+            else:
+                self.labour_time.append(cost)
+
+        if not pct and not fixed and not time_dist:
+            if cname.startswith(RECIPE_PREFIX):
+                self.subrecipes[comp[len(RECIPE_PREFIX):].strip()] = qty
+            elif comp or qty:   # blank spacer rows are not materials
+                self.materials[comp] = qty
+
+    @property
+    def is_empty(self):
+        """
+        True for a placeholder with no materials, sub-recipes or adders;
+        it has no rate (rather than a 0.00 one).
+        """
+        return not (
+            self.materials or self.subrecipes
+            or self.labour_fixed or self.labour_time
+            or self.transport_fixed or self.transport_distance
+            or self.plant_fixed or self.plant_time
+        )
+
+    def breakdown(self, material_total):
+        """Full rate build-up for a given material total."""
+        wastage_cost = material_total * self.wastage_percent
+
+        labour_cost = (
+            material_total * self.labour_percent
+            + sum(self.labour_fixed)
+            + sum(self.labour_time)
+        )
+
+        transport_cost = (
+            material_total * self.transport_percent
+            + sum(self.transport_fixed)
+            + sum(self.transport_distance)
+        )
+
+        plant_cost = (
+            material_total * self.plant_percent
+            + sum(self.plant_fixed)
+            + sum(self.plant_time)
+        )
+
+        subtotal = (
+            material_total
+            + wastage_cost
+            + labour_cost
+            + transport_cost
+            + plant_cost
+        )
+
+        overhead_cost = subtotal * self.overhead_percent
+        return Breakdown(
+            material_total,
+            wastage_cost,
+            labour_cost,
+            transport_cost,
+            plant_cost,
+            overhead_cost,
+            subtotal + overhead_cost,
+        )
+
+
+class RecipeBook(object):
+    """
+    Recipes keyed by type name, in file order.
+
+    ``order`` lists every recipe after all of its sub-recipes, so one
+    pass over it can price shared sub-assemblies once and reuse them.
+    ``cycles`` maps recipes caught in (or depending on) a sub-recipe
+    cycle to a readable description of the problem. ``templates`` are
+    the ``{placeholder}`` types; ``expand`` adds their concrete types.
+    """
+
+    def __init__(self, recipes, report=None, source=None, templates=None):
+        self.recipes = recipes
+        self.report = report or []
+        self.source = source or {}
+        self.templates = templates or []
+        self.instances = {}     # type name -> template recipe or None
+        self._index()
+
+    def _index(self):
+        self.order, self.cycles = self._resolve()
+        self.parents = {}
+        for name, recipe in self.recipes.items():
+            for sub in recipe.subrecipes:
+                self.parents.setdefault(sub, set()).add(name)
+
+    def instantiate(self, name):
+        """
+        The template recipe for type ``name`` (first matching template),
+        built once and cached, or None.
+        """
+        if name in self.instances:
+            return self.instances[name]
+        recipe = None
+        for template in self.templates:
+            values = template.match(name)
+            if values is None:
+                continue
+            try:
+                recipe = template.instantiate(name, values)
+            except (ValueError, ArithmeticError, TypeError) as ex:
+                self.report.append(u"'{}' (template '{}'): {}".format(
+                    name, template.pattern, ex
+                ))
+            break
+        self.instances[name] = recipe
+        return recipe
+
+    def expand(self, names):
+        """
+        Add the template recipes of ``names`` that have no recipe of
+        their own; returns the names added.
+        """
+        added = []
+        if not self.templates:
+            return added
+        for name in names:
+            if name in self.recipes:
+                continue
+            recipe = self.instantiate(name)
+            if recipe is not None:
+                self.recipes[name] = recipe
+                added.append(name)
+        if added:
+            self._index()
+            self.source["templates"] = sorted(
+                n for n, r in self.instances.items() if r is not None
+            )
+        return added
+
+    def _resolve(self):
+        order = []
+        cycles = {}
+        state = {}   # name -> 1 visiting, 2 done
+
+        for root in self.recipes:
+            if root in state:
+                continue
+            stack = [(root, iter(self.recipes[root].subrecipes))]
+            path = [root]
+            state[root] = 1
+            while stack:
+                name, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    path.pop()
+                    state[name] = 2
+                    order.append(name)
+                    for sub in self.recipes[name].subrecipes:
+                        if sub in cycles and name not in cycles:
+                            cycles[name] = cycles[sub]
+                    continue
+                if child not in self.recipes:
+                    self.report.append(u"'{}': sub-recipe '{}' is not defined".format(
+                        name, child
+                    ))
+                    continue
+                if state.get(child) == 1:
+                    loop = path[path.index(child):] + [child]
+                    text = u"recipe cycle: " + u" > ".join(loop)
+                    self.report.append(text)
+                    for member in loop:
+                        cycles.setdefault(member, text)
+                    continue
+                if state.get(child) == 2:
+                    continue
+                state[child] = 1
+                path.append(child)
+                stack.append((child, iter(self.recipes[child].subrecipes)))
+
+        return order, cycles
+
+    def ancestors(self, name):
+        """Every recipe that uses ``name`` directly or through sub-recipes."""
+        seen = set()
+        todo = list(self.parents.get(name, ()))
+        while todo:
+            parent = todo.pop()
+            if parent not in seen:
+                seen.add(parent)
+                todo.extend(self.parents.get(parent, ()))
+        return seen
+
+    def materials_of(self, name):
+        """Every price-book item ``name`` uses, through its sub-recipes too."""
+        seen = set()
+        result = set()
+        todo = [name]
+        while todo:
+            current = todo.pop()
+            recipe = self.recipes.get(current)
+            if recipe is None or current in seen:
+                continue
+            seen.add(current)
+            result.update(recipe.materials)
+            todo.extend(recipe.subrecipes)
+        return result
+
+    def flat_materials(self, name):
+        """
+        ``item -> quantity`` per unit of ``name`` with sub-recipes expanded.
+
+        Recipes in a cycle have no finite expansion and return {}.
+        """
+        if name in self.cycles or name not in self.recipes:
+            return {}
+        result = {}
+        todo = [(name, 1.0)]
+        while todo:
+            current, factor = todo.pop()
+            recipe = self.recipes.get(current)
+            if recipe is None:
+                continue
+            for item, qty in recipe.materials.items():
+                result[item] = result.get(item, 0.0) + factor * qty
+            for sub, qty in recipe.subrecipes.items():
+                todo.append((sub, factor * qty))
+        return result
+
+    def __contains__(self, name):
+        return name in self.recipes
+
+    def __getitem__(self, name):
+        return self.recipes[name]
+
+    def __iter__(self):
+        return iter(self.recipes)
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def get(self, name, default=None):
+        return self.recipes.get(name, default)
+
+    def items(self):
+        return self.recipes.items()
+
+
+def source_stat(csv_path):
+    st = os.stat(csv_path)
+    return {
+        "path": os.path.normcase(os.path.abspath(csv_path)),
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+    }
+
+
+def load(csv_path):
+    rows = csvutil.read_rows(csv_path)
+    return parse_rows(rows, source_stat(csv_path), csv_path)
+
+
+def parse_rows(rows, source=None, label="recipes"):
+    """Build a ``RecipeBook`` from CSV rows (header first)."""
+    if not rows:
+        raise RecipeError("Recipe file is empty: {}".format(label))
+
+    header = [h.strip() for h in rows[0]]
+    for required in (TYPE_COLUMN, COMPONENT_COLUMN):
+        if required not in header:
+            raise RecipeError(
+                "Recipe file has no '{}' column: {}".format(required, label)
+            )
+    col = dict((h, i) for i, h in reversed(list(enumerate(header))) if h)
+
+    def cell(row, name):
+        i = col.get(name)
+        return row[i].strip() if i is not None and i < len(row) else ""
+
+    recipes = OrderedDict()
+    templates = OrderedDict()
+    report = []
+
+    for line_no, row in enumerate(rows[1:], 2):
+        rtype = cell(row, TYPE_COLUMN)
+        if not rtype:
+            continue
+
+        comp = cell(row, COMPONENT_COLUMN)
+        try:
+            qty_text = cell(row, QUANTITY_COLUMN)
+            if is_template(rtype):
+                template = templates.get(rtype)
+                if template is None:
+                    template = templates[rtype] = RecipeTemplate(rtype)
+                if qty_text.startswith("="):
+                    qty = compile_formula(qty_text, template.variables)
+                else:
+                    qty = float(qty_text) if qty_text else 0.0
+                uom = cell(row, UOM_COLUMN)
+                if uom and not template.uom:
+                    template.uom = uom
+                template.add_line(
+                    comp,
+                    qty,
+                    cell(row, PERCENT_COLUMN),
+                    cell(row, FIXED_COLUMN),
+                    cell(row, TIME_COLUMN),
+                    cell(row, RATE_COLUMN),
+                )
+                continue
+
+            qty = float(qty_text) if qty_text else 0.0
+
+            recipe = recipes.get(rtype)
+            if recipe is None:
+                recipe = recipes[rtype] = Recipe(rtype)
+
+            uom = cell(row, UOM_COLUMN)
+            if uom and not recipe.uom:
+                recipe.uom = uom
+
+            recipe.add_component(
+                comp,
+                qty,
+                cell(row, PERCENT_COLUMN),
+                cell(row, FIXED_COLUMN),
+                cell(row, TIME_COLUMN),
+                cell(row, RATE_COLUMN),
+            )
+        except ValueError as ex:
+            report.append(u"line {}: '{}' / '{}': {}".format(
+                line_no, rtype, comp, ex
+            ))
+
+    return RecipeBook(recipes, report, source, list(templates.values()))
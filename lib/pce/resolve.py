@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Matching recipe components to price book items.
+
+Every tool normalises names the same way (``normalize`` / ``key``), so a
+component such as ``Labour Skilled `` or ``Cement_50kg bag`` resolves
+identically in Apply Rate and Material List. A component resolves, in
+order, by
+
+    exact       the item name itself
+    alias       an accepted match stored in ``aliases.csv``
+    normalized  the same ``key`` (case, spacing, ``-`` / ``_`` ignored)
+
+Anything else gets ``suggest``-ed from a character trigram index over
+the item keys; accepted suggestions are saved as aliases so the next run
+resolves them with a single dict lookup. Declined suggestions are saved
+too, as rejected aliases (``Match`` = ``no``), and not suggested again.
+"""
+import os
+import re
+import unicodedata
+
+from pce import csvutil, paths
+
+EXACT = "exact"
+ALIAS = "alias"
+NORMALIZED = "normalized"
+FUZZY = "fuzzy"
+
+# Dice scores (0..1) on key trigrams
+SUGGEST_THRESHOLD = 0.5
+AUTO_THRESHOLD = 0.85
+AUTO_MARGIN = 0.1     # lead over the runner-up needed to auto-apply
+
+ALIAS_COLUMNS = ("Component", "Item", "Match")
+ACCEPTED = "yes"
+REJECTED = "no"     # Match of a declined suggestion
+
+_SPACES = re.compile(r"\s+", re.UNICODE)
+_KEY_DROP = re.compile(r"[\s\-_]+", re.UNICODE)
+_FOLD = {
+    u"\u2044": u"/",    # fraction slash (1 1\u20444Inch)
+    u"\u2215": u"/",    # division slash
+    u"\u00a0": u" ",    # no-break space
+    u"\u2013": u"-",    # en dash
+    u"\u2014": u"-",    # em dash
+}
+
+
+def _text(text):
+    if text is None:
+        return u""
+    if isinstance(text, bytes):
+        return csvutil.decode_line(text)
+    return text
+
+
+def normalize(text):
+    """Unicode (NFKC), case and whitespace normalised display form."""
+    text = unicodedata.normalize("NFKC", _text(text))
+    for old, new in _FOLD.items():
+        text = text.replace(old, new)
+    return _SPACES.sub(u" ", text).strip().lower()
+
+
+def key(text):
+    """``normalize`` without spaces, hyphens or underscores."""
+    return _KEY_DROP.sub(u"", normalize(text))
+
+
+def trigrams(k):
+    padded = u"#" + k + u"#"
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class Suggestion(object):
+    __slots__ = ("component", "item", "score")
+
+    def __init__(self, component, item, score):
+        self.component = component
+        self.item = item
+        self.score = score
+
+    @property
+    def label(self):
+        return u"{}  ->  {}  ({:.0%})".format(
+            self.component.strip(), self.item, self.score
+        )
+
+
+class Resolver(object):
+    """Component -> price book item lookups over a fixed item list."""
+
+    def __init__(self, items, aliases=None, rejected=None):
+        self.items = list(items)
+        self.exact = set(self.items)
+        self.by_key = {}
+        self.postings = {}      # trigram -> [item index]
+        self.sizes = []         # item index -> trigram count
+        for i, item in enumerate(self.items):
+            k = key(item)
+            self.by_key.setdefault(k, item)
+            grams = trigrams(k)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(i)
+
+        self.aliases = {}       # component key -> item
+        for component, item in (aliases or {}).items():
+            if item in self.exact:
+                self.aliases[key(component)] = item
+
+        self.rejected = {}      # component key -> set of items
+        for component, declined in (rejected or {}).items():
+            self.rejected.setdefault(key(component), set()).update(declined)
+
+    def resolve(self, name):
+        """``(item, how)`` or ``(None, None)``; never guesses."""
+        if name in self.exact:
+            return name, EXACT
+        k = key(name)
+        item = self.aliases.get(k)
+        if item is not None:
+            return item, ALIAS
+        item = self.by_key.get(k)
+        if item is not None:
+            return item, NORMALIZED
+        return None, None
+
+    def suggest(self, name, limit=3, threshold=SUGGEST_THRESHOLD):
+        """
+        Best ``Suggestion``s for ``name``, highest score first, leaving
+        out the items already declined for it.
+        """
+        k = key(name)
+        grams = trigrams(k)
+        if not grams:
+            return []
+        declined = self.rejected.get(k, ())
+        shared = {}
+        postings = self.postings
+        for gram in grams:
+            for i in postings.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+
+        n = len(grams)
+        sizes = self.sizes
+        scored = []
+        for i, count in shared.items():
+            score = 2.0 * count / (n + sizes[i])
+            if score >= threshold and self.items[i] not in declined:
+                scored.append((score, i))
+        scored.sort(key=lambda s: (-s[0], self.items[s[1]]))
+        return [Suggestion(name, self.items[i], score)
+                for score, i in scored[:limit]]
+
+    def auto(self, suggestions):
+        """The suggestion to apply without asking, or None."""
+        if not suggestions or suggestions[0].score < AUTO_THRESHOLD:
+            return None
+        if len(suggestions) > 1 and (
+                suggestions[0].score - suggestions[1].score < AUTO_MARGIN):
+            return None
+        return suggestions[0]
+
+
+# ---------------------------------------------------------------------
+# Recipes
+# ---------------------------------------------------------------------
+def resolve_recipes(recipe_book, resolver):
+    """
+    Map every recipe material onto the resolver's items.
+
+    Returns ``(resolved, unresolved)``: ``component -> (item, how)`` for
+    components that needed an alias or normalisation, and the sorted
+    components with no match.
+    """
+    resolved = {}
+    unresolved = set()
+    components = [c for _name, r in recipe_book.items() for c in r.materials]
+    for template in recipe_book.templates:
+        components.extend(template.materials())
+    for component in components:
+        if component in resolved or component in unresolved:
+            continue
+        item, how = resolver.resolve(component)
+        if item is None:
+            unresolved.add(component)
+        elif how != EXACT:
+            resolved[component] = (item, how)
+    return resolved, sorted(unresolved)
+
+
+def rename_materials(recipe_book, mapping):
+    """
+    Rewrite recipe materials through ``component -> item`` in place,
+    template rows included.
+
+    The mapping is recorded in ``recipe_book.source`` so cached scenario
+    tables built from the unresolved names are not reused.
+    """
+    if not mapping:
+        return
+    for template in recipe_book.templates:
+        template.rename(mapping)
+    for _name, recipe in recipe_book.items():
+        if not any(c in mapping for c in recipe.materials):
+            continue
+        materials = recipe.materials.__class__()
+        for component, qty in recipe.materials.items():
+            item = mapping.get(component, component)
+            materials[item] = materials.get(item, 0.0) + qty
+        recipe.materials = materials
+    recipe_book.source["resolved"] = sorted(mapping.items())
+
+
+# ---------------------------------------------------------------------
+# Aliases
+# ---------------------------------------------------------------------
+def _alias_rows(csv_path):
+    """``(component, item, rejected)`` rows of ``aliases.csv``."""
+    csv_path = csv_path or paths.ALIASES_CSV
+    if not os.path.exists(csv_path):
+        return
+    for row in csvutil.read_rows(csv_path)[1:]:
+        if len(row) >= 2 and row[0].strip() and row[1].strip():
+            rejected = len(row) > 2 and row[2].strip().lower() == REJECTED
+            yield row[0].strip(), row[1].strip(), rejected
+
+
+def load_aliases(csv_path=None):
+    """``component -> item`` from ``aliases.csv`` ({} when absent)."""
+    return dict((component, item)
+                for component, item, rejected in _alias_rows(csv_path)
+                if not rejected)
+
+
+def load_rejected(csv_path=None):
+    """``component -> set of declined items`` from ``aliases.csv``."""
+    declined = {}
+    for component, item, rejected in _alias_rows(csv_path):
+        if rejected:
+            declined.setdefault(component, set()).add(item)
+    return declined
+
+
+def save_aliases(aliases, csv_path=None, rejected=None):
+    """
+    Write ``aliases`` and the ``rejected`` suggestions (``component ->
+    items``); without ``rejected`` the ones already saved are kept.
+    """
+    csv_path = csv_path or paths.ALIASES_CSV
+    if rejected is None:
+        rejected = load_rejected(csv_path)
+    rows = [list(ALIAS_COLUMNS)]
+    for component in sorted(set(aliases) | set(rejected), key=normalize):
+        if component in aliases:
+            rows.append([component.strip(), aliases[component], ACCEPTED])
+        for item in sorted(rejected.get(component, ())):
+            rows.append([component.strip(), item, REJECTED])
+    csvutil.write_rows(csv_path, rows)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo cost risk from the Min / Avg / Max price columns.
+
+Every material price is drawn from a triangular (or PERT) distribution
+with the province's Min, Avg and Max unit costs as low, mode and high
+(National fallback per basis, as in Apply Rate). Samples are pushed
+through the linear cost model of each recipe (see ``pce.linear``), so a
+run is a handful of matrix products:
+
+    rates  = samples x weights' + constants        (samples x types)
+    groups = rates x quantities-by-group           (samples x groups)
+
+With NumPy (pyRevit's CPython engine or offline) the whole run is
+vectorized; under IronPython a smaller pure-Python run is used instead.
+Material prices are sampled independently.
+"""
+import math
+import random
+
+from pce import BASES, cost_column
+from pce.engine import price_matrix
+
+try:
+    import numpy as np
+except ImportError:  # IronPython
+    np = None
+
+TRIANGULAR = "triangular"
+PERT = "pert"
+METHODS = (TRIANGULAR, PERT)
+
+PERCENTILES = (10, 50, 90)
+DEFAULT_SAMPLES = 10000 if np is not None else 2000
+
+
+# ---------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------
+def price_ranges(book, province):
+    """
+    ``item -> (low, mode, high)`` from the province's Min/Avg/Max columns.
+
+    A missing basis falls back to the others: no Avg uses the Min/Max
+    midpoint, no Min or Max collapses to the mode. Items with no price
+    in any basis are left out.
+    """
+    columns = [cost_column(province, basis) for basis in BASES]
+    prices, _ = price_matrix(book, columns)
+    ranges = {}
+    for i, item in enumerate(book.items):
+        low, mode, high = [
+            None if math.isnan(col[i]) else col[i] for col in prices
+        ]
+        known = [v for v in (low, mode, high) if v is not None]
+        if not known:
+            continue
+        if mode is None:
+            mode = (min(known) + max(known)) / 2.0
+        low = mode if low is None else low
+        high = mode if high is None else high
+        low, mode, high = sorted((low, mode, high))
+        ranges[item] = (low, mode, high)
+    return ranges
+
+
+class RiskResult(object):
+    """
+    Percentiles (P10, P50, P90 by default) of every simulated quantity.
+
+    ``types`` holds unit rates per recipe, ``groups`` the amount per
+    group (rate x model quantity) and ``total`` the grand total.
+    """
+
+    def __init__(self, percentiles, types, groups, total, samples, backend,
+                 skipped):
+        self.percentiles = percentiles
+        self.types = types
+        self.groups = groups
+        self.total = total
+        self.samples = samples
+        self.backend = backend
+        self.skipped = skipped
+
+
+# ---------------------------------------------------------------------
+# Sampling
+# ---------------------------------------------------------------------
+def _triangular_ppf(u, low, mode, high):
+    """Inverse CDF of one triangular distribution (scalar)."""
+    span = high - low
+    if span <= 0:
+        return low
+    if u < (mode - low) / span:
+        return low + math.sqrt(u * span * (mode - low))
+    return high - math.sqrt((1.0 - u) * span * (high - mode))
+
+
+def _pert_params(low, mode, high):
+    span = high - low
+    if span <= 0:
+        return 1.0, 1.0
+    return 1.0 + 4.0 * (mode - low) / span, 1.0 + 4.0 * (high - mode) / span
+
+
+def _percentile(sorted_values, q):
+    """Linear interpolation, same as ``numpy.percentile``'s default."""
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _sample_numpy(rng, n, low, mode, high, method):
+    span = high - low
+    flat = span <= 0
+    safe = np.where(flat, 1.0, span)
+    if method == PERT:
+        a = np.where(flat, 1.0, 1.0 + 4.0 * (mode - low) / safe)
+        b = np.where(flat, 1.0, 1.0 + 4.0 * (high - mode) / safe)
+        return low + rng.beta(a, b, size=(n, len(low))) * span
+    u = rng.random((n, len(low)))
+    split = np.where(flat, 0.0, (mode - low) / safe)
+    left = low + np.sqrt(u * span * (mode - low))
+    right = high - np.sqrt((1.0 - u) * span * (high - mode))
+    return np.where(u < split, left, right)
+
+
+# ---------------------------------------------------------------------
+# Simulation
+# ---------------------------------------------------------------------
+def _prepare(model, ranges):
+    names = []
+    skipped = dict(model.skipped)
+    for name in sorted(model.costs):
+        missing = model.costs[name].missing(ranges)
+        if missing is None:
+            names.append(name)
+        else:
+            skipped[name] = missing
+    items = sorted(set(
+        item for name in names for item in model.costs[name].weights
+    ))
+    return names, items, skipped
+
+
+def simulate(model, ranges, quantities=None, groups=None,
+             samples=DEFAULT_SAMPLES, method=TRIANGULAR, seed=None,
+             percentiles=PERCENTILES, use_numpy=True):
+    """
+    Run the simulation.
+
+    ``model`` is a ``linear.LinearModel``, ``ranges`` the output of
+    ``price_ranges``, ``quantities`` maps recipe -> model quantity and
+    ``groups`` maps recipe -> group name (e.g. BOQ category); recipes
+    without a quantity only get rate percentiles.
+    """
+    if method not in METHODS:
+        raise ValueError("Unknown distribution: {}".format(method))
+    quantities = quantities or {}
+    groups = groups or {}
+    names, items, skipped = _prepare(model, ranges)
+    group_names = sorted(set(
+        groups.get(name, "") for name in names if quantities.get(name)
+    ))
+
+    if np is not None and use_numpy:
+        run, backend = _simulate_numpy, "numpy"
+    else:
+        run, backend = _simulate_python, "python"
+    type_pct, group_pct, total_pct = run(
+        model, ranges, names, items, quantities, groups, group_names,
+        samples, method, seed, percentiles,
+    )
+    return RiskResult(
+        percentiles, type_pct, group_pct, total_pct, samples, backend, skipped
+    )
+
+
+def _simulate_numpy(model, ranges, names, items, quantities, groups,
+                    group_names, samples, method, seed, percentiles):
+    col = dict((item, j) for j, item in enumerate(items))
+    weights = np.zeros((len(items), len(names)))
+    constants = np.zeros(len(names))
+    for t, name in enumerate(names):
+        cost = model.costs[name]
+        constants[t] = cost.constant
+        for item, w in cost.weights.items():
+            weights[col[item], t] = w
+
+    by_group = np.zeros((len(names), len(group_names)))
+    g_index = dict((g, k) for k, g in enumerate(group_names))
+    for t, name in enumerate(names):
+        qty = quantities.get(name)
+        if qty:
+            by_group[t, g_index[groups.get(name, "")]] = qty
+
+    bounds = np.array([ranges[item] for item in items]).reshape(-1, 3)
+    rng = np.random.default_rng(seed)
+    draws = _sample_numpy(
+        rng, samples, bounds[:, 0], bounds[:, 1], bounds[:, 2], method
+    )
+    rates = draws.dot(weights) + constants
+    amounts = rates.dot(by_group)
+    total = amounts.sum(axis=1)
+
+    qs = list(percentiles)
+    rate_pct = np.percentile(rates, qs, axis=0) if names else np.zeros((len(qs), 0))
+    group_pct = np.percentile(amounts, qs, axis=0) if group_names else np.zeros((len(qs), 0))
+    return (
+        dict((name, tuple(float(v) for v in rate_pct[:, t]))
+             for t, name in enumerate(names)),
+        dict((g, tuple(float(v) for v in group_pct[:, k]))
+             for k, g in enumerate(group_names)),
+        tuple(float(v) for v in np.percentile(total, qs)),
+    )
+
+
+def _simulate_python(model, ranges, names, items, quantities, groups,
+                     group_names, samples, method, seed, percentiles):
+    rng = random.Random(seed)
+    bounds = [ranges[item] for item in items]
+    pert = [_pert_params(*b) for b in bounds] if method == PERT else None
+    col = dict((item, j) for j, item in enumerate(items))
+    sparse = [
+        (name, model.costs[name].constant,
+         [(col[item], w) for item, w in model.costs[name].weights.items()],
+         quantities.get(name), groups.get(name, ""))
+        for name in names
+    ]
+
+    rate_draws = dict((name, []) for name in names)
+    group_draws = dict((g, []) for g in group_names)
+    total_draws = []
+    for _ in range(samples):
+        if pert is None:
+            draw = [_triangular_ppf(rng.random(), *b) for b in bounds]
+        else:
+            draw = [
+                low + rng.betavariate(a, b) * (high - low)
+                for (low, _mode, high), (a, b) in zip(bounds, pert)
+            ]
+        amounts = dict((g, 0.0) for g in group_names)
+        for name, constant, row, qty, group in sparse:
+            rate = constant
+            for j, w in row:
+                rate += w * draw[j]
+            rate_draws[name].append(rate)
+            if qty:
+                amounts[group] += rate * qty
+        for g, value in amounts.items():
+            group_draws[g].append(value)
+        total_draws.append(sum(amounts.values()))
+
+    def pct(values):
+        values.sort()
+        return tuple(_percentile(values, q) for q in percentiles)
+
+    return (
+        dict((name, pct(v)) for name, v in rate_draws.items()),
+        dict((g, pct(v)) for g, v in group_draws.items()),
+        pct(total_draws),
+    )
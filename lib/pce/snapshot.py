@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Price book and recipe snapshot stored in the Revit model.
+
+Apply Rate can store the price view it used (every layer merged into
+one book, the recipe rows and the component aliases) on a
+``DataStorage`` element, with a content hash of the source files and
+the scenario it was stored for. Anyone who opens or syncs the model can
+then price from the snapshot instead of their own extension folder, so
+every workstation prices identically and the network share is not read.
+
+The snapshot is written only when the hash of the source files differs
+from the stored one; storing the same files for another scenario only
+rewrites the scenario field. Reading it compiles the book once per hash into the
+per-user cache (``pce.pricebook`` format), so later runs memory-map the
+cached file and only read the small hash field from the model.
+
+The Revit API is imported when the storage functions are called.
+"""
+import base64
+import datetime
+import hashlib
+import json
+import math
+import os
+import zlib
+
+from pce import csvutil, layers, paths, pricebook
+from pce import recipes as recipe_loader
+
+SCHEMA_GUID = "6f0b2d1e-8c47-4a3e-9d55-3b7a1c2e9f40"
+SCHEMA_NAME = "PyCostEstimatesPriceSnapshot"
+FORMAT_VERSION = 1
+
+HASH_FIELD = "Hash"
+SCENARIO_FIELD = "Scenario"
+CREATED_FIELD = "Created"
+PAYLOAD_FIELD = "Payload"
+
+LAYER_NAME = "model snapshot"
+RECIPES_EXT = ".recipes.json"
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def source_hash(files):
+    """
+    Content hash of the files a snapshot is built from.
+
+    Hashes names and bytes, not paths or times, so the same CSVs give
+    the same hash on every workstation. Missing files are skipped.
+    """
+    digest = hashlib.sha1()
+    for path in files:
+        if not path or not os.path.exists(path):
+            continue
+        digest.update(os.path.basename(path).lower().encode("utf-8") + b"\x00")
+        with open(path, "rb") as f:
+            digest.update(f.read())
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def source_files(project_csv=None, recipes_csv=None, aliases_csv=None):
+    """Price layer files, recipes and aliases a snapshot depends on."""
+    files = [path for _kind, path in layers.layer_files(project_csv=project_csv)]
+    files.append(recipes_csv or paths.RECIPES_CSV)
+    files.append(aliases_csv or paths.ALIASES_CSV)
+    return files
+
+
+class Snapshot(object):
+    """One stored price view: merged book, recipe rows and aliases."""
+
+    def __init__(self, content_hash, scenario, created, book, recipe_rows,
+                 aliases):
+        self.hash = content_hash
+        self.scenario = scenario
+        self.created = created
+        self.book = book                # pricebook.CompiledBook
+        self.recipe_rows = recipe_rows  # recipes.csv rows, header first
+        self.aliases = aliases          # component -> item
+
+    @classmethod
+    def build(cls, book, recipe_rows, aliases, scenario, content_hash):
+        """Snapshot of an open (layered) price book."""
+        columns = list(book.columns)
+        matrix = [list(book.column(c)) for c in columns]
+        compiled = pricebook.CompiledBook(
+            list(book.items), list(book.uoms), columns, matrix, list(book.report)
+        )
+        return cls(
+            content_hash, scenario,
+            datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
+            compiled, [list(r) for r in recipe_rows], dict(aliases),
+        )
+
+    # -- payload ----------------------------------------------------------
+    def to_payload(self):
+        book = self.book
+        data = {
+            "version": FORMAT_VERSION,
+            "items": book.items,
+            "uoms": book.uoms,
+            "columns": book.columns,
+            "matrix": [[None if math.isnan(v) else v for v in col]
+                       for col in book.matrix],
+            "report": book.report,
+            "recipes": self.recipe_rows,
+            "aliases": self.aliases,
+        }
+        raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        return base64.b64encode(zlib.compress(raw, 9)).decode("ascii")
+
+    @classmethod
+    def from_payload(cls, content_hash, scenario, created, payload):
+        try:
+            raw = zlib.decompress(base64.b64decode(payload))
+            data = json.loads(raw.decode("utf-8"))
+        except (ValueError, TypeError, zlib.error) as ex:
+            raise SnapshotError("Price snapshot in the model is unreadable: {}".format(ex))
+        if data.get("version") != FORMAT_VERSION:
+            raise SnapshotError(
+                "Price snapshot format {} is not supported by this version "
+                "of the extension".format(data.get("version"))
+            )
+        nan = float("nan")
+        matrix = [[nan if v is None else v for v in col] for col in data["matrix"]]
+        book = pricebook.CompiledBook(
+            data["items"], data["uoms"], data["columns"], matrix, data["report"]
+        )
+        return cls(content_hash, scenario, created, book, data["recipes"],
+                   data["aliases"])
+
+    def label(self):
+        return u"{} ({}, stored {}, {})".format(
+            LAYER_NAME, self.scenario, self.created, self.hash[:8]
+        )
+
+
+# ---------------------------------------------------------------------
+# Per-user cache of opened snapshots
+# ---------------------------------------------------------------------
+def _cache_paths(content_hash, cache_dir=None):
+    cache_dir = cache_dir or paths.user_cache_dir("snapshots")
+    base = os.path.join(cache_dir, content_hash)
+    return base + pricebook.CACHE_EXT, base + RECIPES_EXT
+
+
+def is_cached(content_hash, cache_dir=None):
+    return all(os.path.exists(p) for p in _cache_paths(content_hash, cache_dir))
+
+
+def cache(snap, cache_dir=None):
+    """Write ``snap`` into the per-user cache (keyed on its hash)."""
+    book_path, recipes_path = _cache_paths(snap.hash, cache_dir)
+    source = {"snapshot": snap.hash}
+    pricebook.write_compiled(book_path, snap.book, source)
+    csvutil.write_json(recipes_path, {
+        "recipes": snap.recipe_rows, "aliases": snap.aliases,
+    })
+
+
+def open_cached(header, cache_dir=None):
+    """
+    ``(LayeredBook, RecipeBook, aliases)`` of a cached snapshot.
+
+    ``header`` is ``(hash, scenario, created)`` as returned by
+    ``read_header``. The book is a single layer named after the
+    snapshot; close it when done.
+    """
+    content_hash, scenario, created = header
+    book_path, _recipes_path = _cache_paths(content_hash, cache_dir)
+    recipe_book, aliases = _open_recipes(content_hash, cache_dir)
+    name = Snapshot(content_hash, scenario, created, None, None, None).label()
+    book = pricebook.PriceBook(book_path)
+    return (
+        layers.LayeredBook([layers.Layer(name, layers.BASE, book_path, book)]),
+        recipe_book,
+        aliases,
+    )
+
+
+def _open_recipes(content_hash, cache_dir=None):
+    """``(RecipeBook, aliases)`` of a cached snapshot."""
+    _book_path, recipes_path = _cache_paths(content_hash, cache_dir)
+    with open(recipes_path, "rb") as f:
+        data = json.loads(f.read().decode("utf-8"))
+    recipe_book = recipe_loader.parse_rows(
+        data["recipes"], {"snapshot": content_hash}, LAYER_NAME
+    )
+    return recipe_book, data["aliases"]
+
+
+# ---------------------------------------------------------------------
+# Extensible Storage
+# ---------------------------------------------------------------------
+def _schema():
+    """The snapshot schema, created in this session if needed."""
+    from System import Guid, String
+    from pyrevit import DB
+
+    storage = DB.ExtensibleStorage
+    guid = Guid(SCHEMA_GUID)
+    schema = storage.Schema.Lookup(guid)
+    if schema is not None:
+        return schema
+    builder = storage.SchemaBuilder(guid)
+    builder.SetSchemaName(SCHEMA_NAME)
+    builder.SetReadAccessLevel(storage.AccessLevel.Public)
+    builder.SetWriteAccessLevel(storage.AccessLevel.Public)
+    builder.SetDocumentation("PyCostEstimates price book and recipe snapshot")
+    for field in (HASH_FIELD, SCENARIO_FIELD, CREATED_FIELD, PAYLOAD_FIELD):
+        builder.AddSimpleField(field, String)
+    return builder.Finish()
+
+
+def _storage(doc, schema):
+    """``(DataStorage, Entity)`` holding the snapshot, or ``(None, None)``."""
+    from pyrevit import DB
+
+    collector = DB.FilteredElementCollector(doc).OfClass(
+        DB.ExtensibleStorage.DataStorage
+    )
+    for element in collector:
+        entity = element.GetEntity(schema)
+        if entity is not None and entity.IsValid():
+            return element, entity
+    return None, None
+
+
+def _get(entity, field):
+    from System import String
+    return entity.Get[String](field) or u""
+
+
+def read_header(doc):
+    """``(hash, scenario, created)`` of the model's snapshot, or None."""
+    from System import Guid
+    from pyrevit import DB
+
+    schema = DB.ExtensibleStorage.Schema.Lookup(Guid(SCHEMA_GUID))
+    if schema is None:
+        return None
+    _element, entity = _storage(doc, schema)
+    if entity is None:
+        return None
+    return (_get(entity, HASH_FIELD), _get(entity, SCENARIO_FIELD),
+            _get(entity, CREATED_FIELD))
+
+
+def load(doc, cache_dir=None):
+    """
+    Open the model's snapshot (see ``open_cached``), or None if the
+    model has none. The payload is read from the model only the first
+    time a workstation sees a given hash.
+    """
+    header = _cached_header(doc, cache_dir)
+    if header is None:
+        return None
+    return open_cached(header, cache_dir)
+
+
+def load_recipes(doc, cache_dir=None):
+    """
+    ``(hash, RecipeBook)`` of the model's snapshot without opening its
+    price book, or None if the model has none.
+    """
+    header = _cached_header(doc, cache_dir)
+    if header is None:
+        return None
+    return header[0], _open_recipes(header[0], cache_dir)[0]
+
+
+def _cached_header(doc, cache_dir=None):
+    """The snapshot header, its payload cached first; None without one."""
+    header = read_header(doc)
+    if header is None:
+        return None
+    if not is_cached(header[0], cache_dir):
+        schema = _schema()
+        _element, entity = _storage(doc, schema)
+        snap = Snapshot.from_payload(
+            header[0], header[1], header[2], _get(entity, PAYLOAD_FIELD)
+        )
+        cache(snap, cache_dir)
+    return header
+
+
+def store(doc, snap):
+    """
+    Write ``snap`` to the model; call inside a transaction. When the
+    stored hash already matches only a changed scenario is written (the
+    payload is the same); returns False when nothing was written.
+    """
+    from System import String
+    from pyrevit import DB
+
+    schema = _schema()
+    element, entity = _storage(doc, schema)
+    if entity is not None and _get(entity, HASH_FIELD) == snap.hash:
+        if _get(entity, SCENARIO_FIELD) == snap.scenario:
+            return False
+        entity.Set[String](SCENARIO_FIELD, snap.scenario)
+        element.SetEntity(entity)
+        return True
+    if element is None:
+        element = DB.ExtensibleStorage.DataStorage.Create(doc)
+    entity = DB.ExtensibleStorage.Entity(schema)
+    entity.Set[String](HASH_FIELD, snap.hash)
+    entity.Set[String](SCENARIO_FIELD, snap.scenario)
+    entity.Set[String](CREATED_FIELD, snap.created)
+    entity.Set[String](PAYLOAD_FIELD, snap.to_payload())
+    element.SetEntity(entity)
+    try:
+        cache(snap)
+    except (IOError, OSError):
+        pass
+    return True
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Worksharing-aware writes.
+
+In a workshared model every element a tool writes is borrowed from
+central, and a write to an element a colleague owns (or that changed in
+central since the last reload) fails. ``partition`` checks the elements
+a run is about to write, before any transaction, and splits them into
+available and blocked; the available ones that are not yet borrowed
+are checked out in one ``CheckoutElements`` call instead of one borrow
+per ``Set``. Only writes that change a value should be partitioned, so
+unchanged elements are never borrowed.
+
+Blocked elements are reported per owner. Update Amount keeps them in a
+``BlockedQueue`` for a later retry pass; Apply Rate leaves blocked
+types out of its incremental state, so its next run re-prices them.
+The Revit API is imported when called.
+"""
+import hashlib
+import json
+import os
+
+from pce import csvutil, paths
+
+QUEUE_VERSION = 1
+
+OWNED = "owned by another user"
+UPDATED_IN_CENTRAL = "changed in central - reload latest"
+DELETED_IN_CENTRAL = "deleted in central - reload latest"
+NOT_BORROWED = "could not be borrowed"
+
+
+class Partition(object):
+    def __init__(self):
+        self.available = []     # ElementIds
+        self.blocked = {}       # element id -> (owner, reason)
+
+    def block(self, element_id, owner, reason):
+        self.blocked[element_id] = (owner or u"", reason)
+
+    def is_blocked(self, element_id):
+        return element_id in self.blocked
+
+
+def by_owner(blocked):
+    """
+    ``[(label, [element ids]), ...]`` for ``element id -> (owner,
+    reason)``, largest group first; the label is the owner, or the
+    reason when nobody owns the elements.
+    """
+    groups = {}
+    for element_id, (owner, reason) in blocked.items():
+        label = owner if owner and reason in (OWNED, NOT_BORROWED) else reason
+        groups.setdefault(label, []).append(element_id)
+    return sorted(
+        ((label, sorted(ids)) for label, ids in groups.items()),
+        key=lambda kv: (-len(kv[1]), kv[0]),
+    )
+
+
+def _owner(doc, element_id):
+    from pyrevit import DB
+
+    try:
+        return DB.WorksharingUtils.GetWorksharingTooltipInfo(doc, element_id).Owner
+    except Exception:
+        return u""
+
+
+def partition(doc, element_ids, borrow=True):
+    """
+    Split ``element_ids`` into available and blocked for writing.
+
+    With ``borrow`` the available elements not yet owned are checked
+    out together; call it with no transaction open. Without it (inside
+    a transaction, e.g. from an updater) they are left to be borrowed
+    by the write. Everything is available in a model that is not
+    workshared.
+    """
+    from pyrevit import DB
+
+    result = Partition()
+    element_ids = list(element_ids)
+    if not doc.IsWorkshared:
+        result.available = element_ids
+        return result
+
+    utils = DB.WorksharingUtils
+    to_borrow = []
+    for element_id in element_ids:
+        updates = utils.GetModelUpdatesStatus(doc, element_id)
+        if updates == DB.ModelUpdatesStatus.UpdatedInCentral:
+            result.block(element_id.IntegerValue, u"", UPDATED_IN_CENTRAL)
+            continue
+        if updates == DB.ModelUpdatesStatus.DeletedInCentral:
+            result.block(element_id.IntegerValue, u"", DELETED_IN_CENTRAL)
+            continue
+
+        status = utils.GetCheckoutStatus(doc, element_id)
+        if status == DB.CheckoutStatus.OwnedByOtherUser:
+            result.block(element_id.IntegerValue, _owner(doc, element_id), OWNED)
+        elif status == DB.CheckoutStatus.OwnedByCurrentUser or not borrow:
+            result.available.append(element_id)
+        else:
+            to_borrow.append(element_id)
+
+    if to_borrow:
+        from System.Collections.Generic import List
+
+        borrowed = set(
+            e.IntegerValue for e in
+            utils.CheckoutElements(doc, List[DB.ElementId](to_borrow))
+        )
+        for element_id in to_borrow:
+            if element_id.IntegerValue in borrowed:
+                result.available.append(element_id)
+            else:
+                result.block(element_id.IntegerValue,
+                             _owner(doc, element_id), NOT_BORROWED)
+    return result
+
+
+def hold_blocked(doc, plan):
+    """
+    Take the writes of a ``plan.ChangePlan`` whose element is blocked
+    out of ``plan.writes`` into ``plan.blocked`` as ``(write, owner,
+    reason)``; the rest are borrowed. Returns the ``Partition``.
+    """
+    ids = {}
+    for w in plan.writes:
+        element_id = w.target.Element.Id
+        ids.setdefault(element_id.IntegerValue, element_id)
+    result = partition(doc, ids.values())
+    if result.blocked:
+        keep = []
+        for w in plan.writes:
+            held = result.blocked.get(w.target.Element.Id.IntegerValue)
+            if held:
+                plan.blocked.append((w, held[0], held[1]))
+            else:
+                keep.append(w)
+        plan.writes = keep
+    return result
+
+
+# ---------------------------------------------------------------------
+# Retry queue
+# ---------------------------------------------------------------------
+class BlockedQueue(object):
+    """Element ids a run could not write, per model, for a retry pass."""
+
+    def __init__(self, blocked=None):
+        self.blocked = blocked or {}    # element id -> (owner, reason)
+
+    def __len__(self):
+        return len(self.blocked)
+
+    def done(self, element_ids):
+        """Forget elements that were written or needed no write."""
+        for element_id in element_ids:
+            self.blocked.pop(element_id, None)
+
+    def add(self, blocked):
+        self.blocked.update(blocked)
+
+    @staticmethod
+    def path_for(doc_key, state_dir=None):
+        state_dir = state_dir or paths.user_cache_dir("blocked")
+        name = hashlib.sha1(doc_key.encode("utf-8")).hexdigest()[:16] + ".json"
+        return os.path.join(state_dir, name)
+
+    @classmethod
+    def load(cls, doc_key, state_dir=None):
+        path = cls.path_for(doc_key, state_dir)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return cls()
+        if data.get("version") != QUEUE_VERSION or data.get("doc") != doc_key:
+            return cls()
+        return cls(dict(
+            (int(element_id), tuple(entry))
+            for element_id, entry in data.get("blocked", {}).items()
+        ))
+
+    def save(self, doc_key, state_dir=None):
+        path = self.path_for(doc_key, state_dir)
+        if not self.blocked:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        csvutil.write_json(path, {
+            "version": QUEUE_VERSION,
+            "doc": doc_key,
+            "blocked": dict(
+                (str(element_id), list(entry))
+                for element_id, entry in self.blocked.items()
+            ),
+        })
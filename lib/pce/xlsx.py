@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming reader for ``.xlsx`` workbooks.
+
+A workbook is a zip of XML parts. Sheets are read row by row with
+``iterparse`` straight from the zip member, and every row element is
+cleared once it has been handed out, so memory stays bounded by the
+widest row plus the shared string table however many sheets the
+workbook has. Only cached cell values and formula text are read;
+nothing is recalculated.
+"""
+import posixpath
+import re
+import zipfile
+from collections import OrderedDict
+
+try:
+    from xml.etree import cElementTree as ET
+except ImportError:
+    from xml.etree import ElementTree as ET
+
+NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_DOC_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_REF = re.compile(r"^\$?([A-Z]{1,3})\$?(\d+)$")
+
+
+class XlsxError(Exception):
+    pass
+
+
+def column_index(letters):
+    """``"A"`` -> 0, ``"AB"`` -> 27."""
+    n = 0
+    for c in letters:
+        n = n * 26 + ord(c) - 64
+    return n - 1
+
+
+def column_letters(index):
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def split_ref(ref):
+    """``"C15"`` -> ``(2, 15)`` (0-based column, 1-based row)."""
+    m = _REF.match(ref or "")
+    if not m:
+        raise XlsxError("Not a cell reference: {}".format(ref))
+    return column_index(m.group(1)), int(m.group(2))
+
+
+class Cell(object):
+    __slots__ = ("col", "row", "value", "formula")
+
+    def __init__(self, col, row, value, formula):
+        self.col = col          # 0-based column
+        self.row = row          # 1-based row
+        self.value = value      # float, text or None
+        self.formula = formula  # formula text ("" for shared formula copies)
+
+    @property
+    def ref(self):
+        return "{}{}".format(column_letters(self.col), self.row)
+
+    @property
+    def is_number(self):
+        return isinstance(self.value, float)
+
+    @property
+    def is_text(self):
+        return self.value is not None and not isinstance(self.value, float)
+
+
+class Workbook(object):
+    """Sheets of one workbook, read on demand."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            self._zip = zipfile.ZipFile(path)
+        except (IOError, OSError, zipfile.BadZipfile) as ex:
+            raise XlsxError("Cannot open workbook {}: {}".format(path, ex))
+        self._strings = None
+        self.sheets = self._sheet_parts()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    def _events(self, part, events=("end",)):
+        try:
+            stream = self._zip.open(part)
+        except KeyError:
+            raise XlsxError("Workbook part missing: {}".format(part))
+        try:
+            for event, elem in ET.iterparse(stream, events):
+                yield event, elem
+        finally:
+            stream.close()
+
+    def _sheet_parts(self):
+        targets = {}
+        for _, elem in self._events("xl/_rels/workbook.xml.rels"):
+            if elem.tag == NS_PKG_REL + "Relationship":
+                target = elem.get("Target")
+                if target.startswith("/"):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join("xl", target))
+                targets[elem.get("Id")] = target
+        sheets = OrderedDict()
+        for _, elem in self._events("xl/workbook.xml"):
+            if elem.tag == NS + "sheet":
+                part = targets.get(elem.get(NS_DOC_REL + "id"))
+                if part:
+                    sheets[elem.get("name")] = part
+            elif elem.tag == NS + "definedNames":
+                elem.clear()
+        return sheets
+
+    def strings(self):
+        """The shared string table (read once)."""
+        if self._strings is None:
+            strings = []
+            if "xl/sharedStrings.xml" in self._zip.namelist():
+                for _, elem in self._events("xl/sharedStrings.xml"):
+                    if elem.tag == NS + "si":
+                        strings.append(u"".join(
+                            t.text or u"" for t in elem.iter(NS + "t")
+                        ))
+                        elem.clear()
+            self._strings = strings
+        return self._strings
+
+    def rows(self, sheet):
+        """Yield ``(row number, [Cell, ...])`` for every non-empty row."""
+        part = self.sheets.get(sheet)
+        if part is None:
+            raise XlsxError("No sheet named '{}' in {}".format(sheet, self.path))
+        strings = self.strings()
+        sheet_data = None
+        last_row = 0
+        for event, elem in self._events(part, ("start", "end")):
+            if event == "start":
+                if elem.tag == NS + "sheetData":
+                    sheet_data = elem
+                continue
+            if elem.tag != NS + "row":
+                continue
+            row_number = int(elem.get("r") or last_row + 1)
+            last_row = row_number
+            cells = []
+            col = -1
+            for c in elem.iter(NS + "c"):
+                ref = c.get("r")
+                col = split_ref(ref)[0] if ref else col + 1
+                value = _value(c, strings)
+                f = c.find(NS + "f")
+                formula = None if f is None else (f.text or "")
+                if value is None and formula is None:
+                    continue
+                cells.append(Cell(col, row_number, value, formula))
+            elem.clear()
+            if sheet_data is not None:
+                sheet_data.clear()   # drop the rows handed out so far
+            if cells:
+                yield row_number, cells
+
+
+def _value(c, strings):
+    kind = c.get("t")
+    if kind == "inlineStr":
+        return u"".join(t.text or u"" for t in c.iter(NS + "t")) or None
+    v = c.find(NS + "v")
+    if v is None or v.text is None:
+        return None
+    if kind == "s":
+        return strings[int(v.text)]
+    if kind in ("str", "e"):
+        return v.text if kind == "str" else None
+    try:
+        return float(v.text)
+    except ValueError:
+        return None
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures for the ``pce`` library tests.
+
+The tests run under CPython with ``lib`` on the path, the way pyRevit
+adds it for the extension. The Revit API is not available: the few
+tests that reach it (e.g. the model snapshot storage) use small
+stand-ins for the calls they make.
+"""
+import io
+import os
+import sys
+
+import pytest
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib")
+if LIB not in sys.path:
+    sys.path.insert(0, LIB)
+
+
+RECIPE_HEADER = (
+    u"Type,Component,Labour/Transport/Wastage/Profit,"
+    u"Labour/Transport/Plant_Fixed,Time/Distance,Rate,Quantity,BOQ UoM\n"
+)
+
+
+def write_csv(path, text):
+    """Write ``text`` (a CSV body, one row per line) and return ``path``."""
+    with io.open(str(path), "w", encoding="utf-8", newline="") as f:
+        f.write(text.lstrip())
+    return str(path)
+
+
+def write_recipes(path, body):
+    """Write a ``recipes.csv`` with the usual header and return ``path``."""
+    return write_csv(path, RECIPE_HEADER + body.lstrip())
+
+
+def load_recipes(tmp_path, body):
+    from pce import recipes
+
+    return recipes.load(write_recipes(tmp_path / "recipes.csv", body))
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    path = tmp_path / "cache"
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def price_csv(tmp_path):
+    """A small base price book: two provinces and National, Min/Avg/Max."""
+    return write_csv(tmp_path / "material_unit_costs.csv", u"""
+Item,UoM,Lusaka_Min_UnitCost,Lusaka_Avg_UnitCost,Lusaka_Max_UnitCost,Central_Min_UnitCost,Central_Avg_UnitCost,Central_Max_UnitCost,National_Min_UnitCost,National_Avg_UnitCost,National_Max_UnitCost
+Cement,Bag,90,100,110,95,105,115,92,102,112
+Sand,m3,40,50,60,,,,45,55,65
+Stone,m3,200,250,300,,,,,,
+""")
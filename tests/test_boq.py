@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from pce import boq, cli, csvutil, engine, layers
+
+from conftest import load_recipes, write_recipes
+
+RECIPES = u"""
+Mortar,Cement,,,,,1,m3
+Mortar,Sand,,,,,2,
+Slab,Stone,,,,,1,m3
+Footing {w}x{t},Cement,,,,,=w*t,m
+"""
+
+
+@pytest.fixture
+def rows():
+    return [
+        boq.QuantityRow(u"Mortar", u"Masonry", uom=u"m2", quantity=2.0, rate=1.0, count=3),
+        boq.QuantityRow(u"Slab", u"Concrete", uom=u"m3", quantity=4.0, rate=90.0),
+        boq.QuantityRow(u"Footing 2x3", u"Concrete", uom=u"m", quantity=10.0),
+        boq.QuantityRow(u"Door", u"Doors", uom=u"No.", quantity=5.0),
+    ]
+
+
+@pytest.fixture
+def local_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path / "localappdata"))
+
+
+def _cli_args(tmp_path, price_csv):
+    suppliers = tmp_path / "suppliers"
+    suppliers.mkdir()
+    return [
+        "--prices", price_csv, "--suppliers", str(suppliers),
+        "--recipes", write_recipes(tmp_path / "recipes.csv", RECIPES),
+        "--aliases", str(tmp_path / "aliases.csv"),
+    ]
+
+
+def test_snapshot_round_trip(tmp_path, rows):
+    assert boq.snapshot_path(u"C:\\Models\\Clinic.rvt").endswith(u"Clinic_quantities.json")
+    assert boq.snapshot_path(u"") is None
+    path = str(tmp_path / "Clinic_quantities.json")
+    boq.write_snapshot(path, rows, u"Clinic")
+    meta, loaded = boq.load_snapshot(path)
+    assert meta["model"] == u"Clinic"
+    assert [r.to_dict() for r in loaded] == [r.to_dict() for r in rows]
+
+
+def test_bad_snapshots_are_reported(tmp_path):
+    path = tmp_path / "q.json"
+    path.write_text(u'{"version": 2, "rows": []}')
+    with pytest.raises(boq.BoqError):
+        boq.load_snapshot(str(path))
+    path.write_text(u'{"version": 1, "rows": [{"type": "A", "colour": "red"}]}')
+    with pytest.raises(boq.BoqError):
+        boq.load_snapshot(str(path))
+    with pytest.raises(boq.BoqError):
+        boq.load_snapshot(str(tmp_path / "missing.json"))
+
+
+def test_price_from_recipes_or_model_rates(tmp_path, price_csv, cache_dir, rows):
+    recipe_book = load_recipes(tmp_path, RECIPES)
+    recipe_book.expand([r.type for r in rows])
+    suppliers = tmp_path / "suppliers"
+    suppliers.mkdir()
+    book = layers.load(price_csv, str(suppliers), cache_dir=cache_dir)
+    try:
+        table = engine.evaluate(book, recipe_book, ["Central_Avg_UnitCost"])
+    finally:
+        book.close()
+
+    lines = dict((l.type, l) for l in boq.price(
+        rows, table, "Central_Avg_UnitCost", recipe_book
+    ))
+    mortar = lines[u"Mortar"]
+    assert (mortar.source, mortar.uom, mortar.rate) == (boq.RECIPES, u"m3", 105 + 2 * 55)
+    assert mortar.amount == pytest.approx(2 * 215)
+    assert lines[u"Footing 2x3"].rate == pytest.approx(6 * 105)
+    # No Stone price in Central: the model's rate is kept, with the reason
+    slab = lines[u"Slab"]
+    assert (slab.source, slab.rate) == (boq.MODEL, 90.0)
+    assert slab.note == u"missing price: Stone"
+    door = lines[u"Door"]
+    assert (door.source, door.rate, door.amount, door.note) == (
+        boq.UNPRICED, None, 0.0, u"no recipe"
+    )
+
+
+def test_model_rates_without_a_table(rows):
+    lines = boq.price(rows)
+    assert [l.source for l in lines] == [boq.MODEL, boq.MODEL, boq.UNPRICED, boq.UNPRICED]
+    assert list(boq.sections(lines)) == [u"Concrete", u"Doors", u"Masonry"]
+
+
+def test_render_csv_totals_every_section(tmp_path, rows):
+    path = str(tmp_path / "boq.csv")
+    total = boq.render(path, boq.price(rows), u"BOQ")
+    assert total == pytest.approx(2.0 + 360.0)
+    table = csvutil.read_rows(path)
+    assert [u"", u"Total Concrete", u"", u"", u"", u"360.00"] in table
+    assert table[-1][1:] == [u"GRAND TOTAL", u"", u"", u"", u"362.00"]
+    with pytest.raises(boq.BoqError):
+        boq.render(str(tmp_path / "boq.pdf"), [], u"BOQ")
+
+
+def test_cli_prices_one_scenario(tmp_path, price_csv, local_cache):
+    out = str(tmp_path / "rates.csv")
+    code = cli.main(["price", "--province", "Central", "--basis", "Avg",
+                     "-o", out] + _cli_args(tmp_path, price_csv))
+    assert code == 0
+    table = dict((row[0], row) for row in csvutil.read_rows(out)[1:])
+    assert table[u"Mortar"][8] == u"215.00"
+    assert table[u"Mortar"][9] == u"yes"            # Sand from National
+    assert table[u"Slab"][10] == u"Stone"
+
+
+def test_cli_renders_a_boq(tmp_path, price_csv, rows, local_cache, capsys):
+    snapshot = str(tmp_path / "Clinic_quantities.json")
+    boq.write_snapshot(snapshot, rows, u"Clinic")
+    out = str(tmp_path / "boq.csv")
+    code = cli.main(["boq", snapshot, "-o", out, "--province", "Central",
+                     "--basis", "Avg"] + _cli_args(tmp_path, price_csv))
+    assert code == 0
+    captured = capsys.readouterr()
+    assert u"4 line(s)" in captured.out
+    assert u"Door" in captured.err
+    assert csvutil.read_rows(out)[0] == [u"Bill of Quantities - Clinic [Central_Avg_UnitCost]"]
+
+
+def test_cli_reports_errors(tmp_path, capsys):
+    code = cli.main(["boq", str(tmp_path / "missing.json"), "-o", str(tmp_path / "b.csv")])
+    assert code == 1
+    assert capsys.readouterr().err.startswith("error:")
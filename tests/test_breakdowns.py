@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from pce import breakdowns
+
+from conftest import load_recipes
+
+PRICES = {"Cement": 100.0, "Sand": 50.0, "Brick": 2.0}
+UOMS = {"Cement": "Bag", "Sand": "m3", "Brick": "No."}
+
+
+@pytest.fixture
+def book(tmp_path):
+    return load_recipes(tmp_path, u"""
+Mortar,Cement,,,,,1,m3
+Mortar,Sand,,,,,2,
+Mortar,Labour Skilled,,20,,,,
+Wall,Recipe: Mortar,,,,,0.5,m2
+Wall,Brick,,,,,50,
+Wall,Profit and Overheads,10%,,,,,
+""")
+
+
+def test_scenario_key():
+    assert breakdowns.scenario_key("Lusaka_Avg_UnitCost") == "Lusaka_Avg_UnitCost"
+    assert (breakdowns.scenario_key("Lusaka_Avg_UnitCost", "2025-01-31")
+            == "Lusaka_Avg_UnitCost@2025-01-31")
+
+
+def test_priced_materials_expand_sub_recipes(book):
+    assert breakdowns.priced_materials(book, "Wall", PRICES, UOMS) == [
+        ("Brick", "No.", 50.0, 2.0),
+        ("Cement", "Bag", 0.5, 100.0),
+        ("Sand", "m3", 1.0, 50.0),
+    ]
+
+
+def test_store_round_trip(tmp_path, book):
+    mortar = book["Mortar"].breakdown(200.0)
+    store = breakdowns.BreakdownStore()
+    store.put("Lusaka_Avg_UnitCost", "uid-1", "Mortar", "m3", mortar,
+              breakdowns.priced_materials(book, "Mortar", PRICES, UOMS))
+    store.put("Lusaka_Avg_UnitCost", "uid-2", "Mortar", "m3", mortar, [])
+    store.current = "Lusaka_Avg_UnitCost"
+    store.save(u"Clinic.rvt", str(tmp_path))
+
+    loaded = breakdowns.BreakdownStore.load(u"Clinic.rvt", str(tmp_path))
+    entry = loaded.get("Lusaka_Avg_UnitCost", "uid-1")
+    assert (entry.name, entry.uom) == ("Mortar", "m3")
+    assert entry.breakdown == mortar
+    assert entry.breakdown.total_cost == pytest.approx(220.0)
+    assert [(m.item, m.cost) for m in entry.materials] == [
+        ("Cement", 100.0), ("Sand", 100.0),
+    ]
+    assert len(loaded.types()) == 2
+    assert list(loaded.by_name()) == ["Mortar"]
+
+    loaded.remove("Lusaka_Avg_UnitCost", "uid-1")
+    assert loaded.get("Lusaka_Avg_UnitCost", "uid-1") is None
+    loaded.clear("Lusaka_Avg_UnitCost")
+    assert loaded.types() == []
+
+
+def test_missing_or_unreadable_store_is_empty(tmp_path):
+    assert breakdowns.BreakdownStore.load(u"Clinic.rvt", str(tmp_path)).scenarios == {}
+    path = breakdowns.BreakdownStore.path_for(u"Clinic.rvt", str(tmp_path))
+    with open(path, "w") as f:
+        f.write("{\"version\": 1, \"scen")
+    assert breakdowns.BreakdownStore.load(u"Clinic.rvt", str(tmp_path)).scenarios == {}
+
+
+def test_buildup_rows_show_sub_recipe_adders(book):
+    mortar = book["Mortar"].breakdown(200.0).total_cost
+    wall = breakdowns.TypeBreakdown(
+        "uid-3", "Wall", "m2", book["Wall"].breakdown(0.5 * mortar + 100.0),
+        [breakdowns.Material(*m)
+         for m in breakdowns.priced_materials(book, "Wall", PRICES, UOMS)],
+    )
+    rows = breakdowns.buildup_rows(wall)
+    labels = [row[0] for row in rows]
+    assert labels == ["Brick", "Cement", "Sand",
+                      "Sub-recipe labour, plant & profit", "Materials",
+                      "Profit & overheads", "Rate per m2"]
+    assert rows[3][4] == pytest.approx(10.0)   # half of the mortar's labour
+    assert rows[-1][4] == pytest.approx(wall.breakdown.total_cost)
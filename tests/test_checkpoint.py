@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import os
+
+from pce import checkpoint
+
+
+def test_chunks_cover_every_item_in_order():
+    assert list(checkpoint.chunks(list(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(checkpoint.chunks([], 2)) == []
+
+
+def test_advance_counts_every_outcome():
+    progress = checkpoint.AmountCheckpoint(total=10)
+    assert not progress.started
+    progress.advance(105, updated=3, unchanged=2, skipped=1, blocked=1)
+    progress.advance(230, updated=1, unchanged=0, skipped=0)
+    assert progress.started
+    assert progress.last_id == 230
+    assert (progress.updated, progress.unchanged, progress.skipped,
+            progress.blocked, progress.done) == (4, 2, 1, 1, 8)
+
+
+def test_save_load_and_clear(tmp_path):
+    state_dir = str(tmp_path)
+    progress = checkpoint.AmountCheckpoint(total=10)
+    progress.advance(105, 3, 2, 1)
+    progress.save(u"C:\\Projects\\Clinic.rvt", state_dir)
+
+    loaded = checkpoint.AmountCheckpoint.load(u"C:\\Projects\\Clinic.rvt", state_dir)
+    assert (loaded.last_id, loaded.done, loaded.total, loaded.updated) == (105, 6, 10, 3)
+    assert loaded.same_session
+    assert loaded.saved_at
+
+    # Another model does not pick it up
+    assert not checkpoint.AmountCheckpoint.load(u"Other.rvt", state_dir).started
+
+    checkpoint.AmountCheckpoint.clear(u"C:\\Projects\\Clinic.rvt", state_dir)
+    assert not checkpoint.AmountCheckpoint.load(
+        u"C:\\Projects\\Clinic.rvt", state_dir
+    ).started
+
+
+def test_checkpoint_of_another_session_is_not_the_same_session():
+    progress = checkpoint.AmountCheckpoint(last_id=1, pid=os.getpid() + 1)
+    assert progress.started
+    assert not progress.same_session
+
+
+def test_unreadable_checkpoint_starts_over(tmp_path):
+    path = checkpoint.AmountCheckpoint.path_for(u"Clinic.rvt", str(tmp_path))
+    with open(path, "w") as f:
+        f.write("{not json")
+    assert not checkpoint.AmountCheckpoint.load(u"Clinic.rvt", str(tmp_path)).started
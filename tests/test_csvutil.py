@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import pytest
+
+from pce import csvutil, resolve
+
+
+def test_parse_number():
+    assert csvutil.parse_number(u" 1,275.50 ") == 1275.5
+    assert csvutil.parse_number(u"-") is None
+    assert csvutil.parse_number(u"") is None
+    with pytest.raises(ValueError):
+        csvutil.parse_number(u"n/a")
+
+
+def test_write_rows_round_trip(tmp_path):
+    path = str(tmp_path / "rows.csv")
+    rows = [[u"Item", u"UoM"], [u'Pipe 1/2" , PVC', u"m"], []]
+    csvutil.write_rows(path, rows)
+    csvutil.write_rows(path, rows)      # replaces an existing file
+    assert csvutil.read_rows(path) == rows[:2] + [[]]
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_mixed_encodings_are_read_line_by_line(tmp_path):
+    path = str(tmp_path / "mixed.csv")
+    with open(path, "wb") as f:
+        f.write(u"Item\r\nCafé\r\n".encode("utf-8") + u"Naïve\r\n".encode("cp1252"))
+    assert csvutil.read_rows(path) == [[u"Item"], [u"Café"], [u"Naïve"]]
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = str(tmp_path / "state.json")
+    csvutil.write_json(path, {"version": 1})
+    with pytest.raises(RuntimeError):
+        with csvutil.open_atomic(path) as f:
+            f.write(b"{")
+            raise RuntimeError("disk full")
+    with open(path) as f:
+        assert json.load(f) == {"version": 1}
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_aliases_round_trip(tmp_path):
+    path = str(tmp_path / "aliases.csv")
+    aliases = {u"Cement, 50kg": u"Cement 42.5-50Kg", u"Sand": u"Building Sand"}
+    resolve.save_aliases(aliases, path)
+    assert resolve.load_aliases(path) == aliases
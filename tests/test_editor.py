@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from pce import editor, resolve
+
+from conftest import write_csv, write_recipes
+
+LUSAKA_AVG = "Lusaka_Avg_UnitCost"
+NATIONAL_AVG = "National_Avg_UnitCost"
+
+
+@pytest.fixture
+def sheets(tmp_path, price_csv):
+    recipes_csv = write_recipes(tmp_path / "recipes.csv", u"""
+Slab,Cement,,,,,2,m3
+Screed,Screed mix,,,,,1,m2
+""")
+    return editor.PriceSheet.load(price_csv), editor.RecipeSheet.load(recipes_csv)
+
+
+def live_pricing(prices, recipes, resolver):
+    price_map = {}
+    for n, _row in enumerate(prices.rows):
+        price_map[prices.item(n)] = prices.price(n, LUSAKA_AVG, NATIONAL_AVG)
+    return editor.LivePricing(recipes.book(resolver), price_map, {"Slab": 10.0})
+
+
+def test_price_edit_reprices_users(sheets):
+    prices, recipes = sheets
+    pricing = live_pricing(prices, recipes, resolve.Resolver(prices.items()))
+    prices.set(0, prices.column(LUSAKA_AVG), u"120")
+    assert pricing.set_price(u"Cement", prices.price(0, LUSAKA_AVG)) == set([u"Slab"])
+    assert pricing.changes() == [(u"Slab", 200.0, 240.0, 10.0, 400.0)]
+
+
+def test_added_item_resolves_after_the_resolver_is_rebuilt(sheets):
+    prices, recipes = sheets
+    pricing = live_pricing(prices, recipes, resolve.Resolver(prices.items()))
+    assert u"Screed" not in pricing.rates
+
+    n = prices.append()
+    prices.set(n, prices.item_col, u"Screed Mix")
+    prices.set(n, prices.column(LUSAKA_AVG), u"30")
+    assert u"Screed Mix" in prices.items()
+    pricing.set_price(u"Screed Mix", prices.price(n, LUSAKA_AVG))
+
+    resolver = resolve.Resolver(prices.items())
+    assert pricing.set_recipes(recipes.book(resolver)) == set([u"Screed"])
+    assert pricing.rates[u"Screed"] == pytest.approx(30.0)
+
+
+def test_deleted_rows_drop_out_of_the_items(sheets):
+    prices, _recipes = sheets
+    prices.delete(0)
+    assert u"Cement" not in prices.items()
+    assert prices.price(0, LUSAKA_AVG) is None
+
+
+def test_bad_price_cells_raise(tmp_path):
+    sheet = editor.PriceSheet.load(write_csv(tmp_path / "p.csv", u"""
+Item,UoM,Lusaka_Avg_UnitCost
+Cement,Bag,abc
+"""))
+    with pytest.raises(ValueError):
+        sheet.price(0, LUSAKA_AVG)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from pce import engine, linear, pricebook, recipes
+
+from conftest import load_recipes
+
+LUSAKA_AVG = "Lusaka_Avg_UnitCost"
+CENTRAL_AVG = "Central_Avg_UnitCost"
+COLUMNS = [LUSAKA_AVG, CENTRAL_AVG]
+
+
+@pytest.fixture
+def book(price_csv, cache_dir):
+    book = pricebook.load(price_csv, cache_dir)
+    yield book
+    book.close()
+
+
+def test_prices_materials_with_adders(tmp_path, book):
+    rb = load_recipes(tmp_path, u"""
+Slab,Cement,,,,,2,m3
+Slab,Sand,,,,,1,
+Slab,Labour,10%,,,,1,
+Slab,Labour Skilled,,20,,,,
+""")
+    table = engine.evaluate(book, rb, COLUMNS)
+    b = table.get("Slab", LUSAKA_AVG)
+    assert b.material_total == pytest.approx(250.0)
+    assert b.labour_cost == pytest.approx(45.0)
+    assert b.total_cost == pytest.approx(295.0)
+
+
+def test_national_fallback(tmp_path, book):
+    rb = load_recipes(tmp_path, u"Mortar,Sand,,,,,1,m3\n")
+    table = engine.evaluate(book, rb, COLUMNS)
+    assert table.get("Mortar", CENTRAL_AVG).total_cost == pytest.approx(55.0)
+    assert table.used_national("Mortar", CENTRAL_AVG)
+    assert not table.used_national("Mortar", LUSAKA_AVG)
+
+
+def test_missing_price_names_component(tmp_path, book):
+    rb = load_recipes(tmp_path, u"Footing,Stone,,,,,1,m3\n")
+    table = engine.evaluate(book, rb, COLUMNS)
+    assert table.get("Footing", CENTRAL_AVG) is None
+    assert table.missing("Footing", CENTRAL_AVG) == "Stone"
+
+
+def test_subrecipe_totals_are_reused(tmp_path, book):
+    rb = load_recipes(tmp_path, u"""
+Mix,Cement,,,,,1,m3
+Wall,Recipe: Mix,,,,,3,m2
+""")
+    table = engine.evaluate(book, rb, COLUMNS)
+    assert table.get("Wall", LUSAKA_AVG).total_cost == pytest.approx(300.0)
+
+
+def test_empty_recipe_is_unpriced(tmp_path, book):
+    rb = load_recipes(tmp_path, u"""
+Window,,,,,,,Each
+Door,Cement,,,,,1,Each
+""")
+    table = engine.evaluate(book, rb, COLUMNS)
+    assert table.get("Window", LUSAKA_AVG) is None
+    assert table.missing("Window", LUSAKA_AVG) == recipes.EMPTY_RECIPE
+    assert table.get("Door", LUSAKA_AVG).total_cost == pytest.approx(100.0)
+
+    model = linear.LinearModel(rb)
+    assert "Window" not in model
+    assert model.skipped["Window"] == recipes.EMPTY_RECIPE
+
+
+def test_labour_only_recipe_is_priced(tmp_path, book):
+    rb = load_recipes(tmp_path, u"Cleaning,Labour Skilled,,50,,,,m2\n")
+    table = engine.evaluate(book, rb, COLUMNS)
+    assert table.get("Cleaning", LUSAKA_AVG).total_cost == pytest.approx(50.0)
+
+
+def test_scenario_table_cache_round_trip(tmp_path, book, cache_dir):
+    rb = load_recipes(tmp_path, u"Door,Cement,,,,,1,Each\n")
+    first = engine.scenario_table(book, rb, cache_dir)
+    second = engine.scenario_table(book, rb, cache_dir)
+    assert second.get("Door", LUSAKA_AVG) == first.get("Door", LUSAKA_AVG)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from pce import incremental
+
+from conftest import load_recipes
+
+COLUMN = "Lusaka_Avg_UnitCost"
+TYPES = {"Wall": ["wall-1"], "Slab": ["slab-1", "slab-2"], "Mortar": []}
+
+
+@pytest.fixture
+def book(tmp_path):
+    return load_recipes(tmp_path, u"""
+Mortar,Cement,,,,,1,m3
+Wall,Recipe: Mortar,,,,,0.5,m2
+Wall,Brick,,,,,50,
+Slab,Cement,,,,,2,m3
+""")
+
+
+def applied(book, rows, prices):
+    return incremental.AppliedState(
+        COLUMN, incremental.recipe_fingerprints(book), rows, prices,
+        dict((name, ids) for name, ids in TYPES.items()),
+    )
+
+
+def test_price_change_reaches_users_through_subrecipes(book):
+    rows = {"Cement": "a", "Brick": "b"}
+    state = applied(book, rows, {"Cement": 100.0, "Brick": 2.0})
+    changes = incremental.diff(
+        state, COLUMN, book, {"Cement": "a2", "Brick": "b"},
+        {"Cement": 110.0, "Brick": 2.0}, TYPES,
+    )
+    assert not changes.full
+    assert set(changes.reasons) == set(["Mortar", "Wall", "Slab"])
+    assert changes.deltas == {"Cement": (100.0, 110.0)}
+    assert incremental.describe(changes.reasons["Slab"][0]) == \
+        u"Cement: 100.00 -> 110.00 (+10.00)"
+
+
+def test_row_edit_without_price_change_is_ignored(book):
+    state = applied(book, {"Cement": "a", "Brick": "b"}, {"Cement": 100.0, "Brick": 2.0})
+    changes = incremental.diff(
+        state, COLUMN, book, {"Cement": "a2", "Brick": "b"},
+        {"Cement": 100.0, "Brick": 2.0}, TYPES,
+    )
+    assert not changes.reasons
+
+
+def test_recipe_edit_and_new_types(book):
+    prices = {"Cement": 100.0, "Brick": 2.0}
+    rows = {"Cement": "a", "Brick": "b"}
+    state = applied(book, rows, prices)
+    book["Mortar"].materials["Cement"] = 2.0
+    types = dict(TYPES, Slab=["slab-1", "slab-2", "slab-3"])
+    changes = incremental.diff(state, COLUMN, book, rows, prices, types)
+    kinds = dict((name, reasons[0][0]) for name, reasons in changes.reasons.items())
+    assert kinds["Slab"] == "new type"
+    # the sub-recipe fingerprint flows into Wall's
+    assert kinds["Wall"] == "recipe"
+
+
+def test_column_change_reprices_everything(book):
+    state = applied(book, {}, {})
+    changes = incremental.diff(state, "Central_Avg_UnitCost", book, {}, {}, TYPES)
+    assert changes.full and changes.affects("Wall")
+
+
+def test_state_round_trip(tmp_path, book):
+    state = applied(book, {"Cement": "a"}, {"Cement": 100.0})
+    state.save("model.rvt", str(tmp_path))
+    loaded = incremental.AppliedState.load("model.rvt", str(tmp_path))
+    assert loaded.column == COLUMN
+    assert loaded.prices == {"Cement": 100.0}
+    assert incremental.AppliedState.load("other.rvt", str(tmp_path)).column is None
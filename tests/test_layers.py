@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from pce import layers
+
+from conftest import write_csv
+
+LUSAKA_AVG = "Lusaka_Avg_UnitCost"
+CENTRAL_AVG = "Central_Avg_UnitCost"
+NATIONAL_AVG = "National_Avg_UnitCost"
+
+
+@pytest.fixture
+def supplier_dir(tmp_path):
+    path = tmp_path / "material_costs"
+    path.mkdir()
+    write_csv(path / "supplier.csv", u"""
+Item,,UnitCost
+Cement,Bag,500
+Stone,m3,280
+Timber,m,30
+""")
+    return str(path)
+
+
+@pytest.fixture
+def book(price_csv, supplier_dir, cache_dir):
+    book = layers.load(price_csv, supplier_dir, None, cache_dir)
+    yield book
+    book.close()
+
+
+def test_flat_supplier_price_never_overrides_a_price(book):
+    assert book.price("Cement", LUSAKA_AVG) == 100
+    assert book.price("Cement", NATIONAL_AVG) == 102
+    assert book.suppliers(LUSAKA_AVG, NATIONAL_AVG)["Cement"].startswith(layers.BASE)
+
+
+def test_flat_supplier_price_fills_national_gaps(book):
+    # Stone has province prices only for Lusaka
+    assert book.price("Stone", LUSAKA_AVG) == 250
+    assert book.price("Stone", CENTRAL_AVG) is None
+    assert book.price("Stone", NATIONAL_AVG) == 280
+    # Items only a supplier sells are National prices
+    assert book.price("Timber", LUSAKA_AVG) is None
+    assert book.price("Timber", NATIONAL_AVG) == 30
+    owner = book.suppliers(CENTRAL_AVG, NATIONAL_AVG)
+    assert owner["Stone"].startswith(layers.SUPPLIER)
+    assert owner["Sand"].startswith(layers.BASE)
+
+
+def test_project_layer_overrides_every_column(tmp_path, price_csv, supplier_dir, cache_dir):
+    project = write_csv(tmp_path / "model_prices.csv", u"""
+Item,,UnitCost
+Cement,Bag,120
+""")
+    book = layers.load(price_csv, supplier_dir, project, cache_dir)
+    try:
+        assert book.price("Cement", LUSAKA_AVG) == 120
+        assert book.price("Cement", NATIONAL_AVG) == 120
+        assert book.suppliers(LUSAKA_AVG)["Cement"].startswith(layers.PROJECT)
+    finally:
+        book.close()
+
+
+def test_project_override_path():
+    assert layers.project_override_path(None) is None
+    assert layers.project_override_path(os.path.join("a", "Model.rvt")) == \
+        os.path.join("a", "Model_prices.csv")
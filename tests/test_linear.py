@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from pce import linear
+
+from conftest import load_recipes
+
+PRICES = {"Cement": 100.0, "Sand": 50.0, "Brick": 2.0}
+
+
+@pytest.fixture
+def book(tmp_path):
+    return load_recipes(tmp_path, u"""
+Mortar,Cement,,,,,1,m3
+Mortar,Sand,,,,,2,
+Mortar,Wastage,10%,,,,,
+Wall,Recipe: Mortar,,,,,0.5,m2
+Wall,Brick,,,,,50,
+Wall,Labour Skilled,,20,,,,
+""")
+
+
+def test_totals_match_the_breakdown(book):
+    model = linear.LinearModel(book)
+    totals = model.totals(PRICES)
+    mortar = book["Mortar"].breakdown(200.0).total_cost
+    assert totals["Mortar"] == pytest.approx(mortar)
+    assert totals["Wall"] == pytest.approx(
+        book["Wall"].breakdown(0.5 * mortar + 100.0).total_cost
+    )
+
+
+def test_what_if_only_touches_users_of_the_item(book):
+    model = linear.LinearModel(book)
+    result = model.what_if(PRICES, {"Brick": 0.5})
+    assert set(result) == set(["Wall"])
+    old, new = result["Wall"]
+    assert new - old == pytest.approx(50.0)
+
+
+def test_unpriced_recipes_are_left_out(book):
+    model = linear.LinearModel(book)
+    assert "Wall" not in model.totals({"Cement": 100.0, "Sand": 50.0})
+
+
+def test_update_recompiles_edited_recipes(book):
+    model = linear.LinearModel(book)
+    book["Mortar"].materials["Cement"] = 2.0
+    model.update(book, ["Mortar", "Wall"])
+    assert model.totals(PRICES)["Mortar"] == pytest.approx(book["Mortar"].breakdown(300.0).total_cost)
+
+
+def test_parse_shocks():
+    items = ["Cement 42.5-50Kg", "Fibercement board", "Sand"]
+    shocks, matches, problems = linear.parse_shocks(
+        u"cement +15%, Sand -5, steel +2%, nonsense", items
+    )
+    assert shocks == {"Cement 42.5-50Kg": pytest.approx(0.15), "Sand": pytest.approx(-0.05)}
+    assert len(matches) == 2
+    assert len(problems) == 2
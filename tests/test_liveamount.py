@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import sys
+import types
+
+import pytest
+
+from pce import liveamount, measure
+
+INVALID = -1
+WALLS = 10
+DOORS = 20
+FLOORS = 30
+
+
+class FakeCollector(object):
+    elements = []
+
+    def __init__(self, doc):
+        pass
+
+    def WherePasses(self, _filter):
+        return list(self.elements)
+
+
+@pytest.fixture(autouse=True)
+def revit(monkeypatch):
+    """Fake ``pyrevit.DB``; the costed-type filter is not needed."""
+    pyrevit = types.ModuleType("pyrevit")
+    pyrevit.DB = types.SimpleNamespace(
+        BuiltInParameter=types.SimpleNamespace(INVALID=INVALID, ALL_MODEL_COST=1),
+        BuiltInCategory=types.SimpleNamespace(**dict(
+            (name, n) for n, name in enumerate(sorted(measure.CATEGORY_METHODS), 1)
+        )),
+        FilteredElementCollector=FakeCollector,
+    )
+    monkeypatch.setitem(sys.modules, "pyrevit", pyrevit)
+    monkeypatch.setattr(liveamount, "_type_filter", lambda: None)
+    monkeypatch.setattr(liveamount, "_calculators", {})
+
+
+def _id(value):
+    return types.SimpleNamespace(IntegerValue=value)
+
+
+class FakeParam(object):
+    def __init__(self, param_id, bip=INVALID, guid=None):
+        self.Id = _id(param_id)
+        self.Definition = types.SimpleNamespace(Name=u"Cost", BuiltInParameter=bip)
+        self.IsShared = guid is not None
+        self.GUID = guid
+
+
+class FakeType(object):
+    def __init__(self, category, param=None):
+        self.Category = types.SimpleNamespace(Id=_id(category))
+        self.param = param
+        self.lookups = 0
+
+    def LookupParameter(self, name):
+        self.lookups += 1
+        return self.param
+
+    def get_Parameter(self, key):
+        return self.param
+
+
+class FakeDoc(object):
+    def __init__(self, code=1):
+        self.code = code
+        self.IsValidObject = True
+
+    def GetHashCode(self):
+        return self.code
+
+
+def test_quantity_parameters_cover_every_measured_built_in():
+    assert set(liveamount.QUANTITY_PARAMETERS) == set([
+        "HOST_VOLUME_COMPUTED", "HOST_AREA_COMPUTED", "CURVE_ELEM_LENGTH",
+        "INSTANCE_LENGTH_PARAM", "COLUMN_HEIGHT", "REBAR_ELEM_TOTAL_LENGTH",
+        "STRUCTURAL_MATERIAL_PARAM", "ELEM_TYPE_PARAM",
+    ])
+
+
+def test_cost_parameter_ids_resolve_once_per_category(monkeypatch):
+    second_wall = FakeType(WALLS, FakeParam(501, guid="g-1"))
+    monkeypatch.setattr(FakeCollector, "elements", [
+        FakeType(WALLS, FakeParam(501, guid="g-1")),
+        second_wall,
+        FakeType(DOORS, FakeParam(-1001, bip=1)),    # the built-in Cost
+        FakeType(FLOORS),                           # no Cost on this one
+        FakeType(FLOORS, FakeParam(502)),           # project parameter
+    ])
+    ids = liveamount.cost_parameter_ids(FakeDoc())
+    assert [i.IntegerValue for i in ids] == [501, 502]
+    assert second_wall.lookups == 0
+
+
+def test_one_calculator_per_document(monkeypatch):
+    lookups = []
+    monkeypatch.setattr(measure, "recipe_uoms", lambda doc: lookups.append(doc) or {})
+    doc = FakeDoc()
+    calculator = liveamount._calculator(doc, False)
+    calculator.type_costs[7] = 100.0
+    calculator.type_methods[7] = measure.AREA
+
+    # Kept between runs; values read from the model are read again
+    assert liveamount._calculator(doc, False) is calculator
+    assert calculator.type_costs == {}
+    assert calculator.type_methods == {7: measure.AREA}
+    assert len(lookups) == 1
+
+    # Recipe units are looked up again only when a type changed
+    assert liveamount._calculator(doc, True) is calculator
+    assert len(lookups) == 2
+
+    assert liveamount._calculator(FakeDoc(2), False) is not calculator
+    doc.IsValidObject = False
+    assert liveamount._calculator(FakeDoc(1), False) is not calculator
+
+
+def test_changed_recipe_units_replace_the_calculator(monkeypatch):
+    uoms = [{u"Wall": u"m2"}]
+    monkeypatch.setattr(measure, "recipe_uoms", lambda doc: uoms[0])
+    doc = FakeDoc()
+    calculator = liveamount._calculator(doc, False)
+    assert liveamount._calculator(doc, True) is calculator
+    uoms[0] = {u"Wall": u"m3"}
+    assert liveamount._calculator(doc, True).uoms == {u"Wall": u"m3"}
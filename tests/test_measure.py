@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from pce import measure
+
+from conftest import load_recipes
+
+
+def test_boq_uom_spellings():
+    assert measure.method_for_uom(u"m3") == measure.VOLUME
+    assert measure.method_for_uom(u" m³ ") == measure.VOLUME
+    assert measure.method_for_uom(u"Sq M") == measure.AREA
+    assert measure.method_for_uom(u"No.") == measure.COUNT
+    assert measure.method_for_uom(u"lm") == measure.LENGTH
+    assert measure.method_for_uom(u"bag") is None
+    assert measure.method_for_uom(None) is None
+
+
+def test_material_method_reads_name_and_class():
+    assert measure.material_method(u"Concrete - Cast-in-Place Concrete") == measure.VOLUME
+    assert measure.material_method(u"Metal - Steel 43-275") == measure.LENGTH
+    assert measure.material_method(u"Timber Metal") == measure.LENGTH
+    assert measure.material_method(u"Timber - Pine") is None
+    assert measure.material_method(None) is None
+
+
+def test_framing_and_columns_follow_their_material():
+    framing = "OST_StructuralFraming"
+    assert measure.pick_method(framing) == measure.LENGTH
+    assert measure.pick_method(framing, by_material=measure.VOLUME) == measure.VOLUME
+    assert measure.pick_method("OST_StructuralColumns") == measure.VOLUME
+    assert measure.pick_method(
+        "OST_StructuralColumns", by_material=measure.LENGTH
+    ) == measure.LENGTH
+    # Material only decides for columns and framing
+    assert measure.pick_method("OST_Walls", by_material=measure.VOLUME) == measure.AREA
+
+
+def test_recipe_uom_wins_over_category_and_material():
+    assert measure.pick_method(
+        "OST_StructuralFraming", measure.AREA, measure.VOLUME
+    ) == measure.AREA
+    assert measure.pick_method("OST_Walls", measure.VOLUME) == measure.VOLUME
+
+
+def test_equipment_and_furniture_are_counted():
+    for category in ("OST_SpecialityEquipment", "OST_Furniture",
+                     "OST_FurnitureSystems"):
+        assert measure.pick_method(category) == measure.COUNT
+    assert measure.pick_method("OST_Topography") is None
+    assert measure.pick_method("OST_Topography", measure.VOLUME) is None
+
+
+def test_recipe_uoms_are_looked_up_by_type_name(tmp_path):
+    uoms = measure.RecipeUoms(load_recipes(tmp_path, u"""
+Wall 200,Brick,,,,,50,m2
+Beam,Cement,,,,,7,
+Strip footing {w}x{t}mm thick,Cement,,,,,7,m3
+"""))
+    assert uoms.get(u"Wall 200") == u"m2"
+    assert uoms.get(u"Beam") is None
+    assert uoms.get(u"Strip footing 300x150mm thick") == u"m3"
+    assert uoms.get(u"Unknown type", u"m") == u"m"
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from pce import modeltypes
+
+
+class Category(object):
+    def __init__(self, name):
+        self.Name = name
+
+
+class Elem(object):
+    def __init__(self, id_, category):
+        self.Id = id_
+        self.Category = Category(category) if category else None
+
+
+def test_type_index_groups_by_name():
+    index = modeltypes.TypeIndex()
+    index.add("Slab 150", Elem(1, "Floors"), "p1")
+    index.add("Slab 150", Elem(2, "Floors"), "p2")
+    index.add("Wall 230", Elem(3, "Walls"), "p3")
+    assert len(index) == 2
+    assert "Slab 150" in index
+    assert index.ids("Slab 150") == [1, 2]
+    assert index.ids("Roof") == []
+    assert sorted(index) == ["Slab 150", "Wall 230"]
+    assert index.collisions() == {}
+
+
+def test_type_index_reports_names_in_several_categories():
+    index = modeltypes.TypeIndex()
+    index.add("Generic 200", Elem(1, "Walls"), "p1")
+    index.add("Generic 200", Elem(2, "Floors"), "p2")
+    index.add("Generic 200", Elem(3, None), "p3")
+    assert index.collisions() == {"Generic 200": ["", "Floors", "Walls"]}
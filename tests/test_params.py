@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import sys
+import types
+
+import pytest
+
+from pce import params
+
+INVALID = -1
+ALL_MODEL_COST = 1
+HOST_VOLUME_COMPUTED = 2
+
+WALLS = 10
+DOORS = 20
+
+
+@pytest.fixture(autouse=True)
+def revit(monkeypatch):
+    """Fake ``pyrevit.DB.BuiltInParameter`` (members are ints here)."""
+    pyrevit = types.ModuleType("pyrevit")
+    pyrevit.DB = types.SimpleNamespace(BuiltInParameter=types.SimpleNamespace(
+        INVALID=INVALID, ALL_MODEL_COST=ALL_MODEL_COST,
+        HOST_VOLUME_COMPUTED=HOST_VOLUME_COMPUTED,
+    ))
+    monkeypatch.setitem(sys.modules, "pyrevit", pyrevit)
+
+
+class FakeParam(object):
+    def __init__(self, name, value=None, bip=INVALID, guid=None, definition=None):
+        self.Definition = definition or types.SimpleNamespace(
+            Name=name, BuiltInParameter=bip
+        )
+        self.IsShared = guid is not None
+        self.GUID = guid
+        self.value = value
+
+    @property
+    def HasValue(self):
+        return self.value is not None
+
+    def AsDouble(self):
+        return self.value
+
+
+class FakeElement(object):
+    def __init__(self, category, *parameters):
+        self.Category = types.SimpleNamespace(
+            Id=types.SimpleNamespace(IntegerValue=category)
+        )
+        self.parameters = parameters
+        self.lookups = 0
+
+    def LookupParameter(self, name):
+        self.lookups += 1
+        return next((p for p in self.parameters if p.Definition.Name == name), None)
+
+    def get_Parameter(self, key):
+        for p in self.parameters:
+            if key == p.Definition.BuiltInParameter and key != INVALID:
+                return p
+            if p.IsShared and key == p.GUID:
+                return p
+            if key is p.Definition:
+                return p
+        return None
+
+
+def test_built_in_parameter_is_resolved_once_per_category():
+    accessor = params.ParameterAccessor(params.PARAM_COST)
+    first = FakeElement(WALLS, FakeParam("Cost", 10.0, bip=ALL_MODEL_COST))
+    second = FakeElement(WALLS, FakeParam("Cost", 20.0, bip=ALL_MODEL_COST))
+    assert accessor.double(first) == 10.0
+    assert accessor.double(second) == 20.0
+    assert (first.lookups, second.lookups) == (1, 0)
+    assert accessor.fallbacks == 0
+
+
+def test_shared_parameter_is_read_by_guid():
+    accessor = params.ParameterAccessor(params.PARAM_AMOUNT)
+    first = FakeElement(DOORS, FakeParam(params.PARAM_AMOUNT, 1.0, guid="g-1"))
+    second = FakeElement(DOORS, FakeParam(u"Montant", 2.0, guid="g-1"))
+    assert accessor.double(first) == 1.0
+    assert accessor.double(second) == 2.0
+    assert second.lookups == 0
+
+
+def test_project_parameter_is_read_by_definition():
+    accessor = params.ParameterAccessor(params.PARAM_AMOUNT)
+    definition = types.SimpleNamespace(Name=params.PARAM_AMOUNT,
+                                       BuiltInParameter=INVALID)
+    first = FakeElement(DOORS, FakeParam(None, 1.0, definition=definition))
+    second = FakeElement(DOORS, FakeParam(None, 2.0, definition=definition))
+    assert accessor.double(first) == 1.0
+    assert accessor.double(second) == 2.0
+    assert second.lookups == 0
+
+
+def test_localised_name_falls_back_to_the_built_in():
+    accessor = params.ParameterAccessor(params.PARAM_VOLUME)
+    elem = FakeElement(WALLS, FakeParam(u"Volumen", 3.0, bip=HOST_VOLUME_COMPUTED))
+    assert accessor.double(elem) == 3.0
+    assert accessor.fallbacks == 0
+
+
+def test_missing_parameter_is_counted_and_retried_per_element():
+    accessors = params.Accessors()
+    bare = FakeElement(WALLS)
+    assert accessors.get(bare, params.PARAM_COST) is None
+    # the category was not resolved, so the next wall decides it
+    wall = FakeElement(WALLS, FakeParam("Cost", 5.0, bip=ALL_MODEL_COST))
+    assert accessors[params.PARAM_COST].double(wall) == 5.0
+    assert accessors.fallbacks == 1
+    assert accessors.fallback_summary() == u"Cost x1"
+
+
+def test_elements_the_getter_cannot_read_are_looked_up_by_name():
+    accessors = params.Accessors()
+    accessor = accessors[params.PARAM_AMOUNT]
+    accessor.get(FakeElement(DOORS, FakeParam(params.PARAM_AMOUNT, 1.0, guid="g-1")))
+    other = FakeElement(DOORS, FakeParam(params.PARAM_AMOUNT, None, guid="g-2"))
+    assert accessor.get(other) is other.parameters[0]
+    assert accessor.double(other) is None      # no value
+    assert accessors.fallback_counts() == {params.PARAM_AMOUNT: 2}
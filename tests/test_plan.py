@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from pce import plan
+
+
+class Param(object):
+    def __init__(self, fail=False):
+        self.value = None
+        self.fail = fail
+
+    def Set(self, value):
+        if self.fail:
+            raise RuntimeError("read-only")
+        self.value = value
+
+
+def test_noops_within_tolerance_are_not_written():
+    p = plan.ChangePlan()
+    same, new, changed = Param(), Param(), Param()
+    assert not p.add("Type", "Wall", same, 10.0, 10.004)
+    assert p.add("Type", "Slab", new, None, 5.0)
+    assert p.add("Type", "Door", changed, 10.0, 12.0)
+    assert p.apply() == 2
+    assert same.value is None and new.value == 5.0 and changed.value == 12.0
+    assert p.counts() == {"planned": 3, "written": 2, "skipped": 1,
+                          "failed": 0, "blocked": 0}
+
+
+def test_failed_writes_are_collected():
+    p = plan.ChangePlan()
+    p.add("Material", "Concrete", Param(fail=True), 1.0, 2.0)
+    assert p.apply() == 0
+    assert p.failed[0][1] == "read-only"
+
+
+def test_table_sorts_by_largest_change():
+    p = plan.ChangePlan()
+    p.add("Type", "Small", Param(), 10.0, 11.0)
+    p.add("Type", "Large", Param(), 10.0, 2.0)
+    rows = p.table()
+    assert [r[1] for r in rows] == ["Large", "Small"]
+    assert rows[0][4] == "-8.00"
+    assert [r[1] for r in p.table("Name")] == ["Large", "Small"]
+    assert p.sorted_writes("New value")[0].name == "Small"
+
+
+def test_tolerance_is_configurable():
+    p = plan.ChangePlan(tolerance=0.0)
+    assert p.add("Type", "Wall", Param(), 10.0, 10.004)
+    assert p.writes[0].delta == pytest.approx(0.004)
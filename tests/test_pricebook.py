@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import math
+import os
+import time
+
+import pytest
+
+from pce import pricebook
+
+from conftest import write_csv
+
+
+def test_compiled_book_reads_back_prices(price_csv, cache_dir):
+    with pricebook.load(price_csv, cache_dir) as book:
+        assert book.items == ["Cement", "Sand", "Stone"]
+        assert book.uoms == ["Bag", "m3", "m3"]
+        assert len(book) == 3 and "Sand" in book
+        assert book.price("Cement", "Central_Avg_UnitCost") == 105
+        assert book.price("Sand", "Central_Avg_UnitCost") is None
+        assert book.price("Gravel", "Central_Avg_UnitCost") is None
+        assert book.price("Cement", "Nowhere_Avg_UnitCost") is None
+        assert book.column("Lusaka_Avg_UnitCost")[1] == 50
+        assert math.isnan(book.column("Central_Avg_UnitCost")[1])
+
+
+def test_prices_for_falls_back_per_item(price_csv, cache_dir):
+    with pricebook.load(price_csv, cache_dir) as book:
+        prices, sources = book.prices_for(
+            "Central_Avg_UnitCost", "National_Avg_UnitCost"
+        )
+    assert prices == {"Cement": 105, "Sand": 55}
+    assert sources == {"Cement": "Central_Avg_UnitCost",
+                       "Sand": "National_Avg_UnitCost"}
+
+
+def test_bad_cells_are_reported_not_priced(tmp_path, cache_dir):
+    csv_path = write_csv(tmp_path / "prices.csv", u"""
+Item,UoM,Lusaka_Avg_UnitCost
+Cement,Bag,abc
+Sand,m3,-5
+,m3,10
+Stone,m3,-
+Sand,m3,60
+""")
+    with pricebook.load(csv_path, cache_dir) as book:
+        assert book.items == ["Cement", "Sand", "Stone"]
+        assert book.price("Cement", "Lusaka_Avg_UnitCost") is None
+        assert book.price("Sand", "Lusaka_Avg_UnitCost") == 60
+        assert book.price("Stone", "Lusaka_Avg_UnitCost") is None
+        report = u"\n".join(book.report)
+        assert book.report_path is not None
+    assert "not a number" in report
+    assert "must be positive" in report
+    assert "no Item name" in report
+    assert "duplicate item 'Sand'" in report
+
+
+def test_missing_item_column_is_an_error(tmp_path, cache_dir):
+    csv_path = write_csv(tmp_path / "prices.csv", u"Name,UoM\nCement,Bag\n")
+    with pytest.raises(pricebook.PriceBookError):
+        pricebook.load(csv_path, cache_dir)
+
+
+def test_cache_is_reused_until_the_csv_changes(price_csv, cache_dir):
+    first = pricebook.compile_to_cache(price_csv, cache_dir)
+    assert pricebook.compile_to_cache(price_csv, cache_dir) == first
+
+    # A new size/mtime compiles a new entry and prunes the stale one
+    with open(price_csv, "a") as f:
+        f.write("Lime,Bag,30,,,,,,,,\n")
+    later = time.time() + 10
+    os.utime(price_csv, (later, later))
+    second = pricebook.compile_to_cache(price_csv, cache_dir)
+    assert second != first
+    assert not os.path.exists(first)
+    with pricebook.PriceBook(second) as book:
+        assert "Lime" in book
+
+
+def test_corrupt_cache_entry_is_recompiled(price_csv, cache_dir):
+    target = pricebook.compile_to_cache(price_csv, cache_dir)
+    with open(target, "wb") as f:
+        f.write(b"garbage")
+    with pricebook.load(price_csv, cache_dir) as book:
+        assert book.price("Cement", "Lusaka_Avg_UnitCost") == 100
+
+
+def test_other_files_are_not_price_books(tmp_path):
+    path = str(tmp_path / "other.pcepb")
+    with open(path, "wb") as f:
+        f.write(pricebook.HEADER.pack(b"NOTABOOK", 0, 0, 0))
+    with pytest.raises(pricebook.PriceBookError):
+        pricebook.PriceBook(path)
+
+
+def test_locked_corrupt_cache_entry_compiles_beside_it(price_csv, cache_dir,
+                                                       monkeypatch):
+    target = pricebook.compile_to_cache(price_csv, cache_dir)
+    with open(target, "wb") as f:
+        f.write(b"garbage")
+
+    def locked(path):
+        raise OSError("in use by another process")
+
+    monkeypatch.setattr(pricebook.os, "remove", locked)
+    with pricebook.load(price_csv, cache_dir) as book:
+        assert book.path != target
+        assert book.price("Cement", "Lusaka_Avg_UnitCost") == 100
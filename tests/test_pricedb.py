@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from pce import pricedb
+
+from conftest import write_csv
+
+pytestmark = pytest.mark.skipif(not pricedb.available(), reason="no sqlite3")
+
+HEADER = u"Item,UoM,Lusaka_Avg_UnitCost,Central_Avg_UnitCost\n"
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = pricedb.connect(str(tmp_path / "prices.sqlite"))
+    yield conn
+    conn.close()
+
+
+def import_book(conn, tmp_path, date, body):
+    path = write_csv(tmp_path / "{}.csv".format(date), HEADER + body.lstrip())
+    return pricedb.import_prices(conn, path, date)
+
+
+def price(conn, as_of, item, province="Lusaka"):
+    book = pricedb.compile_as_of(conn, as_of)
+    value = book.matrix[book.columns.index(province + "_Avg_UnitCost")][book.items.index(item)]
+    return None if value != value else value
+
+
+def test_only_changed_cells_are_stored(conn, tmp_path):
+    assert import_book(conn, tmp_path, "2025-01-01", u"Cement,Bag,100,110\n")[:2] == (2, 0)
+    assert import_book(conn, tmp_path, "2025-02-01", u"Cement,Bag,120,110\n")[:2] == (1, 1)
+    assert price(conn, "2025-01-15", "Cement") == 100
+    assert price(conn, "2025-02-15", "Cement") == 120
+    assert price(conn, "2025-02-15", "Cement", "Central") == 110
+
+
+def test_withdrawn_items_end_at_the_revision(conn, tmp_path):
+    import_book(conn, tmp_path, "2025-01-01", u"Cement,Bag,100,110\nSand,m3,50,55\n")
+    import_book(conn, tmp_path, "2025-02-01", u"Cement,Bag,100,110\n")
+    assert price(conn, "2025-01-15", "Sand") == 50
+    assert price(conn, "2025-02-15", "Sand") is None
+
+
+def test_back_dated_import_does_not_change_later_revisions(conn, tmp_path):
+    import_book(conn, tmp_path, "2025-01-01", u"Cement,Bag,100,110\n")
+    import_book(conn, tmp_path, "2025-03-01", u"Cement,Bag,100,110\n")
+    import_book(conn, tmp_path, "2025-02-01", u"Cement,Bag,130,110\nSand,m3,50,55\n")
+
+    assert price(conn, "2025-01-15", "Cement") == 100
+    assert price(conn, "2025-02-15", "Cement") == 130
+    assert price(conn, "2025-02-15", "Sand") == 50
+    assert price(conn, "2025-03-15", "Cement") == 100
+    assert price(conn, "2025-03-15", "Sand") is None
+    assert price(conn, "2025-03-15", "Cement", "Central") == 110
+
+
+def test_load_prices_is_cached_per_revision(tmp_path, cache_dir):
+    db_path = str(tmp_path / "prices.sqlite")
+    conn = pricedb.connect(db_path)
+    try:
+        import_book(conn, tmp_path, "2025-01-01", u"Cement,Bag,100,110\n")
+    finally:
+        conn.close()
+    book = pricedb.load_prices("2025-06-30", db_path, cache_dir)
+    try:
+        assert book.price("Cement", "Lusaka_Avg_UnitCost") == 100
+    finally:
+        book.close()
+    with pytest.raises(pricedb.PriceDBError):
+        pricedb.load_prices("2024-12-31", db_path, cache_dir)
+
+
+def test_parse_date_rejects_other_formats():
+    assert pricedb.parse_date(" 2025-03-01 ") == "2025-03-01"
+    with pytest.raises(pricedb.PriceDBError):
+        pricedb.parse_date("01/03/2025")
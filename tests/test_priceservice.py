@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from pce import priceservice
+
+from conftest import write_csv, write_recipes
+
+LUSAKA_AVG = "Lusaka_Avg_UnitCost"
+NATIONAL_AVG = "National_Avg_UnitCost"
+
+
+@pytest.fixture
+def pricing_engine(tmp_path, price_csv, cache_dir):
+    supplier_dir = tmp_path / "material_costs"
+    supplier_dir.mkdir()
+    recipes_csv = write_recipes(tmp_path / "recipes.csv", u"""
+Slab,Cement,,,,,2,m3
+Mortar,cement,,,,,1,m3
+Footing,Stone,,,,,1,m3
+Slab {t}mm,Cement,,,,,=t/100,m2
+""")
+    engine = priceservice.PricingEngine(
+        price_csv, str(supplier_dir), recipes_csv,
+        str(tmp_path / "aliases.csv"), cache_dir,
+    )
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def client(pricing_engine):
+    client = priceservice.local_client(pricing_engine)
+    yield client
+    client.close()
+
+
+def test_local_client_prices_types(client):
+    table = client.scenario_table(["Slab", "Mortar", "Footing", "Nope"], LUSAKA_AVG)
+    assert table.columns == [LUSAKA_AVG]
+    assert table.get("Slab", LUSAKA_AVG).total_cost == pytest.approx(200.0)
+    # components are resolved through normalised names
+    assert table.get("Mortar", LUSAKA_AVG).total_cost == pytest.approx(100.0)
+    assert "Nope" not in table
+
+
+def test_templates_are_expanded_on_request(client):
+    table = client.scenario_table(["Slab 150mm"], LUSAKA_AVG)
+    assert table.get("Slab 150mm", LUSAKA_AVG).total_cost == pytest.approx(150.0)
+
+
+def test_prices_and_status(client, pricing_engine):
+    assert client.prices(LUSAKA_AVG, NATIONAL_AVG)["Sand"] == 50
+    client.prices(LUSAKA_AVG, NATIONAL_AVG)
+    assert client.status()["loads"] == pricing_engine.loads == 1
+
+
+def test_errors_are_raised_as_service_errors(client):
+    with pytest.raises(priceservice.ServiceError):
+        client.request("nonsense")
+    with pytest.raises(priceservice.ServiceError):
+        client.scenario_table(["Slab"], "Nowhere_Avg_UnitCost")
+
+
+def test_reloads_when_a_source_changes(client, pricing_engine, price_csv):
+    client.status()
+    client.prices(LUSAKA_AVG)
+    with open(price_csv, "a") as f:
+        f.write("Timber,m,10,11,12,,,,,,\n")
+    assert client.prices(LUSAKA_AVG)["Timber"] == 11
+    assert pricing_engine.loads == 2
+
+
+def test_socket_transport_round_trip(tmp_path, pricing_engine):
+    state_dir = str(tmp_path / "service")
+    (tmp_path / "service").mkdir()
+    ready = threading.Event()
+    server = threading.Thread(
+        target=priceservice.serve,
+        kwargs={"pricing_engine": pricing_engine, "state_dir": state_dir,
+                "ready": ready},
+    )
+    server.daemon = True
+    server.start()
+    assert ready.wait(5)
+
+    client = priceservice.connect(state_dir)
+    assert client is not None
+    try:
+        table = client.scenario_table(["Slab"], LUSAKA_AVG)
+        assert table.get("Slab", LUSAKA_AVG).total_cost == pytest.approx(200.0)
+
+        intruder = priceservice.Client(client.transport, token="wrong")
+        with pytest.raises(priceservice.ServiceError):
+            intruder.status()
+        client.request("stop")
+    finally:
+        client.close()
+    server.join(5)
+    assert not server.is_alive()
+    assert priceservice.connect(state_dir) is None
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+import os
+import zipfile
+from xml.sax.saxutils import escape
+
+import pytest
+
+from pce import editor, rateimport, xlsx
+from pce import recipes as recipe_loader
+
+from conftest import write_recipes
+
+PRICE_SHEET = "01 Material Prices"
+
+SHIPPED_XLSX = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, "PyCostEstimates.tab",
+    "Update.panel", "Apply Rate.pushbutton", "RATE BUILD UP TEMPLATE.xlsx",
+)
+
+
+def write_xlsx(path, sheets):
+    """
+    A minimal workbook: ``sheets`` is ``[(name, {ref: value})]`` where a
+    value is text, a number or ``(number, formula)``.
+    """
+    main = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    rel = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    pkg = "http://schemas.openxmlformats.org/package/2006/relationships"
+    with zipfile.ZipFile(str(path), "w") as z:
+        z.writestr("xl/workbook.xml", u'<workbook xmlns="{}" xmlns:r="{}"><sheets>{}'
+                   u'</sheets></workbook>'.format(main, rel, u"".join(
+                       u'<sheet name="{}" sheetId="{}" r:id="rId{}"/>'.format(
+                           escape(name, {'"': "&quot;"}), n, n)
+                       for n, (name, _) in enumerate(sheets, 1))))
+        z.writestr("xl/_rels/workbook.xml.rels", u'<Relationships xmlns="{}">{}'
+                   u'</Relationships>'.format(pkg, u"".join(
+                       u'<Relationship Id="rId{0}" Target="worksheets/sheet{0}.xml"/>'
+                       .format(n) for n in range(1, len(sheets) + 1))))
+        for n, (_name, cells) in enumerate(sheets, 1):
+            rows = {}
+            for ref, value in cells.items():
+                rows.setdefault(xlsx.split_ref(ref)[1], []).append((ref, value))
+            xml = []
+            for row in sorted(rows):
+                xml.append(u'<row r="{}">'.format(row))
+                for ref, value in sorted(rows[row], key=lambda c: xlsx.split_ref(c[0])):
+                    if isinstance(value, tuple):
+                        xml.append(u'<c r="{}"><f>{}</f><v>{}</v></c>'.format(
+                            ref, escape(value[1]), value[0]))
+                    elif isinstance(value, (int, float)):
+                        xml.append(u'<c r="{}"><v>{}</v></c>'.format(ref, value))
+                    else:
+                        xml.append(u'<c r="{}" t="inlineStr"><is><t>{}</t></is></c>'
+                                   .format(ref, escape(value)))
+                xml.append(u"</row>")
+            z.writestr("xl/worksheets/sheet{}.xml".format(n),
+                       u'<worksheet xmlns="{}"><sheetData>{}</sheetData></worksheet>'
+                       .format(main, u"".join(xml)).encode("utf-8"))
+    return str(path)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    price = u"'{}'!".format(PRICE_SHEET)
+    return write_xlsx(tmp_path / "rates.xlsx", [
+        (PRICE_SHEET, {
+            "A1": u"Material", "B1": u"Unit", "C1": u"Price",
+            "A2": u"Cement", "B2": u"Bag", "C2": 100,
+            "A3": u"Sand", "B3": u"m3", "C3": 50,
+            "A4": u"UPVC Pipes",
+            "A5": u"32mm", "C5": 20,
+        }),
+        (u"PLASTER", {
+            "A1": u"Plaster 12mm",
+            "A2": u"Cement", "B2": (50, price + "C2*0.5"),
+            "A3": u"Sand", "B3": (25, price + "C3/2"),
+            "A4": u"Add 20% labour", "B4": (15, "(B2+B3)*0.2"),
+            "A5": u"Cost /m2", "B5": (90, "SUM(B2:B4)"),
+            "A7": u"Screed",
+            "A8": u"Cement", "B8": (100, price + "C2"),
+            "A9": u"Cost /m2", "B9": (130, "SUM(B8:B8)*1.3"),
+            "A11": u"Pipe run",
+            "A12": u"Pipe", "B12": (40, price + "C5*2"),
+            "A13": u"Total", "B13": (40, "SUM(B12)"),
+        }),
+    ])
+
+
+def test_cell_references():
+    assert xlsx.column_index("A") == 0
+    assert xlsx.column_index("AB") == 27
+    assert xlsx.column_letters(27) == "AB"
+    assert xlsx.split_ref("$C$15") == (2, 15)
+    with pytest.raises(xlsx.XlsxError):
+        xlsx.split_ref("15C")
+
+
+def test_rows_stream_values_and_formulas(workbook):
+    with xlsx.Workbook(workbook) as book:
+        assert list(book.sheets) == [PRICE_SHEET, u"PLASTER"]
+        rows = dict(book.rows(u"PLASTER"))
+        assert [c.value for c in rows[2]] == [u"Cement", 50.0]
+        assert rows[2][1].formula == u"'01 Material Prices'!C2*0.5"
+        assert rows[2][1].ref == "B2" and rows[2][1].is_number
+        assert 6 not in rows
+        with pytest.raises(xlsx.XlsxError):
+            list(book.rows(u"Missing"))
+
+
+def test_not_a_workbook(tmp_path):
+    path = tmp_path / "rates.xlsx"
+    path.write_bytes(b"not a zip")
+    with pytest.raises(xlsx.XlsxError):
+        xlsx.Workbook(str(path))
+
+
+def test_price_sheet_names_sizes_after_their_heading(workbook):
+    with xlsx.Workbook(workbook) as book:
+        assert rateimport.find_price_sheet(book) == PRICE_SHEET
+        sheet = rateimport.PriceSheet.read(book, PRICE_SHEET)
+    assert sheet.items == {2: u"Cement", 3: u"Sand", 5: u"UPVC Pipes 32mm"}
+    assert sheet.lookup(u"'01 Material Prices'!$C$3*2") == (u"Sand", 50.0)
+    assert sheet.lookup(u"Other!C3") is None
+
+
+def test_extract_keeps_only_build_ups_that_add_up(workbook):
+    buildups, rejected = rateimport.extract(workbook)
+    assert [b.name for b in buildups] == [u"Plaster 12mm", u"Pipe run"]
+    plaster = buildups[0]
+    assert (plaster.sheet, plaster.ref, plaster.total, plaster.uom) == (
+        u"PLASTER", "B5", 90.0, u"m2"
+    )
+    assert [(l.kind, l.label, l.item, l.quantity, l.percent)
+            for l in plaster.lines] == [
+        (rateimport.MATERIAL, u"Cement", u"Cement", 0.5, None),
+        (rateimport.MATERIAL, u"Sand", u"Sand", 0.5, None),
+        (rateimport.PERCENT, rateimport.LABOUR, None, None, 0.2),
+    ]
+    assert buildups[1].lines[0].item == u"UPVC Pipes 32mm"
+    assert [(sheet, name, ref) for sheet, name, ref, _ in rejected] == [
+        (u"PLASTER", u"Screed", "B9"),
+    ]
+
+
+def test_recipe_rows_price_like_the_workbook(workbook):
+    buildups, _ = rateimport.extract(workbook)
+    header = [
+        recipe_loader.TYPE_COLUMN, recipe_loader.COMPONENT_COLUMN,
+        recipe_loader.PERCENT_COLUMN, recipe_loader.FIXED_COLUMN,
+        recipe_loader.TIME_COLUMN, recipe_loader.RATE_COLUMN,
+        recipe_loader.QUANTITY_COLUMN, recipe_loader.UOM_COLUMN, u"Comment",
+    ]
+    rows = buildups[0].recipe_rows(header)
+    recipe = recipe_loader.parse_rows([header] + rows)[u"Plaster 12mm"]
+    assert recipe.uom == u"m2"
+    assert dict(recipe.materials) == {u"Cement": 0.5, u"Sand": 0.5}
+    assert recipe.labour_percent == pytest.approx(0.2)
+    assert recipe.breakdown(75.0).total_cost == pytest.approx(90.0)
+    assert u"'PLASTER'!B5" in rows[0][-1]
+
+
+def test_merge_replaces_recipes_of_the_same_name(tmp_path, workbook):
+    path = write_recipes(tmp_path / "recipes.csv", u"""
+Plaster 12mm,Cement,,,,,9,m2
+Wall,Brick,,,,,50,m2
+""")
+    sheet = editor.RecipeSheet.load(path)
+    buildups, _ = rateimport.extract(workbook)
+    added, replaced = rateimport.merge(sheet, buildups)
+    assert added == [u"Pipe run"]
+    assert replaced == [u"Plaster 12mm"]
+    book = sheet.book()
+    assert book[u"Plaster 12mm"].materials[u"Cement"] == 0.5
+    assert u"Wall" in book
+
+
+def test_shipped_template_imports():
+    buildups, _ = rateimport.extract(SHIPPED_XLSX)
+    assert buildups
+    assert all(b.problem() is None for b in buildups)
+    assert len(set(b.name for b in buildups)) == len(buildups)
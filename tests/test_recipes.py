@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from pce import recipes
+
+from conftest import load_recipes
+
+
+def test_order_puts_subrecipes_first(tmp_path):
+    rb = load_recipes(tmp_path, u"""
+Wall,Recipe: Mortar,,,,,0.2,m2
+Wall,Brick,,,,,50,
+Mortar,Recipe: Mix,,,,,1,m3
+Mix,Cement,,,,,7,m3
+""")
+    assert rb.order.index("Mix") < rb.order.index("Mortar") < rb.order.index("Wall")
+    assert rb.ancestors("Mix") == set(["Mortar", "Wall"])
+    assert rb.materials_of("Wall") == set(["Brick", "Cement"])
+    assert rb.flat_materials("Wall") == pytest.approx({"Brick": 50.0, "Cement": 1.4})
+
+
+def test_cycles_are_reported_not_followed(tmp_path):
+    rb = load_recipes(tmp_path, u"""
+A,Recipe: B,,,,,1,m3
+B,Recipe: A,,,,,1,m3
+C,Recipe: A,,,,,1,m3
+D,Cement,,,,,1,m3
+""")
+    assert set(rb.cycles) == set(["A", "B", "C"])
+    assert "recipe cycle" in rb.cycles["C"]
+    assert rb.flat_materials("A") == {}
+    assert "D" not in rb.cycles
+
+
+def test_undefined_subrecipe_is_reported(tmp_path):
+    rb = load_recipes(tmp_path, u"Wall,Recipe: Missing,,,,,1,m2\n")
+    assert any("Missing" in line for line in rb.report)
+
+
+def test_missing_type_column_is_an_error():
+    with pytest.raises(recipes.RecipeError):
+        recipes.parse_rows([[u"Component", u"Quantity"]])
+
+
+def test_empty_recipe(tmp_path):
+    rb = load_recipes(tmp_path, u"""
+Window,,,,,,,Each
+Cleaning,Labour Skilled,,50,,,,m2
+""")
+    assert rb["Window"].is_empty
+    assert not rb["Cleaning"].is_empty
+
+
+def test_templates_build_recipes_for_matching_names(tmp_path):
+    rb = load_recipes(tmp_path, u"""
+Strip footing 600x200mm thick,Cement,,,,,7,m3
+Strip footing {w}x{t}mm thick,Cement,,,,,=7 * w/1000 * t/1000,m
+Strip footing {w}x{t}mm thick,Labour Skilled,,=w/10,,,,
+""")
+    added = rb.expand([u"Strip footing 500x250mm thick",
+                       u"Strip footing 600x200mm thick", u"Pad footing"])
+    assert added == [u"Strip footing 500x250mm thick"]
+    recipe = rb[u"Strip footing 500x250mm thick"]
+    assert recipe.uom == u"m"
+    assert recipe.materials[u"Cement"] == pytest.approx(0.875)
+    assert recipe.labour_fixed == [pytest.approx(50.0)]
+    # the recipe written out in full wins
+    assert rb[u"Strip footing 600x200mm thick"].materials[u"Cement"] == 7
+
+
+def _shipped_recipes():
+    import os
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    return recipes.load(os.path.join(
+        here, os.pardir, "PyCostEstimates.tab", "Update.panel",
+        "Apply Rate.pushbutton", "recipes.csv",
+    ))
+
+
+def test_shipped_recipes_carry_the_strip_footing_template():
+    rb = _shipped_recipes()
+    assert [t.pattern for t in rb.templates] == [u"Strip footing {w}x{t}mm thick"]
+    assert rb.expand([u"Strip footing 700x250mm thick"])
+
+
+def test_shipped_template_reproduces_the_written_out_size():
+    rb = _shipped_recipes()
+    name = u"Strip footing 600x200mm thick"
+    explicit = rb[name]
+    built = rb.instantiate(name)
+    assert vars(built) == vars(explicit)
+    assert built.uom == u"m3"
+    assert built.breakdown(1234.5) == explicit.breakdown(1234.5)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from pce import resolve
+
+from conftest import load_recipes
+
+ITEMS = [u"Cement 42.5-50Kg", u"Building Sand", u"Quarry Dust (A)", u"Quarry Dust (C)"]
+
+
+def test_resolve_never_guesses():
+    resolver = resolve.Resolver(ITEMS, {u"cement bag": u"Cement 42.5-50Kg"})
+    assert resolver.resolve(u"Building Sand") == (u"Building Sand", resolve.EXACT)
+    assert resolver.resolve(u"Cement  Bag") == (u"Cement 42.5-50Kg", resolve.ALIAS)
+    assert resolver.resolve(u"building-sand") == (u"Building Sand", resolve.NORMALIZED)
+    assert resolver.resolve(u"Sand") == (None, None)
+
+
+def test_aliases_to_unknown_items_are_ignored():
+    resolver = resolve.Resolver(ITEMS, {u"gravel": u"Crushed stone"})
+    assert resolver.resolve(u"gravel") == (None, None)
+
+
+def test_suggestions_rank_closest_first():
+    resolver = resolve.Resolver(ITEMS)
+    suggestions = resolver.suggest(u"Cement 42.5 50 Kg")
+    assert suggestions[0].item == u"Cement 42.5-50Kg"
+    assert resolver.auto(suggestions) is suggestions[0]
+
+
+def test_ambiguous_suggestions_are_not_applied():
+    resolver = resolve.Resolver(ITEMS)
+    suggestions = resolver.suggest(u"Quarry Dust")
+    assert set(s.item for s in suggestions[:2]) == set(ITEMS[2:])
+    assert resolver.auto(suggestions) is None
+
+
+def test_resolve_and_rename_recipe_materials(tmp_path):
+    rb = load_recipes(tmp_path, u"""
+Mortar,building sand,,,,,1,m3
+Mortar,Building Sand,,,,,1,
+Mortar,Gravel,,,,,1,
+""")
+    resolved, unresolved = resolve.resolve_recipes(rb, resolve.Resolver(ITEMS))
+    assert resolved == {u"building sand": (u"Building Sand", resolve.NORMALIZED)}
+    assert unresolved == [u"Gravel"]
+
+    resolve.rename_materials(rb, {u"building sand": u"Building Sand"})
+    assert rb["Mortar"].materials[u"Building Sand"] == 2.0
+    assert rb.source["resolved"] == [(u"building sand", u"Building Sand")]
+
+
+def test_declined_suggestions_are_not_offered_again():
+    resolver = resolve.Resolver(ITEMS, rejected={u"quarry  dust": set([ITEMS[2]])})
+    suggestions = resolver.suggest(u"Quarry Dust")
+    assert [s.item for s in suggestions] == [ITEMS[3]]
+    assert resolver.resolve(u"Quarry Dust") == (None, None)
+    # other components are still offered the declined item
+    assert ITEMS[2] in [s.item for s in resolver.suggest(u"Quarry Dust A")]
+
+
+def test_aliases_and_rejections_round_trip(tmp_path):
+    path = str(tmp_path / "aliases.csv")
+    resolve.save_aliases({u"cement bag": ITEMS[0]}, path,
+                         {u"Quarry Dust": set(ITEMS[2:]), u"cement bag": set([ITEMS[1]])})
+    assert resolve.load_aliases(path) == {u"cement bag": ITEMS[0]}
+    assert resolve.load_rejected(path) == {
+        u"Quarry Dust": set(ITEMS[2:]), u"cement bag": set([ITEMS[1]]),
+    }
+    # saving aliases alone keeps the rejections
+    resolve.save_aliases({u"sand": ITEMS[1]}, path)
+    assert resolve.load_aliases(path) == {u"sand": ITEMS[1]}
+    assert u"Quarry Dust" in resolve.load_rejected(path)
+
+
+def test_two_column_alias_files_still_load(tmp_path):
+    path = tmp_path / "aliases.csv"
+    path.write_text(u"Component,Item\ncement bag,Cement 42.5-50Kg\n")
+    assert resolve.load_aliases(str(path)) == {u"cement bag": ITEMS[0]}
+    assert resolve.load_rejected(str(path)) == {}
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from pce import linear, pricebook, risk
+
+from conftest import load_recipes
+
+
+@pytest.fixture
+def model(tmp_path):
+    return linear.LinearModel(load_recipes(tmp_path, u"""
+Mortar,Cement,,,,,1,m3
+Mortar,Sand,,,,,2,
+Mortar,Labour Skilled,,20,,,,
+Slab,Stone,,,,,1,m3
+"""))
+
+
+def test_price_ranges_fall_back_to_national(price_csv, cache_dir):
+    with pricebook.load(price_csv, cache_dir) as book:
+        central = risk.price_ranges(book, "Central")
+        lusaka = risk.price_ranges(book, "Lusaka")
+    assert central == {"Cement": (95, 105, 115), "Sand": (45, 55, 65)}
+    assert lusaka["Stone"] == (200, 250, 300)
+
+
+def test_fixed_prices_give_the_deterministic_totals(model):
+    ranges = {"Cement": (100, 100, 100), "Sand": (50, 50, 50)}
+    result = risk.simulate(model, ranges, quantities={"Mortar": 3},
+                           groups={"Mortar": "Masonry"}, samples=50,
+                           use_numpy=False)
+    rate = model.totals({"Cement": 100, "Sand": 50})["Mortar"]
+    assert result.types["Mortar"] == pytest.approx((rate,) * 3)
+    assert result.groups["Masonry"] == pytest.approx((3 * rate,) * 3)
+    assert result.total == pytest.approx((3 * rate,) * 3)
+    assert result.backend == "python"
+    # no price range for Stone
+    assert result.skipped == {"Slab": "Stone"}
+
+
+@pytest.mark.parametrize("method", risk.METHODS)
+def test_percentiles_stay_within_the_price_range(model, method):
+    ranges = {"Cement": (90, 100, 130), "Sand": (40, 50, 60)}
+    result = risk.simulate(model, ranges, samples=2000, method=method,
+                           seed=7, use_numpy=False)
+    low = model.totals({"Cement": 90, "Sand": 40})["Mortar"]
+    high = model.totals({"Cement": 130, "Sand": 60})["Mortar"]
+    p10, p50, p90 = result.types["Mortar"]
+    assert low <= p10 < p50 < p90 <= high
+    # same seed, same run
+    again = risk.simulate(model, ranges, samples=2000, method=method,
+                          seed=7, use_numpy=False)
+    assert again.types == result.types
+
+
+def test_unknown_distribution_is_rejected(model):
+    with pytest.raises(ValueError):
+        risk.simulate(model, {}, method="uniform")
+
+
+def test_numpy_and_python_runs_agree(model):
+    pytest.importorskip("numpy")
+    ranges = {"Cement": (90, 100, 130), "Sand": (40, 50, 60)}
+    fast = risk.simulate(model, ranges, samples=20000, seed=1)
+    slow = risk.simulate(model, ranges, samples=20000, seed=1, use_numpy=False)
+    assert fast.backend == "numpy"
+    assert fast.types["Mortar"] == pytest.approx(slow.types["Mortar"], rel=0.01)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+import math
+import sys
+import types
+
+import pytest
+
+from pce import csvutil, pricebook, snapshot
+
+from conftest import write_recipes
+
+
+@pytest.fixture
+def snap(tmp_path, price_csv, cache_dir):
+    rows = csvutil.read_rows(write_recipes(tmp_path / "recipes.csv", u"""
+Mortar,Cement,,,,,1,m3
+Mortar,Sand,,,,,2,
+"""))
+    with pricebook.load(price_csv, cache_dir) as book:
+        return snapshot.Snapshot.build(
+            book, rows, {"Portland": "Cement"}, "Central_Avg_UnitCost",
+            snapshot.source_hash([price_csv]),
+        )
+
+
+# ---------------------------------------------------------------------
+# Stand-ins for the few Extensible Storage calls ``store`` and ``load`` make
+# ---------------------------------------------------------------------
+class _Typed(object):
+    """``entity.Get[String]`` / ``entity.Set[String]``."""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __getitem__(self, _type):
+        return self.func
+
+
+class FakeEntity(object):
+    def __init__(self, schema=None):
+        self.fields = {}
+        self.Get = _Typed(lambda field: self.fields.get(field))
+        self.Set = _Typed(self.fields.__setitem__)
+
+    def IsValid(self):
+        return True
+
+
+class FakeStorage(object):
+    def __init__(self):
+        self.entity = None
+        self.writes = 0
+
+    @classmethod
+    def Create(cls, doc):
+        element = cls()
+        doc.elements.append(element)
+        return element
+
+    def GetEntity(self, schema):
+        return self.entity
+
+    def SetEntity(self, entity):
+        self.entity = entity
+        self.writes += 1
+
+
+class FakeDoc(object):
+    def __init__(self):
+        self.elements = []
+
+
+class FakeCollector(object):
+    def __init__(self, doc):
+        self.doc = doc
+
+    def OfClass(self, cls):
+        return [e for e in self.doc.elements if isinstance(e, cls)]
+
+
+@pytest.fixture
+def revit(monkeypatch, tmp_path):
+    """Fake ``pyrevit.DB`` and ``System``; the per-user cache in tmp_path."""
+    storage = types.SimpleNamespace(
+        Schema=types.SimpleNamespace(Lookup=lambda guid: "schema"),
+        DataStorage=FakeStorage,
+        Entity=FakeEntity,
+    )
+    pyrevit = types.ModuleType("pyrevit")
+    pyrevit.DB = types.SimpleNamespace(
+        ExtensibleStorage=storage, FilteredElementCollector=FakeCollector,
+    )
+    system = types.ModuleType("System")
+    system.Guid = str
+    system.String = str
+    monkeypatch.setitem(sys.modules, "pyrevit", pyrevit)
+    monkeypatch.setitem(sys.modules, "System", system)
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path / "localappdata"))
+    return FakeDoc()
+
+
+def test_source_hash_follows_content_not_location(tmp_path):
+    a = tmp_path / "a"
+    b = tmp_path / "b"
+    a.mkdir()
+    b.mkdir()
+    (a / "prices.csv").write_bytes(b"Item,UoM\nCement,Bag\n")
+    (b / "prices.csv").write_bytes(b"Item,UoM\nCement,Bag\n")
+    first = snapshot.source_hash([str(a / "prices.csv"), str(a / "missing.csv")])
+    assert first == snapshot.source_hash([str(b / "prices.csv")])
+    (b / "prices.csv").write_bytes(b"Item,UoM\nCement,Bag 50kg\n")
+    assert first != snapshot.source_hash([str(b / "prices.csv")])
+
+
+def test_payload_round_trip(snap):
+    back = snapshot.Snapshot.from_payload(
+        snap.hash, snap.scenario, snap.created, snap.to_payload()
+    )
+    assert back.book.items == snap.book.items
+    assert back.book.uoms == snap.book.uoms
+    assert back.book.columns == snap.book.columns
+    col = back.book.columns.index("Central_Avg_UnitCost")
+    assert back.book.matrix[col][0] == 105
+    assert math.isnan(back.book.matrix[col][1])     # Sand has no Central price
+    assert back.recipe_rows == snap.recipe_rows
+    assert back.aliases == {"Portland": "Cement"}
+
+
+def test_unreadable_payloads_are_reported(snap):
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.Snapshot.from_payload(snap.hash, "", "", "not base64!")
+    import base64
+    import zlib
+    future = base64.b64encode(zlib.compress(b'{"version": 99}')).decode("ascii")
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.Snapshot.from_payload(snap.hash, "", "", future)
+
+
+def test_cached_snapshot_opens_as_one_layer(snap, cache_dir):
+    snapshot.cache(snap, cache_dir)
+    assert snapshot.is_cached(snap.hash, cache_dir)
+    book, recipe_book, aliases = snapshot.open_cached(
+        (snap.hash, snap.scenario, snap.created), cache_dir
+    )
+    try:
+        assert [layer.name for layer in book.layers] == [snap.label()]
+        assert book.layers[0].book.price("Cement", "Central_Avg_UnitCost") == 105
+    finally:
+        book.close()
+    assert dict(recipe_book["Mortar"].materials) == {"Cement": 1.0, "Sand": 2.0}
+    assert aliases == {"Portland": "Cement"}
+
+
+def test_store_writes_the_payload_once_per_hash(snap, revit):
+    assert snapshot.read_header(revit) is None
+    assert snapshot.store(revit, snap) is True
+    (element,) = revit.elements
+    payload = element.entity.fields[snapshot.PAYLOAD_FIELD]
+    assert snapshot.read_header(revit) == (snap.hash, snap.scenario, snap.created)
+
+    # Same files, same scenario: nothing to write
+    assert snapshot.store(revit, snap) is False
+    assert element.writes == 1
+
+    # Same files for another scenario: only the scenario field changes
+    other = snapshot.Snapshot(snap.hash, "Lusaka_Avg_UnitCost", "later",
+                              snap.book, snap.recipe_rows, snap.aliases)
+    assert snapshot.store(revit, other) is True
+    assert snapshot.read_header(revit) == (snap.hash, "Lusaka_Avg_UnitCost",
+                                           snap.created)
+    assert element.entity.fields[snapshot.PAYLOAD_FIELD] is payload
+
+    # Changed files: a new payload on the same element
+    changed = snapshot.Snapshot("f" * 40, snap.scenario, "later", snap.book,
+                                snap.recipe_rows[:2], snap.aliases)
+    assert snapshot.store(revit, changed) is True
+    assert len(revit.elements) == 1
+    assert element.entity.fields[snapshot.PAYLOAD_FIELD] != payload
+
+
+def test_load_reads_the_model_payload_into_the_cache(snap, revit, cache_dir):
+    snapshot.store(revit, snap)
+    assert not snapshot.is_cached(snap.hash, cache_dir)
+
+    content_hash, recipe_book = snapshot.load_recipes(revit, cache_dir)
+    assert content_hash == snap.hash
+    assert "Mortar" in recipe_book
+    assert snapshot.is_cached(snap.hash, cache_dir)
+
+    book, _recipes, aliases = snapshot.load(revit, cache_dir)
+    book.close()
+    assert aliases == {"Portland": "Cement"}
+
+
+def test_model_without_a_snapshot(revit):
+    assert snapshot.load(revit) is None
+    assert snapshot.load_recipes(revit) is None
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import os
+
+from pce import worksharing
+from pce.worksharing import BlockedQueue
+
+DOC = u"C:\\Models\\Clinic.rvt"
+
+
+def test_by_owner_groups_largest_first():
+    blocked = {
+        1: (u"ana", worksharing.OWNED),
+        2: (u"ana", worksharing.NOT_BORROWED),
+        3: (u"ben", worksharing.OWNED),
+        4: (u"", worksharing.UPDATED_IN_CENTRAL),
+        5: (u"ben", worksharing.DELETED_IN_CENTRAL),
+    }
+    assert worksharing.by_owner(blocked) == [
+        (u"ana", [1, 2]),
+        (u"ben", [3]),
+        (worksharing.UPDATED_IN_CENTRAL, [4]),
+        (worksharing.DELETED_IN_CENTRAL, [5]),
+    ]
+
+
+def test_queue_round_trip(tmp_path):
+    queue = BlockedQueue()
+    queue.add({101: (u"ana", worksharing.OWNED), 102: (u"", worksharing.UPDATED_IN_CENTRAL)})
+    queue.save(DOC, str(tmp_path))
+
+    loaded = BlockedQueue.load(DOC, str(tmp_path))
+    assert loaded.blocked == queue.blocked
+    assert len(loaded) == 2
+    # another model has its own queue
+    assert len(BlockedQueue.load(u"C:\\Models\\Other.rvt", str(tmp_path))) == 0
+
+
+def test_done_forgets_and_an_empty_queue_deletes_its_file(tmp_path):
+    queue = BlockedQueue({101: (u"ana", worksharing.OWNED)})
+    queue.save(DOC, str(tmp_path))
+    path = BlockedQueue.path_for(DOC, str(tmp_path))
+    assert os.path.exists(path)
+
+    queue.done([101, 999])
+    assert len(queue) == 0
+    queue.save(DOC, str(tmp_path))
+    assert not os.path.exists(path)
+    queue.save(DOC, str(tmp_path))      # nothing to delete
+
+
+def test_unreadable_or_foreign_queue_is_empty(tmp_path):
+    path = BlockedQueue.path_for(DOC, str(tmp_path))
+    with open(path, "w") as f:
+        f.write("{\"version\": 1, \"blo")
+    assert len(BlockedQueue.load(DOC, str(tmp_path))) == 0
+    with open(path, "w") as f:
+        f.write("{\"version\": 99, \"doc\": \"x\", \"blocked\": {\"1\": [\"\", \"\"]}}")
+    assert len(BlockedQueue.load(DOC, str(tmp_path))) == 0